@@ -32,6 +32,7 @@ import re
 import redis as redis_sync
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from urllib.parse import urlparse, unquote
+from backend.config.metrics import get_metrics_aggregator
 from backend.config.oss import get_presigned_url_for_download
 from backend.config.redis import get_redis_client
 
@@ -979,7 +980,8 @@ class RAGNodes:
         labels = {"model": model_name, "collection": collection_id}
         result["labels"] = labels
         try:
-            redis_client = self._get_sync_redis_client()
+            # 计数先在进程内聚合，由聚合器按间隔以单次流水线写入 Redis
+            aggregator = get_metrics_aggregator()
             windows = [
                 ("1m", now_ts // 60),
                 ("1h", now_ts // 3600)
@@ -989,10 +991,9 @@ class RAGNodes:
                     f"{self.metrics_redis_prefix}:semantic_rerank:"
                     f"window={window_name}:bucket={bucket}:collection={collection_id}:model={model_name}"
                 )
-                redis_client.hincrby(redis_key, "total", 1)
+                aggregator.hincr(redis_key, "total", 1, ttl=7 * 24 * 3600)
                 if rerank_stats.get("fallback"):
-                    redis_client.hincrby(redis_key, "fallback", 1)
-                redis_client.expire(redis_key, 7 * 24 * 3600)
+                    aggregator.hincr(redis_key, "fallback", 1, ttl=7 * 24 * 3600)
             result["emitted"] = True
             return result
         except Exception as exc:
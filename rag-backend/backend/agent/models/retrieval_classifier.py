@@ -1,9 +1,23 @@
 import json
 import math
+import mmap
 import re
+import struct
+import sys
+import threading
 import time
+from array import array
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 编译后的二进制模型格式：
+#   [magic 8B][header_len uint32 LE][header JSON][padding 至8字节对齐]
+#   [token_logits float64 * N][vocab utf-8, 以\n分隔]
+# token_logits[i] = log P(token_i|pos) - log P(token_i|neg)，推理时只需查表求和。
+COMPILED_MODEL_MAGIC = b"RICNB001"
+COMPILED_MODEL_SUFFIX = ".nbc"
+_COMPILED_HEADER = struct.Struct("<8sI")
+_LIKELIHOOD_FLOOR = 1e-12
 
 
 def _normalize_text(value: Any) -> str:
@@ -19,10 +33,230 @@ def tokenize_text(text: str) -> List[str]:
     return re.findall(r"[a-z0-9_]+|[\u4e00-\u9fff]", raw)
 
 
+def _sigmoid(logit: float) -> float:
+    try:
+        return 1.0 / (1.0 + math.exp(-logit))
+    except OverflowError:
+        return 1.0 if logit > 0 else 0.0
+
+
+class CompiledIntentModel:
+    """朴素贝叶斯模型的数组化推理形式
+
+    训练产物中的 token_counts 在编译时被折叠为每个词的对数似然比，
+    连同先验对数几率与未登录词权重一起保存；单条预测只做 vocab 查表与求和。
+    """
+
+    def __init__(
+        self,
+        *,
+        vocab: Sequence[str],
+        token_logits: Sequence[float],
+        prior_logit: float,
+        unknown_logit: float,
+        model_version: str = "nb-v1",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if len(vocab) != len(token_logits):
+            raise ValueError("compiled_vocab_size_mismatch")
+        self.vocab_index: Dict[str, int] = {token: index for index, token in enumerate(vocab)}
+        self.token_logits = token_logits
+        self.prior_logit = float(prior_logit)
+        self.unknown_logit = float(unknown_logit)
+        self.model_version = model_version
+        self.metadata = metadata or {}
+        # mmap 加载时持有底层映射，避免 memoryview 失效
+        self._buffer: Any = None
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self.vocab_index)
+
+    def logit(self, tokens: Iterable[str]) -> float:
+        vocab_index = self.vocab_index
+        token_logits = self.token_logits
+        unknown_logit = self.unknown_logit
+        score = self.prior_logit
+        for token in tokens:
+            index = vocab_index.get(token)
+            score += unknown_logit if index is None else token_logits[index]
+        return score
+
+    def predict_probability(self, text: str) -> float:
+        return _sigmoid(self.logit(tokenize_text(text)))
+
+    def predict_probabilities(self, texts: Iterable[str]) -> List[float]:
+        return [self.predict_probability(text) for text in texts]
+
+
+def compile_model_payload(payload: Dict[str, Any]) -> CompiledIntentModel:
+    """把训练得到的计数模型（JSON payload 或训练中间结果）编译为查表模型"""
+    token_counts = payload.get("token_counts") or {}
+    class_counts = payload.get("class_counts") or {}
+    token_totals = payload.get("token_totals") or {}
+    if not isinstance(token_counts, dict):
+        raise ValueError("token_counts_invalid")
+    smoothing = float(payload.get("smoothing", 1.0))
+    vocab_size = max(1, int(payload.get("vocab_size", len(token_counts) or 1)))
+
+    pos_count = int(class_counts.get("pos", 0))
+    neg_count = int(class_counts.get("neg", 0))
+    total_examples = max(1, pos_count + neg_count)
+    prior_logit = math.log((pos_count + 1.0) / (total_examples + 2.0)) - math.log(
+        (neg_count + 1.0) / (total_examples + 2.0)
+    )
+
+    def _denominator(class_name: str) -> float:
+        denominator = int(token_totals.get(class_name, 0)) + smoothing * vocab_size
+        return denominator if denominator > 0 else 1.0
+
+    pos_denominator = _denominator("pos")
+    neg_denominator = _denominator("neg")
+
+    def _token_logit(pos_hits: int, neg_hits: int) -> float:
+        pos_likelihood = max((pos_hits + smoothing) / pos_denominator, _LIKELIHOOD_FLOOR)
+        neg_likelihood = max((neg_hits + smoothing) / neg_denominator, _LIKELIHOOD_FLOOR)
+        return math.log(pos_likelihood) - math.log(neg_likelihood)
+
+    vocab: List[str] = []
+    token_logits = array("d")
+    for token, stats in token_counts.items():
+        token_text = str(token)
+        if not token_text.strip() or "\n" in token_text:
+            continue
+        stats = stats or {}
+        vocab.append(token_text)
+        token_logits.append(_token_logit(int(stats.get("pos", 0)), int(stats.get("neg", 0))))
+
+    return CompiledIntentModel(
+        vocab=vocab,
+        token_logits=token_logits,
+        prior_logit=prior_logit,
+        unknown_logit=_token_logit(0, 0),
+        model_version=str(payload.get("model_version") or payload.get("version") or "nb-v1"),
+        metadata=payload.get("metadata") or {},
+    )
+
+
+def compiled_model_path_for(model_path: str | Path) -> Path:
+    return Path(model_path).with_suffix(COMPILED_MODEL_SUFFIX)
+
+
+def write_compiled_model(model: CompiledIntentModel, output_path: str | Path) -> Path:
+    output = Path(output_path)
+    vocab = sorted(model.vocab_index, key=model.vocab_index.__getitem__)
+    header = json.dumps(
+        {
+            "model_version": model.model_version,
+            "token_count": len(vocab),
+            "prior_logit": model.prior_logit,
+            "unknown_logit": model.unknown_logit,
+            "byteorder": sys.byteorder,
+            "metadata": model.metadata,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    prefix_len = _COMPILED_HEADER.size + len(header)
+    padding = b"\0" * ((-prefix_len) % 8)
+    token_logits = array("d", model.token_logits)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_name(f"{output.name}.tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(_COMPILED_HEADER.pack(COMPILED_MODEL_MAGIC, len(header)))
+        handle.write(header)
+        handle.write(padding)
+        handle.write(token_logits.tobytes())
+        handle.write("\n".join(vocab).encode("utf-8"))
+    tmp_path.replace(output)
+    return output
+
+
+def load_compiled_model(model_path: str | Path) -> CompiledIntentModel:
+    """通过 mmap 加载编译模型，权重数组直接引用映射内存，不做拷贝"""
+    with Path(model_path).open("rb") as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    magic, header_len = _COMPILED_HEADER.unpack_from(view, 0)
+    if magic != COMPILED_MODEL_MAGIC:
+        raise ValueError("compiled_model_magic_mismatch")
+    header_start = _COMPILED_HEADER.size
+    header = json.loads(bytes(view[header_start:header_start + header_len]).decode("utf-8"))
+    token_count = int(header.get("token_count", 0))
+    weights_start = header_start + header_len
+    weights_start += (-weights_start) % 8
+    weights_end = weights_start + token_count * 8
+    if weights_end > len(view):
+        raise ValueError("compiled_model_truncated")
+
+    token_logits: Sequence[float]
+    if header.get("byteorder", sys.byteorder) == sys.byteorder:
+        token_logits = view[weights_start:weights_end].cast("d")
+    else:
+        swapped = array("d", bytes(view[weights_start:weights_end]))
+        swapped.byteswap()
+        token_logits = swapped
+    vocab_blob = bytes(view[weights_end:]).decode("utf-8")
+    vocab = vocab_blob.split("\n") if token_count else []
+
+    model = CompiledIntentModel(
+        vocab=vocab,
+        token_logits=token_logits,
+        prior_logit=float(header.get("prior_logit", 0.0)),
+        unknown_logit=float(header.get("unknown_logit", 0.0)),
+        model_version=str(header.get("model_version") or "nb-v1"),
+        metadata=header.get("metadata") or {},
+    )
+    model._buffer = buffer
+    return model
+
+
+def compile_model_file(model_path: str | Path, output_path: str | Path | None = None) -> Path:
+    source = Path(model_path)
+    payload = json.loads(source.read_text(encoding="utf-8"))
+    target = Path(output_path) if output_path else compiled_model_path_for(source)
+    return write_compiled_model(compile_model_payload(payload), target)
+
+
+_compiled_model_cache: Dict[Tuple[str, int, int], CompiledIntentModel] = {}
+_compiled_model_cache_lock = threading.Lock()
+
+
+def _load_model_for_inference(model_path: str) -> CompiledIntentModel:
+    """加载推理模型（进程级缓存，按文件路径+mtime+size失效）
+
+    - 传入 .nbc 文件：直接 mmap 加载；
+    - 传入 JSON 文件：若同名 .nbc 存在且不旧于 JSON 则优先使用，否则在内存中编译。
+    """
+    path = Path(model_path).resolve()
+    stat = path.stat()
+    cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _compiled_model_cache_lock:
+        cached = _compiled_model_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if path.suffix == COMPILED_MODEL_SUFFIX:
+        model = load_compiled_model(path)
+    else:
+        compiled_path = compiled_model_path_for(path)
+        if compiled_path.exists() and compiled_path.stat().st_mtime_ns >= stat.st_mtime_ns:
+            model = load_compiled_model(compiled_path)
+        else:
+            model = compile_model_payload(json.loads(path.read_text(encoding="utf-8")))
+
+    with _compiled_model_cache_lock:
+        for key in [key for key in _compiled_model_cache if key[0] == cache_key[0]]:
+            _compiled_model_cache.pop(key, None)
+        _compiled_model_cache[cache_key] = model
+    return model
+
+
 class RetrievalIntentClassifier:
     """可训练的检索意图分类器（朴素贝叶斯推理）
 
-    模型文件为JSON格式，可通过 scripts/train_retrieval_intent_classifier.py 生成。
+    模型文件为JSON格式，可通过 scripts/train_retrieval_intent_classifier.py 生成；
+    同名 .nbc 编译产物存在时优先以 mmap 方式加载，推理为查表求和。
     """
 
     def __init__(
@@ -46,10 +280,7 @@ class RetrievalIntentClassifier:
         self.loaded_at_ms: Optional[int] = None
         self.metadata: Dict[str, Any] = {}
         self.vocab_size = 0
-        self.smoothing = 1.0
-        self.class_counts = {"pos": 0, "neg": 0}
-        self.token_totals = {"pos": 0, "neg": 0}
-        self.token_counts: Dict[str, Dict[str, int]] = {}
+        self.compiled: Optional[CompiledIntentModel] = None
         self._load_model()
 
     def _load_model(self) -> None:
@@ -61,71 +292,33 @@ class RetrievalIntentClassifier:
             self.error_message = f"model_not_found:{self.model_path}"
             return
         try:
-            payload = json.loads(path.read_text(encoding="utf-8"))
-            token_counts = payload.get("token_counts") or {}
-            class_counts = payload.get("class_counts") or {}
-            token_totals = payload.get("token_totals") or {}
-            if not isinstance(token_counts, dict):
-                raise ValueError("token_counts_invalid")
-            self.token_counts = {
-                str(token): {
-                    "pos": int((stats or {}).get("pos", 0)),
-                    "neg": int((stats or {}).get("neg", 0)),
-                }
-                for token, stats in token_counts.items()
-                if str(token).strip()
-            }
-            self.class_counts = {
-                "pos": int(class_counts.get("pos", 0)),
-                "neg": int(class_counts.get("neg", 0)),
-            }
-            self.token_totals = {
-                "pos": int(token_totals.get("pos", 0)),
-                "neg": int(token_totals.get("neg", 0)),
-            }
-            self.smoothing = float(payload.get("smoothing", 1.0))
-            self.vocab_size = max(1, int(payload.get("vocab_size", len(self.token_counts) or 1)))
-            self.model_version = str(payload.get("model_version") or payload.get("version") or "nb-v1")
-            self.metadata = payload.get("metadata") or {}
+            self.compiled = _load_model_for_inference(self.model_path)
+            self.vocab_size = self.compiled.vocab_size
+            self.model_version = self.compiled.model_version
+            self.metadata = self.compiled.metadata
             self.ready = True
             self.loaded_at_ms = int(time.time() * 1000)
             self.error_message = ""
         except Exception as exc:
             self.ready = False
+            self.compiled = None
             self.error_message = str(exc)
 
-    def _log_prob(self, tokens: List[str], class_name: str) -> float:
-        class_count = int(self.class_counts.get(class_name, 0))
-        total_examples = max(1, int(self.class_counts.get("pos", 0)) + int(self.class_counts.get("neg", 0)))
-        prior = math.log((class_count + 1.0) / (total_examples + 2.0))
-        token_total = int(self.token_totals.get(class_name, 0))
-        denominator = token_total + self.smoothing * self.vocab_size
-        if denominator <= 0:
-            denominator = 1.0
-        log_prob = prior
-        for token in tokens:
-            stats = self.token_counts.get(token, {})
-            token_count = int(stats.get(class_name, 0))
-            likelihood = (token_count + self.smoothing) / denominator
-            log_prob += math.log(max(likelihood, 1e-12))
-        return float(log_prob)
+    def _unavailable_result(self) -> Dict[str, Any]:
+        return {
+            "available": False,
+            "decision": None,
+            "reason": "classifier_disabled" if not self.enabled else (self.error_message or "model_unavailable"),
+            "model_version": self.model_version,
+        }
 
-    def predict(self, text: str) -> Dict[str, Any]:
-        if not self.enabled:
-            return {
-                "available": False,
-                "decision": None,
-                "reason": "classifier_disabled",
-                "model_version": self.model_version,
-            }
-        if not self.ready:
-            return {
-                "available": False,
-                "decision": None,
-                "reason": self.error_message or "model_unavailable",
-                "model_version": self.model_version,
-            }
-        tokens = tokenize_text(text)
+    def _thresholds(self) -> Dict[str, float]:
+        return {
+            "positive": self.positive_threshold,
+            "negative": self.negative_threshold,
+        }
+
+    def _build_result(self, tokens: List[str]) -> Dict[str, Any]:
         if not tokens:
             return {
                 "available": True,
@@ -135,19 +328,11 @@ class RetrievalIntentClassifier:
                 "band": "certain_no",
                 "reason": "empty_input",
                 "model_version": self.model_version,
-                "thresholds": {
-                    "positive": self.positive_threshold,
-                    "negative": self.negative_threshold,
-                },
+                "thresholds": self._thresholds(),
             }
 
-        log_pos = self._log_prob(tokens, "pos")
-        log_neg = self._log_prob(tokens, "neg")
-        logit = log_pos - log_neg
-        try:
-            prob_need_retrieval = 1.0 / (1.0 + math.exp(-logit))
-        except OverflowError:
-            prob_need_retrieval = 1.0 if logit > 0 else 0.0
+        assert self.compiled is not None
+        prob_need_retrieval = _sigmoid(self.compiled.logit(tokens))
         confidence = abs(prob_need_retrieval - 0.5) * 2.0
         decision: Optional[bool] = None
         band = "uncertain"
@@ -171,9 +356,17 @@ class RetrievalIntentClassifier:
             "model_version": self.model_version,
             "model_path": self.model_path,
             "token_count": len(tokens),
-            "thresholds": {
-                "positive": self.positive_threshold,
-                "negative": self.negative_threshold,
-            },
+            "thresholds": self._thresholds(),
             "metadata": self.metadata,
         }
+
+    def predict(self, text: str) -> Dict[str, Any]:
+        if not self.enabled or not self.ready:
+            return self._unavailable_result()
+        return self._build_result(tokenize_text(text))
+
+    def predict_many(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """批量推理，供评测与阈值建议路径使用"""
+        if not self.enabled or not self.ready:
+            return [self._unavailable_result() for _ in texts]
+        return [self._build_result(tokenize_text(text)) for text in texts]
@@ -228,6 +228,27 @@ reasoning: [判断理由] - 详细说明为什么需要或不需要检索的原
 
 【对话历史】
 {history}
+"""
+
+    @staticmethod
+    def get_incremental_conversation_summary_prompt() -> str:
+        """获取增量对话摘要提示词
+        
+        在已有摘要基础上合并新增的若干轮对话，生成新的滚动摘要，
+        避免每次重新总结整段历史。
+        """
+        return """
+你是一个对话总结助手。下面给出同一会话的已有摘要，以及摘要之后新增的多轮对话，请将二者合并为一份新的简洁中文摘要：
+- 用户的大致身份或角色（如果有提到）
+- 本轮对话的主要目标或主题
+- 已经达成的重要结论或共识
+新增对话与已有摘要冲突时以新增对话为准；不要逐句复述原文，只保留对后续对话有用的关键信息，控制在 3~5 句话之内。
+
+【已有摘要】
+{summary}
+
+【新增对话】
+{history}
 """
 
     @staticmethod
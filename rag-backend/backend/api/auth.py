@@ -27,16 +27,14 @@ async def register(register_request: RegisterRequest):
 
 @router.get("/me", response_model=Response)
 async def get_current_user_info(current_user: int = Depends(get_current_user)):
-    """获取当前用户信息"""
-    from backend.service.auth import get_user_by_id
-    
-    user = await get_user_by_id(current_user)
-    if not user:
+    """获取当前用户信息（主体缓存命中时不访问数据库）"""
+    principal = await auth.get_user_principal(current_user)
+    if not principal:
         return Response.error("用户不存在")
     
     return Response.success({
-        "username": user.username,
-        "email": user.email
+        "username": principal["username"],
+        "email": principal["email"]
     })
 
 
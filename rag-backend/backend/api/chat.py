@@ -25,12 +25,14 @@ def _ensure_user_match(target_user_id: str | int, current_user: int) -> None:
 
 
 async def _ensure_conversation_owner(conversation_id: str, current_user: int) -> None:
-    conv_result = await conversation_service.get_conversation_by_id(conversation_id)
-    if not conv_result.get("success"):
-        raise HTTPException(status_code=404, detail="对话不存在")
-    conv_user_id = str((conv_result.get("data") or {}).get("user_id") or "")
-    if conv_user_id != str(current_user):
+    owner_result = await conversation_service.verify_conversation_owner(conversation_id, current_user)
+    if owner_result.get("success"):
+        return
+    if owner_result.get("reason") == "forbidden":
         raise HTTPException(status_code=403, detail="无权限访问该会话")
+    if owner_result.get("reason") == "error":
+        raise HTTPException(status_code=500, detail=owner_result.get("message", "校验对话归属失败"))
+    raise HTTPException(status_code=404, detail="对话不存在")
 
 @router.post('/chat')
 async def chat(
@@ -201,6 +203,84 @@ async def get_single_conversation_history(
         return Response.error(f"服务器内部错误: {str(e)}")
 
 
+@router.get('/history/page/{conversation_id}')
+async def get_conversation_history_page(
+    conversation_id: str,
+    before_id: Optional[int] = Query(None, ge=1, description="翻页游标，返回 id 小于该值的消息"),
+    limit: int = Query(50, ge=1, le=200, description="每页条数"),
+    include_traces: bool = Query(False, description="是否包含节点轨迹消息"),
+    current_user: int = Depends(get_current_user)
+) -> Response:
+    """
+    键集分页查询会话历史，默认只返回对话与摘要消息
+    
+    Args:
+        conversation_id: 会话ID
+        before_id: 翻页游标（上一页返回的 next_before_id）
+        limit: 每页条数
+        include_traces: 是否包含节点轨迹消息
+        current_user: 当前用户
+        
+    Returns:
+        Response: 分页历史记录
+    """
+    try:
+        await _ensure_conversation_owner(conversation_id, current_user)
+        result = await chat_service.get_chat_history_page(
+            conversation_id,
+            before_id=before_id,
+            limit=limit,
+            include_traces=include_traces
+        )
+        if result.get("success"):
+            return Response.success(result)
+        return Response.error(result.get("message", "获取对话历史失败"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"分页查询对话历史接口异常: {str(e)}")
+        return Response.error(f"服务器内部错误: {str(e)}")
+
+
+@router.get('/history/traces/{conversation_id}')
+async def get_conversation_traces(
+    conversation_id: str,
+    after_id: Optional[int] = Query(None, ge=0, description="起始对话消息 id（不含）"),
+    before_id: Optional[int] = Query(None, ge=1, description="结束对话消息 id（不含）"),
+    limit: int = Query(200, ge=1, le=200, description="最大返回条数"),
+    current_user: int = Depends(get_current_user)
+) -> Response:
+    """
+    按需查询一轮对话的节点轨迹（前端展开轨迹时调用）
+    
+    Args:
+        conversation_id: 会话ID
+        after_id: 起始对话消息 id
+        before_id: 结束对话消息 id
+        limit: 最大返回条数
+        current_user: 当前用户
+        
+    Returns:
+        Response: 轨迹消息列表
+    """
+    try:
+        await _ensure_conversation_owner(conversation_id, current_user)
+        result = await chat_service.get_chat_trace_list(
+            conversation_id,
+            after_id=after_id,
+            before_id=before_id,
+            limit=limit
+        )
+        if result.get("success"):
+            return Response.success(result)
+        return Response.error(result.get("message", "获取对话轨迹失败"))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询对话轨迹接口异常: {str(e)}")
+        return Response.error(f"服务器内部错误: {str(e)}")
+
+
 @router.get('/history/titles/{user_id}')
 async def get_chat_history_titles(
     user_id: str,
@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from backend.param.knowledge_library import (
@@ -107,6 +108,13 @@ async def start_document_graph(document_id: int, current_user: int = Depends(get
     return await library_service.start_document_graph(document_id, current_user)
 
 
+@router.post("/documents/{document_id}/reingest")
+async def reingest_document(document_id: int, current_user: int = Depends(get_current_user)):
+    """增量重新入库文档（文档更新后只处理变化的分块）"""
+    logger.info(f"用户 {current_user} 请求重新入库文档: {document_id}")
+    return await library_service.start_document_reingest(document_id, current_user)
+
+
 @router.get("/documents/{document_id}/content")
 async def get_document_content(document_id: int, current_user: int = Depends(get_current_user)):
     """获取文档内容用于预览（支持 md/txt 等纯文本）"""
@@ -115,10 +123,29 @@ async def get_document_content(document_id: int, current_user: int = Depends(get
 
 
 @router.get("/documents/{document_id}/chunks")
-async def get_document_chunks(document_id: int, current_user: int = Depends(get_current_user)):
-    """获取文档的分块信息"""
+async def get_document_chunks(
+    document_id: int,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    current_user: int = Depends(get_current_user)
+):
+    """分页获取文档的分块信息（cursor 为上一页返回的 next_cursor）"""
     logger.info(f"用户 {current_user} 请求获取文档分块信息: {document_id}")
-    return await library_service.get_document_chunks(document_id, current_user)
+    return await library_service.get_document_chunks(document_id, current_user, cursor=cursor, page_size=page_size)
+
+
+@router.get("/documents/{document_id}/job")
+async def get_document_job(document_id: int, current_user: int = Depends(get_current_user)):
+    """获取文档入库任务状态（排队/处理中/重试/失败）"""
+    logger.info(f"用户 {current_user} 请求获取文档任务状态: {document_id}")
+    return await library_service.get_document_job_status(document_id, current_user)
+
+
+@router.get("/cleanup/{task_id}")
+async def get_vector_cleanup(task_id: str, current_user: int = Depends(get_current_user)):
+    """获取删除文档后向量清理任务的状态"""
+    logger.info(f"用户 {current_user} 请求获取向量清理任务状态: {task_id}")
+    return await library_service.get_vector_cleanup_status(task_id, current_user)
 
 
 @router.get("/processing/queue-status")
@@ -1,7 +1,6 @@
 import asyncio
 import hashlib
 import json
-import math
 import os
 import random
 import time
@@ -22,7 +21,13 @@ from ragas.embeddings import LangchainEmbeddingsWrapper
 
 from backend.agent.contexts.raggraph_context import RAGContext
 from backend.agent.graph.raggraph import RAGGraph
-from backend.agent.models.retrieval_classifier import RetrievalIntentClassifier, tokenize_text
+from backend.agent.models.retrieval_classifier import (
+    RetrievalIntentClassifier,
+    compile_model_payload,
+    compiled_model_path_for,
+    tokenize_text,
+    write_compiled_model,
+)
 from backend.agent.models.raggraph_models import RetrievalMode
 from backend.config.agent import get_rag_graph_for_collection
 from backend.config.dependencies import get_current_user
@@ -420,36 +425,6 @@ def _train_nb_classifier_model(
     }
 
 
-def _predict_nb_classifier_probability(model: Dict[str, Any], text: str) -> float:
-    tokens = tokenize_text(text)
-    token_counts = model["token_counts"]
-    class_counts = model["class_counts"]
-    token_totals = model["token_totals"]
-    vocab_size = max(1, int(model["vocab_size"]))
-    smoothing = max(1e-6, float(model["smoothing"]))
-    total_examples = max(1, int(class_counts["pos"]) + int(class_counts["neg"]))
-
-    def _log_prob(class_name: str) -> float:
-        prior = math.log((int(class_counts[class_name]) + 1.0) / (total_examples + 2.0))
-        denominator = int(token_totals[class_name]) + smoothing * vocab_size
-        if denominator <= 0:
-            denominator = 1.0
-        score = prior
-        for token in tokens:
-            stats = token_counts.get(token) or {"pos": 0, "neg": 0}
-            likelihood = (int(stats[class_name]) + smoothing) / denominator
-            score += math.log(max(likelihood, 1e-12))
-        return score
-
-    log_pos = _log_prob("pos")
-    log_neg = _log_prob("neg")
-    logit = log_pos - log_neg
-    try:
-        return 1.0 / (1.0 + math.exp(-logit))
-    except OverflowError:
-        return 1.0 if logit > 0 else 0.0
-
-
 def _binary_metrics_from_prob_rows(prob_rows: List[Tuple[float, int]]) -> Dict[str, Any]:
     tp = fp = tn = fn = 0
     for prob, label in prob_rows:
@@ -599,11 +574,12 @@ def _suggest_classifier_thresholds(prob_rows: List[Tuple[float, int]]) -> Dict[s
 
 
 def _evaluate_nb_classifier_model(model: Dict[str, Any], samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    compiled = compile_model_payload(model)
     start = time.perf_counter()
-    prob_rows: List[Tuple[float, int]] = []
-    for sample in samples:
-        prob = _predict_nb_classifier_probability(model, sample["text"])
-        prob_rows.append((prob, int(sample["label"])))
+    probabilities = compiled.predict_probabilities(sample["text"] for sample in samples)
+    prob_rows: List[Tuple[float, int]] = [
+        (prob, int(sample["label"])) for prob, sample in zip(probabilities, samples)
+    ]
     elapsed_ms = (time.perf_counter() - start) * 1000
     metrics = _binary_metrics_from_prob_rows(prob_rows)
     avg_latency_ms = (elapsed_ms / len(samples)) if samples else None
@@ -694,6 +670,7 @@ def _train_classifier_payload(payload: TrainClassifierRequest, current_user: Any
         },
     }
     model_path.write_text(json.dumps(serializable_model, ensure_ascii=False), encoding="utf-8")
+    compiled_path = write_compiled_model(compile_model_payload(serializable_model), compiled_model_path_for(model_path))
 
     recommended_positive = float(payload.positive_threshold) if payload.positive_threshold is not None else float(
         threshold_suggestion.get("positive_threshold") or 0.75
@@ -735,6 +712,7 @@ def _train_classifier_payload(payload: TrainClassifierRequest, current_user: Any
 
     response_payload = {
         "model_path": str(model_path),
+        "compiled_model_path": str(compiled_path),
         "model_name": model_name,
         "model_version": serializable_model.get("model_version"),
         "recommended_thresholds": {
@@ -1,7 +1,10 @@
 import os
-from threading import Lock
+from threading import RLock
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
 
 # 加载 .env 后面应该可以只保留main文件里的
@@ -9,10 +12,60 @@ load_dotenv()
 
 Base = declarative_base()
 
+# 同步驱动 -> 异步驱动 的映射，用于从 DB_URL 推导异步连接串
+_ASYNC_DRIVER_MAP = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _pool_options(db_url: str) -> dict:
+    """连接池参数，可通过环境变量调整
+
+    pool_size/max_overflow/pool_timeout 只对 QueuePool 系列生效；sqlite 内存库等使用
+    SingletonThreadPool/StaticPool 的方言不接受这些参数，跳过。
+    """
+    options = {
+        "pool_pre_ping": True,                                      # 防止连接失效
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 3600),          # 定时回收连接
+    }
+    url = make_url(db_url)
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        options.update(
+            pool_size=_env_int("DB_POOL_SIZE", 10),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 20),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        )
+    return options
+
+
+def to_async_db_url(db_url: str) -> str:
+    """将同步 DB_URL 转换为对应的异步驱动连接串（已是异步驱动则原样返回）"""
+    url = make_url(db_url)
+    async_driver = _ASYNC_DRIVER_MAP.get(url.drivername)
+    if async_driver is None:
+        return db_url
+    return url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
 class DatabaseFactory:
     _engine = None
     _Session = None
-    _lock = Lock()
+    _async_engine = None
+    _AsyncSession = None
+    _lock = RLock()  # 可重入：get_session 持锁时会调用 get_engine
 
     @classmethod
     def get_engine(cls):
@@ -29,9 +82,8 @@ class DatabaseFactory:
                         raise RuntimeError("❌ DB_URL not found in environment variables")
                     cls._engine = create_engine(
                         db_url,
-                        pool_pre_ping=True,       # 防止连接失效
-                        pool_recycle=3600,        # 定时回收连接
-                        echo=False                # 调试时可设 True 打印 SQL
+                        echo=False,               # 调试时可设 True 打印 SQL
+                        **_pool_options(db_url)
                     )
         return cls._engine
 
@@ -50,10 +102,57 @@ class DatabaseFactory:
 
     @classmethod
     def create_session(cls):
-        """创建一个新的数据库会话实例"""
-        engine = cls.get_engine()
-        Session = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-        return Session()
+        """创建一个新的数据库会话实例（复用缓存的Session工厂）"""
+        return cls.get_session()()
+
+    @classmethod
+    def get_async_engine(cls):
+        """获取异步引擎单例
+
+        优先读取 ASYNC_DB_URL，否则由 DB_URL 推导（如 postgresql -> postgresql+asyncpg）。
+        """
+        if cls._async_engine is None:
+            with cls._lock:
+                if cls._async_engine is None:
+                    db_url = os.getenv("ASYNC_DB_URL") or os.getenv("DB_URL")
+                    if not db_url:
+                        raise RuntimeError("❌ DB_URL not found in environment variables")
+                    async_db_url = to_async_db_url(db_url)
+                    cls._async_engine = create_async_engine(
+                        async_db_url,
+                        echo=False,
+                        **_pool_options(async_db_url)
+                    )
+        return cls._async_engine
+
+    @classmethod
+    def get_async_session(cls) -> async_sessionmaker:
+        """获取缓存的异步Session工厂"""
+        if cls._AsyncSession is None:
+            with cls._lock:
+                if cls._AsyncSession is None:
+                    engine = cls.get_async_engine()
+                    cls._AsyncSession = async_sessionmaker(
+                        bind=engine,
+                        class_=AsyncSession,
+                        autoflush=False,
+                        expire_on_commit=False
+                    )
+        return cls._AsyncSession
+
+    @classmethod
+    def create_async_session(cls) -> AsyncSession:
+        """创建一个新的异步数据库会话，建议配合 async with 使用"""
+        return cls.get_async_session()()
+
+    @classmethod
+    async def dispose_async_engine(cls) -> None:
+        """释放异步连接池（应用关闭时调用）"""
+        engine = cls._async_engine
+        cls._async_engine = None
+        cls._AsyncSession = None
+        if engine is not None:
+            await engine.dispose()
 
     @classmethod
     def get_base(cls):
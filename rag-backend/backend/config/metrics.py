@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内指标聚合器
+业务代码只在内存里累加计数器/直方图，后台线程按固定间隔把增量合并成一次 Redis 流水线事务写出，
+避免每轮对话为计数器付出多次同步往返。写出的 key 与类型保持不变（字符串计数用 INCRBY，哈希计数用 HINCRBY），
+原有读取路径无需改动。
+"""
+import atexit
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import redis as redis_sync
+from backend.config.log import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("RAG_METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+METRICS_DEFAULT_TTL_SECONDS = int(os.getenv("RAG_METRICS_TTL_SECONDS", str(7 * 24 * 3600)))
+# 写出持续失败时最多保留的待写 key 数，超出部分丢弃，防止 Redis 不可用时内存无限增长
+METRICS_MAX_PENDING_KEYS = int(os.getenv("RAG_METRICS_MAX_PENDING_KEYS", "10000"))
+DEFAULT_HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_aggregator: Optional["MetricsAggregator"] = None
+_aggregator_lock = threading.Lock()
+
+
+def _create_sync_redis_client():
+    return redis_sync.Redis(
+        host=os.getenv("REDIS_HOST", "127.0.0.1"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+        password=os.getenv("REDIS_PASSWORD"),
+        decode_responses=True,
+        socket_connect_timeout=2,
+        socket_timeout=2,
+        socket_keepalive=True,
+        retry_on_timeout=True
+    )
+
+
+class MetricsAggregator:
+    """
+    计数器/直方图聚合器
+
+    - incr: 字符串计数器（INCRBY）
+    - hincr: 哈希字段计数器（HINCRBY）
+    - observe: 直方图，写为哈希字段 count/sum/le_<上界>/le_inf（累计分布）
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], Any] = _create_sync_redis_client,
+        flush_interval: float = METRICS_FLUSH_INTERVAL_SECONDS,
+        max_pending_keys: int = METRICS_MAX_PENDING_KEYS
+    ):
+        self.redis_client_factory = redis_client_factory
+        self.flush_interval = float(flush_interval)
+        self.max_pending_keys = max(1, int(max_pending_keys))
+        self.flush_count = 0
+        self.dropped_keys = 0
+        self._redis_client = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._hash_counters: Dict[Tuple[str, str], float] = {}
+        self._ttls: Dict[str, int] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # 记录
+    # ------------------------------------------------------------------
+
+    def incr(self, key: str, amount: int = 1, ttl: int = METRICS_DEFAULT_TTL_SECONDS) -> None:
+        if amount == 0:
+            return
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + int(amount)
+            self._ttls[key] = ttl
+        self._after_record()
+
+    def hincr(self, key: str, field: str, amount: float = 1, ttl: int = METRICS_DEFAULT_TTL_SECONDS) -> None:
+        if amount == 0:
+            return
+        with self._lock:
+            self._hash_counters[(key, field)] = self._hash_counters.get((key, field), 0) + amount
+            self._ttls[key] = ttl
+        self._after_record()
+
+    def observe(
+        self,
+        key: str,
+        value: float,
+        buckets: Iterable[float] = DEFAULT_HISTOGRAM_BUCKETS,
+        ttl: int = METRICS_DEFAULT_TTL_SECONDS
+    ) -> None:
+        value = float(value)
+        fields = ["count", "le_inf"] + [f"le_{bound:g}" for bound in buckets if value <= bound]
+        with self._lock:
+            for field in fields:
+                self._hash_counters[(key, field)] = self._hash_counters.get((key, field), 0) + 1
+            self._hash_counters[(key, "sum")] = self._hash_counters.get((key, "sum"), 0) + value
+            self._ttls[key] = ttl
+        self._after_record()
+
+    def pending_keys(self) -> int:
+        with self._lock:
+            return len(self._ttls)
+
+    def _after_record(self) -> None:
+        if self.flush_interval <= 0:
+            # 间隔 <= 0 时退化为每次记录立即写出（仍为单次流水线）
+            self.flush()
+            return
+        if self._thread is None:
+            self._start()
+
+    # ------------------------------------------------------------------
+    # 写出
+    # ------------------------------------------------------------------
+
+    def _client(self):
+        if self._redis_client is None:
+            self._redis_client = self.redis_client_factory()
+        return self._redis_client
+
+    def _drain(self) -> Tuple[Dict[str, int], Dict[Tuple[str, str], float], Dict[str, int]]:
+        with self._lock:
+            drained = (self._counters, self._hash_counters, self._ttls)
+            self._counters, self._hash_counters, self._ttls = {}, {}, {}
+        return drained
+
+    def _restore(
+        self,
+        counters: Dict[str, int],
+        hash_counters: Dict[Tuple[str, str], float],
+        ttls: Dict[str, int]
+    ) -> None:
+        """写出失败时把增量合并回待写缓冲，等待下一轮重试"""
+        with self._lock:
+            for key, amount in counters.items():
+                if key not in self._ttls and len(self._ttls) >= self.max_pending_keys:
+                    self.dropped_keys += 1
+                    continue
+                self._counters[key] = self._counters.get(key, 0) + amount
+                self._ttls[key] = ttls.get(key, METRICS_DEFAULT_TTL_SECONDS)
+            for (key, field), amount in hash_counters.items():
+                if key not in self._ttls and len(self._ttls) >= self.max_pending_keys:
+                    self.dropped_keys += 1
+                    continue
+                self._hash_counters[(key, field)] = self._hash_counters.get((key, field), 0) + amount
+                self._ttls[key] = ttls.get(key, METRICS_DEFAULT_TTL_SECONDS)
+
+    def flush(self) -> int:
+        """
+        把当前累计的增量在一次流水线事务中写入 Redis
+
+        Returns:
+            int: 本次写出的 key 数；失败时返回 0，增量保留到下一轮
+        """
+        with self._flush_lock:
+            counters, hash_counters, ttls = self._drain()
+            if not ttls:
+                return 0
+            try:
+                pipe = self._client().pipeline(transaction=True)
+                for key, amount in counters.items():
+                    pipe.incrby(key, amount)
+                for (key, field), amount in hash_counters.items():
+                    if isinstance(amount, float) and not amount.is_integer():
+                        pipe.hincrbyfloat(key, field, amount)
+                    else:
+                        pipe.hincrby(key, field, int(amount))
+                for key, ttl in ttls.items():
+                    pipe.expire(key, ttl)
+                pipe.execute()
+                self.flush_count += 1
+                return len(ttls)
+            except Exception as exc:
+                logger.warning(f"指标写出失败，将在下一轮重试: {exc}")
+                self._restore(counters, hash_counters, ttls)
+                return 0
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="metrics-aggregator", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """停止后台线程并写出剩余增量"""
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=max(1.0, self.flush_interval))
+        self.flush()
+
+
+def get_metrics_aggregator() -> MetricsAggregator:
+    """获取进程级指标聚合器单例"""
+    global _aggregator
+    if _aggregator is None:
+        with _aggregator_lock:
+            if _aggregator is None:
+                _aggregator = MetricsAggregator()
+    return _aggregator
+
+
+def shutdown_metrics_aggregator() -> None:
+    """进程退出前写出剩余指标"""
+    global _aggregator
+    with _aggregator_lock:
+        aggregator, _aggregator = _aggregator, None
+    if aggregator is not None:
+        aggregator.close()
+
+
+atexit.register(shutdown_metrics_aggregator)
@@ -0,0 +1,59 @@
+import os
+from itertools import count
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from pymilvus import MilvusClient
+
+# 每个 Milvus 连接目标（uri+db+token）共享的客户端数量；gRPC 通道本身支持多路复用，调用轮流分配到这些客户端
+MILVUS_CLIENT_POOL_SIZE = int(os.getenv("RAG_MILVUS_CLIENT_POOL_SIZE", "2"))
+
+
+class MilvusClientFactory:
+    """
+    进程级 Milvus 客户端池
+    按连接目标缓存客户端，避免每次请求重新建立 gRPC 连接；客户端懒创建，进程退出时统一关闭
+    """
+    _pools: Dict[Tuple[str, str, str], List[MilvusClient]] = {}
+    _counters: Dict[Tuple[str, str, str], "count"] = {}
+    _lock = Lock()
+
+    @classmethod
+    def get_client(cls, uri: Optional[str] = None, db_name: Optional[str] = None, token: Optional[str] = None) -> MilvusClient:
+        """
+        获取共享的 Milvus 客户端，参数缺省时从 MILVUS_URI / MILVUS_DB_NAME / MILVUS_TOKEN 读取
+        """
+        key = (
+            uri or os.getenv('MILVUS_URI', 'http://localhost:19530'),
+            db_name or os.getenv('MILVUS_DB_NAME', 'rag'),
+            token or os.getenv('MILVUS_TOKEN') or ""
+        )
+        with cls._lock:  # 线程安全
+            pool = cls._pools.setdefault(key, [])
+            counter = cls._counters.setdefault(key, count())
+            slot = next(counter) % max(1, MILVUS_CLIENT_POOL_SIZE)
+            if slot >= len(pool):
+                uri_value, db_value, token_value = key
+                kwargs = {"uri": uri_value, "db_name": db_value}
+                if token_value:
+                    kwargs["token"] = token_value
+                pool.append(MilvusClient(**kwargs))
+                slot = len(pool) - 1
+            return pool[slot]
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        with cls._lock:
+            return {"targets": len(cls._pools), "clients": sum(len(pool) for pool in cls._pools.values())}
+
+    @classmethod
+    def close_all(cls):
+        """关闭池中全部客户端"""
+        with cls._lock:
+            pools, cls._pools, cls._counters = cls._pools, {}, {}
+        for pool in pools.values():
+            for client in pool:
+                try:
+                    client.close()
+                except Exception:
+                    pass
@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def _normalize_text(value: Any) -> str:
@@ -278,14 +278,21 @@ def run_classifier_lab(
     unlabeled_count = 0
     unavailable_count = 0
 
+    question_rows: List[Tuple[str, Dict[str, Any]]] = []
     for row in rows:
         question = _normalize_text(row.get("question") or row.get("query"))
-        if not question:
-            continue
+        if question:
+            question_rows.append((question, row))
+    questions = [question for question, _ in question_rows]
+    if hasattr(classifier, "predict_many"):
+        classifier_results = classifier.predict_many(questions)
+    else:
+        classifier_results = [classifier.predict(question) for question in questions]
+
+    for (question, row), classifier_result in zip(question_rows, classifier_results):
         label = parse_need_retrieval_label(row)
         if label is None:
             unlabeled_count += 1
-        classifier_result = classifier.predict(question)
         available = bool(classifier_result.get("available"))
         if not available:
             unavailable_count += 1
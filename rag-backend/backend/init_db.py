@@ -13,6 +13,9 @@ from backend.model.conversation import Conversation
 from backend.model.knowledge_library import KnowledgeLibrary, KnowledgeDocument
 from backend.model.chat_history import ChatHistory
 from backend.model.memory import UserMemoryProfile, UserMemoryEvent
+from backend.model.ingest_job import DocumentIngestJob
+from backend.model.embedding_cache import EmbeddingCacheEntry
+from backend.model.document_chunk import DocumentChunkRecord
 
 
 def create_tables():
@@ -1,10 +1,36 @@
-from sqlalchemy import Column, Integer, String, Text, JSON
+from sqlalchemy import Column, Integer, String, Text, JSON, Index
 from backend.config.database import DatabaseFactory
 
 Base = DatabaseFactory.get_base()
 
+# 消息类别：dialog=用户/助手对话，summary=会话摘要，trace=节点轨迹等过程消息
+MESSAGE_KIND_DIALOG = 'dialog'
+MESSAGE_KIND_SUMMARY = 'summary'
+MESSAGE_KIND_TRACE = 'trace'
+
+
+def resolve_message_kind(role, message_type) -> str:
+    """根据 role/type 推导消息类别"""
+    role = str(role or '').lower()
+    message_type = str(message_type or '').lower()
+    if message_type == 'messages' and role in ('user', 'assistant'):
+        return MESSAGE_KIND_DIALOG
+    if message_type == 'summary':
+        return MESSAGE_KIND_SUMMARY
+    return MESSAGE_KIND_TRACE
+
+
+def _default_message_kind(context):
+    params = context.get_current_parameters()
+    return resolve_message_kind(params.get('role'), params.get('type'))
+
+
 class ChatHistory(Base):
     __tablename__ = 'chat_history'
+    __table_args__ = (
+        # 按会话+类别倒序取最近N条对话 / 键集分页
+        Index('ix_chat_history_conversation_kind_id', 'conversation_id', 'kind', 'id'),
+    )
     
     # 主键
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -18,6 +44,9 @@ class ChatHistory(Base):
     # 消息类型：text, image, file, function_call等
     type = Column(String(20), nullable=False, default='text')
     
+    # 消息类别：dialog/summary/trace，写入时由 role/type 自动推导
+    kind = Column(String(16), nullable=False, default=_default_message_kind, server_default=MESSAGE_KIND_TRACE)
+    
     # 消息内容
     content = Column(Text, nullable=False)
     
@@ -31,6 +60,7 @@ class ChatHistory(Base):
             'conversation_id': self.conversation_id,
             'role': self.role,
             'type': self.type,
+            'kind': self.kind,
             'content': self.content,
             'extra_data': self.extra_data
         }
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func
+from backend.config.database import DatabaseFactory
+
+Base = DatabaseFactory.get_base()
+
+
+class DocumentChunkRecord(Base):
+    """文档分块登记：记录每个分块的内容哈希及其在 Milvus / LightRAG 中的标识，用于增量重新入库"""
+    __tablename__ = 'knowledge_document_chunks'
+    __table_args__ = (
+        Index('ix_document_chunk_document_hash', 'document_id', 'chunk_hash'),
+        Index('ix_document_chunk_graph_doc', 'graph_doc_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, nullable=False, comment='文档ID')
+    chunk_hash = Column(String(64), nullable=False, comment='分块内容 SHA-256')
+    chunk_type = Column(String(20), nullable=False, default='text', comment='分块类型：text/chart')
+    vector_id = Column(String(64), nullable=True, comment='Milvus 主键，未向量化时为空')
+    graph_doc_id = Column(String(64), nullable=True, comment='LightRAG 文档ID')
+    in_graph = Column(Boolean, nullable=False, default=False, comment='是否已写入图谱')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'chunk_hash': self.chunk_hash,
+            'chunk_type': self.chunk_type,
+            'vector_id': self.vector_id,
+            'graph_doc_id': self.graph_doc_id,
+            'in_graph': self.in_graph
+        }
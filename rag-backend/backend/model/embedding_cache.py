@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, func
+from backend.config.database import DatabaseFactory
+
+Base = DatabaseFactory.get_base()
+
+
+class EmbeddingCacheEntry(Base):
+    """分块向量缓存：相同文本 + 相同模型 + 相同维度只请求一次 embedding 服务"""
+    __tablename__ = 'embedding_cache'
+
+    content_hash = Column(String(64), primary_key=True, comment='文本内容 SHA-256')
+    model = Column(String(100), primary_key=True, comment='embedding 模型名称')
+    dimension = Column(Integer, primary_key=True, comment='向量维度（0 表示模型默认维度）')
+    vector = Column(LargeBinary, nullable=False, comment='float32 小端序打包的向量')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
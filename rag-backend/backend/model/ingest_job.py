@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index, func
+from backend.utils.timezone import to_china_time
+from backend.config.database import DatabaseFactory
+
+Base = DatabaseFactory.get_base()
+
+# 任务状态：queued=等待（含退避中的重试）；running=已被某个 worker 租用；succeeded=完成；failed=重试耗尽
+INGEST_JOB_QUEUED = "queued"
+INGEST_JOB_RUNNING = "running"
+INGEST_JOB_SUCCEEDED = "succeeded"
+INGEST_JOB_FAILED = "failed"
+INGEST_JOB_ACTIVE_STATUSES = (INGEST_JOB_QUEUED, INGEST_JOB_RUNNING)
+
+
+class DocumentIngestJob(Base):
+    """文档入库任务（持久化队列）"""
+    __tablename__ = 'document_ingest_jobs'
+    __table_args__ = (
+        # worker 领取任务：按状态 + 可执行时间扫描
+        Index('ix_ingest_job_status_available', 'status', 'available_at', 'id'),
+        Index('ix_ingest_job_document', 'document_id', 'mode', 'status'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, nullable=False, comment='文档ID')
+    document_name = Column(String(200), nullable=False, comment='文档名称')
+    mode = Column(String(20), nullable=False, default='all', comment='处理模式：all/vectorize/graph')
+    payload = Column(JSON, nullable=True, comment='任务参数快照（url、collection_id 等）')
+    status = Column(String(16), nullable=False, default='queued', comment='任务状态')
+    attempts = Column(Integer, nullable=False, default=0, comment='已领取次数')
+    max_attempts = Column(Integer, nullable=False, default=3, comment='最大尝试次数')
+    available_at = Column(DateTime, nullable=False, comment='最早可执行时间（重试退避）')
+    lease_owner = Column(String(128), nullable=True, comment='持有租约的 worker')
+    lease_expires_at = Column(DateTime, nullable=True, comment='租约到期时间（可见性超时）')
+    last_error = Column(Text, nullable=True, comment='最近一次失败原因')
+    result = Column(JSON, nullable=True, comment='处理结果摘要')
+    started_at = Column(DateTime, nullable=True, comment='最近一次开始时间')
+    finished_at = Column(DateTime, nullable=True, comment='结束时间')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'document_name': self.document_name,
+            'mode': self.mode,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'available_at': to_china_time(self.available_at).isoformat() if self.available_at else None,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': to_china_time(self.lease_expires_at).isoformat() if self.lease_expires_at else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'started_at': to_china_time(self.started_at).isoformat() if self.started_at else None,
+            'finished_at': to_china_time(self.finished_at).isoformat() if self.finished_at else None,
+            'created_at': to_china_time(self.created_at).isoformat() if self.created_at else None,
+            'updated_at': to_china_time(self.updated_at).isoformat() if self.updated_at else None
+        }
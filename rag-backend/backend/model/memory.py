@@ -45,6 +45,8 @@ class UserMemoryEvent(Base):
     __table_args__ = (
         Index("idx_user_memory_event_user_collection_created", "user_id", "collection_id", "created_at"),
         Index("idx_user_memory_event_conversation", "conversation_id"),
+        # 幂等写入键：同一写入任务重复投递时不会重复落库
+        Index("uq_user_memory_event_key", "event_key", unique=True),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -56,6 +58,11 @@ class UserMemoryEvent(Base):
     importance = Column(Float, nullable=False, default=0.5)
     source = Column(String(64), nullable=False, default="chat")
     extra_data = Column(JSON, nullable=True)
+    event_key = Column(String(64), nullable=True)
+    # 写入时预计算的词元/n-gram 签名，排序阶段直接复用，避免每轮请求重复切词
+    content_tokens = Column(JSON, nullable=True)
+    # 写入向量索引成功的时间；为空表示尚未入向量库，任务重放时据此补建索引
+    vector_indexed_at = Column(DateTime, nullable=True)
     expires_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
 
@@ -73,3 +80,9 @@ class UserMemoryEvent(Base):
             "expires_at": to_china_time(self.expires_at).isoformat() if self.expires_at else None,
             "created_at": to_china_time(self.created_at).isoformat() if self.created_at else None
         }
+
+    def to_internal_dict(self):
+        """排序与缓存使用的载荷：在 to_dict 基础上附带写入时预计算的词元签名，不对外返回"""
+        data = self.to_dict()
+        data["content_tokens"] = self.content_tokens
+        return data
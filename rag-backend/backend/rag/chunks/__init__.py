@@ -4,16 +4,21 @@ from .models import (
     ChunkStrategy,
     ChunkConfig, 
     ChunkResult,
-    DocumentContent
+    DocumentContent,
+    PageContent
 )
 from .document_extraction import DocumentExtractor
 from .chunks import TextChunker
+from .markdown_outline import MarkdownOutline, parse_markdown_outline
 
 __all__ = [
     "ChunkStrategy",
     "ChunkConfig", 
     "ChunkResult",
     "DocumentContent",
+    "PageContent",
     "DocumentExtractor",
-    "TextChunker"
+    "TextChunker",
+    "MarkdownOutline",
+    "parse_markdown_outline"
 ]
\ No newline at end of file
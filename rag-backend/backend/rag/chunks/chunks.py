@@ -1,5 +1,6 @@
 import re
-from typing import List, Optional, Any, Union, Dict, Tuple
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Optional, Any, Union, Dict, Tuple
 
 from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_experimental.text_splitter import SemanticChunker
@@ -7,7 +8,8 @@ from langchain.text_splitter import MarkdownHeaderTextSplitter
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
 
-from .models import ChunkStrategy, ChunkConfig, ChunkResult, DocumentContent
+from .markdown_outline import DEFAULT_SECTION_TITLE, MarkdownOutline, parse_markdown_outline
+from .models import ChunkStrategy, ChunkConfig, ChunkResult, DocumentContent, PageContent
 
 
 class TextChunker:
@@ -27,13 +29,16 @@ class TextChunker:
             embeddings_model: 嵌入模型，语义分块时必需
         """
         self.embeddings_model = embeddings_model
+        self._medical_splitters: Dict[tuple, RecursiveCharacterTextSplitter] = {}
     
-    def chunk_document(self, document: DocumentContent, config: ChunkConfig) -> ChunkResult:
+    def chunk_document(self, document: DocumentContent, config: ChunkConfig,
+                       outline: Optional[MarkdownOutline] = None) -> ChunkResult:
         """对文档进行分块处理
         
         Args:
             document: 文档内容对象
             config: 分块配置
+            outline: 已解析的 Markdown 大纲（医疗混合分块复用，避免重复解析）
             
         Returns:
             ChunkResult: 分块结果对象
@@ -56,7 +61,7 @@ class TextChunker:
             elif config.strategy == ChunkStrategy.MARKDOWN_HEADER:
                 return self._markdown_header_chunk(document.content, config, document.document_name)
             elif config.strategy == ChunkStrategy.MEDICAL_HYBRID:
-                return self._medical_hybrid_chunk(document.content, config, document.document_name)
+                return self._medical_hybrid_chunk(document.content, config, document.document_name, outline)
             else:
                 return ChunkResult(
                     chunks=[],
@@ -170,12 +175,14 @@ class TextChunker:
             document_name=document_name
         )
 
-    def _medical_hybrid_chunk(self, text: str, config: ChunkConfig, document_name: str) -> ChunkResult:
-        sections = self._split_medical_sections(text, config)
+    def _medical_hybrid_chunk(self, text: str, config: ChunkConfig, document_name: str,
+                              outline: Optional[MarkdownOutline] = None) -> ChunkResult:
+        outline = outline if outline is not None and outline.text == text else parse_markdown_outline(text)
+        sections = self._split_medical_sections(text, config, outline)
+        splitter = self._medical_splitter(config)
         documents: List[Document] = []
         for section_title, section_text in sections:
-            section_chunks = self._split_medical_section_to_chunks(section_text, config)
-            for chunk_text in section_chunks:
+            for chunk_text in splitter.split_text(section_text):
                 cleaned_chunk = chunk_text.strip()
                 if not cleaned_chunk:
                     continue
@@ -188,28 +195,17 @@ class TextChunker:
             document_name=document_name
         )
 
-    def _split_medical_sections(self, text: str, config: ChunkConfig) -> List[Tuple[str, str]]:
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=config.headers_to_split_on)
-        split_docs = markdown_splitter.split_text(text)
+    def _split_medical_sections(self, text: str, config: ChunkConfig,
+                                outline: Optional[MarkdownOutline] = None) -> List[Tuple[str, str]]:
+        outline = outline if outline is not None else parse_markdown_outline(text)
+        levels = [len(marker) for marker, _ in (config.headers_to_split_on or [])] or None
         sections: List[Tuple[str, str]] = []
-        if split_docs:
-            for doc in split_docs:
-                if not isinstance(doc, Document):
-                    continue
-                section_title = (
-                    doc.metadata.get("Header_6")
-                    or doc.metadata.get("Header_5")
-                    or doc.metadata.get("Header_4")
-                    or doc.metadata.get("Header_3")
-                    or doc.metadata.get("Header_2")
-                    or doc.metadata.get("Header_1")
-                    or "未标注章节"
-                )
-                content = (doc.page_content or "").strip()
-                if content:
-                    sections.append((section_title, content))
+        for section in outline.sections(levels):
+            content = outline.section_text(section)
+            if content:
+                sections.append((section.title, content))
         if not sections:
-            sections = [("未标注章节", text)]
+            sections = [(DEFAULT_SECTION_TITLE, text)]
         merged_sections: List[Tuple[str, str]] = []
         for title, content in sections:
             if not merged_sections:
@@ -222,18 +218,22 @@ class TextChunker:
                 merged_sections.append((title, content))
         return merged_sections
 
-    def _split_medical_section_to_chunks(self, section_text: str, config: ChunkConfig) -> List[str]:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.medical_chunk_size,
-            chunk_overlap=config.medical_chunk_overlap,
-            length_function=len,
-            separators=config.separators
-        )
-        docs = splitter.create_documents([section_text])
-        return [doc.page_content for doc in docs if (doc.page_content or "").strip()]
+    def _medical_splitter(self, config: ChunkConfig) -> RecursiveCharacterTextSplitter:
+        """同一配置的章节切分器只创建一次"""
+        key = (config.medical_chunk_size, config.medical_chunk_overlap, tuple(config.separators or ()))
+        splitter = self._medical_splitters.get(key)
+        if splitter is None:
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=config.medical_chunk_size,
+                chunk_overlap=config.medical_chunk_overlap,
+                length_function=len,
+                separators=config.separators
+            )
+            self._medical_splitters[key] = splitter
+        return splitter
 
     def _build_medical_metadata(self, section_title: str, chunk_text: str) -> Dict[str, Any]:
-        title = (section_title or "未标注章节").strip()
+        title = (section_title or DEFAULT_SECTION_TITLE).strip()
         content = chunk_text or ""
         merged = f"{title}\n{content}".lower()
         keyword_roles = [
@@ -285,6 +285,94 @@ class TextChunker:
         document = DocumentContent(content=text, document_name=document_name)
         return self.chunk_document(document, config)
 
+    def iter_page_chunks(self, pages: Iterable[PageContent], config: ChunkConfig,
+                         document_name: str = "", window_chars: int = 20000) -> Iterator[Document]:
+        """流式分块：逐页累积文本，满 window_chars 字符后对窗口分块并产出
+        
+        窗口末尾的分块可能被窗口边界截断，暂不产出，其文本并入下一个窗口重新分块，
+        因此内存中只保留一个窗口的文本。分块元数据带起止页码 page_number / page_end。
+        
+        Args:
+            pages: 逐页文本（如 DocumentExtractor.iter_pdf_pages）
+            config: 分块配置
+            document_name: 文档名称
+            window_chars: 窗口字符数
+        """
+        parts: List[str] = []
+        page_starts: List[int] = []
+        page_numbers: List[int] = []
+        size = 0
+        for page in pages:
+            text = self._normalize_page_text(page.content)
+            if not text:
+                continue
+            if parts:
+                parts.append("\n")
+                size += 1
+            page_starts.append(size)
+            page_numbers.append(page.page_number)
+            parts.append(text)
+            size += len(text)
+            if size < window_chars:
+                continue
+            window = "".join(parts)
+            chunks, carry_from = self._chunk_page_window(window, page_starts, page_numbers, config, document_name, final=False)
+            yield from chunks
+            window_starts, window_numbers = page_starts, page_numbers
+            parts, page_starts, page_numbers = [], [], []
+            size = 0
+            if carry_from is not None:
+                # 被截断的末尾分块连同其所在页码并入下一个窗口
+                first = bisect_right(window_starts, carry_from) - 1
+                for index in range(first, len(window_starts)):
+                    page_starts.append(max(0, window_starts[index] - carry_from))
+                    page_numbers.append(window_numbers[index])
+                parts.append(window[carry_from:])
+                size = len(window) - carry_from
+        if parts:
+            chunks, _ = self._chunk_page_window("".join(parts), page_starts, page_numbers, config, document_name, final=True)
+            yield from chunks
+
+    @staticmethod
+    def _normalize_page_text(text: Optional[str]) -> str:
+        # Markdown 标题切分会逐行去除首尾空白，先统一处理，便于按首行定位分块所在页
+        return "\n".join(line.strip() for line in (text or "").splitlines()).strip()
+
+    @staticmethod
+    def _locate_chunk(window: str, chunk_text: str, cursor: int) -> Optional[int]:
+        head = (chunk_text or "").strip().split("\n", 1)[0][:64]
+        if not head:
+            return None
+        position = window.find(head, cursor)
+        return position if position >= 0 else None
+
+    def _chunk_page_window(self, window: str, page_starts: List[int], page_numbers: List[int],
+                           config: ChunkConfig, document_name: str, final: bool) -> Tuple[List[Document], Optional[int]]:
+        result = self.chunk_document(DocumentContent(content=window, document_name=document_name), config)
+        chunks = list(result.chunks)
+        positions: List[Optional[int]] = []
+        cursor = 0
+        for chunk in chunks:
+            position = self._locate_chunk(window, chunk.page_content, cursor)
+            positions.append(position)
+            if position is not None:
+                cursor = position
+        carry_from = None
+        if not final and len(chunks) > 1 and positions[-1]:
+            carry_from = positions[-1]
+            chunks, positions = chunks[:-1], positions[:-1]
+        last_position = 0
+        for chunk, position in zip(chunks, positions):
+            start = position if position is not None else last_position
+            last_position = start
+            end = start + max(0, len(chunk.page_content or "") - 1)
+            chunk.metadata = {
+                **dict(chunk.metadata or {}),
+                "page_number": page_numbers[max(0, bisect_right(page_starts, start) - 1)],
+                "page_end": page_numbers[max(0, bisect_right(page_starts, end) - 1)]
+            }
+        return chunks, carry_from
+
 
 # 使用示例
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""Markdown 结构大纲
+
+一次逐行扫描得到标题（含偏移与层级路径）、章节与图片，
+文本分块与图表分块都基于同一份大纲，不再对同一篇 Markdown 反复做标题切分和正则扫描。
+围栏代码块内的 # 行与图片不计入大纲。
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_SECTION_TITLE = "未标注章节"
+
+_MARKDOWN_IMAGE_PATTERN = re.compile(r"!\[(?P<alt>[^\]]*)\]\((?P<url>[^)\s]+)(?:\s+\"[^\"]*\")?\)")
+_HTML_IMAGE_PATTERN = re.compile(r"<img[^>]*src=[\"'](?P<url>[^\"']+)[\"'][^>]*>", flags=re.IGNORECASE)
+
+
+@dataclass
+class Heading:
+    """标题行"""
+    level: int                 # 1-6
+    title: str
+    start: int                 # 标题行起始偏移
+    end: int                   # 标题行结束偏移（含换行）
+    path: Tuple[str, ...]      # 从一级到本级的标题路径
+
+
+@dataclass
+class Section:
+    """两个标题之间的正文（不含标题行本身）"""
+    title: str
+    path: Tuple[str, ...]
+    level: int                 # 0 表示第一个标题之前的正文
+    start: int
+    end: int
+
+
+@dataclass
+class ImageRef:
+    """图片引用（Markdown ![]() 或 HTML <img>）"""
+    url: str
+    alt: str
+    start: int
+    end: int
+    kind: str
+
+
+@dataclass
+class MarkdownOutline:
+    """Markdown 文档大纲，偏移均指向原文"""
+    text: str
+    headings: List[Heading] = field(default_factory=list)
+    images: List[ImageRef] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._heading_starts = [heading.start for heading in self.headings]
+
+    def heading_at(self, offset: int) -> Optional[Heading]:
+        """offset 所在位置之前最近的标题"""
+        index = bisect_right(self._heading_starts, offset) - 1
+        return self.headings[index] if index >= 0 else None
+
+    def section_title_at(self, offset: int, default: str = DEFAULT_SECTION_TITLE) -> str:
+        heading = self.heading_at(offset)
+        return heading.title if heading else default
+
+    def sections(self, levels: Optional[Iterable[int]] = None) -> List[Section]:
+        """按给定层级的标题切分章节（默认全部 1-6 级）；未参与切分的标题行保留在正文中"""
+        allowed = set(levels) if levels is not None else None
+        split_on = [h for h in self.headings if allowed is None or h.level in allowed]
+        sections: List[Section] = []
+        start, title, path, level = 0, DEFAULT_SECTION_TITLE, (), 0
+        for heading in split_on:
+            if heading.start > start:
+                sections.append(Section(title, path, level, start, heading.start))
+            start, title, path, level = heading.end, heading.title, heading.path, heading.level
+        if len(self.text) > start:
+            sections.append(Section(title, path, level, start, len(self.text)))
+        return sections
+
+    def section_text(self, section: Section) -> str:
+        return self.text[section.start:section.end].strip()
+
+
+def _parse_heading(stripped: str) -> Optional[Tuple[int, str]]:
+    if not stripped.startswith("#"):
+        return None
+    level = len(stripped) - len(stripped.lstrip("#"))
+    if level > 6 or len(stripped) == level or stripped[level] not in " \t":
+        return None
+    title = stripped[level:].strip().rstrip("#").strip()
+    return (level, title) if title else None
+
+
+def parse_markdown_outline(text: str) -> MarkdownOutline:
+    """逐行扫描一次生成大纲"""
+    text = text or ""
+    headings: List[Heading] = []
+    images: List[ImageRef] = []
+    stack: List[Tuple[int, str]] = []
+    fence: Optional[str] = None
+    offset = 0
+
+    for line in text.splitlines(keepends=True):
+        line_start, offset = offset, offset + len(line)
+        stripped = line.strip()
+
+        if fence is not None:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if stripped.startswith(("```", "~~~")):
+            fence = stripped[:3]
+            continue
+
+        heading = _parse_heading(stripped)
+        if heading is not None:
+            level, title = heading
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, title))
+            headings.append(Heading(level, title, line_start, offset, tuple(t for _, t in stack)))
+            continue
+
+        if "![" in line or "<img" in line.lower():
+            found = [
+                ImageRef(m.group("url").strip(), m.group("alt").strip(), line_start + m.start(), line_start + m.end(), "markdown")
+                for m in _MARKDOWN_IMAGE_PATTERN.finditer(line)
+            ] + [
+                ImageRef(m.group("url").strip(), "", line_start + m.start(), line_start + m.end(), "html")
+                for m in _HTML_IMAGE_PATTERN.finditer(line)
+            ]
+            images.extend(sorted(found, key=lambda image: image.start))
+
+    return MarkdownOutline(text=text, headings=headings, images=images)
@@ -0,0 +1,218 @@
+"""MinerU 异步客户端
+
+创建解析任务后以指数退避轮询任务状态（等待期间不占用线程），完成后流式下载结果压缩包并读取 full.md。
+同一事件循环内的任务在 asyncio.Semaphore 上排队；另有进程级名额计数（多个线程各自 asyncio.run 时也共享同一上限），
+只做非阻塞获取，拿不到时以退避 sleep 重试，排队期间不占用线程。调用方取消协程时立即停止轮询并释放名额。
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from typing import Any, Dict, Optional
+
+import httpx
+
+from backend.config.log import get_logger
+
+logger = get_logger(__name__)
+
+MINERU_MAX_CONCURRENCY = int(os.getenv("RAG_MINERU_MAX_CONCURRENCY", "4"))
+MINERU_POLL_INITIAL_SECONDS = float(os.getenv("RAG_MINERU_POLL_INITIAL_SECONDS", "2"))
+MINERU_POLL_MAX_SECONDS = float(os.getenv("RAG_MINERU_POLL_MAX_SECONDS", "30"))
+MINERU_TIMEOUT_SECONDS = float(os.getenv("RAG_MINERU_TIMEOUT_SECONDS", "300"))
+MINERU_REQUEST_TIMEOUT_SECONDS = float(os.getenv("RAG_MINERU_REQUEST_TIMEOUT_SECONDS", "30"))
+# 其他事件循环占满进程级名额时的重试间隔（秒），逐次翻倍
+_SLOT_RETRY_INITIAL_SECONDS = 0.05
+_SLOT_RETRY_MAX_SECONDS = 1.0
+
+_PENDING_STATES = {"pending", "running", "converting", "waiting-file"}
+
+_mineru_client: Optional["AsyncMineruClient"] = None
+
+
+class MineruError(Exception):
+    """MinerU 任务创建、执行或结果下载失败"""
+
+
+class AsyncMineruClient:
+    """MinerU 官方 API（/extract/task）的异步客户端"""
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_concurrency: int = MINERU_MAX_CONCURRENCY,
+        poll_initial_seconds: float = MINERU_POLL_INITIAL_SECONDS,
+        poll_max_seconds: float = MINERU_POLL_MAX_SECONDS,
+        timeout_seconds: float = MINERU_TIMEOUT_SECONDS,
+        request_timeout_seconds: float = MINERU_REQUEST_TIMEOUT_SECONDS
+    ):
+        api_url = (api_url or os.getenv("MINERU_API_URL") or "").rstrip("/")
+        if not api_url:
+            raise ValueError("请设置环境变量 MINERU_API_URL")
+        self.task_url = api_url if api_url.endswith("/extract/task") else f"{api_url}/extract/task"
+        self.api_key = api_key or os.getenv("MINERU_API_KEY")
+        if not self.api_key:
+            raise ValueError("请设置环境变量 MINERU_API_KEY")
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.poll_initial_seconds = max(0.0, float(poll_initial_seconds))
+        self.poll_max_seconds = max(self.poll_initial_seconds, float(poll_max_seconds))
+        self.timeout_seconds = float(timeout_seconds)
+        self.request_timeout_seconds = float(request_timeout_seconds)
+        # 进程级名额：不绑定事件循环，只做非阻塞获取；每个事件循环另有自己的 asyncio.Semaphore 排队
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._loop_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._active_lock = threading.Lock()
+        self.active = 0
+
+    def _loop_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._active_lock:
+            semaphore = self._loop_slots.get(loop)
+            if semaphore is None:
+                semaphore = self._loop_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _acquire_slot(self) -> asyncio.Semaphore:
+        """先在本事件循环的信号量上排队，再以非阻塞方式获取进程级名额（被其他事件循环占满时退避重试）"""
+        local = self._loop_semaphore()
+        await local.acquire()
+        try:
+            delay = _SLOT_RETRY_INITIAL_SECONDS
+            while not self._slots.acquire(blocking=False):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _SLOT_RETRY_MAX_SECONDS)
+        except BaseException:
+            local.release()
+            raise
+        return local
+
+    def _release_slot(self, local: asyncio.Semaphore) -> None:
+        self._slots.release()
+        local.release()
+
+    def _track_active(self, delta: int) -> None:
+        with self._active_lock:
+            self.active += delta
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+
+    @staticmethod
+    def _payload(response: httpx.Response, action: str) -> Dict[str, Any]:
+        response.raise_for_status()
+        try:
+            result = response.json()
+        except ValueError as exc:
+            raise MineruError(f"MinerU API返回的不是有效的JSON格式: {exc}")
+        if result.get("code") != 0:
+            raise MineruError(f"MinerU{action}失败: {result.get('msg', '未知错误')}")
+        return result.get("data") or {}
+
+    async def create_task(self, client: httpx.AsyncClient, pdf_url: str) -> str:
+        data = {
+            "url": pdf_url,
+            "model_version": os.getenv("MINERU_MODEL_VERSION", "vlm"),
+            "is_ocr": os.getenv("MINERU_IS_OCR", "true").lower() == "true",
+            "enable_formula": os.getenv("MINERU_ENABLE_FORMULA", "true").lower() == "true",
+            "enable_table": os.getenv("MINERU_ENABLE_TABLE", "true").lower() == "true",
+            "language": os.getenv("MINERU_LANGUAGE", "ch")
+        }
+        response = await client.post(self.task_url, headers=self._headers(), json=data)
+        task_id = self._payload(response, "任务创建").get("task_id")
+        if not task_id:
+            raise MineruError("未获得有效的任务ID")
+        return task_id
+
+    async def wait_for_task(self, client: httpx.AsyncClient, task_id: str) -> Dict[str, Any]:
+        """轮询任务直到完成：间隔从 poll_initial_seconds 起每次翻倍（带抖动），上限 poll_max_seconds"""
+        result_url = f"{self.task_url}/{task_id}"
+        delay = self.poll_initial_seconds
+        polls = 0
+        while True:
+            response = await client.get(result_url, headers=self._headers())
+            task_data = self._payload(response, "查询任务结果")
+            polls += 1
+            state = task_data.get("state")
+            if state == "done":
+                logger.info(f"MinerU 任务完成: {task_id}, 轮询 {polls} 次")
+                return task_data
+            if state == "failed":
+                raise MineruError(f"MinerU解析失败: {task_data.get('err_msg', '解析失败')}")
+            if state not in _PENDING_STATES:
+                raise MineruError(f"未知的任务状态: {state}")
+            if state == "running":
+                progress = task_data.get("extract_progress") or {}
+                logger.info(
+                    f"MinerU解析进度: {task_id} {progress.get('extracted_pages', 0)}/{progress.get('total_pages', 0)} 页"
+                )
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(self.poll_max_seconds, max(delay, 0.001) * 2)
+
+    async def download_markdown(self, client: httpx.AsyncClient, zip_url: str) -> str:
+        """流式下载结果压缩包到临时文件并读取其中的 full.md"""
+        with tempfile.TemporaryFile() as zip_file:
+            async with client.stream("GET", zip_url) as response:
+                response.raise_for_status()
+                async for block in response.aiter_bytes():
+                    zip_file.write(block)
+            zip_file.seek(0)
+            try:
+                return await asyncio.to_thread(self._read_full_markdown, zip_file)
+            except zipfile.BadZipFile as exc:
+                raise MineruError(f"zip文件损坏或格式错误: {exc}")
+
+    @staticmethod
+    def _read_full_markdown(zip_file) -> str:
+        with zipfile.ZipFile(zip_file) as archive:
+            names = archive.namelist()
+            target = next((name for name in names if os.path.basename(name) == "full.md"), None)
+            if target is None:
+                raise MineruError(f"未找到full.md文件。压缩包内的文件列表: {names}")
+            return archive.read(target).decode("utf-8")
+
+    async def extract(self, pdf_url: str) -> str:
+        """解析 PDF URL 为 Markdown 文本；超过 timeout_seconds 或未返回 zip 结果文件时抛出 MineruError"""
+        if not pdf_url:
+            raise ValueError("MinerU官方API需要PDF文件的URL地址，不支持直接文件上传。请先将文件上传到可访问的URL")
+        local_slot = await self._acquire_slot()
+        try:
+            self._track_active(1)
+            started = time.monotonic()
+            try:
+                async with httpx.AsyncClient(timeout=self.request_timeout_seconds, follow_redirects=True) as client:
+                    task_id = await self.create_task(client, pdf_url)
+                    logger.info(f"MinerU 任务已创建: {task_id}")
+                    try:
+                        task_data = await asyncio.wait_for(self.wait_for_task(client, task_id), self.timeout_seconds)
+                    except asyncio.TimeoutError:
+                        raise MineruError(f"处理超时，超过{self.timeout_seconds:.0f}秒未完成")
+                    zip_url = task_data.get("full_zip_url") or ""
+                    if not zip_url:
+                        raise MineruError(f"MinerU 任务已完成但未返回结果文件URL: {task_id}")
+                    if not zip_url.lower().split("?", 1)[0].endswith(".zip"):
+                        raise MineruError(f"MinerU 结果文件不是zip压缩包: {zip_url}")
+                    content = await self.download_markdown(client, zip_url)
+                    logger.info(f"MinerU 解析完成: {task_id}, 耗时 {time.monotonic() - started:.1f}s, 内容长度 {len(content)}")
+                    return content
+            except httpx.HTTPError as exc:
+                raise MineruError(f"MinerU API请求失败: {exc}")
+            finally:
+                self._track_active(-1)
+        finally:
+            self._release_slot(local_slot)
+
+
+def get_mineru_client() -> AsyncMineruClient:
+    """获取进程级 MinerU 客户端（共享并发上限）"""
+    global _mineru_client
+    if _mineru_client is None:
+        _mineru_client = AsyncMineruClient()
+    return _mineru_client
@@ -22,6 +22,14 @@ class DocumentContent:
     document_name: str  # 文档名称
 
 
+@dataclass
+class PageContent:
+    """单页文本（流式解析 PDF 时逐页产出）"""
+    content: str        # 页面文本
+    page_number: int    # 页码，从 1 开始
+    document_name: str  # 文档名称
+
+
 @dataclass
 class ChunkConfig:
     """分块配置"""
@@ -100,3 +108,4 @@ class ChunkResult:
     strategy: ChunkStrategy          # 使用的分块策略
     total_chunks: int               # 总块数
     document_name: str              # 原文档名称
+    document_id: Optional[str] = None  # 向量库中的文档标识（写入每个分块的 document_id 字段）
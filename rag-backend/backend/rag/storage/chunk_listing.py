@@ -0,0 +1,246 @@
+"""Milvus 分块分页浏览
+
+按 (chunk_index, 主键) 游标分页读取某个文档的分块，分块按其在文档中的顺序返回（主键是 uuid4，按主键翻页会打乱顺序）。
+Milvus 查询没有 ORDER BY，因此每页按 chunk_index 区间查询：从游标位置起取 chunk_index 落在窗口内的分块，
+不足一页时窗口加倍继续向后取，直到凑满一页或没有更多分块，再在页内按 (chunk_index, 主键) 排序。
+返回的 next_cursor 是本页最后一条的 (chunk_index, 主键)（编码为不透明字符串），不存在偏移量翻页的深度扫描。
+没有 chunk_index 字段的旧 collection 退化为按主键翻页。只返回标量字段（不读取向量），每页条数受服务端上限约束。
+"""
+
+import base64
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+from pymilvus import DataType
+
+# 分块浏览每页默认条数与服务端上限
+CHUNK_LIST_DEFAULT_PAGE_SIZE = int(os.getenv("RAG_CHUNK_LIST_DEFAULT_PAGE_SIZE", "50"))
+CHUNK_LIST_MAX_PAGE_SIZE = int(os.getenv("RAG_CHUNK_LIST_MAX_PAGE_SIZE", "200"))
+
+# 浏览分块时需要的标量字段，collection 中不存在的字段自动跳过
+CHUNK_LIST_FIELDS = (
+    "document_name",
+    "document_id",
+    "chunk_index",
+    "chunk_size",
+    "chunk_type",
+    "section_title",
+    "page_number",
+)
+_TEXT_FIELDS = ("text", "text_content")
+_VECTOR_TYPES = {
+    DataType.FLOAT_VECTOR,
+    DataType.BINARY_VECTOR,
+    DataType.FLOAT16_VECTOR,
+    DataType.BFLOAT16_VECTOR,
+    DataType.SPARSE_FLOAT_VECTOR,
+}
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无法解析"""
+
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    """未指定时取默认值，超过服务端上限时截断"""
+    if not page_size or page_size <= 0:
+        return CHUNK_LIST_DEFAULT_PAGE_SIZE
+    return min(int(page_size), CHUNK_LIST_MAX_PAGE_SIZE)
+
+
+def encode_cursor(primary_key: Any, chunk_index: Optional[int] = None) -> str:
+    payload: Dict[str, Any] = {"pk": primary_key}
+    if chunk_index is not None:
+        payload["i"] = chunk_index
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """解析游标为 {"pk": 主键, "i": chunk_index 或 None}，首页返回 None"""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        value = payload["pk"]
+        chunk_index = payload.get("i")
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise InvalidCursorError(f"无效的分页游标: {cursor}") from exc
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise InvalidCursorError(f"无效的分页游标: {cursor}")
+    if chunk_index is not None and (isinstance(chunk_index, bool) or not isinstance(chunk_index, int)):
+        raise InvalidCursorError(f"无效的分页游标: {cursor}")
+    return {"pk": value, "i": chunk_index}
+
+
+def describe_chunk_fields(client, collection_name: str) -> Dict[str, Any]:
+    """从 schema 解析主键字段、正文字段与可投影的标量字段（排除所有向量字段）"""
+    fields = client.describe_collection(collection_name).get("fields", [])
+    primary_key = next(field["name"] for field in fields if field.get("is_primary"))
+    scalar_names = {field["name"] for field in fields if field.get("type") not in _VECTOR_TYPES}
+    text_field = next((name for name in _TEXT_FIELDS if name in scalar_names), None)
+    output_fields = [name for name in CHUNK_LIST_FIELDS if name in scalar_names]
+    if text_field:
+        output_fields.append(text_field)
+    return {
+        "primary_key": primary_key,
+        "text_field": text_field,
+        "output_fields": output_fields,
+        "field_names": scalar_names,
+    }
+
+
+def document_chunk_filter(schema: Dict[str, Any], document_id: Optional[str], document_name: str) -> str:
+    """有 document_id 字段的 collection 按 document_id 过滤，旧 collection 按文档名过滤"""
+    if document_id and "document_id" in schema["field_names"]:
+        return f"document_id == {json.dumps(document_id, ensure_ascii=False)}"
+    return f"document_name == {json.dumps(document_name, ensure_ascii=False)}"
+
+
+def _literal(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _cursor_filter(base_filter: str, primary_key: str, cursor_value: Any) -> str:
+    if cursor_value is None:
+        return base_filter
+    return f"({base_filter}) and {primary_key} > {_literal(cursor_value)}"
+
+
+def _index_window_filter(base_filter: str, primary_key: str, after: Optional[Dict[str, Any]], lower: int, upper: int) -> str:
+    """chunk_index 落在 [lower, upper) 且位于游标之后的分块；游标所在 chunk_index 内按主键续接"""
+    window = f"chunk_index >= {lower} and chunk_index < {upper}"
+    if after is not None and after["i"] == lower:
+        window = (
+            f"(chunk_index == {lower} and {primary_key} > {_literal(after['pk'])})"
+            f" or (chunk_index > {lower} and chunk_index < {upper})"
+        )
+    return f"({base_filter}) and ({window})"
+
+
+def iter_chunk_rows(
+    client,
+    collection_name: str,
+    filter_expr: str,
+    output_fields: List[str],
+    batch_size: int = CHUNK_LIST_DEFAULT_PAGE_SIZE,
+    limit: int = -1,
+) -> Iterator[Dict[str, Any]]:
+    """按主键顺序逐批读取匹配分块（query_iterator），调用方停止迭代时释放服务端迭代器"""
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        limit=limit,
+        filter=filter_expr,
+        output_fields=output_fields,
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                return
+            yield from rows
+    finally:
+        iterator.close()
+
+
+def list_chunk_page(
+    client,
+    collection_name: str,
+    filter_expr: str,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None,
+    with_total: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    读取一页分块
+
+    Args:
+        client: MilvusClient（使用 MilvusClientFactory 的共享客户端）
+        collection_name: collection 名称
+        filter_expr: 文档过滤表达式
+        cursor: 上一页返回的 next_cursor，首页为空
+        page_size: 每页条数，超过 CHUNK_LIST_MAX_PAGE_SIZE 时截断
+        with_total: 是否额外统计匹配分块总数（count(*)）
+        schema: describe_chunk_fields 的结果，调用方已获取时传入以省去一次 describe
+
+    Returns:
+        Dict: rows=本页分块, next_cursor=下一页游标（没有更多时为 None）, has_more, page_size, total
+    """
+    page_size = clamp_page_size(page_size)
+    schema = schema or describe_chunk_fields(client, collection_name)
+    primary_key = schema["primary_key"]
+    output_fields = [primary_key] + [name for name in schema["output_fields"] if name != primary_key]
+    after = decode_cursor(cursor)
+    if "chunk_index" in schema["field_names"]:
+        if after is not None and after["i"] is None:
+            raise InvalidCursorError(f"无效的分页游标: {cursor}")
+        rows = _read_index_ordered(client, collection_name, filter_expr, primary_key, output_fields, after, page_size + 1)
+    else:
+        rows = list(iter_chunk_rows(
+            client,
+            collection_name,
+            _cursor_filter(filter_expr, primary_key, after["pk"] if after else None),
+            output_fields,
+            batch_size=page_size + 1,
+            limit=page_size + 1,
+        ))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    total = None
+    if with_total:
+        counted = client.query(collection_name=collection_name, filter=filter_expr, output_fields=["count(*)"])
+        total = counted[0]["count(*)"] if counted else 0
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1][primary_key], rows[-1].get("chunk_index"))
+    return {
+        "rows": rows,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "page_size": page_size,
+        "total": total,
+        "primary_key": primary_key,
+        "text_field": schema["text_field"],
+    }
+
+
+def _read_index_ordered(
+    client,
+    collection_name: str,
+    filter_expr: str,
+    primary_key: str,
+    output_fields: List[str],
+    after: Optional[Dict[str, Any]],
+    needed: int,
+) -> List[Dict[str, Any]]:
+    """按 chunk_index 窗口向后读取，凑满 needed 条后按 (chunk_index, 主键) 排序返回前 needed 条"""
+    lower = after["i"] if after else 0
+    span = needed
+    rows: List[Dict[str, Any]] = []
+    while True:
+        upper = lower + span
+        rows.extend(iter_chunk_rows(
+            client,
+            collection_name,
+            _index_window_filter(filter_expr, primary_key, after, lower, upper),
+            output_fields,
+            batch_size=needed,
+        ))
+        if len(rows) >= needed:
+            break
+        # 窗口内不足一页：确认后面还有分块再加倍窗口继续（重新入库后 chunk_index 可能有空洞）
+        beyond = list(iter_chunk_rows(
+            client,
+            collection_name,
+            f"({filter_expr}) and chunk_index >= {upper}",
+            [primary_key],
+            batch_size=1,
+            limit=1,
+        ))
+        if not beyond:
+            break
+        lower, span = upper, span * 2
+    rows.sort(key=lambda row: (row.get("chunk_index") or 0, row[primary_key]))
+    return rows[:needed]
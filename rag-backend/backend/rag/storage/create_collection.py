@@ -65,6 +65,14 @@ def create_text_chunks_collection(collection_name: str = None, embedding_dim: in
         description="原文档名称"
     )
     
+    # 文档标识字段 - 按文档批量删除
+    schema.add_field(
+        field_name="document_id", 
+        datatype=DataType.VARCHAR,
+        max_length=128,
+        description="稳定的文档标识（知识库文档ID或来源哈希）"
+    )
+    
     # 元数据字段
     schema.add_field(
         field_name="chunk_index", 
@@ -78,6 +86,30 @@ def create_text_chunks_collection(collection_name: str = None, embedding_dim: in
         description="文本块字符数"
     )
     
+    # 页码字段 - 仅 PDF 分块有值，其他文档为空
+    schema.add_field(
+        field_name="page_number", 
+        datatype=DataType.INT64,
+        nullable=True,
+        description="分块起始页码"
+    )
+    
+    schema.add_field(
+        field_name="page_end", 
+        datatype=DataType.INT64,
+        nullable=True,
+        description="分块结束页码"
+    )
+    
+    # 证据等级 - 仅推荐条款有值
+    schema.add_field(
+        field_name="evidence_level", 
+        datatype=DataType.VARCHAR,
+        max_length=64,
+        nullable=True,
+        description="推荐条款的证据等级"
+    )
+    
     # 创建索引参数
     index_params = client.prepare_index_params()
     
@@ -107,6 +139,12 @@ def create_text_chunks_collection(collection_name: str = None, embedding_dim: in
         index_type="INVERTED"
     )
     
+    # 4. 文档标识索引 - 用于 document_id in [...] 批量删除
+    index_params.add_index(
+        field_name="document_id",
+        index_type="INVERTED"
+    )
+    
     # 统一创建collection和索引
     client.create_collection(
         collection_name=collection_name,
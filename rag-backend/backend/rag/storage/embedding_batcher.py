@@ -0,0 +1,187 @@
+"""
+Embedding 批处理引擎
+
+按 token 数把分块打包成不超过服务商限制的批次，多个批次在限速器控制下并发请求，
+单个批次遇到限流/超时等瞬时错误时按指数退避重试，不影响其他批次。
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from backend.config.log import get_logger
+from .embedding_cache import EmbeddingCache, embedding_identity, get_embedding_cache, split_cached
+
+logger = get_logger(__name__)
+
+# DashScope text-embedding-v4：单次请求最多 10 条，单条最多 8192 token
+EMBED_MAX_BATCH_SIZE = int(os.getenv("RAG_EMBED_MAX_BATCH_SIZE", "10"))
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("RAG_EMBED_MAX_BATCH_TOKENS", "8192"))
+EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+# 进程内所有批次共享的请求速率上限（次/秒），<=0 表示不限速
+EMBED_REQUESTS_PER_SECOND = float(os.getenv("RAG_EMBED_REQUESTS_PER_SECOND", "8"))
+EMBED_MAX_RETRIES = int(os.getenv("RAG_EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BASE_SECONDS = float(os.getenv("RAG_EMBED_RETRY_BASE_SECONDS", "1"))
+
+_TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+_TRANSIENT_NAME_HINTS = ("timeout", "ratelimit", "connection", "serviceunavailable", "internalserver")
+_CJK_PATTERN = re.compile("[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+_shared_rate_limiter: Optional["RateLimiter"] = None
+_shared_rate_limiter_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    if not text:
+        return 1
+    cjk = len(_CJK_PATTERN.findall(text))
+    return max(1, cjk + (len(text) - cjk + 3) // 4)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """限流、超时、连接错误与 5xx 视为瞬时错误"""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status in _TRANSIENT_STATUS_CODES:
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__.lower()
+    return any(hint in name for hint in _TRANSIENT_NAME_HINTS)
+
+
+class RateLimiter:
+    """线程安全的匀速限速器：相邻两次请求至少间隔 1/rate 秒"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def get_shared_rate_limiter() -> RateLimiter:
+    """同一进程内所有文档共享一个限速器，避免并发入库时叠加超出服务商配额"""
+    global _shared_rate_limiter
+    if _shared_rate_limiter is None:
+        with _shared_rate_limiter_lock:
+            if _shared_rate_limiter is None:
+                _shared_rate_limiter = RateLimiter(EMBED_REQUESTS_PER_SECOND)
+    return _shared_rate_limiter
+
+
+class EmbeddingBatcher:
+    """按 token 预算打包、并发请求并按批重试的 embedding 执行器（先查内容哈希缓存，只请求未命中的文本）"""
+
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+        max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+        concurrency: int = EMBED_CONCURRENCY,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = EMBED_MAX_RETRIES,
+        retry_base_seconds: float = EMBED_RETRY_BASE_SECONDS,
+        cache: Optional[EmbeddingCache] = None,
+        use_cache: bool = True
+    ):
+        self.embedding_function = embedding_function
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_batch_tokens = max(1, int(max_batch_tokens))
+        self.concurrency = max(1, int(concurrency))
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.max_retries = max(0, int(max_retries))
+        self.retry_base_seconds = max(0.0, float(retry_base_seconds))
+        self.cache = (cache or get_embedding_cache()) if use_cache else None
+        self.model, self.dimension = embedding_identity(embedding_function)
+        self.last_stats: Dict[str, Any] = {}
+
+    def plan_batches(self, texts: List[str]) -> List[List[int]]:
+        """按顺序贪心打包：条数不超过 max_batch_size，估算 token 不超过 max_batch_tokens（超长单条独占一批）"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts: List[str]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                vectors = self.embedding_function.embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"embedding 返回数量不一致: {len(vectors)} != {len(texts)}")
+                return {"vectors": vectors, "retries": attempt}
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_transient_error(exc):
+                    raise
+                delay = self.retry_base_seconds * (2 ** attempt)
+                attempt += 1
+                logger.warning(f"embedding 批次瞬时失败，{delay:.1f}s 后第 {attempt} 次重试: {exc}")
+                time.sleep(delay)
+
+    def _embed_uncached(self, texts: List[str]) -> Dict[str, Any]:
+        batches = self.plan_batches(texts)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        retries = 0
+        if batches:
+            workers = min(self.concurrency, len(batches))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed-batch") as executor:
+                futures = [
+                    (batch, executor.submit(self._embed_batch, [texts[i] for i in batch]))
+                    for batch in batches
+                ]
+                for batch, future in futures:
+                    outcome = future.result()
+                    retries += outcome["retries"]
+                    for index, vector in zip(batch, outcome["vectors"]):
+                        vectors[index] = vector
+        return {"vectors": vectors, "batches": len(batches), "retries": retries}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """计算 texts 的向量，返回顺序与输入一致"""
+        started = time.monotonic()
+        hashes, cached, missing = split_cached(texts, self.cache, self.model, self.dimension)
+        outcome = self._embed_uncached(list(missing.values()))
+        fresh = dict(zip(missing.keys(), outcome["vectors"]))
+        if self.cache and fresh:
+            self.cache.put_many(fresh.items(), self.model, self.dimension)
+        vectors = [cached.get(hash_value) or fresh[hash_value] for hash_value in hashes]
+
+        elapsed = time.monotonic() - started
+        cache_hits = sum(1 for hash_value in hashes if hash_value in cached)
+        self.last_stats = {
+            "chunks": len(texts),
+            "embedded": len(missing),
+            "cache_hits": cache_hits,
+            "cache_hit_ratio": round(cache_hits / len(texts), 4) if texts else 0.0,
+            "batches": outcome["batches"],
+            "retries": outcome["retries"],
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(len(texts) / elapsed, 2) if elapsed > 0 else float(len(texts))
+        }
+        logger.info(
+            f"embedding 完成: {len(texts)} 个分块, 缓存命中 {cache_hits}, 请求 {len(missing)} 条/{outcome['batches']} 批, "
+            f"重试 {outcome['retries']} 次, {self.last_stats['chunks_per_second']} chunks/s"
+        )
+        return vectors
@@ -0,0 +1,162 @@
+"""
+分块向量持久化缓存
+
+以 (内容 SHA-256, 模型, 维度) 为键把向量存入业务数据库（DatabaseFactory 配置的库），
+新版本指南、爬虫页面的公共段落、上传到多个知识库的同一份 PDF 等重复文本只需请求一次 embedding 服务。
+缓存读写失败只记录告警并按未命中处理，不影响入库。
+"""
+import hashlib
+import os
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from backend.config.database import DatabaseFactory
+from backend.config.log import get_logger
+from backend.model.embedding_cache import EmbeddingCacheEntry
+
+logger = get_logger(__name__)
+
+EMBED_CACHE_ENABLED = str(os.getenv("RAG_EMBED_CACHE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+# 单条 SQL 中 IN 查询的最大哈希数
+EMBED_CACHE_LOOKUP_BATCH_SIZE = int(os.getenv("RAG_EMBED_CACHE_LOOKUP_BATCH_SIZE", "500"))
+
+_embedding_cache_table_ready = False
+_embedding_cache: Optional["EmbeddingCache"] = None
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: Sequence[float]) -> bytes:
+    packed = array("f", vector)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_vector(raw: bytes) -> List[float]:
+    packed = array("f")
+    packed.frombytes(raw)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tolist()
+
+
+def _ensure_embedding_cache_table() -> bool:
+    global _embedding_cache_table_ready
+    if _embedding_cache_table_ready:
+        return True
+    try:
+        EmbeddingCacheEntry.__table__.create(bind=DatabaseFactory.get_engine(), checkfirst=True)
+        _embedding_cache_table_ready = True
+        return True
+    except (SQLAlchemyError, RuntimeError) as exc:
+        logger.error(f"检查或创建向量缓存表失败: {exc}")
+        return False
+
+
+class EmbeddingCache:
+    """数据库向量缓存（同步接口，在入库线程中调用）"""
+
+    def get_many(self, hashes: Iterable[str], model: str, dimension: int) -> Dict[str, List[float]]:
+        """批量查询，返回命中的 {content_hash: vector}"""
+        unique = list(dict.fromkeys(hashes))
+        if not unique or not _ensure_embedding_cache_table():
+            return {}
+        found: Dict[str, List[float]] = {}
+        db = DatabaseFactory.create_session()
+        try:
+            for start in range(0, len(unique), EMBED_CACHE_LOOKUP_BATCH_SIZE):
+                batch = unique[start:start + EMBED_CACHE_LOOKUP_BATCH_SIZE]
+                rows = db.execute(
+                    select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.vector).where(
+                        EmbeddingCacheEntry.model == model,
+                        EmbeddingCacheEntry.dimension == dimension,
+                        EmbeddingCacheEntry.content_hash.in_(batch)
+                    )
+                ).all()
+                for hash_value, raw in rows:
+                    found[hash_value] = unpack_vector(raw)
+        except SQLAlchemyError as exc:
+            logger.warning(f"读取向量缓存失败，按未命中处理: {exc}")
+        finally:
+            db.close()
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Sequence[float]]], model: str, dimension: int) -> int:
+        """批量写入；并发 worker 已写入的同一内容会被跳过"""
+        pending = dict(items)
+        if not pending or not _ensure_embedding_cache_table():
+            return 0
+        db = DatabaseFactory.create_session()
+        try:
+            existing = set()
+            keys = list(pending)
+            for start in range(0, len(keys), EMBED_CACHE_LOOKUP_BATCH_SIZE):
+                existing.update(db.execute(
+                    select(EmbeddingCacheEntry.content_hash).where(
+                        EmbeddingCacheEntry.model == model,
+                        EmbeddingCacheEntry.dimension == dimension,
+                        EmbeddingCacheEntry.content_hash.in_(keys[start:start + EMBED_CACHE_LOOKUP_BATCH_SIZE])
+                    )
+                ).scalars().all())
+            rows = [
+                {"content_hash": key, "model": model, "dimension": dimension, "vector": pack_vector(vector)}
+                for key, vector in pending.items() if key not in existing
+            ]
+            if not rows:
+                return 0
+            db.execute(EmbeddingCacheEntry.__table__.insert(), rows)
+            db.commit()
+            return len(rows)
+        except IntegrityError:
+            # 与其他 worker 同时写入了相同内容，缓存已存在即可
+            db.rollback()
+            return 0
+        except SQLAlchemyError as exc:
+            db.rollback()
+            logger.warning(f"写入向量缓存失败: {exc}")
+            return 0
+        finally:
+            db.close()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取进程级向量缓存，RAG_EMBED_CACHE_ENABLED=false 时返回 None"""
+    global _embedding_cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def embedding_identity(embedding_function) -> Tuple[str, int]:
+    """从 LangChain embedding 实例推导缓存键中的 (模型, 维度)"""
+    model = getattr(embedding_function, "model", None) or getattr(embedding_function, "model_name", None)
+    dimension = getattr(embedding_function, "dimensions", None)
+    return str(model or type(embedding_function).__name__), int(dimension or 0)
+
+
+def split_cached(
+    texts: Sequence[str],
+    cache: Optional[EmbeddingCache],
+    model: str,
+    dimension: int
+) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+    """
+    计算哈希并查缓存
+
+    Returns:
+        (每条文本的哈希, 已命中的 {哈希: 向量}, 需要请求的去重后 {哈希: 文本})
+    """
+    hashes = [content_hash(text) for text in texts]
+    cached = cache.get_many(hashes, model, dimension) if cache else {}
+    missing: Dict[str, str] = {}
+    for hash_value, text in zip(hashes, texts):
+        if hash_value not in cached and hash_value not in missing:
+            missing[hash_value] = text
+    return hashes, cached, missing
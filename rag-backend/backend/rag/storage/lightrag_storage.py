@@ -1,5 +1,8 @@
+import asyncio
+import inspect
 import os
-from typing import List, Dict, Optional
+import time
+from typing import Any, Callable, List, Dict, Optional
 import numpy as np
 from dotenv import load_dotenv
 import logging
@@ -7,12 +10,22 @@ import logging
 from lightrag import LightRAG, QueryParam
 from lightrag.llm.openai import openai_complete_if_cache, openai_embed
 from lightrag.kg.shared_storage import initialize_pipeline_status
-from lightrag.utils import setup_logger, EmbeddingFunc
+from lightrag.utils import setup_logger, EmbeddingFunc, compute_mdhash_id, sanitize_text_for_encoding
+
+from .embedding_cache import get_embedding_cache, split_cached
 
 # 设置日志
 setup_logger("lightrag", level="INFO")
 logger = logging.getLogger(__name__)
 
+# 每次 ainsert 的文本数（批次间汇报进度）
+LIGHTRAG_INSERT_BATCH_SIZE = int(os.getenv("RAG_LIGHTRAG_INSERT_BATCH_SIZE", "32"))
+# 同一批次内并行处理的文档数（实体抽取并发）
+LIGHTRAG_MAX_PARALLEL_INSERT = int(os.getenv("RAG_LIGHTRAG_MAX_PARALLEL_INSERT", "4"))
+# LLM / embedding 调用的最大并发
+LIGHTRAG_LLM_MAX_ASYNC = int(os.getenv("RAG_LIGHTRAG_LLM_MAX_ASYNC", "8"))
+LIGHTRAG_EMBEDDING_MAX_ASYNC = int(os.getenv("RAG_LIGHTRAG_EMBEDDING_MAX_ASYNC", "8"))
+
 
 class LightRAGStorage:
     """LightRAG存储和检索类
@@ -41,6 +54,8 @@ class LightRAGStorage:
         self.working_dir = os.path.join(os.path.dirname(__file__), "lightrag_storage")
 
         self.rag: Optional[LightRAG] = None
+        # 本实例 embedding 缓存命中统计（hits=命中条数，embedded=实际请求条数）
+        self.embedding_cache_stats: Dict[str, int] = {"hits": 0, "embedded": 0}
 
         # 确保工作目录存在
         os.makedirs(self.working_dir, exist_ok=True)
@@ -66,14 +81,27 @@ class LightRAGStorage:
         return llm_model_func
 
     async def _get_embedding_func(self):
-        """嵌入模型函数"""
+        """嵌入模型函数（先查内容哈希向量缓存，只请求未命中的文本）"""
+        model = os.getenv("VECTOR_DASHSCOPE_EMBEDDING_MODEL", "text-embedding-v4")
+        dimension = int(os.getenv("EMBEDDING_DIM", 1024))
+
         async def embedding_func(texts: List[str]) -> np.ndarray:
-            return await openai_embed(
-                texts,
-                model=os.getenv("VECTOR_DASHSCOPE_EMBEDDING_MODEL", "text-embedding-v4"),
-                api_key=os.getenv("VECTOR_DASHSCOPE_API_KEY"),
-                base_url=os.getenv("VECTOR_DASHSCOPE_API_BASE", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-            )
+            cache = get_embedding_cache()
+            hashes, cached, missing = await asyncio.to_thread(split_cached, texts, cache, model, dimension)
+            fresh = {}
+            if missing:
+                vectors = await openai_embed(
+                    list(missing.values()),
+                    model=model,
+                    api_key=os.getenv("VECTOR_DASHSCOPE_API_KEY"),
+                    base_url=os.getenv("VECTOR_DASHSCOPE_API_BASE", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+                )
+                fresh = dict(zip(missing.keys(), [list(map(float, vector)) for vector in vectors]))
+                if cache:
+                    await asyncio.to_thread(cache.put_many, fresh.items(), model, dimension)
+            self.embedding_cache_stats["hits"] += sum(1 for hash_value in hashes if hash_value in cached)
+            self.embedding_cache_stats["embedded"] += len(missing)
+            return np.array([cached.get(hash_value) or fresh[hash_value] for hash_value in hashes])
         return embedding_func
 
 
@@ -116,6 +144,9 @@ class LightRAGStorage:
                 embedding_dim=int(os.getenv("EMBEDDING_DIM", 1024))
             ),
             llm_model_func=llm_model_func,
+            llm_model_max_async=LIGHTRAG_LLM_MAX_ASYNC,
+            embedding_func_max_async=LIGHTRAG_EMBEDDING_MAX_ASYNC,
+            max_parallel_insert=LIGHTRAG_MAX_PARALLEL_INSERT,
             workspace=self.workspace,
             graph_storage=graph_storage,
             kv_storage=kv_storage,
@@ -144,14 +175,86 @@ class LightRAGStorage:
 
         await self.rag.ainsert(text)
 
-    async def insert_texts(self, texts: List[str]) -> None:
+    async def insert_texts(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        file_path: Optional[str] = None,
+        progress_callback: Optional[Callable[[int, int], Any]] = None
+    ) -> Dict[str, Any]:
         """批量插入文本
 
+        每次 ainsert 传入一批文本，由 LightRAG 在 max_parallel_insert 范围内并行做实体抽取，
+        同一批次的实体/关系在一轮合并中写入图存储；批次之间汇报进度。
+
         Args:
             texts: 文本列表
+            batch_size: 每次 ainsert 的文本数，默认 RAG_LIGHTRAG_INSERT_BATCH_SIZE
+            file_path: 来源文档名，写入 LightRAG 的 file_path 便于溯源
+            progress_callback: 每批完成后回调 (已完成数, 总数)，可为协程函数
+
+        Returns:
+            写入统计
         """
+        if self.rag is None:
+            await self.initialize()
+
+        # 与 LightRAG 默认规则一致的文档ID，同批次内重复内容只保留一份（ainsert 要求 ids 唯一）
+        unique: Dict[str, str] = {}
         for text in texts:
-            await self.insert_text(text)
+            if text and text.strip():
+                unique.setdefault(self.doc_id_for_text(text), text)
+        items = list(unique.items())
+        total = len(items)
+        batch_size = max(1, int(batch_size or LIGHTRAG_INSERT_BATCH_SIZE))
+        started = time.monotonic()
+        done = 0
+        batches = 0
+        for start in range(0, total, batch_size):
+            batch = items[start:start + batch_size]
+            kwargs: Dict[str, Any] = {"ids": [doc_id for doc_id, _ in batch]}
+            if file_path:
+                kwargs["file_paths"] = [file_path] * len(batch)
+            await self.rag.ainsert([text for _, text in batch], **kwargs)
+            done += len(batch)
+            batches += 1
+            logger.info(
+                f"LightRAG 写入进度: {done}/{total}, workspace={self.workspace}, "
+                f"耗时 {time.monotonic() - started:.1f}s"
+            )
+            if progress_callback is not None:
+                outcome = progress_callback(done, total)
+                if inspect.isawaitable(outcome):
+                    await outcome
+        return {
+            "total": total,
+            "batches": batches,
+            "seconds": round(time.monotonic() - started, 3)
+        }
+
+    @staticmethod
+    def doc_id_for_text(text: str) -> str:
+        """与 LightRAG ainsert 未指定 ids 时的规则一致：按清洗后内容的 MD5 生成文档ID"""
+        return compute_mdhash_id(sanitize_text_for_encoding(text), prefix="doc-")
+
+    async def delete_doc_ids(self, doc_ids: List[str]) -> int:
+        """按文档ID删除 LightRAG 文档及其独占的实体/关系
+
+        Args:
+            doc_ids: 文档ID列表
+
+        Returns:
+            删除的文档数
+        """
+        if self.rag is None:
+            await self.initialize()
+
+        deleted = 0
+        for doc_id in doc_ids:
+            result = await self.rag.adelete_by_doc_id(doc_id)
+            if getattr(result, "status", None) == "success":
+                deleted += 1
+        return deleted
 
     async def query(
         self,
@@ -1,18 +1,62 @@
 """Milvus存储管理类"""
 
+import hashlib
+import json
 import os
 import time
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable
 from langchain_milvus import Milvus,BM25BuiltInFunction
+from pymilvus import DataType
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 
 from ..chunks.models import ChunkResult
+from .embedding_batcher import EmbeddingBatcher
 
 # 加载环境变量
 load_dotenv()
 
+# 预先算好向量后写入 Milvus 的单次插入条数
+MILVUS_INSERT_BATCH_SIZE = int(os.getenv("RAG_MILVUS_INSERT_BATCH_SIZE", "1000"))
+# 按 document_id 批量删除时每次 delete 调用携带的 id 数（in 表达式长度）
+MILVUS_DELETE_BATCH_SIZE = int(os.getenv("RAG_MILVUS_DELETE_BATCH_SIZE", "200"))
+
+DOCUMENT_ID_FIELD = "document_id"
+# 只有部分分块有值的元数据字段（页码仅 PDF 分块有，证据等级仅推荐条款有）：
+# 所有分块都写入这些键（缺省为 None），字段建为可空，同一 collection 可混存 PDF 与其他文档
+NULLABLE_CHUNK_FIELDS: Dict[str, Dict[str, Any]] = {
+    "page_number": {"dtype": DataType.INT64},
+    "page_end": {"dtype": DataType.INT64},
+    "evidence_level": {"dtype": DataType.VARCHAR, "max_length": 64},
+}
+
+
+def chunk_metadata_schema() -> Dict[str, Dict[str, Any]]:
+    """新建 collection 时可空元数据字段的 schema（langchain 会消费该字典，每次调用返回新副本）"""
+    return {
+        field: {"dtype": spec["dtype"], "kwargs": {**{k: v for k, v in spec.items() if k != "dtype"}, "nullable": True}}
+        for field, spec in NULLABLE_CHUNK_FIELDS.items()
+    }
+
+
+def knowledge_document_id(document_id: Any) -> str:
+    """知识库文档（MySQL 主键）对应的向量库 document_id"""
+    return f"kb-{document_id}"
+
+
+def source_document_id(source: str) -> str:
+    """没有知识库文档记录的来源（爬取页面 URL、文档名）按内容哈希生成稳定的 document_id"""
+    return "src-" + hashlib.sha1((source or "").encode("utf-8")).hexdigest()[:24]
+
+
+def _milvus_string_literal(value: str) -> str:
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def _milvus_in_expr(field_name: str, values: Iterable[str]) -> str:
+    return f"{field_name} in [{', '.join(_milvus_string_literal(value) for value in values)}]"
+
 
 class MilvusStorage:
     """Milvus向量存储管理类
@@ -26,7 +70,9 @@ class MilvusStorage:
                  uri: Optional[str] = None, 
                  db_name: Optional[str] = None,
                  token: Optional[str] = None,
-                 collection_name: Optional[str] = None):
+                 collection_name: Optional[str] = None,
+                 partition_key_field: Optional[str] = None,
+                 num_partitions: Optional[int] = None):
         """初始化Milvus存储客户端
         
         Args:
@@ -35,6 +81,8 @@ class MilvusStorage:
             db_name: 数据库名称，默认从环境变量MILVUS_DB_NAME获取
             token: 认证令牌，默认从环境变量MILVUS_TOKEN获取（可选）
             collection_name: 集合名称，默认从环境变量MILVUS_COLLECTION_NAME获取
+            partition_key_field: 分区键字段（元数据中的标量字段），仅在新建 collection 时生效
+            num_partitions: 分区键模式下的分区数，默认使用 Milvus 服务端配置
         """
         
         # 从环境变量读取配置，如果参数没有提供的话
@@ -42,9 +90,12 @@ class MilvusStorage:
         self.db_name = db_name or os.getenv('MILVUS_DB_NAME', 'rag')
         self.token = token or os.getenv('MILVUS_TOKEN') or None
         self.collection_name = collection_name or os.getenv('MILVUS_COLLECTION_NAME', 'chunks')
+        self.partition_key_field = partition_key_field
+        self._document_id_index_ready = False
         
         # 设置embedding函数
         self.embedding_function = embedding_function
+        self.embedding_batcher = EmbeddingBatcher(embedding_function)
         
         # 初始化LangChain Milvus向量存储
         self.vector_store = Milvus(
@@ -60,7 +111,10 @@ class MilvusStorage:
             collection_name=self.collection_name,
             builtin_function=BM25BuiltInFunction(),
             consistency_level="Bounded",
-            drop_old=False
+            drop_old=False,
+            metadata_schema=chunk_metadata_schema(),
+            partition_key_field=partition_key_field,
+            num_partitions=num_partitions if partition_key_field else None
         )
         
     def store_chunks(self, chunk_result: ChunkResult) -> Dict[str, Any]:
@@ -124,8 +178,10 @@ class MilvusStorage:
             # 创建符合Milvus集合schema的元数据
             # 注意：page_content会自动映射到text_content字段
             updated_metadata = {
+                **dict.fromkeys(NULLABLE_CHUNK_FIELDS),  # 所有分块带相同的可空字段
                 **chunk.metadata,  # 保留原有元数据
                 "document_name": chunk_result.document_name,
+                DOCUMENT_ID_FIELD: chunk_result.document_id or source_document_id(chunk_result.document_name),
                 "chunk_index": idx,
                 "chunk_size": len(chunk.page_content)
             }
@@ -141,6 +197,55 @@ class MilvusStorage:
         
         return documents
     
+    def prepare_documents(self, chunk_results: List[ChunkResult]) -> List[Document]:
+        """把多个分块结果转换为待入库的 Document 列表"""
+        documents = []
+        for chunk_result in chunk_results:
+            if chunk_result.chunks:
+                documents.extend(self._convert_chunks_to_langchain_docs(chunk_result))
+        return documents
+
+    def embed_documents(self, documents: List[Document]) -> List[List[float]]:
+        """为 Document 计算向量（不写入 Milvus），供入库流水线的 embed 阶段调用
+        
+        按 token 预算打包并发请求，吞吐统计见 self.embedding_batcher.last_stats
+        """
+        return self.embedding_batcher.embed([doc.page_content for doc in documents])
+
+    def insert_embedded_documents(self, documents: List[Document], embeddings: List[List[float]]) -> List[str]:
+        """写入已计算好向量的 Document，供入库流水线的 store 阶段调用"""
+        if not documents:
+            return []
+        if len(documents) != len(embeddings):
+            raise ValueError(f"向量数量与文档数量不一致: {len(embeddings)} != {len(documents)}")
+        from uuid import uuid4
+        ids = self.vector_store.add_embeddings(
+            texts=[doc.page_content for doc in documents],
+            embeddings=embeddings,
+            metadatas=[doc.metadata for doc in documents],
+            batch_size=MILVUS_INSERT_BATCH_SIZE,
+            ids=[str(uuid4()) for _ in documents]
+        )
+        self._ensure_document_id_index()
+        return ids
+
+    def has_field(self, field_name: str, collection_name: Optional[str] = None) -> bool:
+        """collection 的 schema 中是否有该字段（旧 collection 没有 document_id 字段）"""
+        target_collection = collection_name or self.collection_name
+        client = self.vector_store.client
+        if not client.has_collection(target_collection):
+            return False
+        description = client.describe_collection(target_collection)
+        return any(field.get("name") == field_name for field in description.get("fields", []))
+
+    def _ensure_document_id_index(self) -> None:
+        """首次写入后为 document_id 建倒排索引（每个实例只检查一次）"""
+        if self._document_id_index_ready:
+            return
+        if self.has_field(DOCUMENT_ID_FIELD):
+            self.ensure_scalar_indexes([DOCUMENT_ID_FIELD])
+        self._document_id_index_ready = True
+
     def store_chunks_batch(self, chunk_results: List[ChunkResult]) -> Dict[str, Any]:
         """批量存储多个分块结果到Milvus
         
@@ -167,14 +272,8 @@ class MilvusStorage:
         
         try:
             # 收集所有文档
-            all_documents = []
-            total_chunks = 0
-            
-            for chunk_result in chunk_results:
-                if chunk_result.chunks:
-                    documents = self._convert_chunks_to_langchain_docs(chunk_result)
-                    all_documents.extend(documents)
-                    total_chunks += len(documents)
+            all_documents = self.prepare_documents(chunk_results)
+            total_chunks = len(all_documents)
             
             if not all_documents:
                 return {
@@ -184,20 +283,9 @@ class MilvusStorage:
                     "document_count": len(chunk_results)
                 }
             
-            # 分批处理文档，每批最多8个（留一些余量）
-            batch_size = 8
-            all_ids = []
-            
-            for i in range(0, len(all_documents), batch_size):
-                batch_documents = all_documents[i:i + batch_size]
-                
-                # 为当前批次生成UUID作为主键
-                from uuid import uuid4
-                batch_uuids = [str(uuid4()) for _ in range(len(batch_documents))]
-                
-                # 批量添加当前批次的文档
-                batch_ids = self.vector_store.add_documents(documents=batch_documents, ids=batch_uuids)
-                all_ids.extend(batch_ids)
+            # 先并发计算全部向量，再整体批量写入 Milvus
+            embeddings = self.embed_documents(all_documents)
+            all_ids = self.insert_embedded_documents(all_documents, embeddings)
             
             return {
                 "status": "success",
@@ -205,16 +293,82 @@ class MilvusStorage:
                 "total_chunks": total_chunks,
                 "document_count": len(chunk_results),
                 "ids": all_ids,
-                "collection_name": self.collection_name
+                "collection_name": self.collection_name,
+                "embedding_stats": dict(self.embedding_batcher.last_stats)
             }
             
         except Exception as e:
             raise Exception(f"Milvus批量插入失败: {str(e)}")
     
+    def delete_by_ids(self, ids: List[str]) -> int:
+        """按主键删除分块（增量重新入库时删除已消失的分块）"""
+        if not ids:
+            return 0
+        self.vector_store.delete(ids=list(ids))
+        return len(ids)
+
+    def delete_documents(self,
+                         document_ids: List[str],
+                         document_names: Optional[List[str]] = None,
+                         batch_size: int = MILVUS_DELETE_BATCH_SIZE,
+                         collection_name: Optional[str] = None) -> Dict[str, Any]:
+        """按 document_id 批量删除分块，每次 delete 携带 batch_size 个 id 的 in 表达式
+
+        Args:
+            document_ids: 要删除的 document_id 列表
+            document_names: 旧 collection（schema 中没有 document_id 字段）按文档名删除时使用
+            batch_size: 单次 delete 的 id 数
+            collection_name: collection名称
+
+        Returns:
+            Dict: 删除结果，delete_count 为各批删除条数之和
+        """
+        target_collection = collection_name or self.collection_name
+        try:
+            if not self.vector_store:
+                raise ValueError("向量存储未初始化")
+            client = self.vector_store.client
+            if not client.has_collection(target_collection):
+                return {
+                    "status": "warning",
+                    "message": f"Collection '{target_collection}' 不存在",
+                    "collection_name": target_collection
+                }
+            if self.has_field(DOCUMENT_ID_FIELD, target_collection):
+                field_name, values = DOCUMENT_ID_FIELD, document_ids
+            else:
+                field_name, values = "document_name", document_names or []
+            values = list(dict.fromkeys(value for value in values if value))
+            batch_size = max(1, int(batch_size))
+            delete_count = 0
+            batches = 0
+            for start in range(0, len(values), batch_size):
+                result = client.delete(
+                    collection_name=target_collection,
+                    filter=_milvus_in_expr(field_name, values[start:start + batch_size])
+                )
+                delete_count += (result or {}).get("delete_count", 0)
+                batches += 1
+            return {
+                "status": "success",
+                "message": f"按 {field_name} 删除 {len(values)} 个文档的分块",
+                "collection_name": target_collection,
+                "field": field_name,
+                "document_count": len(values),
+                "batches": batches,
+                "delete_count": delete_count
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "collection_name": target_collection,
+                "error": str(e)
+            }
+
     def delete_document(self, 
                        document_name: str, 
                        collection_name: Optional[str] = None) -> Dict[str, Any]:
-        """删除指定文档的所有chunks
+        """删除指定文档名的所有chunks（未写入 document_id 的旧分块按文档名清理）
         
         Args:
             document_name: 文档名称
@@ -241,13 +395,10 @@ class MilvusStorage:
                     "collection_name": target_collection
                 }
             
-            # 构造删除表达式：匹配 document_name 元数据
-            expr = f'document_name == "{document_name}"'
-            
-            # 执行删除
+            # 文档名作为字符串字面量转义，避免引号破坏表达式
             result = client.delete(
                 collection_name=target_collection,
-                expr=expr
+                filter=f"document_name == {_milvus_string_literal(document_name)}"
             )
             
             return {
@@ -255,7 +406,7 @@ class MilvusStorage:
                 "document_name": document_name,
                 "message": f"成功删除文档 '{document_name}' 的所有 chunks",
                 "collection_name": target_collection,
-                "delete_count": result.delete_count if hasattr(result, 'delete_count') else "unknown"
+                "delete_count": (result or {}).get("delete_count", "unknown")
             }
             
         except Exception as e:
@@ -302,6 +453,44 @@ class MilvusStorage:
                 "error": str(e)
             }
 
+    def get_partition_key_field(self) -> Optional[str]:
+        """返回当前 collection 实际生效的分区键字段，collection 不存在或未启用分区键时返回 None"""
+        client = self.vector_store.client
+        if not client.has_collection(self.collection_name):
+            return None
+        description = client.describe_collection(self.collection_name)
+        for field in description.get("fields", []):
+            if field.get("is_partition_key"):
+                return field.get("name")
+        return None
+
+    def ensure_scalar_indexes(self, field_names: List[str], index_type: str = "INVERTED") -> List[str]:
+        """为标量字段补建索引（已存在的跳过），用于加速过滤表达式
+        
+        Args:
+            field_names: 需要建索引的标量字段
+            index_type: 索引类型，默认倒排索引
+            
+        Returns:
+            List[str]: 本次新建索引的字段
+        """
+        client = self.vector_store.client
+        if not client.has_collection(self.collection_name):
+            return []
+        existing_fields = set()
+        for index_name in client.list_indexes(self.collection_name):
+            info = client.describe_index(self.collection_name, index_name) or {}
+            existing_fields.add(info.get("field_name") or index_name)
+        created: List[str] = []
+        for field_name in field_names:
+            if field_name in existing_fields:
+                continue
+            index_params = client.prepare_index_params()
+            index_params.add_index(field_name=field_name, index_type=index_type, index_name=f"idx_{field_name}")
+            client.create_index(self.collection_name, index_params)
+            created.append(field_name)
+        return created
+
     def create_hybrid_retriever(self, **kwargs):
         """创建混合检索器
         
@@ -332,7 +521,7 @@ class MilvusStorage:
             query: 查询文本
             k: 返回结果数量
             **kwargs: 其他搜索参数，支持：
-                - filter: 文档元数据过滤条件
+                - expr: Milvus 过滤表达式，在服务端先过滤再检索（命中分区键时只扫描对应分区）
                 - 其他Milvus搜索参数
             
         Returns:
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""为存量记忆事件回填词元签名
+
+content_tokens 列由服务启动时的表结构检查补齐，但不会在请求路径上回填存量数据。
+本脚本按主键分批补算签名，每批单独提交；未回填的事件排序时现场切词，可在服务运行期间执行。
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.config.log import setup_default_logging
+from backend.service.memory import MEMORY_SIGNATURE_BACKFILL_BATCH_SIZE, backfill_event_token_signatures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=MEMORY_SIGNATURE_BACKFILL_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None, help="最多执行的批数；默认回填全部")
+    args = parser.parse_args()
+
+    setup_default_logging()
+    total = backfill_event_token_signatures(batch_size=args.batch_size, max_batches=args.max_batches)
+    print(f"[OK] 已回填 {total} 条记忆事件签名")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Markdown 大纲分块吞吐基准
+
+生成大体量的合成医疗指南 Markdown（多级标题、推荐条款、表格、图片、代码块），对比：
+- legacy：MarkdownHeaderTextSplitter 切章节 + 每个章节新建 RecursiveCharacterTextSplitter + 正则扫描图片并线性查找所属标题
+- outline：parse_markdown_outline 单次扫描，文本分块与图表分块共用同一份大纲
+
+用法：python backend/scripts/benchmark_markdown_outline.py --size-mb 8 --repeat 3
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from langchain.text_splitter import MarkdownHeaderTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from backend.rag.chunks.markdown_outline import parse_markdown_outline
+from backend.service.ingest_tasks import build_chart_chunks, chunk_config_for, chunk_document_with_charts
+
+_IMAGE_PATTERN = re.compile(r"!\[(?P<alt>[^\]]*)\]\((?P<url>[^)\s]+)(?:\s+\"[^\"]*\")?\)")
+_HTML_IMAGE_PATTERN = re.compile(r"<img[^>]*src=[\"'](?P<url>[^\"']+)[\"'][^>]*>", flags=re.IGNORECASE)
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.+)$", flags=re.MULTILINE)
+
+_SENTENCES = [
+    "推荐血压控制目标为<130/80 mmHg（证据等级：A）。",
+    "妊娠期女性禁用ACEI/ARB类药物。",
+    "起始剂量为5 mg，每日一次，2~4周后根据血压滴定。",
+    "常见不良反应包括干咳、高钾血症与血管性水肿。",
+    "合并糖尿病的患者应优先考虑RAS抑制剂。",
+    "随访期间需监测肾功能与电解质。",
+]
+
+
+def build_guideline(size_bytes: int, seed: int = 7) -> str:
+    """生成不小于 size_bytes 的合成医疗指南"""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    chapter = 0
+    while total < size_bytes:
+        chapter += 1
+        block = [f"# 第{chapter}章 高血压管理\n"]
+        for section in range(1, 5):
+            block.append(f"## {chapter}.{section} 诊疗建议\n")
+            for sub in range(1, 3):
+                block.append(f"### {chapter}.{section}.{sub} 用药方案\n")
+                block.append("".join(rng.choice(_SENTENCES) for _ in range(rng.randint(6, 14))) + "\n")
+                block.append("| 药物 | 剂量 | 频次 |\n| --- | --- | --- |\n| 氨氯地平 | 5 mg | qd |\n")
+                if rng.random() < 0.3:
+                    block.append(f"![血压趋势图{chapter}-{section}-{sub}](images/{chapter}_{section}_{sub}.png)\n第 {chapter} 页\n")
+                if rng.random() < 0.1:
+                    block.append("```\n# 非标题注释\nbp = measure()\n```\n")
+                block.append("\n")
+        text = "\n".join(block)
+        parts.append(text)
+        total += len(text.encode("utf-8"))
+    return "".join(parts)
+
+
+def legacy_chunk(content: str, document_name: str) -> Tuple[int, int]:
+    """改造前的流程：标题切分器 + 每章节新建切分器 + 独立的图片正则扫描"""
+    config = chunk_config_for("md")
+    sections = []
+    for doc in MarkdownHeaderTextSplitter(headers_to_split_on=config.headers_to_split_on).split_text(content):
+        title = next((doc.metadata[f"Header_{level}"] for level in range(6, 0, -1) if doc.metadata.get(f"Header_{level}")), "未标注章节")
+        if doc.page_content.strip():
+            sections.append((title, doc.page_content.strip()))
+    text_chunks = 0
+    for _, section_text in sections:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=config.medical_chunk_size,
+            chunk_overlap=config.medical_chunk_overlap,
+            length_function=len,
+            separators=config.separators
+        )
+        text_chunks += len([doc for doc in splitter.create_documents([section_text]) if doc.page_content.strip()])
+    headings = [(m.start(), m.group(1).strip()) for m in _HEADING_PATTERN.finditer(content)]
+    matches = sorted(list(_IMAGE_PATTERN.finditer(content)) + list(_HTML_IMAGE_PATTERN.finditer(content)), key=lambda m: m.start())
+    for match in matches:
+        title = "未标注章节"
+        for position, heading in headings:
+            if position > match.start():
+                break
+            title = heading
+    return text_chunks, len(matches)
+
+
+def outline_chunk(content: str, document_name: str) -> Tuple[int, int]:
+    text_result, chart_result = chunk_document_with_charts(content, document_name, "md", None)
+    return text_result.total_chunks, chart_result.total_chunks
+
+
+def _measure(func: Callable[[str, str], Tuple[int, int]], content: str, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    counts = (0, 0)
+    for _ in range(repeat):
+        started = time.perf_counter()
+        counts = func(content, "guideline.md")
+        best = min(best, time.perf_counter() - started)
+    size_mb = len(content.encode("utf-8")) / (1024 * 1024)
+    return {
+        "seconds": round(best, 3),
+        "mb_per_second": round(size_mb / best, 2) if best > 0 else 0.0,
+        "text_chunks": counts[0],
+        "chart_chunks": counts[1],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Markdown 大纲分块吞吐基准")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="合成指南大小（MB）")
+    parser.add_argument("--repeat", type=int, default=3, help="每种流程重复次数，取最快一次")
+    parser.add_argument("--input", help="使用已有 Markdown 文件代替合成指南")
+    args = parser.parse_args()
+
+    if args.input:
+        content = Path(args.input).read_text(encoding="utf-8")
+    else:
+        content = build_guideline(int(args.size_mb * 1024 * 1024))
+
+    started = time.perf_counter()
+    outline = parse_markdown_outline(content)
+    parse_seconds = time.perf_counter() - started
+    build_chart_chunks(content, "guideline.md", None, outline)
+
+    legacy = _measure(legacy_chunk, content, max(1, args.repeat))
+    current = _measure(outline_chunk, content, max(1, args.repeat))
+    print(
+        json.dumps(
+            {
+                "size_mb": round(len(content.encode("utf-8")) / (1024 * 1024), 2),
+                "outline": {
+                    "parse_seconds": round(parse_seconds, 3),
+                    "headings": len(outline.headings),
+                    "images": len(outline.images),
+                },
+                "legacy": legacy,
+                "single_pass": current,
+                "speedup": round(legacy["seconds"] / current["seconds"], 2) if current["seconds"] else None,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
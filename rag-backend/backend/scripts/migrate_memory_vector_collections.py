@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""迁移记忆向量集合为 user_id 分区键结构
+
+旧集合的 user_id 只是普通元数据字段，检索时需要在 Python 侧过滤其他用户的命中。
+本脚本按数据库中的记忆事件重建集合（user_id 分区键 + user_id/collection_id 标量索引）。
+默认迁移所有存在记忆事件的知识库，已是新结构的集合只补建索引。
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.config.log import setup_default_logging
+from backend.service.memory import (
+    MEMORY_VECTOR_MIGRATE_BATCH_SIZE,
+    list_memory_vector_collection_ids,
+    migrate_memory_vector_collection
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", action="append", default=[], help="知识库ID，可重复指定；默认全部")
+    parser.add_argument("--batch-size", type=int, default=MEMORY_VECTOR_MIGRATE_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="已是分区键结构也强制重建")
+    args = parser.parse_args()
+
+    setup_default_logging()
+    collection_ids = args.collection or list_memory_vector_collection_ids()
+    failed = 0
+    for collection_id in collection_ids:
+        result = migrate_memory_vector_collection(collection_id, batch_size=args.batch_size, force=args.force)
+        if result.get("success"):
+            print(f"[OK] {collection_id}: {result.get('message')}")
+        else:
+            failed += 1
+            print(f"[FAIL] {collection_id}: {result.get('error')}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""独立运行文档入库 worker
+
+与 API 进程解耦部署时使用（此时可设置 RAG_INGEST_EMBEDDED_WORKER=false），
+可同时启动多个进程，通过数据库租约领取任务，互不重复。
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.config.log import setup_default_logging
+from backend.service.ingest_executor import shutdown_cpu_executor
+from backend.service.ingest_queue import INGEST_WORKER_CONCURRENCY, IngestWorker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker-id", default=None, help="worker 名称，默认 主机名-进程号-随机后缀")
+    parser.add_argument("--concurrency", type=int, default=INGEST_WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    setup_default_logging()
+    worker = IngestWorker(worker_id=args.worker_id, concurrency=args.concurrency)
+    try:
+        asyncio.run(worker.run_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_cpu_executor()
+
+
+if __name__ == "__main__":
+    main()
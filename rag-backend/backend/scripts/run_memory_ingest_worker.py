@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""独立运行记忆写入消费者
+
+与 API 进程解耦部署时使用（此时可设置 RAG_MEMORY_INGEST_EMBEDDED_WORKER=false），
+可同时启动多个实例，由 Redis 消费组分摊任务。
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.config.log import setup_default_logging
+from backend.service.memory_ingest import MEMORY_INGEST_BATCH_SIZE, MemoryIngestWorker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consumer", default=None, help="消费者名称，默认 主机名-进程号")
+    parser.add_argument("--batch-size", type=int, default=MEMORY_INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    setup_default_logging()
+    worker = MemoryIngestWorker(consumer_name=args.consumer, batch_size=args.batch_size)
+    try:
+        asyncio.run(worker.run_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
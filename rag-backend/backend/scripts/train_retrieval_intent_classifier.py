@@ -7,7 +7,6 @@
 import argparse
 import datetime as dt
 import json
-import math
 import random
 import sys
 import time
@@ -19,7 +18,13 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from backend.agent.models.retrieval_classifier import tokenize_text
+from backend.agent.models.retrieval_classifier import (
+    compile_model_file,
+    compile_model_payload,
+    compiled_model_path_for,
+    tokenize_text,
+    write_compiled_model,
+)
 
 
 def _normalize_text(value: Any) -> str:
@@ -132,36 +137,6 @@ def _train_nb(
     }
 
 
-def _predict_prob(model: Dict[str, Any], text: str) -> float:
-    tokens = tokenize_text(text)
-    token_counts = model["token_counts"]
-    class_counts = model["class_counts"]
-    token_totals = model["token_totals"]
-    vocab_size = max(1, int(model["vocab_size"]))
-    smoothing = float(model["smoothing"])
-    total_examples = max(1, int(class_counts["pos"]) + int(class_counts["neg"]))
-
-    def _log_prob(class_name: str) -> float:
-        prior = math.log((int(class_counts[class_name]) + 1.0) / (total_examples + 2.0))
-        denominator = int(token_totals[class_name]) + smoothing * vocab_size
-        if denominator <= 0:
-            denominator = 1.0
-        score = prior
-        for token in tokens:
-            stats = token_counts.get(token) or {"pos": 0, "neg": 0}
-            likelihood = (int(stats[class_name]) + smoothing) / denominator
-            score += math.log(max(likelihood, 1e-12))
-        return score
-
-    log_pos = _log_prob("pos")
-    log_neg = _log_prob("neg")
-    logit = log_pos - log_neg
-    try:
-        return 1.0 / (1.0 + math.exp(-logit))
-    except OverflowError:
-        return 1.0 if logit > 0 else 0.0
-
-
 def _binary_metrics_from_probabilities(prob_rows: List[Tuple[float, int]]) -> Dict[str, Any]:
     tp = fp = tn = fn = 0
     for prob, label in prob_rows:
@@ -193,11 +168,12 @@ def _binary_metrics_from_probabilities(prob_rows: List[Tuple[float, int]]) -> Di
 
 
 def _evaluate(model: Dict[str, Any], samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    compiled = compile_model_payload(model)
     start = time.perf_counter()
-    prob_rows: List[Tuple[float, int]] = []
-    for sample in samples:
-        prob = _predict_prob(model, sample["text"])
-        prob_rows.append((prob, int(sample["label"])))
+    probabilities = compiled.predict_probabilities(sample["text"] for sample in samples)
+    prob_rows: List[Tuple[float, int]] = [
+        (prob, int(sample["label"])) for prob, sample in zip(probabilities, samples)
+    ]
     elapsed_ms = (time.perf_counter() - start) * 1000
     metrics = _binary_metrics_from_probabilities(prob_rows)
     avg_latency_ms = (elapsed_ms / len(samples)) if samples else None
@@ -379,8 +355,8 @@ def _split_samples(
 
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input", required=True, help="训练JSONL路径")
-    parser.add_argument("--output", required=True, help="输出模型JSON路径")
+    parser.add_argument("--input", required=True, help="训练JSONL路径（--compile-only 时为模型JSON路径）")
+    parser.add_argument("--output", help="输出模型JSON路径")
     parser.add_argument("--seed", type=int, default=42)
     parser.add_argument("--split-strategy", choices=["random", "time"], default="random")
     parser.add_argument("--valid-ratio", type=float, default=0.2)
@@ -388,8 +364,17 @@ def main() -> None:
     parser.add_argument("--smoothing", type=float, default=1.0)
     parser.add_argument("--min-token-freq", type=int, default=2)
     parser.add_argument("--model-version", default="nb-v1")
+    parser.add_argument("--compiled-output", default=None, help="编译模型(.nbc)输出路径，默认与JSON同名")
+    parser.add_argument("--compile-only", action="store_true", help="仅将 --input 指定的模型JSON编译为 .nbc")
     args = parser.parse_args()
 
+    if args.compile_only:
+        compiled_path = compile_model_file(args.input, args.compiled_output)
+        print(json.dumps({"compiled_output": str(compiled_path)}, ensure_ascii=False, indent=2))
+        return
+    if not args.output:
+        parser.error("未指定 --compile-only 时必须提供 --output")
+
     input_path = Path(args.input)
     output_path = Path(args.output)
     rows = _load_dataset(input_path)
@@ -463,11 +448,16 @@ def main() -> None:
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
     output_path.write_text(json.dumps(serializable_model, ensure_ascii=False), encoding="utf-8")
+    compiled_output_path = write_compiled_model(
+        compile_model_payload(serializable_model),
+        Path(args.compiled_output) if args.compiled_output else compiled_model_path_for(output_path),
+    )
 
     print(
         json.dumps(
             {
                 "output": str(output_path),
+                "compiled_output": str(compiled_output_path),
                 "split_strategy": args.split_strategy,
                 "train_metrics": train_metrics,
                 "valid_metrics": valid_metrics,
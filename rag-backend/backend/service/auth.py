@@ -1,8 +1,14 @@
+import asyncio
 import os
+import threading
+import time
 import bcrypt
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from backend.param.auth import LoginRequest, RegisterRequest
 from backend.param.common import Response
 from backend.model.user import User
@@ -10,15 +16,111 @@ from backend.config.jwt import create_token, verify_token
 from backend.config.database import DatabaseFactory
 from backend.config.log import get_logger
 
+# bcrypt 为 CPU 密集操作，放到固定大小的线程池执行，避免登录高峰阻塞事件循环；池大小即并发上限
+AUTH_PASSWORD_HASH_WORKERS = int(os.getenv("RAG_AUTH_PASSWORD_HASH_WORKERS", "4"))
+# 用户主体（id/用户名/邮箱/是否启用）的进程内缓存，用户信息变更时需调用 invalidate_user_principal
+AUTH_PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("RAG_AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+AUTH_PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("RAG_AUTH_PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+_principal_cache: "OrderedDict[int, tuple]" = OrderedDict()
+_principal_cache_lock = threading.Lock()
+
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    global _password_executor
+    if _password_executor is None:
+        with _password_executor_lock:
+            if _password_executor is None:
+                _password_executor = ThreadPoolExecutor(
+                    max_workers=max(1, AUTH_PASSWORD_HASH_WORKERS),
+                    thread_name_prefix="password-hash"
+                )
+    return _password_executor
+
 
 async def hash_password(password: str) -> str:
-    """密码哈希"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """密码哈希（在密码线程池中执行）"""
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(
+        _get_password_executor(),
+        lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    )
+    return hashed.decode('utf-8')
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    """验证密码（在密码线程池中执行）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_password_executor(),
+        bcrypt.checkpw,
+        plain_password.encode('utf-8'),
+        hashed_password.encode('utf-8')
+    )
+
+
+def build_user_claims(user: User) -> Dict[str, Any]:
+    """写入 token 的用户声明，接口可直接使用而无需回查数据库"""
+    return {
+        "sub": str(user.id),
+        "username": user.username,
+        "email": user.email
+    }
+
+
+def _user_principal(user: User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "is_active": bool(user.is_active)
+    }
+
+
+def invalidate_user_principal(user_id: Optional[int] = None) -> None:
+    """用户信息变更（改名、禁用、删除等）后失效主体缓存；不传 user_id 时清空全部"""
+    with _principal_cache_lock:
+        if user_id is None:
+            _principal_cache.clear()
+        else:
+            _principal_cache.pop(int(user_id), None)
+
+
+async def get_user_principal(user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    获取启用状态的用户主体，带 TTL 缓存
+
+    Returns:
+        Optional[Dict]: {"id", "username", "email", "is_active"}；用户不存在或已禁用时返回 None
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    now = time.monotonic()
+    with _principal_cache_lock:
+        cached = _principal_cache.get(user_id)
+        if cached and cached[0] > now:
+            _principal_cache.move_to_end(user_id)
+            return dict(cached[1])
+
+    async with DatabaseFactory.create_async_session() as session:
+        user = (await session.execute(
+            select(User).where(User.id == user_id, User.is_active == True)
+        )).scalars().first()
+    if not user:
+        invalidate_user_principal(user_id)
+        return None
+    principal = _user_principal(user)
+    if AUTH_PRINCIPAL_CACHE_TTL_SECONDS > 0:
+        with _principal_cache_lock:
+            _principal_cache[user_id] = (now + AUTH_PRINCIPAL_CACHE_TTL_SECONDS, principal)
+            _principal_cache.move_to_end(user_id)
+            while len(_principal_cache) > AUTH_PRINCIPAL_CACHE_MAX_SIZE:
+                _principal_cache.popitem(last=False)
+    return dict(principal)
 
 
 async def authenticate_user(email: str, password: str) -> Optional[User]:
@@ -27,32 +129,24 @@ async def authenticate_user(email: str, password: str) -> Optional[User]:
     logger.info(f"开始用户认证 - 邮箱: {email}")
     
     try:
-        logger.info("获取数据库会话")
-        session = DatabaseFactory.create_session()
-        logger.info("数据库会话创建成功")
-        
-        try:
+        async with DatabaseFactory.create_async_session() as session:
             # 从数据库查询用户
-            logger.info(f"查询用户 - 邮箱: {email}")
-            user = session.query(User).filter_by(email=email, is_active=True).first()
-            logger.info(f"用户查询完成 - 找到用户: {user is not None}")
-            
-            if not user:
-                logger.warning(f"未找到用户 - 邮箱: {email}")
-                return None
-            
-            # 验证密码
-            logger.info("开始密码验证")
-            if await verify_password(password, user.password_hash):
-                logger.info("密码验证成功")
-                return user
-            else:
-                logger.warning("密码验证失败")
-                return None
-        finally:
-            logger.info("关闭数据库会话")
-            session.close()
-            logger.info("数据库会话已关闭")
+            user = (await session.execute(
+                select(User).where(User.email == email, User.is_active == True)
+            )).scalars().first()
+        logger.info(f"用户查询完成 - 找到用户: {user is not None}")
+        
+        if not user:
+            logger.warning(f"未找到用户 - 邮箱: {email}")
+            return None
+        
+        # 验证密码
+        if await verify_password(password, user.password_hash):
+            logger.info("密码验证成功")
+            return user
+        else:
+            logger.warning("密码验证失败")
+            return None
     except Exception as e:
         logger.error(f"用户认证过程中发生错误: {str(e)}")
         raise
@@ -87,6 +181,7 @@ async def create_user(username: str, password: str, email: str) -> User:
         session.add(user)
         session.commit()
         session.refresh(user)  # 获取数据库生成的ID等字段
+        invalidate_user_principal(user.id)
         
         return user
     except HTTPException:
@@ -146,9 +241,9 @@ async def login(login_request: LoginRequest) -> Response:
         
         logger.info(f"用户认证成功 - 用户: {user.username}")
         
-        # 生成token，使用user.id作为subject
+        # 生成token：user.id 作为 subject，并携带用户名/邮箱声明
         logger.info("开始生成token")
-        token = create_token(data={"sub": str(user.id)})
+        token = create_token(data=build_user_claims(user))
         logger.info("token生成成功")
         
         result = Response.success({
@@ -187,19 +282,17 @@ async def register(register_request: RegisterRequest) -> Response:
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())) -> Response:
-    """获取当前用户信息"""
-    try:
-        payload = verify_token(credentials.credentials)
-        current_email = payload.get("sub")
-    except Exception:
+    """获取当前用户信息（token 声明 + 缓存的主体校验，缓存命中时不访问数据库）"""
+    payload = verify_token(credentials.credentials)
+    if not payload or not payload.get("sub"):
         return Response.error("Token无效或已过期")
     
-    user = await get_user_by_email(current_email)
+    principal = await get_user_principal(payload.get("sub"))
     
-    if not user:
+    if not principal:
         return Response.error("用户不存在")
     
     return Response.success({
-        "username": user.username,
-        "email": user.email
-    })
\ No newline at end of file
+        "username": principal["username"],
+        "email": principal["email"]
+    })
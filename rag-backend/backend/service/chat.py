@@ -12,21 +12,26 @@ from backend.agent.contexts.raggraph_context import RAGContext
 from backend.param.chat import ChatRequest
 from backend.config.log import get_logger
 from backend.service import conversation as conversation_service
+from starlette.concurrency import run_in_threadpool
 from backend.service.chat_history import (
-    save_chat_message,
-    get_chat_messages,
-    get_latest_conversation_summary,
-    get_recent_dialog_messages
+    ChatMessageBuffer,
+    save_chat_message_async,
+    get_chat_messages_async,
+    get_chat_messages_page_async,
+    get_trace_messages_async,
+    get_latest_conversation_summary_async,
+    get_recent_dialog_messages_async
 )
-from backend.agent.prompts.raggraph_prompt import RAGGraphPrompts
+from backend.service.conversation_summary import schedule_conversation_summary
+from backend.service.memory_ingest import enqueue_memory_write_async
 from backend.service.memory import (
-    get_user_memory_context,
+    get_user_memory_context_async,
     build_memory_system_prompt,
     write_user_memory,
-    list_user_memories,
-    delete_memory_profile,
-    delete_memory_events_by_conversation,
-    delete_all_user_memory
+    list_user_memories_async,
+    delete_memory_profile_async,
+    delete_memory_events_by_conversation_async,
+    delete_all_user_memory_async
 )
 
 logger = get_logger(__name__)
@@ -233,6 +238,25 @@ def _build_node_trace(node_name: str, node_output: Dict[str, Any], step_index: i
     return trace
 
 
+async def _submit_user_memory(
+    user_id: str,
+    collection_id: str,
+    conversation_id: str,
+    user_message: str,
+    assistant_message: Optional[str] = None
+) -> None:
+    """投递记忆写入任务，由后台消费者批量落库；队列不可用时回退为直接写入"""
+    memory_kwargs = {
+        "user_id": user_id,
+        "collection_id": collection_id,
+        "conversation_id": conversation_id,
+        "user_message": user_message,
+        "assistant_message": assistant_message
+    }
+    if not await enqueue_memory_write_async(**memory_kwargs):
+        await run_in_threadpool(write_user_memory, **memory_kwargs)
+
+
 def _validate_chat_request(chat_request: ChatRequest) -> Dict[str, Any]:
     """
     验证聊天请求参数
@@ -292,6 +316,7 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
     Yields:
         Dict[str, Any]: 流式聊天响应数据
     """
+    message_buffer: Optional[ChatMessageBuffer] = None
     try:
         logger.info(f"开始处理流式聊天请求: {chat_request.content[:100]}...")
         
@@ -347,30 +372,26 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
                 }
                 return
         else:
-            # 验证对话是否存在并更新时间戳
-            conv_result = await conversation_service.get_conversation_by_id(session_id)
-            if not conv_result.get("success"):
-                yield {
-                    "type": "error",
-                    "error": "对话不存在",
-                    "message": "指定的对话不存在"
-                }
-                return
-
-            conv_data = conv_result.get("data") or {}
-            conv_user_id = str(conv_data.get("user_id") or "").strip()
-            if conv_user_id != str(user_id):
-                logger.warning(f"用户 {user_id} 尝试访问不属于自己的会话: {session_id}")
-                yield {
-                    "type": "error",
-                    "error": "无权限访问该会话",
-                    "message": "无权限访问该会话"
-                }
+            # 校验归属并刷新时间戳：单条 UPDATE，归属缓存命中时不访问数据库
+            owner_result = await conversation_service.verify_conversation_owner(session_id, user_id, touch=True)
+            if not owner_result.get("success"):
+                if owner_result.get("reason") == "forbidden":
+                    yield {
+                        "type": "error",
+                        "error": "无权限访问该会话",
+                        "message": "无权限访问该会话"
+                    }
+                else:
+                    yield {
+                        "type": "error",
+                        "error": owner_result.get("error", "对话不存在"),
+                        "message": "指定的对话不存在"
+                    }
                 return
-            
-            # 更新现有对话的时间戳
-            await conversation_service.update_conversation_timestamp(session_id)
         
+        # 本轮流式对话的消息写缓冲：轨迹批量落库，用户消息/最终回答即时事务提交
+        message_buffer = ChatMessageBuffer(conversation_id=session_id)
+
         # 创建 RAG 上下文
         context = RAGContext(
             session_id=session_id,
@@ -383,66 +404,27 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
         # ===== 构造带长短期记忆的对话历史（会话内） =====
         history_messages: List[Dict[str, str]] = []
         conversation_summary: Optional[str] = None
-        memory_context = get_user_memory_context(
+        memory_context = await get_user_memory_context_async(
             user_id=user_id,
             collection_id=collection_id,
             query_text=user_content
         )
+        logger.info(
+            f"记忆上下文读取完成: source={memory_context.get('source')}, "
+            f"latency_ms={memory_context.get('latency_ms')}, timed_out={memory_context.get('timed_out')}"
+        )
         memory_prompt = build_memory_system_prompt(memory_context)
         try:
-            # 从数据库获取该会话的历史消息（已按时间升序）
-            history_records = get_chat_messages(session_id)
-
-            dialog_records: List[Dict[str, Any]] = []
-            summary_records: List[Dict[str, Any]] = []
-            for record in history_records:
-                role = (record.get("role") or "").lower()
-                msg_type = (record.get("type") or "").lower()
-                content_text = (record.get("content") or "").strip()
-                if not content_text:
-                    continue
-                if msg_type == "messages" and role in ["user", "assistant"]:
-                    dialog_records.append(record)
-                elif msg_type == "summary":
-                    summary_records.append(record)
-
             # 已存在的摘要（仅在当前 conversation_id 内生效）
-            if summary_records:
-                conversation_summary = summary_records[-1].get("content") or None
+            conversation_summary = await get_latest_conversation_summary_async(session_id)
 
-            # 将较早的对话压缩为摘要（对话内长期记忆），仅在消息较多且尚无摘要时触发
-            if not conversation_summary and len(dialog_records) > 12:
-                # 取较早的部分作为摘要来源，例如前 len(dialog_records) - 8 条
-                long_records = dialog_records[:-8]
-                lines: List[str] = []
-                for r in long_records:
-                    role = (r.get("role") or "").lower()
-                    text = (r.get("content") or "").strip()
-                    if not text:
-                        continue
-                    if role == "user":
-                        prefix = "用户"
-                    else:
-                        prefix = "助手"
-                    lines.append(f"{prefix}: {text}")
-                if lines:
-                    history_text = "\n".join(lines)
-                    try:
-                        prompt = RAGGraphPrompts.get_conversation_summary_prompt().format(history=history_text)
-                        summary_result = rag_graph.llm.invoke(prompt)
-                        conversation_summary = getattr(summary_result, "content", None) or str(summary_result)
-                        # 将摘要写入 chat_history，type=summary，只在当前会话内使用
-                        save_chat_message(
-                            conversation_id=session_id,
-                            role="system",
-                            message_type="summary",
-                            content=conversation_summary,
-                            extra_data={"node_name": "conversation_summary"}
-                        )
-                        logger.info("已为当前会话生成对话摘要")
-                    except Exception as summarise_error:
-                        logger.error(f"生成对话摘要失败: {summarise_error}")
-                        conversation_summary = None
+            # 只按索引读取最近的对话消息，不再加载整段历史与节点轨迹；
+            # 摘要由回答完成后的后台任务增量维护，这里只读取已有的最新摘要
+            recent_records = await get_recent_dialog_messages_async(session_id, limit=10)
+            dialog_records: List[Dict[str, Any]] = [
+                record for record in recent_records
+                if (record.get("content") or "").strip()
+            ]
 
             # 短期记忆：保留最近 10 条 user/assistant 对话
             short_dialog = dialog_records[-10:] if len(dialog_records) > 10 else dialog_records
@@ -488,12 +470,12 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
 
         
         # 存储用户输入消息到数据库
-        save_chat_message(
-            conversation_id=session_id,
+        await message_buffer.add(
             role="user",
             message_type="messages",
             content=user_content,
-            extra_data={"node_name": "user_input"}
+            extra_data={"node_name": "user_input"},
+            durable=True
         )
         
         # 调用 RAGGraph stream 方法
@@ -519,12 +501,12 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
                         }
                         latest_message = node_output['messages'][-1]
                         message_content = latest_message.content if hasattr(latest_message, 'content') else str(latest_message)
-                        save_chat_message(
-                            conversation_id=session_id,
+                        await message_buffer.add(
                             role="assistant",
                             message_type="messages",
                             content=message_content,
-                            extra_data=extra_data
+                            extra_data=extra_data,
+                            durable=True
                         )
                         latest_assistant_answer = message_content
                         
@@ -548,8 +530,7 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
                         "trace_data": trace_data,
                         "step_index": step_index
                     }
-                    save_chat_message(
-                        conversation_id=session_id,
+                    await message_buffer.add(
                         role="system",
                         message_type="updates",
                         content=content,
@@ -606,20 +587,22 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
                 "trace_data": end_trace,
                 "step_index": end_step_index
             }
-            save_chat_message(
-                conversation_id=session_id,
+            await message_buffer.add(
                 role="system",
                 message_type="updates",
                 content=end_content,
                 extra_data=extra_data
             )
-            write_user_memory(
+            await message_buffer.close()
+            await _submit_user_memory(
                 user_id=user_id,
                 collection_id=collection_id,
                 conversation_id=session_id,
                 user_message=user_content,
                 assistant_message=latest_assistant_answer
             )
+            # 后台增量更新会话摘要，不阻塞本次响应
+            schedule_conversation_summary(session_id, getattr(rag_graph, "llm", None))
 
 
 
@@ -645,7 +628,7 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
                         "session_id": session_id,
                         "content": content
                     }
-                write_user_memory(
+                await _submit_user_memory(
                     user_id=user_id,
                     collection_id=collection_id,
                     conversation_id=session_id,
@@ -679,6 +662,114 @@ async def chat_stream(chat_request: ChatRequest) -> AsyncGenerator[Dict[str, Any
             "error": str(e),
             "message": "流式聊天处理失败"
         }
+    finally:
+        # 异常或客户端断开时也要写入已缓存的轨迹消息
+        if message_buffer and message_buffer.pending_count:
+            if not await message_buffer.close():
+                logger.warning(f"流结束时写入缓存消息失败: conversation_id={message_buffer.conversation_id}")
+
+
+def _format_history_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """将 chat_history 记录转换为前端需要的格式"""
+    history_item = {
+        'id': record['id'],
+        'conversation_id': record['conversation_id'],
+        'role': record['role'],
+        'type': record['type'],
+        'kind': record.get('kind'),
+        'content': record['content'],
+        'timestamp': record.get('created_at') or record.get('timestamp')
+    }
+    if record.get('extra_data'):
+        history_item['extra_data'] = record['extra_data']
+        if isinstance(record['extra_data'], dict) and 'node_name' in record['extra_data']:
+            history_item['node_name'] = record['extra_data']['node_name']
+    return history_item
+
+
+async def get_chat_history_page(
+    conversation_id: str,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    include_traces: bool = False
+) -> Dict[str, Any]:
+    """
+    键集分页获取会话历史（调用方需先校验会话归属）
+
+    Args:
+        conversation_id: 会话ID
+        before_id: 翻页游标，返回 id 小于该值的消息
+        limit: 每页条数
+        include_traces: 是否包含节点轨迹消息
+
+    Returns:
+        Dict[str, Any]: 分页历史数据
+    """
+    try:
+        page = await get_chat_messages_page_async(
+            conversation_id,
+            before_id=before_id,
+            limit=limit,
+            include_traces=include_traces
+        )
+        history = [_format_history_record(record) for record in page["messages"]]
+        return {
+            "success": True,
+            "conversation_id": conversation_id,
+            "history": history,
+            "has_more": page["has_more"],
+            "next_before_id": page["next_before_id"],
+            "limit": page["limit"],
+            "message": f"成功获取 {len(history)} 条聊天历史"
+        }
+    except Exception as e:
+        logger.error(f"分页获取聊天历史失败: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "获取聊天历史失败"
+        }
+
+
+async def get_chat_trace_list(
+    conversation_id: str,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 200
+) -> Dict[str, Any]:
+    """
+    按需获取一轮对话的节点轨迹（调用方需先校验会话归属）
+
+    Args:
+        conversation_id: 会话ID
+        after_id: 起始对话消息 id（不含）
+        before_id: 结束对话消息 id（不含）
+        limit: 最大返回条数
+
+    Returns:
+        Dict[str, Any]: 轨迹消息列表
+    """
+    try:
+        records = await get_trace_messages_async(
+            conversation_id,
+            after_id=after_id,
+            before_id=before_id,
+            limit=limit
+        )
+        traces = [_format_history_record(record) for record in records]
+        return {
+            "success": True,
+            "conversation_id": conversation_id,
+            "traces": traces,
+            "message": f"成功获取 {len(traces)} 条轨迹"
+        }
+    except Exception as e:
+        logger.error(f"获取对话轨迹失败: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "获取对话轨迹失败"
+        }
 
 
 async def get_chat_history_list(user_id: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
@@ -707,46 +798,27 @@ async def get_chat_history_list(user_id: str, conversation_id: Optional[str] = N
             # 获取指定会话的历史记录
             logger.info(f"获取会话 {conversation_id} 的历史记录")
             
-            # 验证对话是否存在
-            conv_result = await conversation_service.get_conversation_by_id(conversation_id)
-            if not conv_result.get("success"):
+            # 验证对话是否存在且属于当前用户
+            owner_result = await conversation_service.verify_conversation_owner(conversation_id, user_id)
+            if not owner_result.get("success"):
+                if owner_result.get("reason") == "forbidden":
+                    return {
+                        "success": False,
+                        "error": "无权限访问该会话",
+                        "message": "无权限访问该会话"
+                    }
                 return {
                     "success": False,
                     "error": "对话不存在",
                     "message": "指定的对话不存在"
                 }
-            conv_data = conv_result.get("data") or {}
-            conv_user_id = str(conv_data.get("user_id") or "").strip()
-            if conv_user_id != str(user_id):
-                return {
-                    "success": False,
-                    "error": "无权限访问该会话",
-                    "message": "无权限访问该会话"
-                }
             
             try:
                 # 直接从数据库获取聊天历史（不需要 RAGGraph）
-                from backend.service.chat_history import get_chat_messages
-                history_records = get_chat_messages(conversation_id)
+                history_records = await get_chat_messages_async(conversation_id)
                 
                 # 转换为前端需要的格式
-                history = []
-                for record in history_records:
-                    history_item = {
-                        'id': record['id'],
-                        'conversation_id': record['conversation_id'],
-                        'role': record['role'],
-                        'type': record['type'],
-                        'content': record['content'],
-                        'timestamp': record.get('created_at') or record.get('timestamp')
-                    }
-                    
-                    if record.get('extra_data'):
-                        history_item['extra_data'] = record['extra_data']
-                        if isinstance(record['extra_data'], dict) and 'node_name' in record['extra_data']:
-                            history_item['node_name'] = record['extra_data']['node_name']
-                    
-                    history.append(history_item)
+                history = [_format_history_record(record) for record in history_records]
                 
                 logger.info(f"成功获取会话 {conversation_id} 的 {len(history)} 条历史记录")
                 
@@ -839,22 +911,20 @@ async def add_chat_history_list(user_id: str, conversation_id: str, message: Dic
                 "message": "添加聊天历史失败"
             }
         
-        # 验证对话是否存在
-        conv_result = await conversation_service.get_conversation_by_id(conversation_id)
-        if not conv_result.get("success"):
+        # 验证对话是否存在且属于当前用户
+        owner_result = await conversation_service.verify_conversation_owner(conversation_id, user_id)
+        if not owner_result.get("success"):
+            if owner_result.get("reason") == "forbidden":
+                return {
+                    "success": False,
+                    "error": "无权限访问该会话",
+                    "message": "无权限访问该会话"
+                }
             return {
                 "success": False,
                 "error": "对话不存在",
                 "message": "指定的对话不存在"
             }
-        conv_data = conv_result.get("data") or {}
-        conv_user_id = str(conv_data.get("user_id") or "").strip()
-        if conv_user_id != str(user_id):
-            return {
-                "success": False,
-                "error": "无权限访问该会话",
-                "message": "无权限访问该会话"
-            }
         
         # 验证消息格式
         if not isinstance(message, dict) or "role" not in message or "content" not in message:
@@ -880,7 +950,7 @@ async def add_chat_history_list(user_id: str, conversation_id: str, message: Dic
         
         # 直接保存到数据库
         try:
-            save_chat_message(
+            await save_chat_message_async(
                 conversation_id=conversation_id,
                 role=role,
                 message_type="messages",
@@ -977,7 +1047,7 @@ async def get_user_memory_snapshot(
 ) -> Dict[str, Any]:
     try:
         started_at = time.perf_counter()
-        data = list_user_memories(
+        data = await list_user_memories_async(
             user_id=user_id,
             collection_id=collection_id,
             profile_limit=profile_limit,
@@ -988,8 +1058,8 @@ async def get_user_memory_snapshot(
         target_conversation_id = str(conversation_id or "").strip()
         if target_conversation_id:
             try:
-                conversation_summary = get_latest_conversation_summary(conversation_id=target_conversation_id)
-                short_dialog = get_recent_dialog_messages(
+                conversation_summary = await get_latest_conversation_summary_async(conversation_id=target_conversation_id)
+                short_dialog = await get_recent_dialog_messages_async(
                     conversation_id=target_conversation_id,
                     limit=short_term_limit
                 )
@@ -1046,7 +1116,10 @@ async def get_user_memory_snapshot(
             "hybrid_event_count": hybrid_event_count,
             "recall_mode": recall_mode
         }
-        data["metrics"] = {"response_latency_ms": response_latency_ms}
+        data["metrics"] = {
+            "response_latency_ms": response_latency_ms,
+            "source_latency_ms": data.pop("source_latency_ms", {})
+        }
         data["memory_kinds"] = {
             "short_term": "会话内最近对话（不跨会话）",
             "conversation_summary": "会话内长期摘要（不跨会话）",
@@ -1060,7 +1133,7 @@ async def get_user_memory_snapshot(
 
 
 async def remove_user_memory_profile(user_id: str, collection_id: str, memory_key: str) -> Dict[str, Any]:
-    ok = delete_memory_profile(user_id=user_id, collection_id=collection_id, memory_key=memory_key)
+    ok = await delete_memory_profile_async(user_id=user_id, collection_id=collection_id, memory_key=memory_key)
     if ok:
         return {
             "success": True,
@@ -1071,7 +1144,7 @@ async def remove_user_memory_profile(user_id: str, collection_id: str, memory_ke
 
 
 async def remove_conversation_memory_events(user_id: str, collection_id: str, conversation_id: str) -> Dict[str, Any]:
-    count = delete_memory_events_by_conversation(
+    count = await delete_memory_events_by_conversation_async(
         user_id=user_id,
         collection_id=collection_id,
         conversation_id=conversation_id
@@ -1084,7 +1157,7 @@ async def remove_conversation_memory_events(user_id: str, collection_id: str, co
 
 
 async def remove_all_user_memory(user_id: str, collection_id: str) -> Dict[str, Any]:
-    result = delete_all_user_memory(user_id=user_id, collection_id=collection_id)
+    result = await delete_all_user_memory_async(user_id=user_id, collection_id=collection_id)
     return {
         "success": True,
         "data": {"deleted_profile_count": result.get("profiles", 0), "deleted_event_count": result.get("events", 0)},
@@ -4,16 +4,58 @@
 聊天历史存储服务层
 提供聊天消息的数据库存储功能
 """
+import os
+import time
 from typing import Dict, Any, Optional, List
-from sqlalchemy import inspect
+from sqlalchemy import inspect, select, delete, func, insert, update, text
 from sqlalchemy.exc import SQLAlchemyError
 from backend.config.database import DatabaseFactory
-from backend.model.chat_history import ChatHistory
+from backend.model.chat_history import (
+    ChatHistory,
+    MESSAGE_KIND_DIALOG,
+    MESSAGE_KIND_SUMMARY,
+    MESSAGE_KIND_TRACE
+)
 from backend.config.log import get_logger
 
 logger = get_logger(__name__)
 _chat_history_table_ready = False
 
+# 流式对话消息持久化模式：batched=写缓冲批量落库，row=逐条提交
+CHAT_HISTORY_DURABILITY = os.getenv("RAG_CHAT_HISTORY_DURABILITY", "batched").strip().lower()
+CHAT_HISTORY_BATCH_MAX_ROWS = int(os.getenv("RAG_CHAT_HISTORY_BATCH_MAX_ROWS", "20"))
+CHAT_HISTORY_BATCH_FLUSH_SECONDS = float(os.getenv("RAG_CHAT_HISTORY_BATCH_FLUSH_SECONDS", "2.0"))
+# 历史分页接口单页上限（服务端强制）
+CHAT_HISTORY_PAGE_MAX = int(os.getenv("RAG_CHAT_HISTORY_PAGE_MAX", "200"))
+
+
+def _upgrade_chat_history_schema(conn) -> None:
+    """
+    建表，或为旧表补齐 kind 列（并回填）与 (conversation_id, kind, id) 复合索引
+    """
+    table = ChatHistory.__table__
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        table.create(bind=conn, checkfirst=True)
+        return
+    columns = {column["name"] for column in inspector.get_columns(table.name)}
+    if "kind" not in columns:
+        logger.info("chat_history 表缺少 kind 列，开始迁移")
+        conn.execute(text(
+            f"ALTER TABLE {table.name} ADD COLUMN kind VARCHAR(16) NOT NULL DEFAULT '{MESSAGE_KIND_TRACE}'"
+        ))
+        conn.execute(update(ChatHistory).where(
+            ChatHistory.type == "messages",
+            ChatHistory.role.in_(["user", "assistant"])
+        ).values(kind=MESSAGE_KIND_DIALOG))
+        conn.execute(update(ChatHistory).where(
+            ChatHistory.type == "summary"
+        ).values(kind=MESSAGE_KIND_SUMMARY))
+    index_names = {index["name"] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in index_names:
+            index.create(bind=conn)
+
 
 def _ensure_chat_history_table() -> bool:
     global _chat_history_table_ready
@@ -21,10 +63,23 @@ def _ensure_chat_history_table() -> bool:
         return True
     try:
         engine = DatabaseFactory.get_engine()
-        inspector = inspect(engine)
-        table_exists = inspector.has_table(ChatHistory.__tablename__)
-        if not table_exists:
-            ChatHistory.__table__.create(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            _upgrade_chat_history_schema(conn)
+        _chat_history_table_ready = True
+        return True
+    except SQLAlchemyError as exc:
+        logger.error(f"确保chat_history表存在失败: {exc}")
+        return False
+
+
+async def _ensure_chat_history_table_async() -> bool:
+    global _chat_history_table_ready
+    if _chat_history_table_ready:
+        return True
+    try:
+        engine = DatabaseFactory.get_async_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(_upgrade_chat_history_schema)
         _chat_history_table_ready = True
         return True
     except SQLAlchemyError as exc:
@@ -172,7 +227,7 @@ def get_latest_conversation_summary(conversation_id: str) -> Optional[str]:
         db = DatabaseFactory.create_session()
         row = db.query(ChatHistory).filter(
             ChatHistory.conversation_id == conversation_id,
-            ChatHistory.type == "summary",
+            ChatHistory.kind == MESSAGE_KIND_SUMMARY,
             ChatHistory.role == "system"
         ).order_by(ChatHistory.id.desc()).first()
         if not row:
@@ -196,8 +251,7 @@ def get_recent_dialog_messages(conversation_id: str, limit: int = 10) -> List[Di
         db = DatabaseFactory.create_session()
         rows = db.query(ChatHistory).filter(
             ChatHistory.conversation_id == conversation_id,
-            ChatHistory.type == "messages",
-            ChatHistory.role.in_(["user", "assistant"])
+            ChatHistory.kind == MESSAGE_KIND_DIALOG
         ).order_by(ChatHistory.id.desc()).limit(normalized_limit).all()
         rows = list(reversed(rows))
         return [item.to_dict() for item in rows]
@@ -244,3 +298,369 @@ def delete_conversation_messages(conversation_id: str) -> bool:
     finally:
         if db:
             db.close()
+
+
+# ---------------------------------------------------------------------------
+# 异步版本：基于 AsyncSession，供 async 路由 / 流式对话直接 await，避免阻塞事件循环
+# ---------------------------------------------------------------------------
+
+async def save_chat_message_async(
+    conversation_id: str,
+    role: str,
+    message_type: str,
+    content: str,
+    extra_data: Optional[Dict[str, Any]] = None
+) -> bool:
+    """
+    异步保存聊天消息到数据库（参数同 save_chat_message）
+    """
+    if not await _ensure_chat_history_table_async():
+        return False
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            db.add(ChatHistory(
+                conversation_id=conversation_id,
+                role=role,
+                type=message_type,
+                content=content,
+                extra_data=extra_data
+            ))
+            await db.commit()
+        logger.info(f"成功保存聊天消息: conversation_id={conversation_id}, type={message_type}, role={role}")
+        return True
+    except Exception as e:
+        logger.error(f"保存聊天消息失败: {str(e)}")
+        return False
+
+
+async def save_chat_messages_batch_async(rows: List[Dict[str, Any]]) -> bool:
+    """
+    在同一事务内批量写入多条聊天消息（单条 INSERT 语句）
+
+    Args:
+        rows: 消息列表，每项包含 conversation_id/role/type/content/extra_data
+
+    Returns:
+        bool: 保存是否成功
+    """
+    if not rows:
+        return True
+    if not await _ensure_chat_history_table_async():
+        return False
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            await db.execute(insert(ChatHistory), rows)
+            await db.commit()
+        logger.info(f"成功批量保存聊天消息: conversation_id={rows[0].get('conversation_id')}, count={len(rows)}")
+        return True
+    except Exception as e:
+        logger.error(f"批量保存聊天消息失败: {str(e)}")
+        return False
+
+
+class ChatMessageBuffer:
+    """
+    单次流式对话的写缓冲（write-behind）
+
+    节点轨迹等消息先缓存在内存，达到条数/时间阈值或流结束时一次性批量写入；
+    用户消息与最终回答等关键消息通过 durable=True 立即落库，并与此前缓存的消息
+    在同一事务内提交，保证按 id 排序的消息顺序与产生顺序一致。
+    durability 为 row 时退化为逐条提交。
+    """
+
+    def __init__(
+        self,
+        conversation_id: str,
+        durability: Optional[str] = None,
+        max_rows: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self.conversation_id = conversation_id
+        self.durability = (durability or CHAT_HISTORY_DURABILITY or "batched").strip().lower()
+        self.max_rows = max(1, int(max_rows or CHAT_HISTORY_BATCH_MAX_ROWS))
+        self.flush_interval = float(CHAT_HISTORY_BATCH_FLUSH_SECONDS if flush_interval is None else flush_interval)
+        self._pending: List[Dict[str, Any]] = []
+        self._last_flush_at = time.monotonic()
+        self.flush_count = 0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def add(
+        self,
+        role: str,
+        message_type: str,
+        content: str,
+        extra_data: Optional[Dict[str, Any]] = None,
+        durable: bool = False
+    ) -> bool:
+        """
+        追加一条消息；durable=True 时立即与缓存一并提交
+        """
+        if self.durability == "row":
+            return await save_chat_message_async(
+                conversation_id=self.conversation_id,
+                role=role,
+                message_type=message_type,
+                content=content,
+                extra_data=extra_data
+            )
+        self._pending.append({
+            "conversation_id": self.conversation_id,
+            "role": role,
+            "type": message_type,
+            "content": content,
+            "extra_data": extra_data
+        })
+        if (
+            durable
+            or len(self._pending) >= self.max_rows
+            or time.monotonic() - self._last_flush_at >= self.flush_interval
+        ):
+            return await self.flush()
+        return True
+
+    async def flush(self) -> bool:
+        """将缓存的消息一次性写入数据库；失败时保留缓存以便下次重试"""
+        self._last_flush_at = time.monotonic()
+        if not self._pending:
+            return True
+        rows = self._pending
+        self._pending = []
+        ok = await save_chat_messages_batch_async(rows)
+        if not ok:
+            self._pending = rows + self._pending
+            return False
+        self.flush_count += 1
+        return True
+
+    async def close(self) -> bool:
+        """流结束时调用，写入剩余消息"""
+        return await self.flush()
+
+
+async def get_chat_messages_async(
+    conversation_id: str,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None
+) -> list:
+    """
+    异步获取对话的聊天消息（参数同 get_chat_messages）
+    """
+    if not await _ensure_chat_history_table_async():
+        return []
+    try:
+        stmt = select(ChatHistory).where(
+            ChatHistory.conversation_id == conversation_id
+        ).order_by(ChatHistory.id.asc())
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit:
+            stmt = stmt.limit(limit)
+        async with DatabaseFactory.create_async_session() as db:
+            messages = (await db.execute(stmt)).scalars().all()
+        result = [message.to_dict() for message in messages]
+        logger.info(f"获取聊天消息成功: conversation_id={conversation_id}, count={len(result)}")
+        return result
+    except Exception as e:
+        logger.error(f"获取聊天消息失败: {str(e)}")
+        return []
+
+
+async def get_message_count_async(conversation_id: str) -> int:
+    """
+    异步获取对话的消息数量
+    """
+    if not await _ensure_chat_history_table_async():
+        return 0
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            return (await db.execute(
+                select(func.count()).select_from(ChatHistory).where(
+                    ChatHistory.conversation_id == conversation_id
+                )
+            )).scalar_one()
+    except Exception as e:
+        logger.error(f"获取消息数量失败: {str(e)}")
+        return 0
+
+
+async def get_latest_conversation_summary_async(conversation_id: str) -> Optional[str]:
+    try:
+        if not await _ensure_chat_history_table_async():
+            return None
+        async with DatabaseFactory.create_async_session() as db:
+            row = (await db.execute(
+                select(ChatHistory).where(
+                    ChatHistory.conversation_id == conversation_id,
+                    ChatHistory.kind == MESSAGE_KIND_SUMMARY,
+                    ChatHistory.role == "system"
+                ).order_by(ChatHistory.id.desc()).limit(1)
+            )).scalars().first()
+        if not row:
+            return None
+        content = str(row.content or "").strip()
+        return content or None
+    except Exception as e:
+        logger.error(f"获取会话摘要失败: {str(e)}")
+        return None
+
+
+async def get_latest_conversation_summary_record_async(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """获取最新一条会话摘要记录（含 extra_data 中的摘要检查点）"""
+    try:
+        if not await _ensure_chat_history_table_async():
+            return None
+        async with DatabaseFactory.create_async_session() as db:
+            row = (await db.execute(
+                select(ChatHistory).where(
+                    ChatHistory.conversation_id == conversation_id,
+                    ChatHistory.kind == MESSAGE_KIND_SUMMARY,
+                    ChatHistory.role == "system"
+                ).order_by(ChatHistory.id.desc()).limit(1)
+            )).scalars().first()
+        return row.to_dict() if row else None
+    except Exception as e:
+        logger.error(f"获取会话摘要失败: {str(e)}")
+        return None
+
+
+async def get_dialog_messages_after_async(
+    conversation_id: str,
+    after_id: Optional[int] = None,
+    limit: int = 200
+) -> List[Dict[str, Any]]:
+    """按 id 升序获取某条消息之后的对话消息，用于增量摘要"""
+    try:
+        if not await _ensure_chat_history_table_async():
+            return []
+        stmt = select(ChatHistory).where(
+            ChatHistory.conversation_id == conversation_id,
+            ChatHistory.kind == MESSAGE_KIND_DIALOG
+        )
+        if after_id:
+            stmt = stmt.where(ChatHistory.id > int(after_id))
+        stmt = stmt.order_by(ChatHistory.id.asc()).limit(max(1, int(limit or 200)))
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(stmt)).scalars().all()
+        return [row.to_dict() for row in rows]
+    except Exception as e:
+        logger.error(f"获取增量对话消息失败: {str(e)}")
+        return []
+
+
+async def get_recent_dialog_messages_async(conversation_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    normalized_limit = max(1, min(int(limit or 10), 100))
+    try:
+        if not await _ensure_chat_history_table_async():
+            return []
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(
+                select(ChatHistory).where(
+                    ChatHistory.conversation_id == conversation_id,
+                    ChatHistory.kind == MESSAGE_KIND_DIALOG
+                ).order_by(ChatHistory.id.desc()).limit(normalized_limit)
+            )).scalars().all()
+        rows = list(reversed(rows))
+        return [item.to_dict() for item in rows]
+    except Exception as e:
+        logger.error(f"获取最近对话消息失败: {str(e)}")
+        return []
+
+
+async def get_chat_messages_page_async(
+    conversation_id: str,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    include_traces: bool = False
+) -> Dict[str, Any]:
+    """
+    键集分页获取会话消息（按 id 倒序翻页，页内按 id 升序返回）
+
+    Args:
+        conversation_id: 对话ID
+        before_id: 仅返回 id 小于该值的消息（为空表示从最新一条开始）
+        limit: 每页条数，服务端上限 CHAT_HISTORY_PAGE_MAX
+        include_traces: 是否包含节点轨迹消息，默认仅返回对话与摘要
+
+    Returns:
+        Dict[str, Any]: messages/has_more/next_before_id
+    """
+    page_size = max(1, min(int(limit or 50), CHAT_HISTORY_PAGE_MAX))
+    empty = {"messages": [], "has_more": False, "next_before_id": None, "limit": page_size}
+    if not await _ensure_chat_history_table_async():
+        return empty
+    try:
+        kinds = [MESSAGE_KIND_DIALOG, MESSAGE_KIND_SUMMARY]
+        if include_traces:
+            kinds.append(MESSAGE_KIND_TRACE)
+        stmt = select(ChatHistory).where(
+            ChatHistory.conversation_id == conversation_id,
+            ChatHistory.kind.in_(kinds)
+        )
+        if before_id:
+            stmt = stmt.where(ChatHistory.id < int(before_id))
+        stmt = stmt.order_by(ChatHistory.id.desc()).limit(page_size + 1)
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(stmt)).scalars().all()
+        has_more = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        return {
+            "messages": [row.to_dict() for row in rows],
+            "has_more": has_more,
+            "next_before_id": rows[0].id if has_more and rows else None,
+            "limit": page_size
+        }
+    except Exception as e:
+        logger.error(f"分页获取聊天消息失败: {str(e)}")
+        return empty
+
+
+async def get_trace_messages_async(
+    conversation_id: str,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = CHAT_HISTORY_PAGE_MAX
+) -> List[Dict[str, Any]]:
+    """
+    按需获取节点轨迹消息，(after_id, before_id) 为开区间，通常取一轮对话的前后两条对话消息 id
+    """
+    page_size = max(1, min(int(limit or CHAT_HISTORY_PAGE_MAX), CHAT_HISTORY_PAGE_MAX))
+    if not await _ensure_chat_history_table_async():
+        return []
+    try:
+        stmt = select(ChatHistory).where(
+            ChatHistory.conversation_id == conversation_id,
+            ChatHistory.kind == MESSAGE_KIND_TRACE
+        )
+        if after_id:
+            stmt = stmt.where(ChatHistory.id > int(after_id))
+        if before_id:
+            stmt = stmt.where(ChatHistory.id < int(before_id))
+        stmt = stmt.order_by(ChatHistory.id.asc()).limit(page_size)
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(stmt)).scalars().all()
+        return [row.to_dict() for row in rows]
+    except Exception as e:
+        logger.error(f"获取轨迹消息失败: {str(e)}")
+        return []
+
+
+async def delete_conversation_messages_async(conversation_id: str) -> bool:
+    """
+    异步删除对话的所有消息
+    """
+    if not await _ensure_chat_history_table_async():
+        return False
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            result = await db.execute(
+                delete(ChatHistory).where(ChatHistory.conversation_id == conversation_id)
+            )
+            await db.commit()
+        logger.info(f"成功删除对话消息: conversation_id={conversation_id}, count={result.rowcount}")
+        return True
+    except Exception as e:
+        logger.error(f"删除对话消息失败: {str(e)}")
+        return False
@@ -4,8 +4,12 @@
 对话服务层
 提供对话相关的业务逻辑处理
 """
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update
 from sqlalchemy.sql import func
 from backend.model.conversation import Conversation
 from backend.config.log import get_logger
@@ -14,6 +18,54 @@ from backend.param.common import Response
 
 logger = get_logger(__name__)
 
+# 已校验归属的 (用户, 对话) 进程内缓存：命中时本轮对话不访问数据库，对话时间戳最多每个 TTL 刷新一次。
+# 归属关系创建后不会变化，缓存只需在删除对话时失效；多进程部署下其他进程的删除最多延迟 TTL 生效。
+CONVERSATION_OWNER_CACHE_TTL_SECONDS = float(os.getenv("RAG_CONVERSATION_OWNER_CACHE_TTL_SECONDS", "30"))
+CONVERSATION_OWNER_CACHE_MAX_SIZE = int(os.getenv("RAG_CONVERSATION_OWNER_CACHE_MAX_SIZE", "10000"))
+
+_owner_cache: "OrderedDict[tuple, float]" = OrderedDict()
+_owner_cache_lock = threading.Lock()
+
+
+def _owner_cache_hit(user_id: int, conversation_id: str) -> bool:
+    key = (user_id, conversation_id)
+    with _owner_cache_lock:
+        expires_at = _owner_cache.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            _owner_cache.pop(key, None)
+            return False
+        _owner_cache.move_to_end(key)
+        return True
+
+
+def _owner_cache_put(user_id: int, conversation_id: str) -> None:
+    if CONVERSATION_OWNER_CACHE_TTL_SECONDS <= 0:
+        return
+    with _owner_cache_lock:
+        _owner_cache[(user_id, conversation_id)] = time.monotonic() + CONVERSATION_OWNER_CACHE_TTL_SECONDS
+        _owner_cache.move_to_end((user_id, conversation_id))
+        while len(_owner_cache) > CONVERSATION_OWNER_CACHE_MAX_SIZE:
+            _owner_cache.popitem(last=False)
+
+
+def invalidate_conversation_owner_cache(conversation_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
+    """删除对话后清理归属缓存；按对话或按用户失效"""
+    with _owner_cache_lock:
+        for key in list(_owner_cache.keys()):
+            if conversation_id is not None and key[1] == conversation_id:
+                _owner_cache.pop(key, None)
+            elif user_id is not None and str(key[0]) == str(user_id):
+                _owner_cache.pop(key, None)
+
+
+def _parse_user_id(user_id: Any) -> Optional[int]:
+    text = str(user_id or "").strip()
+    if not text.isdigit() or int(text) <= 0:
+        return None
+    return int(text)
+
 
 async def create_conversation(user_id: str, title: str = None) -> Dict[str, Any]:
     """
@@ -54,15 +106,15 @@ async def create_conversation(user_id: str, title: str = None) -> Dict[str, Any]
                 "message": "创建对话失败"
             }
         
-        db = DatabaseFactory.create_session()
+        db = DatabaseFactory.create_async_session()
         
         conversation = Conversation(
             user_id=user_id_int,
             title=title or "新对话"
         )
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
+        await db.refresh(conversation)
         
         logger.info(f"成功创建对话: {conversation.conversation_id}")
         
@@ -74,7 +126,7 @@ async def create_conversation(user_id: str, title: str = None) -> Dict[str, Any]
             
     except Exception as e:
         if db:
-            db.rollback()
+            await db.rollback()
         logger.error(f"创建对话失败: {str(e)}")
         return {
             "success": False,
@@ -83,7 +135,7 @@ async def create_conversation(user_id: str, title: str = None) -> Dict[str, Any]
         }
     finally:
         if db:
-            db.close()
+            await db.close()
 
 
 async def get_conversation_by_id(conversation_id: str) -> Dict[str, Any]:
@@ -108,11 +160,11 @@ async def get_conversation_by_id(conversation_id: str) -> Dict[str, Any]:
                 "message": "获取对话失败"
             }
         
-        db = DatabaseFactory.create_session()
+        db = DatabaseFactory.create_async_session()
         
-        conversation = db.query(Conversation).filter(
-            Conversation.conversation_id == conversation_id
-        ).first()
+        conversation = (await db.execute(
+            select(Conversation).where(Conversation.conversation_id == conversation_id)
+        )).scalars().first()
         
         if conversation:
             return {
@@ -136,7 +188,7 @@ async def get_conversation_by_id(conversation_id: str) -> Dict[str, Any]:
         }
     finally:
         if db:
-            db.close()
+            await db.close()
 
 
 async def get_conversations_by_user(user_id: str, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
@@ -185,17 +237,21 @@ async def get_conversations_by_user(user_id: str, limit: int = 50, offset: int =
         if offset < 0:
             offset = 0
         
-        db = DatabaseFactory.create_session()
+        db = DatabaseFactory.create_async_session()
         
         # 获取总数
-        total_count = db.query(Conversation).filter(
-            Conversation.user_id == user_id_int
-        ).count()
+        total_count = (await db.execute(
+            select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id_int)
+        )).scalar_one()
         
         # 获取对话列表
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user_id_int
-        ).order_by(Conversation.updated_at.desc()).offset(offset).limit(limit).all()
+        conversations = (await db.execute(
+            select(Conversation)
+            .where(Conversation.user_id == user_id_int)
+            .order_by(Conversation.updated_at.desc())
+            .offset(offset)
+            .limit(limit)
+        )).scalars().all()
         
         conversation_list = []
         for conv in conversations:
@@ -224,7 +280,7 @@ async def get_conversations_by_user(user_id: str, limit: int = 50, offset: int =
         }
     finally:
         if db:
-            db.close()
+            await db.close()
 
 
 async def update_conversation_title(conversation_id: str, title: str) -> Dict[str, Any]:
@@ -262,17 +318,17 @@ async def update_conversation_title(conversation_id: str, title: str) -> Dict[st
         if len(title) > 100:
             title = title[:100]
         
-        db = DatabaseFactory.create_session()
+        db = DatabaseFactory.create_async_session()
         
-        conversation = db.query(Conversation).filter(
-            Conversation.conversation_id == conversation_id
-        ).first()
+        conversation = (await db.execute(
+            select(Conversation).where(Conversation.conversation_id == conversation_id)
+        )).scalars().first()
         
         if conversation:
             conversation.title = title
             conversation.updated_at = func.now()
-            db.commit()
-            db.refresh(conversation)
+            await db.commit()
+            await db.refresh(conversation)
             
             return {
                 "success": True,
@@ -288,7 +344,7 @@ async def update_conversation_title(conversation_id: str, title: str) -> Dict[st
             
     except Exception as e:
         if db:
-            db.rollback()
+            await db.rollback()
         logger.error(f"更新对话标题失败: {str(e)}")
         return {
             "success": False,
@@ -297,7 +353,7 @@ async def update_conversation_title(conversation_id: str, title: str) -> Dict[st
         }
     finally:
         if db:
-            db.close()
+            await db.close()
 
 
 async def delete_conversation(conversation_id: str) -> Dict[str, Any]:
@@ -322,15 +378,16 @@ async def delete_conversation(conversation_id: str) -> Dict[str, Any]:
                 "message": "删除对话失败"
             }
         
-        db = DatabaseFactory.create_session()
+        db = DatabaseFactory.create_async_session()
         
-        conversation = db.query(Conversation).filter(
-            Conversation.conversation_id == conversation_id
-        ).first()
+        conversation = (await db.execute(
+            select(Conversation).where(Conversation.conversation_id == conversation_id)
+        )).scalars().first()
         
         if conversation:
-            db.delete(conversation)
-            db.commit()
+            await db.delete(conversation)
+            await db.commit()
+            invalidate_conversation_owner_cache(conversation_id=conversation_id)
             
             return {
                 "success": True,
@@ -346,7 +403,7 @@ async def delete_conversation(conversation_id: str) -> Dict[str, Any]:
             
     except Exception as e:
         if db:
-            db.rollback()
+            await db.rollback()
         logger.error(f"删除对话失败: {str(e)}")
         return {
             "success": False,
@@ -355,7 +412,7 @@ async def delete_conversation(conversation_id: str) -> Dict[str, Any]:
         }
     finally:
         if db:
-            db.close()
+            await db.close()
 
 
 async def delete_user_conversations(user_id: str) -> Dict[str, Any]:
@@ -371,24 +428,21 @@ async def delete_user_conversations(user_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"删除用户 {user_id} 的所有对话")
         
-        db = DatabaseFactory.create_session()
-        try:
-            count = db.query(Conversation).filter(
-                Conversation.user_id == int(user_id) if user_id.isdigit() else 1
-            ).count()
+        async with DatabaseFactory.create_async_session() as db:
+            user_filter = Conversation.user_id == int(user_id) if user_id.isdigit() else 1
+            count = (await db.execute(
+                select(func.count()).select_from(Conversation).where(user_filter)
+            )).scalar_one()
             
-            db.query(Conversation).filter(
-                Conversation.user_id == int(user_id) if user_id.isdigit() else 1
-            ).delete()
-            db.commit()
+            await db.execute(delete(Conversation).where(user_filter))
+            await db.commit()
+            invalidate_conversation_owner_cache(user_id=user_id)
             
             return {
                 "success": True,
                 "data": {"deleted_count": count},
                 "message": f"成功删除 {count} 个对话"
             }
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"删除用户对话失败: {str(e)}")
@@ -412,19 +466,18 @@ async def get_conversation_count_by_user(user_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"获取用户 {user_id} 的对话总数")
         
-        db = DatabaseFactory.create_session()
-        try:
-            count = db.query(Conversation).filter(
-                Conversation.user_id == int(user_id) if user_id.isdigit() else 1
-            ).count()
+        async with DatabaseFactory.create_async_session() as db:
+            count = (await db.execute(
+                select(func.count()).select_from(Conversation).where(
+                    Conversation.user_id == int(user_id) if user_id.isdigit() else 1
+                )
+            )).scalar_one()
             
             return {
                 "success": True,
                 "data": {"count": count},
                 "message": f"用户共有 {count} 个对话"
             }
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"获取用户对话总数失败: {str(e)}")
@@ -448,17 +501,15 @@ async def update_conversation_timestamp(conversation_id: str) -> Dict[str, Any]:
     try:
         logger.info(f"更新对话 {conversation_id} 的时间戳")
         
-        db = DatabaseFactory.create_session()
-        try:
-            conversation = db.query(Conversation).filter(
-                Conversation.conversation_id == conversation_id
-            ).first()
+        async with DatabaseFactory.create_async_session() as db:
+            conversation = (await db.execute(
+                select(Conversation).where(Conversation.conversation_id == conversation_id)
+            )).scalars().first()
             
             if conversation:
-                from sqlalchemy.sql import func
                 conversation.updated_at = func.now()
-                db.commit()
-                db.refresh(conversation)
+                await db.commit()
+                await db.refresh(conversation)
                 
                 return {
                     "success": True,
@@ -470,8 +521,6 @@ async def update_conversation_timestamp(conversation_id: str) -> Dict[str, Any]:
                     "success": False,
                     "message": "对话不存在"
                 }
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"更新对话时间戳失败: {str(e)}")
@@ -479,4 +528,88 @@ async def update_conversation_timestamp(conversation_id: str) -> Dict[str, Any]:
             "success": False,
             "error": str(e),
             "message": "更新对话时间戳失败"
-        }
\ No newline at end of file
+        }
+
+
+async def verify_conversation_owner(conversation_id: str, user_id: Any, touch: bool = False) -> Dict[str, Any]:
+    """
+    校验对话归属，可同时刷新对话时间戳
+
+    命中归属缓存时不访问数据库；未命中时只执行一条语句：
+    touch=True 为 UPDATE ... WHERE conversation_id AND user_id（支持 RETURNING 的方言直接返回主键，
+    否则以匹配行数判断），touch=False 为按两个条件的主键查询。仅在校验失败时追加一次查询区分"不存在"与"无权限"。
+
+    Args:
+        conversation_id: 对话ID
+        user_id: 用户ID
+        touch: 是否刷新 updated_at
+
+    Returns:
+        Dict[str, Any]: {"success", "data": {"conversation_id", "cached"}}；失败时 reason 为 not_found / forbidden
+    """
+    user_id_int = _parse_user_id(user_id)
+    if not conversation_id or not str(conversation_id).strip() or user_id_int is None:
+        return {
+            "success": False,
+            "error": "对话不存在",
+            "reason": "not_found",
+            "message": "对话不存在"
+        }
+    conversation_id = str(conversation_id).strip()
+    if _owner_cache_hit(user_id_int, conversation_id):
+        return {
+            "success": True,
+            "data": {"conversation_id": conversation_id, "cached": True},
+            "message": "对话归属校验通过"
+        }
+
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            owner_filter = (
+                Conversation.conversation_id == conversation_id,
+                Conversation.user_id == user_id_int
+            )
+            if touch:
+                stmt = update(Conversation).where(*owner_filter).values(updated_at=func.now())
+                if db.bind.dialect.update_returning:
+                    verified = (await db.execute(stmt.returning(Conversation.id))).first() is not None
+                else:
+                    verified = (await db.execute(stmt)).rowcount > 0
+                await db.commit()
+            else:
+                verified = (await db.execute(select(Conversation.id).where(*owner_filter))).first() is not None
+
+            if verified:
+                _owner_cache_put(user_id_int, conversation_id)
+                return {
+                    "success": True,
+                    "data": {"conversation_id": conversation_id, "cached": False},
+                    "message": "对话归属校验通过"
+                }
+
+            exists = (await db.execute(
+                select(Conversation.id).where(Conversation.conversation_id == conversation_id)
+            )).first() is not None
+    except Exception as e:
+        logger.error(f"校验对话归属失败: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "reason": "error",
+            "message": "校验对话归属失败"
+        }
+
+    if exists:
+        logger.warning(f"用户 {user_id} 尝试访问不属于自己的会话: {conversation_id}")
+        return {
+            "success": False,
+            "error": "无权限访问该会话",
+            "reason": "forbidden",
+            "message": "无权限访问该会话"
+        }
+    return {
+        "success": False,
+        "error": "对话不存在",
+        "reason": "not_found",
+        "message": "对话不存在"
+    }
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话滚动摘要服务
+在回答完成后于后台增量更新会话摘要，聊天主链路只读取最新摘要而不等待生成
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+from backend.agent.prompts.raggraph_prompt import RAGGraphPrompts
+from backend.config.log import get_logger
+from backend.service.chat_history import (
+    get_dialog_messages_after_async,
+    get_latest_conversation_summary_record_async,
+    save_chat_message_async
+)
+
+logger = get_logger(__name__)
+
+# 尚无摘要时，对话消息超过该数量才生成首个摘要
+SUMMARY_TRIGGER_DIALOG = int(os.getenv("RAG_SUMMARY_TRIGGER_DIALOG", "12"))
+# 最近若干条对话作为短期记忆原样保留，不折叠进摘要
+SUMMARY_KEEP_RECENT = int(os.getenv("RAG_SUMMARY_KEEP_RECENT", "8"))
+# 已有摘要时，检查点之后至少累积多少条可折叠对话才更新
+SUMMARY_MIN_NEW_DIALOG = int(os.getenv("RAG_SUMMARY_MIN_NEW_DIALOG", "4"))
+# 单次最多折叠的对话条数，超出部分留给下一次增量
+SUMMARY_MAX_FOLD = int(os.getenv("RAG_SUMMARY_MAX_FOLD", "200"))
+
+# 每个会话同一时刻只运行一个摘要任务；保存强引用避免任务被回收
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _format_dialog_lines(records: List[Dict[str, Any]]) -> str:
+    lines: List[str] = []
+    for record in records:
+        text = (record.get("content") or "").strip()
+        if not text:
+            continue
+        prefix = "用户" if (record.get("role") or "").lower() == "user" else "助手"
+        lines.append(f"{prefix}: {text}")
+    return "\n".join(lines)
+
+
+async def refresh_conversation_summary(conversation_id: str, llm: Any) -> Optional[str]:
+    """
+    增量更新会话摘要：只把上次检查点之后、且不在最近保留窗口内的对话合并进已有摘要
+
+    Args:
+        conversation_id: 对话ID
+        llm: 支持 ainvoke 的聊天模型
+
+    Returns:
+        Optional[str]: 新摘要；未达到触发条件或失败时返回 None
+    """
+    latest = await get_latest_conversation_summary_record_async(conversation_id)
+    previous_summary = str((latest or {}).get("content") or "").strip() or None
+    checkpoint_id = None
+    if latest:
+        extra_data = latest.get("extra_data") or {}
+        # 旧摘要没有检查点时，以摘要记录自身 id 作为近似检查点
+        checkpoint_id = extra_data.get("summarized_until_id") or latest.get("id")
+
+    keep_recent = max(0, SUMMARY_KEEP_RECENT)
+    new_records = await get_dialog_messages_after_async(
+        conversation_id,
+        after_id=checkpoint_id,
+        limit=max(1, SUMMARY_MAX_FOLD) + keep_recent
+    )
+    if previous_summary is None and len(new_records) <= SUMMARY_TRIGGER_DIALOG:
+        return None
+    foldable = new_records[:-keep_recent] if keep_recent else new_records
+    if not foldable:
+        return None
+    if previous_summary is not None and len(foldable) < SUMMARY_MIN_NEW_DIALOG:
+        return None
+
+    history_text = _format_dialog_lines(foldable)
+    if not history_text:
+        return None
+    if previous_summary:
+        prompt = RAGGraphPrompts.get_incremental_conversation_summary_prompt().format(
+            summary=previous_summary,
+            history=history_text
+        )
+    else:
+        prompt = RAGGraphPrompts.get_conversation_summary_prompt().format(history=history_text)
+
+    summary_result = await llm.ainvoke(prompt)
+    summary = str(getattr(summary_result, "content", None) or summary_result).strip()
+    if not summary:
+        return None
+    # 将摘要写入 chat_history，type=summary，只在当前会话内使用；检查点记录已折叠到的对话 id
+    await save_chat_message_async(
+        conversation_id=conversation_id,
+        role="system",
+        message_type="summary",
+        content=summary,
+        extra_data={
+            "node_name": "conversation_summary",
+            "summarized_until_id": foldable[-1]["id"],
+            "folded_count": len(foldable),
+            "previous_summary_id": (latest or {}).get("id")
+        }
+    )
+    logger.info(f"已增量更新会话摘要: conversation_id={conversation_id}, folded={len(foldable)}")
+    return summary
+
+
+async def _run_summary_task(conversation_id: str, llm: Any) -> Optional[str]:
+    try:
+        return await refresh_conversation_summary(conversation_id, llm)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        logger.error(f"后台生成对话摘要失败: conversation_id={conversation_id}, error={exc}")
+        return None
+    finally:
+        _summary_tasks.pop(conversation_id, None)
+
+
+def schedule_conversation_summary(conversation_id: str, llm: Any) -> Optional[asyncio.Task]:
+    """
+    在后台调度一次增量摘要（不阻塞调用方）；同一会话已有任务在运行时直接复用
+
+    Returns:
+        Optional[asyncio.Task]: 摘要任务；无运行中的事件循环时返回 None
+    """
+    if not conversation_id or llm is None:
+        return None
+    running = _summary_tasks.get(conversation_id)
+    if running and not running.done():
+        return running
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    task = loop.create_task(_run_summary_task(conversation_id, llm))
+    _summary_tasks[conversation_id] = task
+    return task
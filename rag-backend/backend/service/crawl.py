@@ -7,7 +7,7 @@ from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
 from crawl4ai.deep_crawling.filters import FilterChain, URLPatternFilter
 from crawl4ai.content_filter_strategy import LLMContentFilter, PruningContentFilter, RelevantContentFilter
 from backend.param.crawl import CrawlRequest
-from backend.rag.storage.milvus_storage import MilvusStorage
+from backend.rag.storage.milvus_storage import MilvusStorage, knowledge_document_id, source_document_id
 from backend.rag.storage.lightrag_storage import LightRAGStorage
 from backend.config.embedding import get_embedding_model
 from backend.rag.chunks.chunks import ChunkResult, TextChunker
@@ -37,6 +37,8 @@ async def initialize_collection_and_store(request: CrawlRequest):
     
     # 初始化爬虫状态
     await init_crawl_status(request.collection_id)
+    # 本次爬取的所有页面写入同一个 document_id：有文档记录时用记录ID，删除该文档即可批量清理
+    vector_document_id = source_document_id(request.url)
     
     # 为对应的知识库添加文档记录
     from backend.service.knowledge_library import add_document
@@ -62,7 +64,9 @@ async def initialize_collection_and_store(request: CrawlRequest):
             )
             
             # 添加文档到知识库
-            await add_document(doc_request, library.user_id)
+            added = await add_document(doc_request, library.user_id)
+            if added.status == 200 and added.data:
+                vector_document_id = knowledge_document_id(added.data["id"])
             logger.info(f"成功为知识库 {library.title} 添加文档记录: {request.title or '爬虫文档'}")
         else:
             logger.warning(f"未找到collection_id为 {request.collection_id} 的知识库")
@@ -96,6 +100,7 @@ async def initialize_collection_and_store(request: CrawlRequest):
                 type="light_and_milvus",
                 param=[milvus_storage, lightrag_storage],
                 collection_id=request.collection_id,
+                document_id=vector_document_id,
             )
 
             # 处理完成，更新状态为完成
@@ -108,7 +113,7 @@ async def initialize_collection_and_store(request: CrawlRequest):
             return
     
     try:
-        await crawl_doc(request.url, request.prefix, request.if_llm, request.model_id, request.provider, request.base_url, request.api_key, milvus_storage, lightrag_storage, request.collection_id)
+        await crawl_doc(request.url, request.prefix, request.if_llm, request.model_id, request.provider, request.base_url, request.api_key, milvus_storage, lightrag_storage, request.collection_id, document_id=vector_document_id)
         # await test_crawl_doc(request.url, request.prefix, request.if_llm, request.model_id, request.provider, request.base_url, request.api_key)
         # 爬虫完成，更新状态为已完成
         await update_crawl_status(request.collection_id, CRAWL_STATUS_COMPLETED)
@@ -291,7 +296,7 @@ async def test_crawl_doc(site: str, prefix: str, if_llm: bool, model_id: str, pr
     print("测试完成")
 
 
-async def crawl_doc(site: str, prefix: str, if_llm: bool, model_id: str, provider: str, base_url: str, api_token: str, milvus_storage: MilvusStorage, lightrag_storage: LightRAGStorage, collection_id: str):
+async def crawl_doc(site: str, prefix: str, if_llm: bool, model_id: str, provider: str, base_url: str, api_token: str, milvus_storage: MilvusStorage, lightrag_storage: LightRAGStorage, collection_id: str, document_id: str = None):
     content_filter: RelevantContentFilter
     if if_llm:
         content_filter = LLMContentFilter(
@@ -370,7 +375,7 @@ async def crawl_doc(site: str, prefix: str, if_llm: bool, model_id: str, provide
                             logger.warning(f"URL {result.url} 的内容为空，跳过处理")
                             continue
                             
-                        await handle_md(md_content=result.markdown.fit_markdown, type="light_and_milvus", param=[milvus_storage, lightrag_storage], collection_id=collection_id)
+                        await handle_md(md_content=result.markdown.fit_markdown, type="light_and_milvus", param=[milvus_storage, lightrag_storage], collection_id=collection_id, document_id=document_id or source_document_id(result.url))
                         # await handle_md(md_content=result.markdown.fit_markdown, type="milvus", param=[milvus_storage], collection_id=collection_id)
                         logger.info(f"成功处理: {result.url}")
                         
@@ -391,7 +396,7 @@ async def crawl_doc(site: str, prefix: str, if_llm: bool, model_id: str, provide
             logger.info("爬虫运行完成")
 
 
-async def handle_md(md_content, type="print", param=None, collection_id: str = None, document_name: str = "crawled_document"):
+async def handle_md(md_content, type="print", param=None, collection_id: str = None, document_name: str = "crawled_document", document_id: str = None):
     try:
         if type == "print":
             logger.info(md_content)
@@ -415,6 +420,7 @@ async def handle_md(md_content, type="print", param=None, collection_id: str = N
                 logger.warning("文档分块结果为空，跳过存储")
                 return
                 
+            md_result.document_id = document_id
             param[0].store_chunks_batch([md_result])
             logger.info(f"成功存储文档分块，共 {len(md_result.chunks)} 个分块 (document_name: {document_name})")
             
@@ -439,11 +445,12 @@ async def handle_md(md_content, type="print", param=None, collection_id: str = N
                 logger.warning("文档分块结果为空，跳过存储")
                 return
             
+            md_result.document_id = document_id
             param[0].store_chunks_batch([md_result])
             logger.info(f"成功存储文档分块到Milvus，共 {len(md_result.chunks)} 个分块 (document_name: {document_name})")
             # 将Document对象转换为字符串列表
             text_chunks = [chunk.page_content for chunk in md_result.chunks]
-            await param[1].insert_texts(text_chunks)
+            await param[1].insert_texts(text_chunks, file_path=document_name)
             logger.info(f"成功存储文档到LightRAG (document_name: {document_name})")
             
             # 更新爬虫计数
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档分块登记与差异计算
+每次入库后把分块内容哈希及其 Milvus 主键 / LightRAG 文档ID 记入 knowledge_document_chunks，
+文档更新时按哈希对比新旧分块：只向量化、写入新增分块，只删除消失的分块，未变化的分块原样保留。
+同一内容出现多次时按多重集合计数对比。
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from backend.config.database import DatabaseFactory
+from backend.config.log import get_logger
+from backend.model.document_chunk import DocumentChunkRecord
+from backend.rag.storage.embedding_cache import content_hash
+
+logger = get_logger(__name__)
+
+_chunk_table_ready = False
+
+
+def chunk_hash(text: str) -> str:
+    return content_hash(text)
+
+
+def _ensure_chunk_table() -> bool:
+    global _chunk_table_ready
+    if _chunk_table_ready:
+        return True
+    try:
+        DocumentChunkRecord.__table__.create(bind=DatabaseFactory.get_engine(), checkfirst=True)
+        _chunk_table_ready = True
+        return True
+    except SQLAlchemyError as exc:
+        logger.error(f"检查或创建分块登记表失败: {exc}")
+        return False
+
+
+def plan_chunk_diff(current: Sequence[Tuple[Any, str]], new_hashes: Sequence[str]) -> Dict[str, List]:
+    """
+    对比已入库分块与新版本分块
+
+    Args:
+        current: 已入库分块 [(标识, 哈希)]
+        new_hashes: 新版本分块哈希（按分块顺序）
+
+    Returns:
+        Dict: added=需要新增的新分块下标, removed=需要删除的已入库分块标识, kept=保留数量
+    """
+    available: Dict[str, List[Any]] = defaultdict(list)
+    for key, hash_value in current:
+        available[hash_value].append(key)
+    added: List[int] = []
+    kept = 0
+    for index, hash_value in enumerate(new_hashes):
+        if available.get(hash_value):
+            available[hash_value].pop()
+            kept += 1
+        else:
+            added.append(index)
+    removed = [key for keys in available.values() for key in keys]
+    return {"added": added, "removed": removed, "kept": kept}
+
+
+def load_document_chunks(document_id: int) -> List[Dict[str, Any]]:
+    if not _ensure_chunk_table():
+        raise RuntimeError("分块登记表不可用")
+    db = DatabaseFactory.create_session()
+    try:
+        rows = db.execute(
+            select(DocumentChunkRecord).where(DocumentChunkRecord.document_id == document_id)
+            .order_by(DocumentChunkRecord.id.asc())
+        ).scalars().all()
+        return [row.to_dict() for row in rows]
+    finally:
+        db.close()
+
+
+def record_vector_changes(
+    document_id: int,
+    removed_row_ids: Iterable[int],
+    added: Iterable[Tuple[str, str, str]]
+) -> None:
+    """
+    登记向量侧变更
+
+    Args:
+        removed_row_ids: 已从 Milvus 删除的分块登记ID
+        added: 新写入 Milvus 的 [(哈希, 分块类型, Milvus 主键)]
+    """
+    removed_row_ids = list(removed_row_ids)
+    db = DatabaseFactory.create_session()
+    try:
+        if removed_row_ids:
+            db.execute(
+                update(DocumentChunkRecord).where(DocumentChunkRecord.id.in_(removed_row_ids))
+                .values(vector_id=None)
+            )
+        # 优先挂到只在图谱中的同内容登记上，避免同一分块出现两条登记
+        graph_only = defaultdict(list)
+        for row in db.execute(
+            select(DocumentChunkRecord).where(
+                DocumentChunkRecord.document_id == document_id,
+                DocumentChunkRecord.vector_id.is_(None)
+            )
+        ).scalars():
+            graph_only[row.chunk_hash].append(row)
+        for hash_value, chunk_type, vector_id in added:
+            if graph_only.get(hash_value):
+                graph_only[hash_value].pop().vector_id = vector_id
+            else:
+                db.add(DocumentChunkRecord(
+                    document_id=document_id, chunk_hash=hash_value, chunk_type=chunk_type,
+                    vector_id=vector_id, in_graph=False
+                ))
+        db.flush()
+        _delete_orphans(db, document_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def record_graph_changes(
+    document_id: int,
+    removed_row_ids: Iterable[int],
+    added: Iterable[Tuple[str, str, str]]
+) -> None:
+    """
+    登记图谱侧变更
+
+    Args:
+        removed_row_ids: 已从 LightRAG 删除的分块登记ID
+        added: 新写入 LightRAG 的 [(哈希, 分块类型, LightRAG 文档ID)]
+    """
+    removed_row_ids = list(removed_row_ids)
+    db = DatabaseFactory.create_session()
+    try:
+        if removed_row_ids:
+            db.execute(
+                update(DocumentChunkRecord).where(DocumentChunkRecord.id.in_(removed_row_ids))
+                .values(in_graph=False)
+            )
+        vector_only = defaultdict(list)
+        for row in db.execute(
+            select(DocumentChunkRecord).where(
+                DocumentChunkRecord.document_id == document_id,
+                DocumentChunkRecord.in_graph == False
+            )
+        ).scalars():
+            vector_only[row.chunk_hash].append(row)
+        for hash_value, chunk_type, graph_doc_id in added:
+            if vector_only.get(hash_value):
+                row = vector_only[hash_value].pop()
+                row.in_graph = True
+                row.graph_doc_id = graph_doc_id
+            else:
+                db.add(DocumentChunkRecord(
+                    document_id=document_id, chunk_hash=hash_value, chunk_type=chunk_type,
+                    graph_doc_id=graph_doc_id, in_graph=True
+                ))
+        db.flush()
+        _delete_orphans(db, document_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _delete_orphans(db, document_id: int) -> None:
+    db.execute(
+        delete(DocumentChunkRecord).where(
+            DocumentChunkRecord.document_id == document_id,
+            DocumentChunkRecord.vector_id.is_(None),
+            DocumentChunkRecord.in_graph == False
+        )
+    )
+
+
+def graph_doc_ids_in_use(graph_doc_ids: Iterable[str], exclude_row_ids: Iterable[int]) -> set:
+    """同一内容可能被其他文档共享（LightRAG 按内容生成文档ID），删除前排除仍被引用的ID"""
+    graph_doc_ids = list(set(graph_doc_ids))
+    if not graph_doc_ids:
+        return set()
+    db = DatabaseFactory.create_session()
+    try:
+        return set(db.execute(
+            select(DocumentChunkRecord.graph_doc_id).where(
+                DocumentChunkRecord.graph_doc_id.in_(graph_doc_ids),
+                DocumentChunkRecord.in_graph == True,
+                DocumentChunkRecord.id.notin_(list(exclude_row_ids) or [-1])
+            )
+        ).scalars().all())
+    finally:
+        db.close()
+
+
+def delete_document_chunks(document_id: int) -> int:
+    """删除文档时清理登记"""
+    if not _ensure_chunk_table():
+        return 0
+    db = DatabaseFactory.create_session()
+    try:
+        deleted = db.execute(
+            delete(DocumentChunkRecord).where(DocumentChunkRecord.document_id == document_id)
+        ).rowcount
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def summarize_diff(plan: Optional[Dict[str, List]]) -> Optional[Dict[str, int]]:
+    if plan is None:
+        return None
+    return {"added": len(plan["added"]), "removed": len(plan["removed"]), "kept": plan["kept"]}
@@ -4,23 +4,55 @@
 文档处理器
 专门处理用户上传的文档（与爬虫逻辑完全分离）
 """
+import asyncio
 import os
-import re
-from typing import Optional, Dict, Any, List, Tuple
+import shutil
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Union
 import tempfile
-from urllib.parse import urljoin
 from langchain_core.documents import Document
 from backend.config.log import get_logger
-from backend.config.oss import OssClientFactory
-from backend.rag.storage.milvus_storage import MilvusStorage
+from backend.rag.storage.milvus_storage import MilvusStorage, knowledge_document_id
 from backend.rag.storage.lightrag_storage import LightRAGStorage
-from backend.rag.chunks.document_extraction import DocumentExtractor
-from backend.rag.chunks.chunks import TextChunker
-from backend.rag.chunks.models import ChunkConfig, ChunkStrategy, DocumentContent, ChunkResult
+from backend.rag.chunks.mineru_client import get_mineru_client
+from backend.rag.chunks.models import ChunkResult, ChunkStrategy
+from backend.service.document_chunk_index import (
+    chunk_hash,
+    graph_doc_ids_in_use,
+    load_document_chunks,
+    plan_chunk_diff,
+    record_graph_changes,
+    record_vector_changes,
+    summarize_diff,
+)
+from backend.service.ingest_executor import run_cpu_task, run_cpu_task_sync
+from backend.service.oss_download import OSS_DOWNLOAD_BUFFER_SIZE, download_to_spooled_file, download_to_temp_path
+from backend.service.ingest_tasks import (
+    chunk_document_with_charts,
+    chunk_pdf_pages,
+    count_pdf_pages,
+    extract_document_text,
+    merge_chunk_results,
+    plan_page_ranges,
+)
 
 logger = get_logger(__name__)
 
 
+@dataclass
+class PdfSource:
+    """已下载到本地临时文件、等待逐页解析的 PDF"""
+    path: str
+    bucket: str
+    key: str
+
+    def cleanup(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
 class DocumentProcessor:
     """文档处理器
     
@@ -31,18 +63,28 @@ class DocumentProcessor:
     4. 构建知识图谱（LightRAG + Neo4j）
     """
     
-    def __init__(self, collection_id: str, milvus_storage: MilvusStorage, lightrag_storage: LightRAGStorage):
+    def __init__(
+        self,
+        collection_id: str,
+        milvus_storage: MilvusStorage,
+        lightrag_storage: LightRAGStorage,
+        document_id: Optional[int] = None,
+        replace_untracked: bool = False
+    ):
         """初始化文档处理器
         
         Args:
             collection_id: 知识库 collection_id
             milvus_storage: Milvus 存储实例
             lightrag_storage: LightRAG 存储实例
+            document_id: 知识库文档ID；提供时登记分块哈希，重新入库只处理变化的分块
+            replace_untracked: 重新入库时若该文档尚无分块登记（旧版本入库），先按文档名清空 Milvus 中的旧分块
         """
         self.collection_id = collection_id
         self.milvus_storage = milvus_storage
         self.lightrag_storage = lightrag_storage
-        self.chunker = TextChunker()
+        self.document_id = document_id
+        self.replace_untracked = replace_untracked
         
     async def process_document(
         self,
@@ -69,52 +111,14 @@ class DocumentProcessor:
         logger.info(f"开始处理文档: {document_name}, OSS: {oss_bucket}/{oss_key}")
         
         try:
-            # 1. 从 OSS 读取文档内容
-            content = await self._read_from_oss(oss_bucket, oss_key, file_type, source_url)
-            
-            if not content or not content.strip():
-                raise ValueError(f"文档内容为空: {document_name}")
-            
-            logger.info(f"成功从 OSS 读取文档，内容长度: {len(content)} 字符")
-            
-            # 2. 文档分块
-            chunks_result = await self._chunk_document(content, document_name, file_type)
-            chart_chunks_result = self._build_chart_chunks(content, document_name, source_url)
-            all_chunk_results = [chunks_result]
-            if chart_chunks_result.total_chunks > 0:
-                all_chunk_results.append(chart_chunks_result)
-            
-            if not chunks_result or not chunks_result.chunks:
-                raise ValueError(f"文档分块结果为空: {document_name}")
-            
-            text_chunk_count = len(chunks_result.chunks)
-            chart_chunk_count = chart_chunks_result.total_chunks
-            chunk_count = text_chunk_count + chart_chunk_count
-            logger.info(f"文档分块完成，文本块: {text_chunk_count}, 图表块: {chart_chunk_count}")
-            
-            # 3. 存储到 Milvus
-            await self._store_to_milvus(all_chunk_results, document_name)
-            
-            # 4. 构建知识图谱（LightRAG + Neo4j）
-            await self._build_knowledge_graph(all_chunk_results, document_name)
-            
-            result = {
-                "status": "success",
-                "document_name": document_name,
-                "chunk_count": chunk_count,
-                "text_chunk_count": text_chunk_count,
-                "chart_chunk_count": chart_chunk_count,
-                "message": f"文档处理完成：{chunk_count} 个分块已入库"
-            }
-            
+            job = await self._run_pipeline(document_name, oss_bucket, oss_key, file_type, source_url, vectorize=True, graph=True)
+            result = self._build_result(job, f"文档处理完成：{job['chunk_count']} 个分块已入库")
             logger.info(f"文档处理成功: {document_name}")
             return result
             
         except Exception as e:
             error_msg = f"处理文档失败: {document_name}, 错误: {str(e)}"
             logger.error(error_msg)
-            import traceback
-            traceback.print_exc()
             raise Exception(error_msg)
     
     async def vectorize_document(
@@ -139,49 +143,14 @@ class DocumentProcessor:
         logger.info(f"开始向量化文档: {document_name}")
         
         try:
-            # 1. 从 OSS 读取文档内容
-            content = await self._read_from_oss(oss_bucket, oss_key, file_type, source_url)
-            
-            if not content or not content.strip():
-                raise ValueError(f"文档内容为空: {document_name}")
-            
-            logger.info(f"成功从 OSS 读取文档，内容长度: {len(content)} 字符")
-            
-            # 2. 文档分块
-            chunks_result = await self._chunk_document(content, document_name, file_type)
-            chart_chunks_result = self._build_chart_chunks(content, document_name, source_url)
-            all_chunk_results = [chunks_result]
-            if chart_chunks_result.total_chunks > 0:
-                all_chunk_results.append(chart_chunks_result)
-            
-            if not chunks_result or not chunks_result.chunks:
-                raise ValueError(f"文档分块结果为空: {document_name}")
-            
-            text_chunk_count = len(chunks_result.chunks)
-            chart_chunk_count = chart_chunks_result.total_chunks
-            chunk_count = text_chunk_count + chart_chunk_count
-            logger.info(f"文档分块完成，文本块: {text_chunk_count}, 图表块: {chart_chunk_count}")
-            
-            # 3. 存储到 Milvus
-            await self._store_to_milvus(all_chunk_results, document_name)
-            
-            result = {
-                "status": "success",
-                "document_name": document_name,
-                "chunk_count": chunk_count,
-                "text_chunk_count": text_chunk_count,
-                "chart_chunk_count": chart_chunk_count,
-                "message": f"向量化完成：{chunk_count} 个分块已入库"
-            }
-            
+            job = await self._run_pipeline(document_name, oss_bucket, oss_key, file_type, source_url, vectorize=True, graph=False)
+            result = self._build_result(job, f"向量化完成：{job['chunk_count']} 个分块已入库")
             logger.info(f"文档向量化成功: {document_name}")
             return result
             
         except Exception as e:
             error_msg = f"向量化文档失败: {document_name}, 错误: {str(e)}"
             logger.error(error_msg)
-            import traceback
-            traceback.print_exc()
             raise Exception(error_msg)
     
     async def graph_document(
@@ -206,323 +175,367 @@ class DocumentProcessor:
         logger.info(f"开始图谱化文档: {document_name}")
         
         try:
-            # 1. 从 OSS 读取文档内容
-            content = await self._read_from_oss(oss_bucket, oss_key, file_type, source_url)
-            
-            if not content or not content.strip():
-                raise ValueError(f"文档内容为空: {document_name}")
-            
-            logger.info(f"成功从 OSS 读取文档，内容长度: {len(content)} 字符")
-            
-            # 2. 文档分块
-            chunks_result = await self._chunk_document(content, document_name, file_type)
-            chart_chunks_result = self._build_chart_chunks(content, document_name, source_url)
-            all_chunk_results = [chunks_result]
-            if chart_chunks_result.total_chunks > 0:
-                all_chunk_results.append(chart_chunks_result)
-            
-            if not chunks_result or not chunks_result.chunks:
-                raise ValueError(f"文档分块结果为空: {document_name}")
-            
-            text_chunk_count = len(chunks_result.chunks)
-            chart_chunk_count = chart_chunks_result.total_chunks
-            chunk_count = text_chunk_count + chart_chunk_count
-            logger.info(f"文档分块完成，文本块: {text_chunk_count}, 图表块: {chart_chunk_count}")
-            
-            # 3. 构建知识图谱
-            await self._build_knowledge_graph(all_chunk_results, document_name)
-            
-            result = {
-                "status": "success",
-                "document_name": document_name,
-                "chunk_count": chunk_count,
-                "text_chunk_count": text_chunk_count,
-                "chart_chunk_count": chart_chunk_count,
-                "message": f"图谱化完成：{chunk_count} 个分块已入图"
-            }
-            
+            job = await self._run_pipeline(document_name, oss_bucket, oss_key, file_type, source_url, vectorize=False, graph=True)
+            result = self._build_result(job, f"图谱化完成：{job['chunk_count']} 个分块已入图")
             logger.info(f"文档图谱化成功: {document_name}")
             return result
             
         except Exception as e:
             error_msg = f"图谱化文档失败: {document_name}, 错误: {str(e)}"
             logger.error(error_msg)
-            import traceback
-            traceback.print_exc()
             raise Exception(error_msg)
     
-    async def _read_from_oss(self, bucket: str, key: str, file_type: str, source_url: Optional[str]) -> str:
-        """从 OSS 读取文档内容（使用 SDK，不走 HTTP）
+    async def _run_pipeline(
+        self,
+        document_name: str,
+        oss_bucket: str,
+        oss_key: str,
+        file_type: str,
+        source_url: Optional[str],
+        vectorize: bool,
+        graph: bool
+    ) -> Dict[str, Any]:
+        """把文档提交到进程级分阶段流水线（extract -> chunk -> embed -> store -> graph）并等待完成"""
+        from backend.service.ingest_pipeline import get_document_pipeline
+        job = {
+            "processor": self,
+            "document_name": document_name,
+            "oss_bucket": oss_bucket,
+            "oss_key": oss_key,
+            "file_type": file_type,
+            "source_url": source_url,
+            "vectorize": vectorize,
+            "graph": graph
+        }
+        return await get_document_pipeline().submit(job)
+    
+    def _build_result(self, job: Dict[str, Any], message: str) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "document_name": job["document_name"],
+            "chunk_count": job["chunk_count"],
+            "text_chunk_count": job["text_chunk_count"],
+            "chart_chunk_count": job["chart_chunk_count"],
+            "embedding_stats": job.get("embedding_stats"),
+            "graph_embedding_stats": job.get("graph_embedding_stats"),
+            "graph_stats": job.get("graph_stats"),
+            "diff": {
+                "vector": summarize_diff(job.get("vector_plan")),
+                "graph": summarize_diff(job.get("graph_plan"))
+            },
+            "message": message
+        }
+    
+    async def _extract_stage(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """extract 阶段：从 OSS 下载并解析出文本（PDF 只落盘，留给 chunk 阶段逐页流式解析）"""
+        source = await self._read_from_oss(job["oss_bucket"], job["oss_key"], job["file_type"], job["source_url"])
+        if isinstance(source, PdfSource):
+            logger.info(f"PDF 已下载到临时文件，等待逐页解析: {job['document_name']}")
+            job["pdf_source"] = source
+            return job
+        if not source or not source.strip():
+            raise ValueError(f"文档内容为空: {job['document_name']}")
+        logger.info(f"成功从 OSS 读取文档，内容长度: {len(source)} 字符")
+        job["content"] = source
+        return job
+    
+    async def _chunk_stage(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """chunk 阶段：文本分块 + 图表分块（在入库进程池中执行，不占用事件循环线程与 GIL）"""
+        document_name = job["document_name"]
+        content = job.pop("content", None)
+        pdf_source = job.pop("pdf_source", None)
+        chunks_result = None
+        chart_chunks_result = ChunkResult(chunks=[], strategy=ChunkStrategy.RECURSIVE, total_chunks=0, document_name=document_name)
+        if pdf_source is not None:
+            chunks_result = await self._chunk_pdf(pdf_source, document_name, job["file_type"])
+            if not chunks_result.chunks:
+                # 扫描件等没有文本层的 PDF 改用 MinerU 解析
+                content = await self._read_with_mineru(pdf_source.bucket, pdf_source.key, job["source_url"])
+                if not content or not content.strip():
+                    raise ValueError(f"文档内容为空: {document_name}")
+        if content is not None:
+            chunks_result, chart_chunks_result = await run_cpu_task(
+                chunk_document_with_charts, content, document_name, job["file_type"], job["source_url"]
+            )
+        
+        if not chunks_result or not chunks_result.chunks:
+            raise ValueError(f"文档分块结果为空: {document_name}")
+        
+        all_chunk_results = [chunks_result]
+        if chart_chunks_result.total_chunks > 0:
+            all_chunk_results.append(chart_chunks_result)
+        if self.document_id is not None:
+            for result in all_chunk_results:
+                result.document_id = knowledge_document_id(self.document_id)
+        job["chunk_results"] = all_chunk_results
+        job["text_chunk_count"] = len(chunks_result.chunks)
+        job["chart_chunk_count"] = chart_chunks_result.total_chunks
+        job["chunk_count"] = job["text_chunk_count"] + job["chart_chunk_count"]
+        logger.info(f"文档分块完成，文本块: {job['text_chunk_count']}, 图表块: {job['chart_chunk_count']}")
+        return job
+    
+    async def _chunk_pdf(self, source: "PdfSource", document_name: str, file_type: str) -> ChunkResult:
+        """逐页流式解析并分块；页数较多时按页段拆到多个子进程并行，完成后删除临时文件"""
+        try:
+            page_count = await run_cpu_task(count_pdf_pages, source.path)
+            ranges = plan_page_ranges(page_count)
+            results = await asyncio.gather(*(
+                run_cpu_task(chunk_pdf_pages, source.path, document_name, file_type, start, end)
+                for start, end in ranges
+            ))
+        finally:
+            await asyncio.to_thread(source.cleanup)
+        merged = merge_chunk_results(list(results), document_name, file_type)
+        logger.info(f"PDF 流式分块完成: {document_name}, 页数: {page_count}, 页段: {len(ranges)}, 分块: {merged.total_chunks}")
+        return merged
+    
+    async def _embed_stage(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """embed 阶段：为分块计算向量（仅向量化模式）；已登记分块的文档只计算新增分块"""
+        if not job["vectorize"]:
+            return job
+        try:
+            documents = self.milvus_storage.prepare_documents(job["chunk_results"])
+            hashes = [chunk_hash(doc.page_content) for doc in documents]
+            if self.document_id is not None:
+                rows = await asyncio.to_thread(load_document_chunks, self.document_id)
+                tracked = [(row["id"], row["chunk_hash"]) for row in rows if row["vector_id"]]
+                plan = plan_chunk_diff(tracked, hashes)
+                job["vector_plan"] = plan
+                job["removed_vector_ids"] = [row["vector_id"] for row in rows if row["id"] in set(plan["removed"])]
+                # 旧版本入库时尚未登记分块：先按文档名清空，再整体写入并登记
+                job["purge_untracked"] = self.replace_untracked and not tracked
+                documents = [documents[i] for i in plan["added"]]
+                hashes = [hashes[i] for i in plan["added"]]
+                logger.info(f"分块差异: {job['document_name']}, {summarize_diff(plan)}")
+            job["documents"] = documents
+            job["document_hashes"] = hashes
+            job["embeddings"] = await asyncio.to_thread(self.milvus_storage.embed_documents, documents) if documents else []
+            job["embedding_stats"] = dict(self.milvus_storage.embedding_batcher.last_stats) if documents else None
+            return job
+        except Exception as e:
+            logger.error(f"向量计算失败: {job['document_name']}, 错误: {str(e)}")
+            raise Exception(f"向量计算失败: {str(e)}")
+    
+    async def _store_stage(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """store 阶段：删除消失的分块、写入新增分块并登记"""
+        if not job["vectorize"]:
+            return job
+        documents, embeddings = job.pop("documents"), job.pop("embeddings")
+        plan = job.get("vector_plan")
+        if plan is not None:
+            if job["purge_untracked"]:
+                await asyncio.to_thread(self.milvus_storage.delete_document, job["document_name"])
+            await asyncio.to_thread(self.milvus_storage.delete_by_ids, job["removed_vector_ids"])
+        ids = await self._store_to_milvus(documents, embeddings, job["document_name"])
+        if plan is not None:
+            added = [
+                (hash_value, doc.metadata.get("chunk_type", "text"), vector_id)
+                for hash_value, doc, vector_id in zip(job["document_hashes"], documents, ids)
+            ]
+            await asyncio.to_thread(record_vector_changes, self.document_id, plan["removed"], added)
+        return job
+    
+    async def _graph_stage(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """graph 阶段：构建知识图谱；已登记分块的文档只写入新增文本、删除消失文本"""
+        if not job["graph"]:
+            return job
+        chunks = [chunk for chunk_result in job["chunk_results"] for chunk in chunk_result.chunks]
+        texts = [chunk.page_content for chunk in chunks]
+        graph_plan = None
+        if self.document_id is not None:
+            rows = await asyncio.to_thread(load_document_chunks, self.document_id)
+            graph_plan = plan_chunk_diff(
+                [(row["id"], row["chunk_hash"]) for row in rows if row["in_graph"]],
+                [chunk_hash(text) for text in texts]
+            )
+            job["graph_plan"] = graph_plan
+            chunks = [chunks[i] for i in graph_plan["added"]]
+            texts = [texts[i] for i in graph_plan["added"]]
+        
+        before = dict(self.lightrag_storage.embedding_cache_stats)
+        if texts:
+            job["graph_stats"] = await self._build_knowledge_graph(texts, job["document_name"])
+        
+        if graph_plan is not None:
+            removed = set(graph_plan["removed"])
+            removed_doc_ids = {row["graph_doc_id"] for row in rows if row["id"] in removed and row["graph_doc_id"]}
+            shared = await asyncio.to_thread(graph_doc_ids_in_use, removed_doc_ids, removed)
+            if removed_doc_ids - shared:
+                await self.lightrag_storage.delete_doc_ids(sorted(removed_doc_ids - shared))
+            added = [
+                (chunk_hash(chunk.page_content), chunk.metadata.get("chunk_type", "text"), LightRAGStorage.doc_id_for_text(chunk.page_content))
+                for chunk in chunks
+            ]
+            await asyncio.to_thread(record_graph_changes, self.document_id, graph_plan["removed"], added)
+        
+        hits = self.lightrag_storage.embedding_cache_stats["hits"] - before["hits"]
+        embedded = self.lightrag_storage.embedding_cache_stats["embedded"] - before["embedded"]
+        job["graph_embedding_stats"] = {
+            "cache_hits": hits,
+            "embedded": embedded,
+            "cache_hit_ratio": round(hits / (hits + embedded), 4) if hits + embedded else 0.0
+        }
+        return job
+    
+    async def _read_from_oss(self, bucket: str, key: str, file_type: str, source_url: Optional[str]) -> Union[str, "PdfSource"]:
+        """从 OSS 读取文档内容（下载与解析均为阻塞调用，放到线程中执行）"""
+        return await asyncio.to_thread(self._read_from_oss_sync, bucket, key, file_type, source_url)
+    
+    def _read_from_oss_sync(self, bucket: str, key: str, file_type: str, source_url: Optional[str]) -> Union[str, "PdfSource"]:
+        """从 OSS 读取文档内容（使用 SDK 流式下载，不把整个对象读入内存）
         
         Args:
             bucket: OSS 存储桶
             key: 对象键
             
         Returns:
-            str: 文档内容
+            str: 文档内容；PDF 返回落盘后的 PdfSource，由 chunk 阶段逐页解析
         """
         try:
-            import alibabacloud_oss_v2 as oss
             import urllib.parse
             
-            client = OssClientFactory.get_client()
-            
             # URL 解码 key（处理中文文件名）
             decoded_key = urllib.parse.unquote(key)
-            
-            # 使用 GetObject 直接读取内容
-            request = oss.GetObjectRequest(bucket=bucket, key=decoded_key)
-            result = client.get_object(request)
-            
-            raw_bytes = result.body.read()
             normalized_type = (file_type or "").lower()
-            extractor = DocumentExtractor()
-            detected_type = None
-            if raw_bytes.startswith(b"%PDF"):
-                detected_type = "pdf"
-            elif raw_bytes.startswith(b"PK"):
-                detected_type = "docx"
-            elif raw_bytes[:4] == b"\xD0\xCF\x11\xE0":
-                detected_type = "doc"
-            if normalized_type in {"pdf", "doc", "docx"} or detected_type:
-                effective_type = normalized_type if normalized_type in {"pdf", "doc", "docx"} else detected_type
-                suffix = f".{effective_type}" if effective_type else ""
-                with tempfile.NamedTemporaryFile(delete=True, suffix=suffix) as temp_file:
-                    temp_file.write(raw_bytes)
-                    temp_file.flush()
-                    parsed = extractor.read_document(temp_file.name)
-                    content = parsed.content
-                if effective_type == "pdf" and (not content or not content.strip()):
-                    mineru_url = os.getenv("MINERU_API_URL")
-                    mineru_key = os.getenv("MINERU_API_KEY")
-                    if mineru_url and mineru_key:
-                        target_url = source_url
-                        try:
-                            from backend.config.oss import get_presigned_url_for_download
-                            presign = get_presigned_url_for_download(bucket=bucket, key=decoded_key)
-                            if presign and presign.get("url"):
-                                target_url = presign.get("url")
-                        except Exception as presign_error:
-                            logger.warning(f"生成下载URL失败: {bucket}/{decoded_key}, 错误: {str(presign_error)}")
-                        if target_url:
-                            try:
-                                parsed = extractor.read_document(target_url, pdf_extract_method="mineru")
-                                content = parsed.content
-                            except Exception as mineru_error:
-                                logger.warning(f"MinerU 解析失败: {target_url}, 错误: {str(mineru_error)}")
-            else:
-                try:
-                    content = raw_bytes.decode("utf-8")
-                except UnicodeDecodeError:
-                    content = raw_bytes.decode("utf-8", errors="ignore")
             
-            logger.info(f"成功从 OSS 读取: {bucket}/{decoded_key}, 文件大小: {len(raw_bytes)} bytes, 内容长度: {len(content)}")
+            # 已知的二进制格式直接流式写入磁盘临时文件，不经过内存
+            if normalized_type in {"pdf", "doc", "docx"}:
+                path, stats = download_to_temp_path(bucket, decoded_key, suffix=f".{normalized_type}")
+                logger.info(f"成功从 OSS 读取: {bucket}/{decoded_key}, 文件大小: {stats['bytes']} bytes")
+                return self._parse_downloaded_file(path, normalized_type, bucket, decoded_key)
+            
+            spooled, stats = download_to_spooled_file(bucket, decoded_key)
+            with spooled:
+                head = spooled.read(8)
+                spooled.seek(0)
+                detected_type = None
+                if head.startswith(b"%PDF"):
+                    detected_type = "pdf"
+                elif head.startswith(b"PK"):
+                    detected_type = "docx"
+                elif head[:4] == b"\xD0\xCF\x11\xE0":
+                    detected_type = "doc"
+                if detected_type:
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{detected_type}") as temp_file:
+                        shutil.copyfileobj(spooled, temp_file, OSS_DOWNLOAD_BUFFER_SIZE)
+                    return self._parse_downloaded_file(temp_file.name, detected_type, bucket, decoded_key)
+                raw_bytes = spooled.read()
+            try:
+                content = raw_bytes.decode("utf-8")
+            except UnicodeDecodeError:
+                content = raw_bytes.decode("utf-8", errors="ignore")
+            
+            logger.info(f"成功从 OSS 读取: {bucket}/{decoded_key}, 文件大小: {stats['bytes']} bytes, 内容长度: {len(content)}")
             return content
             
         except Exception as e:
             logger.error(f"从 OSS 读取失败: {bucket}/{key}, 错误: {str(e)}")
             raise Exception(f"OSS 读取失败: {str(e)}")
     
-    async def _chunk_document(
-        self,
-        content: str,
-        document_name: str,
-        file_type: str
-    ) -> Optional[Any]:
-        """对文档内容进行分块
-        
-        Args:
-            content: 文档内容
-            document_name: 文档名称
-            file_type: 文件类型
-            
-        Returns:
-            ChunkResult: 分块结果
-        """
+    def _parse_downloaded_file(self, path: str, file_type: str, bucket: str, decoded_key: str) -> Union[str, "PdfSource"]:
+        """PDF 交给 chunk 阶段逐页解析；Word 在入库进程池中解析后删除临时文件"""
+        if file_type == "pdf":
+            return PdfSource(path=path, bucket=bucket, key=decoded_key)
         try:
-            # 根据文件类型选择分块策略
-            normalized_type = (file_type or "").lower()
-            if normalized_type in ["md", "markdown", "txt", "pdf", "doc", "docx"]:
-                strategy = ChunkStrategy.MEDICAL_HYBRID
-                chunk_config = ChunkConfig(
-                    strategy=strategy,
-                    medical_chunk_size=650,
-                    medical_chunk_overlap=100,
-                    medical_min_section_length=80
-                )
-            else:
-                strategy = ChunkStrategy.RECURSIVE
-                chunk_config = ChunkConfig(strategy=strategy, chunk_size=1000, chunk_overlap=200)
-            
-            # 创建文档对象
-            document = DocumentContent(
-                content=content,
-                document_name=document_name
-            )
-            
-            # 执行分块
-            result = self.chunker.chunk_document(document, chunk_config)
-            for idx, chunk in enumerate(result.chunks):
-                original_metadata = dict(chunk.metadata or {})
-                chunk.metadata = {
-                    **original_metadata,
-                    "chunk_type": "text",
-                    "source": "vector",
-                    "document_name": document_name,
-                    "file_type": normalized_type,
-                    "chunk_index": idx,
-                    "chunk_chars": len(chunk.page_content or "")
-                }
-            
-            logger.info(f"文档分块完成: {document_name}, 策略: {strategy.value}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"文档分块失败: {document_name}, 错误: {str(e)}")
-            raise
+            # 解析在入库进程池中执行，当前线程只等待结果
+            return run_cpu_task_sync(extract_document_text, path)
+        finally:
+            os.remove(path)
     
-    def _extract_headings(self, content: str) -> List[Tuple[int, str]]:
-        heading_matches = list(re.finditer(r"^#{1,6}\s+(.+)$", content, flags=re.MULTILINE))
-        return [(match.start(), match.group(1).strip()) for match in heading_matches]
-
-    def _find_closest_heading(self, headings: List[Tuple[int, str]], position: int) -> str:
-        section_title = "未标注章节"
-        for heading_pos, heading_title in headings:
-            if heading_pos > position:
-                break
-            section_title = heading_title
-        return section_title
-
-    def _normalize_image_url(self, image_url: str, source_url: Optional[str]) -> str:
-        if image_url.startswith(("http://", "https://")):
-            return image_url
-        if source_url:
-            return urljoin(source_url, image_url)
-        return image_url
-
-    def _extract_page_number(self, context_text: str) -> Optional[int]:
-        page_match = re.search(r"第\s*(\d+)\s*页|(?:P|p|Page)\s*[:：]?\s*(\d+)", context_text)
-        if not page_match:
-            return None
-        page_value = page_match.group(1) or page_match.group(2)
-        if not page_value:
-            return None
-        return int(page_value)
-
-    def _sanitize_context(self, raw_text: str) -> str:
-        cleaned = re.sub(r"!\[[^\]]*\]\([^)]+\)", "", raw_text)
-        cleaned = re.sub(r"<img[^>]+>", "", cleaned)
-        cleaned = re.sub(r"\s+", " ", cleaned).strip()
-        return cleaned
-
-    def _generate_chart_caption(self, alt_text: str, section_title: str, context_text: str) -> str:
-        context = self._sanitize_context(context_text)
-        context = context[:260] if context else ""
-        alt = (alt_text or "").strip()
-        if alt and context:
-            return f"{section_title}；图示主题：{alt}；相关内容：{context}"
-        if context:
-            return f"{section_title}；相关内容：{context}"
-        if alt:
-            return f"{section_title}；图示主题：{alt}"
-        return f"{section_title}；图表内容待补充"
-
-    def _build_chart_chunks(self, content: str, document_name: str, source_url: Optional[str]) -> ChunkResult:
-        headings = self._extract_headings(content)
-        markdown_pattern = r"!\[(?P<alt>[^\]]*)\]\((?P<url>[^)\s]+)(?:\s+\"[^\"]*\")?\)"
-        html_pattern = r"<img[^>]*src=[\"'](?P<url>[^\"']+)[\"'][^>]*>"
-        all_matches = []
-        all_matches.extend([("markdown", m) for m in re.finditer(markdown_pattern, content)])
-        all_matches.extend([("html", m) for m in re.finditer(html_pattern, content, flags=re.IGNORECASE)])
-        all_matches.sort(key=lambda item: item[1].start())
-        chunks: List[Document] = []
-        for idx, (_, match) in enumerate(all_matches, start=1):
-            image_url = match.group("url").strip()
-            alt_text = match.groupdict().get("alt", "").strip() if match.groupdict() else ""
-            normalized_image_url = self._normalize_image_url(image_url, source_url)
-            start = max(0, match.start() - 320)
-            end = min(len(content), match.end() + 320)
-            context_text = content[start:end]
-            section_title = self._find_closest_heading(headings, match.start())
-            page_number = self._extract_page_number(context_text)
-            chart_id = f"{document_name}#chart-{idx}"
-            caption = self._generate_chart_caption(alt_text, section_title, context_text)
-            page_text = str(page_number) if page_number is not None else "未知"
-            chunk_text = (
-                f"图表ID: {chart_id}\n"
-                f"所属章节: {section_title}\n"
-                f"页码: {page_text}\n"
-                f"图表摘要: {caption}\n"
-                f"图表地址: {normalized_image_url}"
-            )
-            metadata = {
-                "chunk_type": "chart",
-                "source": "vector_chart",
-                "chart_id": chart_id,
-                "chart_image_url": normalized_image_url,
-                "section_title": section_title,
-                "page_number": page_number,
-                "chart_caption": caption
-            }
-            chunks.append(Document(page_content=chunk_text, metadata=metadata))
-        return ChunkResult(
-            chunks=chunks,
-            strategy=ChunkStrategy.RECURSIVE,
-            total_chunks=len(chunks),
-            document_name=document_name
-        )
-
-    async def _store_to_milvus(self, chunk_results: List[Any], document_name: str):
-        """将分块存储到 Milvus
+    async def _read_with_mineru(self, bucket: str, decoded_key: str, source_url: Optional[str]) -> str:
+        """PyPDF2 未提取到文本时通过 MinerU 解析（需配置 MINERU_API_URL / MINERU_API_KEY），等待期间不占用线程"""
+        mineru_url = os.getenv("MINERU_API_URL")
+        mineru_key = os.getenv("MINERU_API_KEY")
+        if not (mineru_url and mineru_key):
+            return ""
+        target_url = source_url
+        try:
+            from backend.config.oss import get_presigned_url_for_download
+            presign = await asyncio.to_thread(get_presigned_url_for_download, bucket=bucket, key=decoded_key)
+            if presign and presign.get("url"):
+                target_url = presign.get("url")
+        except Exception as presign_error:
+            logger.warning(f"生成下载URL失败: {bucket}/{decoded_key}, 错误: {str(presign_error)}")
+        if not target_url:
+            return ""
+        try:
+            return await get_mineru_client().extract(target_url)
+        except Exception as mineru_error:
+            logger.warning(f"MinerU 解析失败: {target_url}, 错误: {str(mineru_error)}")
+            return ""
+    
+    async def _store_to_milvus(self, documents: List[Document], embeddings: List[List[float]], document_name: str):
+        """将已计算向量的分块写入 Milvus
         
         Args:
-            chunks_result: 分块结果
+            documents: 待写入的分块
+            embeddings: 与 documents 一一对应的向量
             document_name: 文档名称
         """
         try:
-            result = self.milvus_storage.store_chunks_batch(chunk_results)
+            ids = await asyncio.to_thread(self.milvus_storage.insert_embedded_documents, documents, embeddings)
             
             logger.info(
                 f"成功存储到 Milvus: {document_name}, "
-                f"chunks: {result.get('total_chunks', 0)}, "
+                f"chunks: {len(documents)}, "
                 f"collection: {self.collection_id}"
             )
+            return ids
             
         except Exception as e:
             logger.error(f"Milvus 存储失败: {document_name}, 错误: {str(e)}")
             raise Exception(f"向量存储失败: {str(e)}")
     
-    async def _build_knowledge_graph(self, chunk_results: List[Any], document_name: str):
+    async def _build_knowledge_graph(self, text_chunks: List[str], document_name: str):
         """构建知识图谱（LightRAG + Neo4j）
         
         Args:
-            chunks_result: 分块结果
+            text_chunks: 需要写入图谱的分块文本
             document_name: 文档名称
         """
         try:
-            # 提取所有 chunk 的文本内容
-            text_chunks = []
-            for chunk_result in chunk_results:
-                text_chunks.extend([chunk.page_content for chunk in chunk_result.chunks])
-            
             # 初始化 LightRAG（如果尚未初始化）
             if self.lightrag_storage.rag is None:
                 await self.lightrag_storage.initialize()
             
-            # 批量插入文本到 LightRAG
-            await self.lightrag_storage.insert_texts(text_chunks)
+            # 分批插入文本到 LightRAG（批内并行抽取，批间汇报进度）
+            stats = await self.lightrag_storage.insert_texts(text_chunks, file_path=document_name)
             
             logger.info(
                 f"成功构建知识图谱: {document_name}, "
                 f"chunks: {len(text_chunks)}, "
-                f"workspace: {self.collection_id}"
+                f"workspace: {self.collection_id}, "
+                f"统计: {stats}"
             )
+            return stats
             
         except Exception as e:
             logger.error(f"知识图谱构建失败: {document_name}, 错误: {str(e)}")
             raise Exception(f"图谱构建失败: {str(e)}")
 
 
+def build_document_pipeline_stages() -> List["PipelineStage"]:
+    """文档入库流水线的阶段定义，每个阶段委托给条目所属的 DocumentProcessor"""
+    from backend.service.ingest_pipeline import INGEST_STAGE_CONCURRENCY, PipelineStage
+
+    def _delegate(method_name: str):
+        async def handler(job: Dict[str, Any]) -> Dict[str, Any]:
+            return await getattr(job["processor"], method_name)(job)
+        return handler
+
+    return [
+        PipelineStage(name, _delegate(f"_{name}_stage"), INGEST_STAGE_CONCURRENCY[name])
+        for name in ("extract", "chunk", "embed", "store", "graph")
+    ]
+
+
+def cleanup_document_job(job: Dict[str, Any]) -> None:
+    """条目被流水线丢弃时删除尚未逐页解析的 PDF 临时文件（chunk 阶段取走后由 _chunk_pdf 负责删除）"""
+    pdf_source = job.pop("pdf_source", None) if isinstance(job, dict) else None
+    if pdf_source is not None:
+        pdf_source.cleanup()
+
+
 async def process_uploaded_document(
     document_name: str,
     oss_bucket: str,
@@ -531,7 +544,9 @@ async def process_uploaded_document(
     file_type: str = "md",
     source_url: Optional[str] = None,
     vectorize_only: bool = False,
-    graph_only: bool = False
+    graph_only: bool = False,
+    document_id: Optional[int] = None,
+    reingest: bool = False
 ) -> Dict[str, Any]:
     """处理上传的文档（独立函数，供外部调用）
     
@@ -543,6 +558,8 @@ async def process_uploaded_document(
         file_type: 文件类型
         vectorize_only: 仅向量化（不做图谱）
         graph_only: 仅图谱化（不做向量）
+        document_id: 知识库文档ID，用于分块登记与增量更新
+        reingest: 是否为已入库文档的重新入库（更新新版本）
         
     Returns:
         Dict: 处理结果
@@ -572,7 +589,9 @@ async def process_uploaded_document(
     processor = DocumentProcessor(
         collection_id=collection_id,
         milvus_storage=milvus_storage,
-        lightrag_storage=lightrag_storage
+        lightrag_storage=lightrag_storage,
+        document_id=document_id,
+        replace_untracked=reingest
     )
     
     # 根据模式调用不同的方法
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+入库 CPU 任务进程池
+PDF 解析与分块是纯 Python 计算，放在线程里仍会持有 GIL，大文件入库时拖慢同一进程内的对话接口。
+这里用 spawn 方式启动的 ProcessPoolExecutor 执行 ingest_tasks 中的任务：
+- 任务必须是模块级函数，参数与返回值可 pickle（提交时校验，闭包/绑定方法直接拒绝）
+- 子进程每执行 max_tasks_per_child 个任务后自动替换，回收解析大文件后膨胀的内存
+- 子进程崩溃（BrokenProcessPool）时丢弃旧进程池，下一个任务重新创建
+RAG_INGEST_CPU_WORKERS=0 时退化为线程执行（不额外启动进程）。
+"""
+import asyncio
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from backend.config.log import get_logger
+
+logger = get_logger(__name__)
+
+INGEST_CPU_WORKERS = int(os.getenv("RAG_INGEST_CPU_WORKERS", "2"))
+INGEST_CPU_MAX_TASKS_PER_CHILD = int(os.getenv("RAG_INGEST_CPU_MAX_TASKS_PER_CHILD", "50"))
+
+_cpu_executor: Optional["CpuTaskExecutor"] = None
+_cpu_executor_lock = threading.Lock()
+
+
+def ensure_serializable_task(fn: Callable) -> None:
+    """子进程按 模块名+函数名 反查任务，只接受模块级函数"""
+    qualname = getattr(fn, "__qualname__", "")
+    if (
+        not callable(fn)
+        or not (getattr(fn, "__self__", None) is None or inspect.ismodule(fn.__self__))
+        or "<locals>" in qualname
+        or "<lambda>" in qualname
+        or "." in qualname
+        or getattr(fn, "__module__", None) in (None, "__main__")
+    ):
+        raise TypeError(f"CPU 任务必须是可导入的模块级函数: {qualname or fn!r}")
+
+
+class CpuTaskExecutor:
+    """可回收子进程的 CPU 任务执行器"""
+
+    def __init__(self, workers: int = INGEST_CPU_WORKERS, max_tasks_per_child: int = INGEST_CPU_MAX_TASKS_PER_CHILD):
+        self.workers = max(0, int(workers))
+        self.max_tasks_per_child = max(1, int(max_tasks_per_child))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.pool_restarts = 0
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.workers > 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # fork 会把 API 进程中的线程锁、数据库连接一并复制到子进程，统一使用 spawn
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=self.max_tasks_per_child
+                )
+                logger.info(f"入库 CPU 进程池已创建: workers={self.workers}, max_tasks_per_child={self.max_tasks_per_child}")
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self.pool_restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_done(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        """投递任务到子进程，返回 concurrent.futures.Future"""
+        ensure_serializable_task(fn)
+        pool = self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            pool = self._get_pool()
+            future = pool.submit(fn, *args)
+        self.submitted += 1
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _check_broken(self, future: Future) -> None:
+        # 等待方被取消时子进程任务通常仍在运行，不能在事件循环线程上阻塞等待其结果；
+        # 未完成的任务若随后因进程池损坏失败，下一次 submit 会重建进程池
+        if not future.done() or future.cancelled():
+            return
+        if isinstance(future.exception(), BrokenProcessPool):
+            logger.error("入库 CPU 子进程异常退出，进程池将在下一个任务时重建")
+            pool = self._pool
+            if pool is not None:
+                self._discard_pool(pool)
+
+    def run_sync(self, fn: Callable, *args: Any) -> Any:
+        """在当前（非事件循环）线程中阻塞等待子进程结果"""
+        if not self.uses_processes:
+            ensure_serializable_task(fn)
+            return fn(*args)
+        future = self.submit(fn, *args)
+        try:
+            return future.result()
+        finally:
+            self._check_broken(future)
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """在事件循环中等待子进程结果，不占用事件循环线程"""
+        if not self.uses_processes:
+            ensure_serializable_task(fn)
+            return await asyncio.to_thread(fn, *args)
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            self._check_broken(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "process" if self.uses_processes else "thread",
+            "workers": self.workers,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": max(0, self.submitted - self.completed - self.failed),
+            "pool_restarts": self.pool_restarts
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_cpu_executor() -> CpuTaskExecutor:
+    """获取进程级 CPU 任务执行器"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = CpuTaskExecutor()
+    return _cpu_executor
+
+
+async def run_cpu_task(fn: Callable, *args: Any) -> Any:
+    return await get_cpu_executor().run(fn, *args)
+
+
+def run_cpu_task_sync(fn: Callable, *args: Any) -> Any:
+    return get_cpu_executor().run_sync(fn, *args)
+
+
+def get_cpu_executor_stats() -> Optional[Dict[str, Any]]:
+    return _cpu_executor.stats() if _cpu_executor else None
+
+
+def shutdown_cpu_executor(wait: bool = True) -> None:
+    global _cpu_executor
+    executor, _cpu_executor = _cpu_executor, None
+    if executor:
+        executor.shutdown(wait=wait)
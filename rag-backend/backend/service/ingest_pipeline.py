@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段文档入库流水线
+把单个文档的 下载/解析(extract) -> 分块(chunk) -> 向量化(embed) -> 写入 Milvus(store) -> 图谱化(graph)
+拆成独立阶段，阶段之间用有界队列衔接，每个阶段有各自的并发数：
+文档 A 在请求 embedding 服务时，文档 B 可以同时在解析，CPU 密集与网络密集的阶段得以重叠。
+下游阶段跟不上时有界队列会阻塞上游，避免解析结果在内存中无限堆积。
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from backend.config.log import get_logger
+
+logger = get_logger(__name__)
+
+INGEST_STAGE_QUEUE_SIZE = int(os.getenv("RAG_INGEST_STAGE_QUEUE_SIZE", "4"))
+INGEST_STAGE_CONCURRENCY = {
+    "extract": int(os.getenv("RAG_INGEST_STAGE_EXTRACT_CONCURRENCY", "2")),
+    "chunk": int(os.getenv("RAG_INGEST_STAGE_CHUNK_CONCURRENCY", "2")),
+    "embed": int(os.getenv("RAG_INGEST_STAGE_EMBED_CONCURRENCY", "3")),
+    "store": int(os.getenv("RAG_INGEST_STAGE_STORE_CONCURRENCY", "2")),
+    "graph": int(os.getenv("RAG_INGEST_STAGE_GRAPH_CONCURRENCY", "2")),
+}
+
+StageHandler = Callable[[Any], Awaitable[Any]]
+ItemCleanup = Callable[[Any], None]
+
+_document_pipeline: Optional["StagedPipeline"] = None
+
+
+class PipelineStage:
+    """流水线中的一个阶段：有界输入队列 + concurrency 个消费协程"""
+
+    def __init__(self, name: str, handler: StageHandler, concurrency: int = 1, queue_size: int = INGEST_STAGE_QUEUE_SIZE):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency))
+        self.queue_size = max(1, int(queue_size))
+        self.queue: Optional[asyncio.Queue] = None
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        elapsed = max(elapsed, 1e-6)
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_capacity": self.queue_size,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_seconds": round(self.busy_seconds / self.processed, 3) if self.processed else 0.0,
+            "throughput_per_min": round(self.processed * 60 / elapsed, 3),
+            "utilization": round(min(1.0, self.busy_seconds / (elapsed * self.concurrency)), 3)
+        }
+
+
+class StagedPipeline:
+    """
+    有界队列串联的多阶段流水线
+
+    submit() 把条目放入第一个阶段（队列满时等待），条目依次流经各阶段后返回最后一个阶段的输出；
+    任一阶段抛出异常时该条目不再流向后续阶段，异常原样抛给 submit() 的调用方。
+    条目中途被丢弃（阶段失败或调用方已取消）时调用 cleanup 释放其持有的资源（如临时文件）。
+    """
+
+    def __init__(self, stages: List[PipelineStage], name: str = "pipeline", cleanup: Optional[ItemCleanup] = None):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.name = name
+        self.stages = stages
+        self.cleanup = cleanup
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started_at = time.monotonic()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        # 首次使用或事件循环已更换（如独立脚本多次 asyncio.run）时，在当前循环内重建队列与消费协程
+        self._loop = loop
+        self._started_at = time.monotonic()
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        self._tasks = [
+            loop.create_task(self._stage_worker(index), name=f"{self.name}-{stage.name}-{n}")
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.concurrency)
+        ]
+        logger.info(
+            f"入库流水线已启动: {self.name}, 阶段并发="
+            + ", ".join(f"{stage.name}:{stage.concurrency}" for stage in self.stages)
+        )
+
+    async def _discard(self, stage: PipelineStage, item: Any) -> None:
+        if self.cleanup is None:
+            return
+        try:
+            await asyncio.to_thread(self.cleanup, item)
+        except Exception as exc:
+            logger.warning(f"入库流水线清理条目失败: {self.name}/{stage.name}, error={exc}")
+
+    async def _stage_worker(self, index: int) -> None:
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            future, item = await stage.queue.get()
+            try:
+                if future.done():
+                    # 调用方已取消或前序阶段已失败
+                    await self._discard(stage, item)
+                    continue
+                stage.in_flight += 1
+                started = time.monotonic()
+                try:
+                    item = await stage.handler(item)
+                except Exception as exc:
+                    stage.failed += 1
+                    if not future.done():
+                        future.set_exception(exc)
+                    await self._discard(stage, item)
+                    continue
+                finally:
+                    stage.in_flight -= 1
+                    stage.busy_seconds += time.monotonic() - started
+                stage.processed += 1
+                if next_stage is not None:
+                    await next_stage.queue.put((future, item))
+                elif not future.done():
+                    future.set_result(item)
+            finally:
+                stage.queue.task_done()
+
+    async def submit(self, item: Any) -> Any:
+        """提交条目并等待其流经全部阶段"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self.stages[0].queue.put((future, item))
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """各阶段吞吐、耗时与队列深度（进程内统计）"""
+        elapsed = time.monotonic() - self._started_at
+        return {
+            "name": self.name,
+            "running": bool(self._tasks),
+            "uptime_seconds": int(elapsed),
+            "stages": {stage.name: stage.stats(elapsed) for stage in self.stages}
+        }
+
+    async def close(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def get_document_pipeline() -> StagedPipeline:
+    """获取进程级文档入库流水线"""
+    global _document_pipeline
+    if _document_pipeline is None:
+        from backend.service.document_processor import build_document_pipeline_stages, cleanup_document_job
+        _document_pipeline = StagedPipeline(
+            build_document_pipeline_stages(), name="document-ingest", cleanup=cleanup_document_job
+        )
+    return _document_pipeline
+
+
+def get_document_pipeline_stats() -> Optional[Dict[str, Any]]:
+    return _document_pipeline.stats() if _document_pipeline else None
+
+
+async def close_document_pipeline() -> None:
+    global _document_pipeline
+    pipeline, _document_pipeline = _document_pipeline, None
+    if pipeline:
+        await pipeline.close()
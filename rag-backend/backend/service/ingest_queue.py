@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档入库任务队列（数据库持久化）
+任务写入 document_ingest_jobs 表，由任意数量的 worker 进程以租约方式领取：
+- 领取时以条件 UPDATE 抢占（仅一个 worker 能成功），同时写入租约到期时间（可见性超时）；
+- 处理期间定期续租，worker 崩溃后租约过期，任务会被其他 worker 重新领取；
+- 失败按指数退避重新排队，超过最大尝试次数后标记为 failed。
+API 进程重启不会丢失排队或处理中的任务。
+"""
+import asyncio
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import and_, func, inspect, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from backend.config.database import DatabaseFactory
+from backend.config.log import get_logger
+from backend.model.ingest_job import (
+    DocumentIngestJob,
+    INGEST_JOB_ACTIVE_STATUSES,
+    INGEST_JOB_FAILED,
+    INGEST_JOB_QUEUED,
+    INGEST_JOB_RUNNING,
+    INGEST_JOB_SUCCEEDED,
+)
+
+logger = get_logger(__name__)
+
+INGEST_WORKER_CONCURRENCY = int(os.getenv("RAG_INGEST_WORKER_CONCURRENCY", "3"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("RAG_INGEST_MAX_ATTEMPTS", "3"))
+INGEST_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("RAG_INGEST_VISIBILITY_TIMEOUT_SECONDS", "600"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("RAG_INGEST_RETRY_BASE_SECONDS", "30"))
+INGEST_RETRY_MAX_SECONDS = float(os.getenv("RAG_INGEST_RETRY_MAX_SECONDS", "900"))
+INGEST_POLL_INTERVAL_SECONDS = float(os.getenv("RAG_INGEST_POLL_INTERVAL_SECONDS", "2"))
+INGEST_EMBEDDED_WORKER = str(os.getenv("RAG_INGEST_EMBEDDED_WORKER", "true")).strip().lower() in {"1", "true", "yes", "on"}
+INGEST_CLAIM_SCAN_SIZE = 8
+
+IngestHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+_ingest_table_ready = False
+_embedded_worker: Optional["IngestWorker"] = None
+_embedded_worker_task: Optional[asyncio.Task] = None
+
+
+def _upgrade_ingest_job_schema(conn) -> None:
+    table = DocumentIngestJob.__table__
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        table.create(bind=conn, checkfirst=True)
+        return
+    index_names = {index["name"] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in index_names:
+            index.create(bind=conn)
+
+
+async def _ensure_ingest_job_table_async() -> bool:
+    global _ingest_table_ready
+    if _ingest_table_ready:
+        return True
+    try:
+        engine = DatabaseFactory.get_async_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(_upgrade_ingest_job_schema)
+        _ingest_table_ready = True
+        return True
+    except SQLAlchemyError as exc:
+        logger.error(f"检查或创建入库任务表失败: {exc}")
+        return False
+
+
+def retry_backoff_seconds(attempts: int) -> float:
+    """第 attempts 次失败后的重试等待：指数退避 + 10% 抖动，避免多个任务同时重试"""
+    delay = min(INGEST_RETRY_MAX_SECONDS, INGEST_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+async def enqueue_ingest_job(
+    document_id: int,
+    document_name: str,
+    mode: str = "all",
+    payload: Optional[Dict[str, Any]] = None,
+    max_attempts: int = INGEST_MAX_ATTEMPTS
+) -> Dict[str, Any]:
+    """
+    提交文档入库任务；同一文档同一模式已有排队/处理中的任务时直接返回该任务
+
+    Returns:
+        Dict: {"job": 任务字典, "created": 是否新建}
+    """
+    if not await _ensure_ingest_job_table_async():
+        raise RuntimeError("入库任务表不可用")
+    async with DatabaseFactory.create_async_session() as db:
+        existing = (await db.execute(
+            select(DocumentIngestJob).where(
+                DocumentIngestJob.document_id == document_id,
+                DocumentIngestJob.mode == mode,
+                DocumentIngestJob.status.in_(INGEST_JOB_ACTIVE_STATUSES)
+            ).order_by(DocumentIngestJob.id.desc())
+        )).scalars().first()
+        if existing:
+            return {"job": existing.to_dict(), "created": False}
+        job = DocumentIngestJob(
+            document_id=document_id,
+            document_name=document_name,
+            mode=mode,
+            payload=payload or {},
+            status=INGEST_JOB_QUEUED,
+            attempts=0,
+            max_attempts=max(1, int(max_attempts)),
+            available_at=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        return {"job": job.to_dict(), "created": True}
+
+
+def _claimable_filter(now: datetime):
+    return or_(
+        and_(DocumentIngestJob.status == INGEST_JOB_QUEUED, DocumentIngestJob.available_at <= now),
+        and_(DocumentIngestJob.status == INGEST_JOB_RUNNING, DocumentIngestJob.lease_expires_at < now)
+    )
+
+
+async def claim_ingest_job(
+    worker_id: str,
+    visibility_timeout: int = INGEST_VISIBILITY_TIMEOUT_SECONDS
+) -> Optional[Dict[str, Any]]:
+    """
+    领取一个可执行任务（排队到期，或租约已过期的处理中任务）
+
+    以 "UPDATE ... WHERE id AND 原状态条件" 乐观抢占，多个 worker 并发领取时只有一个成功；
+    租约过期且尝试次数已耗尽的任务直接标记为 failed。
+    """
+    if not await _ensure_ingest_job_table_async():
+        return None
+    now = datetime.utcnow()
+    async with DatabaseFactory.create_async_session() as db:
+        candidates = (await db.execute(
+            select(DocumentIngestJob.id, DocumentIngestJob.attempts, DocumentIngestJob.max_attempts, DocumentIngestJob.status)
+            .where(_claimable_filter(now))
+            .order_by(DocumentIngestJob.available_at.asc(), DocumentIngestJob.id.asc())
+            .limit(INGEST_CLAIM_SCAN_SIZE)
+        )).all()
+        for job_id, attempts, max_attempts, status in candidates:
+            if status == INGEST_JOB_RUNNING and attempts >= max_attempts:
+                await db.execute(
+                    update(DocumentIngestJob)
+                    .where(DocumentIngestJob.id == job_id, _claimable_filter(now))
+                    .values(
+                        status=INGEST_JOB_FAILED,
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        finished_at=now,
+                        last_error=func.coalesce(DocumentIngestJob.last_error, "租约超时且重试次数已耗尽")
+                    )
+                )
+                await db.commit()
+                continue
+            claimed = (await db.execute(
+                update(DocumentIngestJob)
+                .where(DocumentIngestJob.id == job_id, _claimable_filter(now))
+                .values(
+                    status=INGEST_JOB_RUNNING,
+                    attempts=DocumentIngestJob.attempts + 1,
+                    lease_owner=worker_id,
+                    lease_expires_at=now + timedelta(seconds=visibility_timeout),
+                    started_at=now
+                )
+            )).rowcount
+            await db.commit()
+            if claimed:
+                job = await db.get(DocumentIngestJob, job_id)
+                return dict(job.to_dict(), payload=job.payload or {})
+    return None
+
+
+async def extend_ingest_job_lease(
+    job_id: int,
+    worker_id: str,
+    visibility_timeout: int = INGEST_VISIBILITY_TIMEOUT_SECONDS
+) -> bool:
+    """续租；返回 False 表示租约已被其他 worker 接管"""
+    async with DatabaseFactory.create_async_session() as db:
+        extended = (await db.execute(
+            update(DocumentIngestJob)
+            .where(
+                DocumentIngestJob.id == job_id,
+                DocumentIngestJob.status == INGEST_JOB_RUNNING,
+                DocumentIngestJob.lease_owner == worker_id
+            )
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=visibility_timeout))
+        )).rowcount
+        await db.commit()
+    return bool(extended)
+
+
+async def complete_ingest_job(job_id: int, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+    async with DatabaseFactory.create_async_session() as db:
+        updated = (await db.execute(
+            update(DocumentIngestJob)
+            .where(DocumentIngestJob.id == job_id, DocumentIngestJob.lease_owner == worker_id)
+            .values(
+                status=INGEST_JOB_SUCCEEDED,
+                lease_owner=None,
+                lease_expires_at=None,
+                last_error=None,
+                result=result or {},
+                finished_at=datetime.utcnow()
+            )
+        )).rowcount
+        await db.commit()
+    return bool(updated)
+
+
+async def fail_ingest_job(job_id: int, worker_id: str, error: str) -> Optional[str]:
+    """
+    记录失败：未耗尽尝试次数时按退避重新排队，否则标记为 failed
+
+    Returns:
+        Optional[str]: 更新后的状态；租约已失效时返回 None
+    """
+    async with DatabaseFactory.create_async_session() as db:
+        job = (await db.execute(
+            select(DocumentIngestJob).where(
+                DocumentIngestJob.id == job_id,
+                DocumentIngestJob.lease_owner == worker_id
+            )
+        )).scalars().first()
+        if not job:
+            return None
+        now = datetime.utcnow()
+        job.last_error = str(error)[:2000]
+        job.lease_owner = None
+        job.lease_expires_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = INGEST_JOB_FAILED
+            job.finished_at = now
+        else:
+            job.status = INGEST_JOB_QUEUED
+            job.available_at = now + timedelta(seconds=retry_backoff_seconds(job.attempts))
+        status = job.status
+        await db.commit()
+    return status
+
+
+async def get_ingest_queue_snapshot(limit: int = 50) -> Dict[str, Any]:
+    """队列概况：处理中 / 排队中（含退避等待）/ 最近失败的任务"""
+    if not await _ensure_ingest_job_table_async():
+        return {"running": [], "queued": [], "failed": [], "queued_count": 0, "running_count": 0}
+    async with DatabaseFactory.create_async_session() as db:
+        counts = dict((await db.execute(
+            select(DocumentIngestJob.status, func.count())
+            .where(DocumentIngestJob.status.in_(INGEST_JOB_ACTIVE_STATUSES))
+            .group_by(DocumentIngestJob.status)
+        )).all())
+        running = (await db.execute(
+            select(DocumentIngestJob).where(DocumentIngestJob.status == INGEST_JOB_RUNNING)
+            .order_by(DocumentIngestJob.started_at.asc()).limit(limit)
+        )).scalars().all()
+        queued = (await db.execute(
+            select(DocumentIngestJob).where(DocumentIngestJob.status == INGEST_JOB_QUEUED)
+            .order_by(DocumentIngestJob.available_at.asc(), DocumentIngestJob.id.asc()).limit(limit)
+        )).scalars().all()
+        failed = (await db.execute(
+            select(DocumentIngestJob).where(DocumentIngestJob.status == INGEST_JOB_FAILED)
+            .order_by(DocumentIngestJob.id.desc()).limit(10)
+        )).scalars().all()
+    return {
+        "running": [job.to_dict() for job in running],
+        "queued": [job.to_dict() for job in queued],
+        "failed": [job.to_dict() for job in failed],
+        "queued_count": int(counts.get(INGEST_JOB_QUEUED, 0)),
+        "running_count": int(counts.get(INGEST_JOB_RUNNING, 0))
+    }
+
+
+async def get_document_ingest_jobs(document_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """某文档最近的入库任务（新到旧）"""
+    if not await _ensure_ingest_job_table_async():
+        return []
+    async with DatabaseFactory.create_async_session() as db:
+        jobs = (await db.execute(
+            select(DocumentIngestJob).where(DocumentIngestJob.document_id == document_id)
+            .order_by(DocumentIngestJob.id.desc()).limit(limit)
+        )).scalars().all()
+    return [job.to_dict() for job in jobs]
+
+
+class IngestWorker:
+    """
+    入库任务 worker：最多并发处理 concurrency 个任务，可在多个进程中同时运行
+    """
+
+    def __init__(
+        self,
+        handler: Optional[IngestHandler] = None,
+        worker_id: Optional[str] = None,
+        concurrency: int = INGEST_WORKER_CONCURRENCY,
+        visibility_timeout: int = INGEST_VISIBILITY_TIMEOUT_SECONDS,
+        poll_interval: float = INGEST_POLL_INTERVAL_SECONDS
+    ):
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, int(concurrency))
+        self.visibility_timeout = max(1, int(visibility_timeout))
+        self.poll_interval = max(0.05, float(poll_interval))
+        self._tasks: set = set()
+        self._stopped = asyncio.Event()
+
+    def _get_handler(self) -> IngestHandler:
+        if self.handler is None:
+            from backend.service.knowledge_library import run_document_ingest_job
+            self.handler = run_document_ingest_job
+        return self.handler
+
+    @property
+    def active_count(self) -> int:
+        return len(self._tasks)
+
+    async def _heartbeat(self, job_id: int, handler_task: asyncio.Task) -> None:
+        loop = asyncio.get_running_loop()
+        interval = max(1.0, self.visibility_timeout / 3)
+        # 领取时写入的租约到期时间（本地时钟估算）；续租失败时按此判断租约是否已失效
+        deadline = loop.time() + self.visibility_timeout
+        while True:
+            await asyncio.sleep(max(0.0, min(interval, deadline - loop.time())))
+            started = loop.time()
+            try:
+                extended = await extend_ingest_job_lease(job_id, self.worker_id, self.visibility_timeout)
+            except Exception as exc:
+                # 续租出错（如数据库瞬时故障）时下个周期重试，租约到期前仍未续上才视为丢失
+                if loop.time() < deadline:
+                    logger.warning(f"入库任务续租失败，稍后重试: job={job_id}, worker={self.worker_id}, error={exc}")
+                    continue
+                logger.error(f"入库任务续租失败且租约已到期，取消处理: job={job_id}, worker={self.worker_id}, error={exc}")
+                handler_task.cancel()
+                return
+            if not extended:
+                # 租约已过期或被其他 worker 接管，立即停止处理，避免两个 worker 同时写同一文档
+                logger.warning(f"入库任务租约已失效，取消处理: job={job_id}, worker={self.worker_id}")
+                handler_task.cancel()
+                return
+            deadline = started + self.visibility_timeout
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        logger.info(
+            f"开始处理入库任务: job={job_id}, document={job['document_name']}, "
+            f"mode={job['mode']}, attempt={job['attempts']}/{job['max_attempts']}"
+        )
+        handler_task = asyncio.create_task(self._get_handler()(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, handler_task))
+        try:
+            result = await handler_task
+            await complete_ingest_job(job_id, self.worker_id, result)
+            logger.info(f"入库任务完成: job={job_id}, document={job['document_name']}")
+        except asyncio.CancelledError:
+            if handler_task.cancelled() and heartbeat.done() and not heartbeat.cancelled():
+                # 租约丢失：任务已归属其他 worker，本 worker 不再提交完成或失败状态
+                logger.warning(f"入库任务已放弃: job={job_id}, document={job['document_name']}, worker={self.worker_id}")
+                return
+            # 停机时不修改任务状态，租约过期后由其他 worker 重新领取
+            raise
+        except Exception as exc:
+            status = await fail_ingest_job(job_id, self.worker_id, str(exc))
+            logger.error(f"入库任务失败: job={job_id}, document={job['document_name']}, status={status}, error={exc}")
+        finally:
+            heartbeat.cancel()
+            handler_task.cancel()
+
+    async def run_once(self) -> int:
+        """在空闲槽位内领取任务并后台执行，返回本轮领取数"""
+        claimed = 0
+        while len(self._tasks) < self.concurrency and not self._stopped.is_set():
+            job = await claim_ingest_job(self.worker_id, self.visibility_timeout)
+            if not job:
+                break
+            task = asyncio.create_task(self._run_job(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            claimed += 1
+        return claimed
+
+    async def run_forever(self) -> None:
+        logger.info(f"入库任务 worker 启动: worker={self.worker_id}, concurrency={self.concurrency}")
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"入库任务 worker 领取失败: {exc}")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        logger.info(f"入库任务 worker 已停止领取: worker={self.worker_id}")
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """等待处理中的任务结束；超时未完成的任务被取消，其租约过期后会被重新领取"""
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def is_ingest_worker_running() -> bool:
+    return bool(_embedded_worker_task and not _embedded_worker_task.done())
+
+
+def start_ingest_worker() -> Optional[asyncio.Task]:
+    """在当前事件循环内启动内嵌 worker（RAG_INGEST_EMBEDDED_WORKER=true 时）"""
+    global _embedded_worker, _embedded_worker_task
+    if not INGEST_EMBEDDED_WORKER:
+        return None
+    if is_ingest_worker_running():
+        return _embedded_worker_task
+    _embedded_worker = IngestWorker()
+    _embedded_worker_task = asyncio.get_running_loop().create_task(_embedded_worker.run_forever())
+    return _embedded_worker_task
+
+
+async def stop_ingest_worker(timeout: float = 5.0) -> None:
+    """停止内嵌 worker"""
+    global _embedded_worker, _embedded_worker_task
+    worker, task = _embedded_worker, _embedded_worker_task
+    _embedded_worker, _embedded_worker_task = None, None
+    if worker:
+        worker.stop()
+    if task and not task.done():
+        try:
+            await asyncio.wait_for(task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            task.cancel()
+    if worker:
+        await worker.drain(timeout=timeout)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档入库 CPU 密集任务
+PDF/Word 解析、文本分块、图表分块、PDF 逐页流式分块都是纯计算，放在这里作为模块级函数：
+参数与返回值只使用可 pickle 的数据（路径、字符串、ChunkResult），由 ingest_executor 投递到子进程执行，
+子进程只需导入本模块及分块依赖，不会加载 Milvus、LightRAG 等存储客户端。
+"""
+import os
+import re
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+from langchain_core.documents import Document
+from backend.config.log import get_logger
+from backend.rag.chunks.chunks import TextChunker
+from backend.rag.chunks.document_extraction import DocumentExtractor
+from backend.rag.chunks.markdown_outline import MarkdownOutline, parse_markdown_outline
+from backend.rag.chunks.models import ChunkConfig, ChunkResult, ChunkStrategy, DocumentContent
+
+logger = get_logger(__name__)
+
+# 流式分块窗口大小（字符）；页数不少于 RAG_PDF_PARALLEL_MIN_PAGES 的 PDF 按页段拆分到多个子进程
+PDF_CHUNK_WINDOW_CHARS = int(os.getenv("RAG_PDF_CHUNK_WINDOW_CHARS", "20000"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("RAG_PDF_PARALLEL_MIN_PAGES", "120"))
+PDF_PAGE_RANGE_SIZE = int(os.getenv("RAG_PDF_PAGE_RANGE_SIZE", "60"))
+
+_PAGE_NUMBER_PATTERN = re.compile(r"第\s*(\d+)\s*页|(?:P|p|Page)\s*[:：]?\s*(\d+)")
+
+_chunker: Optional[TextChunker] = None
+
+
+def _get_chunker() -> TextChunker:
+    global _chunker
+    if _chunker is None:
+        _chunker = TextChunker()
+    return _chunker
+
+
+def extract_document_text(file_path: str) -> str:
+    """解析本地 PDF/Word/Markdown 文件为文本"""
+    return DocumentExtractor().read_document(file_path).content
+
+
+def chunk_config_for(file_type: str) -> ChunkConfig:
+    """根据文件类型选择分块策略"""
+    normalized_type = (file_type or "").lower()
+    if normalized_type in ["md", "markdown", "txt", "pdf", "doc", "docx"]:
+        return ChunkConfig(
+            strategy=ChunkStrategy.MEDICAL_HYBRID,
+            medical_chunk_size=650,
+            medical_chunk_overlap=100,
+            medical_min_section_length=80
+        )
+    return ChunkConfig(strategy=ChunkStrategy.RECURSIVE, chunk_size=1000, chunk_overlap=200)
+
+
+def annotate_text_chunks(chunks: List[Document], document_name: str, file_type: str) -> None:
+    normalized_type = (file_type or "").lower()
+    for idx, chunk in enumerate(chunks):
+        original_metadata = dict(chunk.metadata or {})
+        chunk.metadata = {
+            **original_metadata,
+            "chunk_type": "text",
+            "source": "vector",
+            "document_name": document_name,
+            "file_type": normalized_type,
+            "chunk_index": idx,
+            "chunk_chars": len(chunk.page_content or "")
+        }
+
+
+def chunk_document_content(
+    content: str,
+    document_name: str,
+    file_type: str,
+    outline: Optional[MarkdownOutline] = None
+) -> ChunkResult:
+    """对文档内容进行分块
+
+    Args:
+        content: 文档内容
+        document_name: 文档名称
+        file_type: 文件类型
+        outline: 已解析的 Markdown 大纲（与图表分块共用）
+
+    Returns:
+        ChunkResult: 分块结果
+    """
+    try:
+        chunk_config = chunk_config_for(file_type)
+        document = DocumentContent(content=content, document_name=document_name)
+        result = _get_chunker().chunk_document(document, chunk_config, outline)
+        annotate_text_chunks(result.chunks, document_name, file_type)
+        logger.info(f"文档分块完成: {document_name}, 策略: {chunk_config.strategy.value}")
+        return result
+
+    except Exception as e:
+        logger.error(f"文档分块失败: {document_name}, 错误: {str(e)}")
+        raise
+
+
+def count_pdf_pages(file_path: str) -> int:
+    return DocumentExtractor().count_pdf_pages(file_path)
+
+
+def plan_page_ranges(
+    page_count: int,
+    parallel_min_pages: int = PDF_PARALLEL_MIN_PAGES,
+    range_size: int = PDF_PAGE_RANGE_SIZE
+) -> List[Tuple[int, int]]:
+    """页数不少于 parallel_min_pages 时按 range_size 页拆段（闭区间，页码从 1 开始），否则整份一段"""
+    if page_count <= 0:
+        return []
+    if page_count < parallel_min_pages:
+        return [(1, page_count)]
+    range_size = max(1, range_size)
+    return [(start, min(start + range_size - 1, page_count)) for start in range(1, page_count + 1, range_size)]
+
+
+def chunk_pdf_pages(
+    file_path: str,
+    document_name: str,
+    file_type: str,
+    start_page: int = 1,
+    end_page: Optional[int] = None
+) -> ChunkResult:
+    """逐页流式解析 PDF 并分块，内存中只保留一个窗口的文本；分块带起止页码"""
+    chunk_config = chunk_config_for(file_type)
+    pages = DocumentExtractor().iter_pdf_pages(file_path, start_page, end_page)
+    chunks = list(_get_chunker().iter_page_chunks(pages, chunk_config, document_name, PDF_CHUNK_WINDOW_CHARS))
+    annotate_text_chunks(chunks, document_name, file_type)
+    return ChunkResult(
+        chunks=chunks,
+        strategy=chunk_config.strategy,
+        total_chunks=len(chunks),
+        document_name=document_name
+    )
+
+
+def merge_chunk_results(results: List[ChunkResult], document_name: str, file_type: str) -> ChunkResult:
+    """按页段顺序合并分段分块结果，重新编号 chunk_index"""
+    chunks = [chunk for result in results for chunk in result.chunks]
+    annotate_text_chunks(chunks, document_name, file_type)
+    return ChunkResult(
+        chunks=chunks,
+        strategy=results[0].strategy if results else chunk_config_for(file_type).strategy,
+        total_chunks=len(chunks),
+        document_name=document_name
+    )
+
+
+def _normalize_image_url(image_url: str, source_url: Optional[str]) -> str:
+    if image_url.startswith(("http://", "https://")):
+        return image_url
+    if source_url:
+        return urljoin(source_url, image_url)
+    return image_url
+
+
+def _extract_page_number(context_text: str) -> Optional[int]:
+    page_match = _PAGE_NUMBER_PATTERN.search(context_text)
+    if not page_match:
+        return None
+    page_value = page_match.group(1) or page_match.group(2)
+    if not page_value:
+        return None
+    return int(page_value)
+
+
+def _sanitize_context(raw_text: str) -> str:
+    cleaned = re.sub(r"!\[[^\]]*\]\([^)]+\)", "", raw_text)
+    cleaned = re.sub(r"<img[^>]+>", "", cleaned)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    return cleaned
+
+
+def _generate_chart_caption(alt_text: str, section_title: str, context_text: str) -> str:
+    context = _sanitize_context(context_text)
+    context = context[:260] if context else ""
+    alt = (alt_text or "").strip()
+    if alt and context:
+        return f"{section_title}；图示主题：{alt}；相关内容：{context}"
+    if context:
+        return f"{section_title}；相关内容：{context}"
+    if alt:
+        return f"{section_title}；图示主题：{alt}"
+    return f"{section_title}；图表内容待补充"
+
+
+def build_chart_chunks(
+    content: str,
+    document_name: str,
+    source_url: Optional[str],
+    outline: Optional[MarkdownOutline] = None
+) -> ChunkResult:
+    """从 Markdown/HTML 图片引用生成图表分块（附带所属章节、页码与上下文摘要）"""
+    outline = outline if outline is not None else parse_markdown_outline(content)
+    chunks: List[Document] = []
+    for idx, image in enumerate(outline.images, start=1):
+        normalized_image_url = _normalize_image_url(image.url, source_url)
+        start = max(0, image.start - 320)
+        end = min(len(content), image.end + 320)
+        context_text = content[start:end]
+        section_title = outline.section_title_at(image.start)
+        page_number = _extract_page_number(context_text)
+        chart_id = f"{document_name}#chart-{idx}"
+        caption = _generate_chart_caption(image.alt, section_title, context_text)
+        page_text = str(page_number) if page_number is not None else "未知"
+        chunk_text = (
+            f"图表ID: {chart_id}\n"
+            f"所属章节: {section_title}\n"
+            f"页码: {page_text}\n"
+            f"图表摘要: {caption}\n"
+            f"图表地址: {normalized_image_url}"
+        )
+        metadata = {
+            "chunk_type": "chart",
+            "source": "vector_chart",
+            "chart_id": chart_id,
+            "chart_image_url": normalized_image_url,
+            "section_title": section_title,
+            "page_number": page_number,
+            "chart_caption": caption
+        }
+        chunks.append(Document(page_content=chunk_text, metadata=metadata))
+    return ChunkResult(
+        chunks=chunks,
+        strategy=ChunkStrategy.RECURSIVE,
+        total_chunks=len(chunks),
+        document_name=document_name
+    )
+
+
+def chunk_document_with_charts(
+    content: str,
+    document_name: str,
+    file_type: str,
+    source_url: Optional[str]
+) -> Tuple[ChunkResult, ChunkResult]:
+    """一次投递完成文本分块与图表分块：正文只序列化一次到子进程，Markdown 大纲也只解析一次"""
+    outline = parse_markdown_outline(content)
+    return (
+        chunk_document_content(content, document_name, file_type, outline),
+        build_chart_chunks(content, document_name, source_url, outline)
+    )
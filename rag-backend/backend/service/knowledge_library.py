@@ -9,6 +9,7 @@ import uuid
 import time
 import requests
 import asyncio
+from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
@@ -19,81 +20,38 @@ from backend.param.knowledge_library import (
 from backend.param.common import Response
 from backend.config.log import get_logger
 from backend.config.database import DatabaseFactory
+from backend.service import ingest_queue
+from backend.service.ingest_pipeline import get_document_pipeline_stats
+from backend.service.ingest_executor import get_cpu_executor_stats
+from backend.service import vector_cleanup
 
 logger = get_logger(__name__)
 
-# 全局并发控制：最多同时处理 3 个文档
-_processing_semaphore = asyncio.Semaphore(3)
-_processing_queue = asyncio.Queue()
-_queue_processor_started = False
+MODE_TEXT = {"all": "解析", "vectorize": "向量化", "graph": "图谱化"}
 
-# 跟踪正在处理的文档（document_id -> {"name": str, "mode": str, "start_time": float}）
-_processing_documents = {}
 
-# 跟踪排队中的任务（按加入顺序）
-_queued_tasks = []  # [{"document_id": int, "document_name": str, "mode": str, "enqueue_time": float}]
-
-
-async def _queue_processor():
-    """后台任务队列处理器，确保有序处理文档"""
-    logger.info("文档处理队列处理器已启动")
-    while True:
-        try:
-            # 从队列中获取任务
-            task_data = await _processing_queue.get()
-            
-            if task_data is None:  # 结束信号
-                break
-            
-            url = task_data['url']
-            collection_id = task_data['collection_id']
-            document_name = task_data['document_name']
-            document_id = task_data.get('document_id')  # 获取文档ID
-            mode = task_data.get('mode', 'all')  # 获取处理模式，默认为 all
-            
-            # 从排队列表中移除
-            if document_id:
-                _queued_tasks[:] = [t for t in _queued_tasks if t['document_id'] != document_id]
-            
-            logger.info(f"队列处理器开始处理文档: {document_name}, 模式: {mode}, 队列剩余: {_processing_queue.qsize()}")
-            
-            # 使用信号量控制并发
-            async with _processing_semaphore:
-                # 记录开始处理
-                if document_id:
-                    _processing_documents[document_id] = {
-                        "name": document_name,
-                        "mode": mode,
-                        "start_time": time.time()
-                    }
-                
-                try:
-                    await _process_uploaded_file(url, collection_id, document_name, document_id, mode)
-                finally:
-                    # 移除处理记录
-                    if document_id and document_id in _processing_documents:
-                        del _processing_documents[document_id]
-            
-            # 标记任务完成
-            _processing_queue.task_done()
-            
-        except Exception as e:
-            logger.error(f"队列处理器异常: {str(e)}")
-            if document_id and document_id in _processing_documents:
-                del _processing_documents[document_id]
-            # 从排队列表中移除
-            if document_id:
-                _queued_tasks[:] = [t for t in _queued_tasks if t['document_id'] != document_id]
-            _processing_queue.task_done()
-
-
-async def _ensure_queue_processor():
-    """确保队列处理器已启动"""
-    global _queue_processor_started
-    if not _queue_processor_started:
-        asyncio.create_task(_queue_processor())
-        _queue_processor_started = True
-        logger.info("文档处理队列处理器已创建")
+async def run_document_ingest_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """入库队列 worker 的任务处理函数：失败时抛出异常，由队列按退避重试"""
+    payload = job.get("payload") or {}
+    result = await _process_uploaded_file(
+        payload["url"],
+        payload["collection_id"],
+        job["document_name"],
+        job["document_id"],
+        job.get("mode") or "all",
+        reingest=bool(payload.get("reingest"))
+    )
+    result = result or {}
+    # 向量缓存命中率等统计随任务结果持久化，可通过任务状态接口查询
+    return {
+        "mode": job.get("mode"),
+        "status": result.get("status"),
+        "chunk_count": result.get("chunk_count"),
+        "diff": result.get("diff"),
+        "embedding_stats": result.get("embedding_stats"),
+        "graph_embedding_stats": result.get("graph_embedding_stats"),
+        "graph_stats": result.get("graph_stats")
+    }
 
 
 async def get_user_libraries(user_id: str) -> Response:
@@ -348,6 +306,8 @@ async def update_document(document_id: int, request: UpdateDocumentRequest, user
             if not document:
                 return Response.error("文档不存在或无权限访问")
             
+            url_changed = request.url is not None and request.url != document.url
+            
             # 更新字段
             if request.name is not None:
                 document.name = request.name
@@ -364,7 +324,12 @@ async def update_document(document_id: int, request: UpdateDocumentRequest, user
             session.refresh(document)
             
             logger.info(f"成功更新文档: {document.name}")
-            return Response.success(document.to_dict())
+            data = document.to_dict()
+            # 已入库文档换了新版本文件：提交增量重新入库
+            if url_changed and (document.is_processed or document.is_vectorized or document.is_graphed):
+                reingest = await start_document_reingest(document_id, user_id)
+                data["reingest"] = reingest.data or {"error": reingest.msg}
+            return Response.success(data)
         finally:
             session.close()
             
@@ -400,16 +365,24 @@ async def delete_document(document_id: int, user_id: str) -> Response:
             session.commit()
             logger.info(f"已删除文档记录: {document_name}")
             
-            # 2. 异步清理 Milvus 和 Neo4j 数据
-            import asyncio
+            # 2. 后台按 document_id 清理 Milvus 分块（可按任务ID查询完成情况），并清理分块登记
+            from backend.rag.storage.milvus_storage import knowledge_document_id
+            cleanup = vector_cleanup.submit_vector_cleanup(
+                collection_id=collection_id,
+                document_ids=[knowledge_document_id(document_id)],
+                document_names=[document_name]
+            )
             asyncio.create_task(_cleanup_document_data(
                 collection_id=collection_id,
                 document_name=document_name,
                 document_id=document_id
             ))
             
-            logger.info(f"成功删除文档: {document_name}，数据清理任务已启动")
-            return Response.success({"message": "文档删除成功，图谱数据正在清理..."})
+            logger.info(f"成功删除文档: {document_name}，数据清理任务已启动: {cleanup['task_id']}")
+            return Response.success({
+                "message": "文档删除成功，向量数据正在清理...",
+                "cleanup_task_id": cleanup["task_id"]
+            })
         finally:
             session.close()
             
@@ -457,13 +430,38 @@ async def start_document_graph(document_id: int, user_id: str) -> Response:
     return await _start_processing(document_id, user_id, mode="graph")
 
 
-async def _start_processing(document_id: int, user_id: str, mode: str = "all") -> Response:
+async def start_document_reingest(document_id: int, user_id: str) -> Response:
+    """重新入库已处理的文档（文档内容更新后调用）
+    
+    只对新版本中新增的分块做向量化和图谱写入，删除已消失的分块，未变化的分块保留
+    
+    Args:
+        document_id: 文档ID
+        user_id: 用户ID
+        
+    Returns:
+        Response: 处理结果
+    """
+    return await _start_processing(document_id, user_id, reingest=True)
+
+
+def _reingest_mode(document: KnowledgeDocument) -> str:
+    """按文档已完成的处理范围决定重新入库模式"""
+    if document.is_vectorized and not document.is_graphed:
+        return "vectorize"
+    if document.is_graphed and not document.is_vectorized:
+        return "graph"
+    return "all"
+
+
+async def _start_processing(document_id: int, user_id: str, mode: str = "all", reingest: bool = False) -> Response:
     """通用的文档处理启动函数
     
     Args:
         document_id: 文档ID
         user_id: 用户ID
         mode: 处理模式 - all/vectorize/graph
+        reingest: 是否为已处理文档的增量重新入库（模式按已完成的处理范围确定）
         
     Returns:
         Response: 处理结果
@@ -483,7 +481,11 @@ async def _start_processing(document_id: int, user_id: str, mode: str = "all") -
             if not document:
                 return Response.error("文档不存在或无权限访问")
             
-            if document.is_processed:
+            if reingest:
+                if not (document.is_processed or document.is_vectorized or document.is_graphed):
+                    return Response.error("文档尚未解析，请先开始解析")
+                mode = _reingest_mode(document)
+            elif document.is_processed:
                 return Response.error("文档已经解析过，无需重复处理")
             
             if not document.url:
@@ -493,44 +495,39 @@ async def _start_processing(document_id: int, user_id: str, mode: str = "all") -
             
             logger.info(f"用户 {user_id} 请求开始解析文档: {document.name}")
             
-            # 确保队列处理器已启动
-            await _ensure_queue_processor()
-            
-            # 将任务加入处理队列
-            task_info = {
-                'url': document.url,
-                'collection_id': library.collection_id,
-                'document_name': document.name,
-                'document_id': document.id,
-                'mode': mode  # 传递处理模式
-            }
-            await _processing_queue.put(task_info)
-            
-            # 记录到排队列表
-            _queued_tasks.append({
-                "document_id": document.id,
-                "document_name": document.name,
-                "mode": mode,
-                "enqueue_time": time.time()
-            })
-            
-            queue_size = _processing_queue.qsize()
-            available_slots = _processing_semaphore._value
-            max_concurrent = 3
-            processing_count = max_concurrent - available_slots
+            # 任务写入持久化队列，由入库 worker（内嵌或独立进程）领取处理
+            enqueued = await ingest_queue.enqueue_ingest_job(
+                document_id=document.id,
+                document_name=document.name,
+                mode=mode,
+                payload={
+                    'url': document.url,
+                    'collection_id': library.collection_id,
+                    'reingest': reingest
+                }
+            )
+            job = enqueued["job"]
+            snapshot = await ingest_queue.get_ingest_queue_snapshot(limit=0)
+            queue_size = snapshot["queued_count"]
+            processing_count = snapshot["running_count"]
+            max_concurrent = ingest_queue.INGEST_WORKER_CONCURRENCY
             
-            logger.info(f"文档已加入处理队列，当前队列长度: {queue_size}，正在处理: {processing_count} 个")
+            logger.info(f"文档已加入处理队列: job={job['id']}，当前排队: {queue_size}，正在处理: {processing_count} 个")
             
             # 根据模式返回不同消息
-            mode_text = "解析" if mode == "all" else ("向量化" if mode == "vectorize" else "图谱化")
+            mode_text = ("重新" if reingest else "") + MODE_TEXT.get(mode, "解析")
             
-            if processing_count >= max_concurrent:
+            if not enqueued["created"]:
+                message = f"文档已在{mode_text}队列中，请勿重复提交"
+            elif processing_count >= max_concurrent:
                 message = f"文档已加入{mode_text}队列（排队位置: {queue_size}，当前有 {processing_count} 个文档正在处理，请耐心等待）"
             else:
                 message = f"文档已加入{mode_text}队列（排队位置: {queue_size}）"
             
             return Response.success({
                 "message": message,
+                "job_id": job["id"],
+                "job_status": job["status"],
                 "queue_position": queue_size,
                 "processing_count": processing_count,
                 "max_concurrent": max_concurrent
@@ -551,44 +548,62 @@ async def get_processing_queue_status() -> Response:
         Response: 包含队列长度、并发数、正在处理和排队中的文档列表等信息
     """
     try:
-        queue_size = _processing_queue.qsize()
-        available_slots = _processing_semaphore._value  # 可用并发槽位
-        max_concurrent = 3  # 与 _processing_semaphore 初始化值一致
-        processing_count = max_concurrent - available_slots
-        
-        # 构建正在处理的文档列表
-        processing_list = []
-        for doc_id, doc_info in _processing_documents.items():
-            elapsed_time = int(time.time() - doc_info['start_time'])
-            processing_list.append({
-                "document_id": doc_id,
-                "document_name": doc_info['name'],
-                "mode": doc_info['mode'],
-                "elapsed_seconds": elapsed_time,
-                "status": "processing"  # 正在处理
-            })
+        snapshot = await ingest_queue.get_ingest_queue_snapshot()
+        now = datetime.now(timezone.utc)
+        max_concurrent = ingest_queue.INGEST_WORKER_CONCURRENCY
         
-        # 构建排队中的文档列表
-        queued_list = []
-        for idx, task in enumerate(_queued_tasks, 1):
-            wait_time = int(time.time() - task['enqueue_time'])
-            queued_list.append({
-                "document_id": task['document_id'],
-                "document_name": task['document_name'],
-                "mode": task['mode'],
-                "wait_seconds": wait_time,
-                "queue_position": idx,  # 排队位置
-                "status": "queued"  # 排队中
-            })
+        def _seconds_since(iso_time: Optional[str]) -> int:
+            if not iso_time:
+                return 0
+            return max(0, int((now - datetime.fromisoformat(iso_time)).total_seconds()))
+        
+        # 正在处理的文档（可能分布在多个 worker 进程）
+        processing_list = [{
+            "document_id": job["document_id"],
+            "document_name": job["document_name"],
+            "mode": job["mode"],
+            "job_id": job["id"],
+            "attempts": job["attempts"],
+            "worker": job["lease_owner"],
+            "elapsed_seconds": _seconds_since(job["started_at"]),
+            "status": "processing"
+        } for job in snapshot["running"]]
+        
+        # 排队中的文档（含等待重试的任务）
+        queued_list = [{
+            "document_id": job["document_id"],
+            "document_name": job["document_name"],
+            "mode": job["mode"],
+            "job_id": job["id"],
+            "attempts": job["attempts"],
+            "last_error": job["last_error"],
+            "wait_seconds": _seconds_since(job["created_at"]),
+            "queue_position": idx,
+            "status": "retrying" if job["attempts"] else "queued"
+        } for idx, job in enumerate(snapshot["queued"], 1)]
+        
+        failed_list = [{
+            "document_id": job["document_id"],
+            "document_name": job["document_name"],
+            "mode": job["mode"],
+            "job_id": job["id"],
+            "attempts": job["attempts"],
+            "last_error": job["last_error"],
+            "status": "failed"
+        } for job in snapshot["failed"]]
         
         status = {
-            "queue_size": queue_size,  # 排队中的任务数
-            "processing_count": len(processing_list),  # 正在处理的任务数（修正：使用实际数量）
-            "max_concurrent": max_concurrent,  # 最大并发数
-            "available_slots": available_slots,  # 剩余可用槽位
-            "processor_running": _queue_processor_started,  # 处理器是否运行
+            "queue_size": snapshot["queued_count"],  # 排队中的任务数
+            "processing_count": snapshot["running_count"],  # 正在处理的任务数
+            "max_concurrent": max_concurrent,  # 单个 worker 的最大并发数
+            "available_slots": max(0, max_concurrent - snapshot["running_count"]),  # 剩余可用槽位
+            "processor_running": ingest_queue.is_ingest_worker_running(),  # 内嵌 worker 是否运行
             "processing_documents": processing_list,  # 正在处理的文档列表
-            "queued_documents": queued_list  # 排队中的文档列表
+            "queued_documents": queued_list,  # 排队中的文档列表
+            "failed_documents": failed_list,  # 最近重试耗尽的文档
+            "pipeline": get_document_pipeline_stats(),  # 本进程入库流水线各阶段吞吐与队列深度
+            "cpu_executor": get_cpu_executor_stats(),  # 本进程解析/分块子进程池
+            "vector_cleanup": vector_cleanup.get_vector_cleanup_stats()  # 本进程向量清理任务
         }
         
         logger.info(f"队列状态: 处理中={len(processing_list)}, 排队={len(queued_list)}")
@@ -599,7 +614,73 @@ async def get_processing_queue_status() -> Response:
         return Response.error(f"获取队列状态失败: {str(e)}")
 
 
-async def _process_uploaded_file(url: str, collection_id: str, document_name: str, document_id: int = None, mode: str = "all"):
+async def get_document_job_status(document_id: int, user_id: str) -> Response:
+    """获取文档最近的入库任务状态
+    
+    Args:
+        document_id: 文档ID
+        user_id: 用户ID
+        
+    Returns:
+        Response: 最近一次任务及历史任务列表
+    """
+    try:
+        session = DatabaseFactory.create_session()
+        try:
+            document = session.query(KnowledgeDocument).join(KnowledgeLibrary).filter(
+                KnowledgeDocument.id == document_id,
+                KnowledgeLibrary.user_id == user_id,
+                KnowledgeLibrary.is_active == True
+            ).first()
+            if not document:
+                return Response.error("文档不存在或无权限访问")
+        finally:
+            session.close()
+        
+        jobs = await ingest_queue.get_document_ingest_jobs(document_id)
+        return Response.success({
+            "document_id": document_id,
+            "job": jobs[0] if jobs else None,
+            "jobs": jobs
+        })
+        
+    except Exception as e:
+        logger.error(f"获取文档任务状态失败: {str(e)}")
+        return Response.error(f"获取文档任务状态失败: {str(e)}")
+
+
+async def get_vector_cleanup_status(task_id: str, user_id: str) -> Response:
+    """获取删除文档后向量清理任务的状态
+    
+    Args:
+        task_id: 删除文档时返回的 cleanup_task_id
+        user_id: 用户ID
+        
+    Returns:
+        Response: 任务状态（pending/running/success/error）与删除条数
+    """
+    try:
+        record = vector_cleanup.get_vector_cleanup(task_id)
+        if not record:
+            return Response.error("清理任务不存在或已过期")
+        session = DatabaseFactory.create_session()
+        try:
+            library = session.query(KnowledgeLibrary).filter(
+                KnowledgeLibrary.collection_id == record["collection_id"],
+                KnowledgeLibrary.user_id == user_id
+            ).first()
+            if not library:
+                return Response.error("清理任务不存在或已过期")
+        finally:
+            session.close()
+        return Response.success(record)
+        
+    except Exception as e:
+        logger.error(f"获取向量清理任务状态失败: {str(e)}")
+        return Response.error(f"获取向量清理任务状态失败: {str(e)}")
+
+
+async def _process_uploaded_file(url: str, collection_id: str, document_name: str, document_id: int = None, mode: str = "all", reingest: bool = False):
     """处理上传的文件（向量化和图谱构建）
     
     使用独立的 DocumentProcessor，完全解耦爬虫逻辑
@@ -610,6 +691,7 @@ async def _process_uploaded_file(url: str, collection_id: str, document_name: st
         document_name: 文档名称
         document_id: 文档ID（用于更新状态）
         mode: 处理模式 - all/vectorize/graph
+        reingest: 是否为已入库文档的增量重新入库
     """
     try:
         from backend.service.document_processor import process_uploaded_document
@@ -668,7 +750,9 @@ async def _process_uploaded_file(url: str, collection_id: str, document_name: st
             file_type=file_type,
             source_url=url,
             vectorize_only=vectorize_only,
-            graph_only=graph_only
+            graph_only=graph_only,
+            document_id=document_id,
+            reingest=reingest
         )
         
         # 标记文档处理状态
@@ -676,12 +760,12 @@ async def _process_uploaded_file(url: str, collection_id: str, document_name: st
             await _mark_document_processed(document_id, mode)
         
         logger.info(f"文件处理完成: {document_name}, 结果: {result}")
+        return result
         
     except Exception as e:
         logger.error(f"处理上传文件异常: {document_name}, 错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # 不再向上抛出异常，避免影响队列处理
+        # 向上抛出，由入库队列记录失败并按退避重试
+        raise
 
 
 async def _cleanup_library_data(collection_id: str, library_title: str):
@@ -731,7 +815,7 @@ async def _cleanup_library_data(collection_id: str, library_title: str):
 
 
 async def _cleanup_document_data(collection_id: str, document_name: str, document_id: int):
-    """清理文档相关的向量和图谱数据
+    """清理文档相关的分块登记和图谱数据（Milvus 分块由 vector_cleanup 按 document_id 删除）
     
     Args:
         collection_id: 知识库 collection_id
@@ -741,24 +825,14 @@ async def _cleanup_document_data(collection_id: str, document_name: str, documen
     try:
         logger.info(f"开始清理文档数据: {document_name} (collection_id: {collection_id})")
         
-        # 1. 清理 Milvus 向量数据
+        # 分块登记随文档一并删除
         try:
-            from backend.rag.storage.milvus_storage import MilvusStorage
-            from backend.config.embedding import get_embedding_model
-            
-            milvus_storage = MilvusStorage(
-                embedding_function=get_embedding_model(),
-                collection_name=collection_id,
-            )
-            
-            # Milvus 按文档名称删除
-            result = milvus_storage.delete_document(document_name)
-            logger.info(f"Milvus 数据清理结果: {result}")
-            
+            from backend.service.document_chunk_index import delete_document_chunks
+            await asyncio.to_thread(delete_document_chunks, document_id)
         except Exception as e:
-            logger.error(f"Milvus 数据清理失败: {str(e)}")
+            logger.error(f"分块登记清理失败: {str(e)}")
         
-        # 2. 清理 LightRAG/Neo4j 图谱数据
+        # 清理 LightRAG/Neo4j 图谱数据
         # 注意：LightRAG 不支持单文档删除，只能删除整个 workspace
         # 这里记录警告，用户需要删除整个知识库才会清理图谱
         logger.warning(
@@ -888,10 +962,32 @@ async def get_document_content(document_id: int, user_id: str) -> Response:
         return Response.error(f"获取文档内容失败: {str(e)}")
 
 
-async def get_document_chunks(document_id: int, user_id: str) -> Response:
-    """获取文档的分块信息（从 Milvus 查询）"""
+async def get_document_chunks(
+    document_id: int,
+    user_id: str,
+    cursor: Optional[str] = None,
+    page_size: Optional[int] = None
+) -> Response:
+    """分页获取文档的分块信息（从 Milvus 按 chunk_index 游标顺序读取，不返回向量）
+    
+    Args:
+        document_id: 文档ID
+        user_id: 用户ID
+        cursor: 上一页返回的 next_cursor，首页为空
+        page_size: 每页条数，服务端上限 RAG_CHUNK_LIST_MAX_PAGE_SIZE
+        
+    Returns:
+        Response: 本页分块、next_cursor/has_more；首页附带分块总数
+    """
     try:
-        from pymilvus import MilvusClient
+        from backend.config.milvus import MilvusClientFactory
+        from backend.rag.storage.chunk_listing import (
+            InvalidCursorError,
+            describe_chunk_fields,
+            document_chunk_filter,
+            list_chunk_page,
+        )
+        from backend.rag.storage.milvus_storage import knowledge_document_id
         
         db_factory = DatabaseFactory()
         session = db_factory.create_session()
@@ -914,79 +1010,79 @@ async def get_document_chunks(document_id: int, user_id: str) -> Response:
             
             library = document.library
             collection_id = library.collection_id
-            
-            if not collection_id:
-                return Response.error("知识库未初始化")
-            
-            # 连接 Milvus
-            milvus_uri = os.getenv('MILVUS_URI', 'http://localhost:19530')
-            temp_client = MilvusClient(uri=milvus_uri)
-            
-            # 查询分块信息 - 尝试多个collection名称
-            chunks_collection = f"{collection_id}_chunks"
-            
-            # 检查collection是否存在
-            all_collections = temp_client.list_collections()
-            
-            # 如果标准名称不存在，尝试不带后缀的
-            if chunks_collection not in all_collections:
-                if collection_id in all_collections:
-                    chunks_collection = collection_id
-                    logger.info(f"Collection {collection_id}_chunks 不存在，使用 {collection_id}")
-                else:
-                    return Response.error(f"Collection 不存在: {chunks_collection} 和 {collection_id} 都未找到")
-            
-            try:
-                logger.info(f"开始查询 collection: {chunks_collection}, 文档名: {document.name}")
-                
-                # 查询分块数据
-                results = temp_client.query(
-                    collection_name=chunks_collection,
-                    filter=f'document_name == "{document.name}"',
-                    output_fields=['document_name', 'chunk_index', 'chunk_size', 'text'],
-                    limit=1000
-                )
-                
-                logger.info(f"查询结果数量: {len(results)}")
-                
-                if not results:
-                    return Response.success({
-                        "document_id": document_id,
-                        "document_name": document.name,
-                        "total_chunks": 0,
-                        "chunks": [],
-                        "message": "文档未向量化或未找到分块"
-                    })
-                
-                # 按 chunk_index 排序
-                sorted_results = sorted(results, key=lambda x: x.get('chunk_index', 0))
-                
-                # 构造返回数据
-                chunks = []
-                for r in sorted_results:
-                    chunk_text = r.get('text', '')  # 新版使用 'text' 字段
-                    
-                    chunks.append({
-                        "chunk_index": r.get('chunk_index', 0),
-                        "chunk_size": r.get('chunk_size', len(chunk_text)),
-                        "text": chunk_text,
-                        "preview": chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
-                    })
-                
-                return Response.success({
-                    "document_id": document_id,
-                    "document_name": document.name,
-                    "total_chunks": len(chunks),
-                    "chunks": chunks
-                })
-                
-            except Exception as e:
-                logger.error(f"查询 Milvus 失败: {str(e)}")
-                return Response.error(f"查询分块信息失败: {str(e)}")
-            
+            document_name = document.name
         finally:
             session.close()
+        
+        if not collection_id:
+            return Response.error("知识库未初始化")
+        
+        def _list_page() -> Optional[Dict[str, Any]]:
+            # 共享客户端，不为每次浏览新建 gRPC 连接
+            client = MilvusClientFactory.get_client()
             
+            # 查询分块信息 - 尝试多个collection名称
+            chunks_collection = f"{collection_id}_chunks"
+            if not client.has_collection(chunks_collection):
+                if not client.has_collection(collection_id):
+                    return None
+                chunks_collection = collection_id
+            
+            schema = describe_chunk_fields(client, chunks_collection)
+            page = list_chunk_page(
+                client,
+                chunks_collection,
+                document_chunk_filter(schema, knowledge_document_id(document_id), document_name),
+                cursor=cursor,
+                page_size=page_size,
+                with_total=not cursor,
+                schema=schema
+            )
+            page["collection_name"] = chunks_collection
+            return page
+        
+        try:
+            page = await asyncio.to_thread(_list_page)
+        except InvalidCursorError as e:
+            return Response.error(str(e))
+        except Exception as e:
+            logger.error(f"查询 Milvus 失败: {str(e)}")
+            return Response.error(f"查询分块信息失败: {str(e)}")
+        
+        if page is None:
+            return Response.error(f"Collection 不存在: {collection_id}_chunks 和 {collection_id} 都未找到")
+        
+        # 构造返回数据（list_chunk_page 已按 chunk_index 排好序）
+        chunks = []
+        for r in page["rows"]:
+            chunk_text = r.get(page["text_field"], '') if page["text_field"] else ''
+            chunks.append({
+                "chunk_index": r.get('chunk_index', 0),
+                "chunk_size": r.get('chunk_size', len(chunk_text)),
+                "chunk_type": r.get('chunk_type'),
+                "section_title": r.get('section_title'),
+                "page_number": r.get('page_number'),
+                "text": chunk_text,
+                "preview": chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
+            })
+        
+        data = {
+            "document_id": document_id,
+            "document_name": document_name,
+            "total_chunks": page["total"],
+            "chunks": chunks,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+            "page_size": page["page_size"]
+        }
+        if not cursor and not chunks:
+            data["message"] = "文档未向量化或未找到分块"
+        logger.info(
+            f"分块查询: collection={page['collection_name']}, 文档={document_name}, "
+            f"本页={len(chunks)}, has_more={page['has_more']}"
+        )
+        return Response.success(data)
+        
     except Exception as e:
         logger.error(f"获取文档分块信息失败: {str(e)}")
         return Response.error(f"获取文档分块信息失败: {str(e)}")
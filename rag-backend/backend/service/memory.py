@@ -1,12 +1,21 @@
+import asyncio
+import hashlib
 import json
 import os
 import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 import redis as redis_sync
-from sqlalchemy import or_, inspect
+from sqlalchemy import and_, or_, inspect, select, update, delete, bindparam
+from sqlalchemy import text as sql_text
 from sqlalchemy.exc import SQLAlchemyError
 from backend.config.database import DatabaseFactory
+from backend.config.metrics import get_metrics_aggregator
+from backend.config.redis import get_redis_client
 from backend.model.memory import UserMemoryProfile, UserMemoryEvent
 from backend.config.log import get_logger
 
@@ -24,6 +33,11 @@ MEMORY_DEDUP_HOURS = int(os.getenv("RAG_MEMORY_DEDUP_HOURS", "48"))
 MEMORY_VECTOR_ENABLED = str(os.getenv("RAG_MEMORY_VECTOR_ENABLED", "false")).strip().lower() in {"1", "true", "yes", "on"}
 MEMORY_VECTOR_COLLECTION_PREFIX = os.getenv("RAG_MEMORY_VECTOR_COLLECTION_PREFIX", "memory_events")
 MEMORY_VECTOR_TOPK = int(os.getenv("RAG_MEMORY_VECTOR_TOPK", "8"))
+# 记忆向量集合按 user_id 分区键组织，检索时把用户/知识库谓词下推到 Milvus 过滤表达式
+MEMORY_VECTOR_PARTITION_KEY = "user_id"
+MEMORY_VECTOR_SCALAR_INDEX_FIELDS = ("user_id", "collection_id")
+MEMORY_VECTOR_NUM_PARTITIONS = int(os.getenv("RAG_MEMORY_VECTOR_NUM_PARTITIONS", "0")) or None
+MEMORY_VECTOR_MIGRATE_BATCH_SIZE = int(os.getenv("RAG_MEMORY_VECTOR_MIGRATE_BATCH_SIZE", "200"))
 MEMORY_PROFILE_COMPLIANCE_ENABLED = str(os.getenv("RAG_MEMORY_PROFILE_COMPLIANCE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
 MEMORY_EVENT_RELEVANCE_ENABLED = str(os.getenv("RAG_MEMORY_EVENT_RELEVANCE_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
 MEMORY_EVENT_MIN_RELEVANCE = float(os.getenv("RAG_MEMORY_EVENT_MIN_RELEVANCE", "0.16"))
@@ -31,10 +45,19 @@ MEMORY_EVENT_MIN_SCORE = float(os.getenv("RAG_MEMORY_EVENT_MIN_SCORE", "0.22"))
 MEMORY_EVENT_TOPIC_MAX = int(os.getenv("RAG_MEMORY_EVENT_TOPIC_MAX", "2"))
 MEMORY_EVENT_CANDIDATE_MULTIPLIER = int(os.getenv("RAG_MEMORY_EVENT_CANDIDATE_MULTIPLIER", "5"))
 MEMORY_EVENT_TOKEN_BUDGET = int(os.getenv("RAG_MEMORY_EVENT_TOKEN_BUDGET", "420"))
+MEMORY_CONTEXT_TIME_BUDGET_MS = int(os.getenv("RAG_MEMORY_CONTEXT_TIME_BUDGET_MS", "800"))
+MEMORY_EVENT_INDEX_CACHE_SIZE = int(os.getenv("RAG_MEMORY_EVENT_INDEX_CACHE_SIZE", "256"))
+# 切词规则变化时递增，旧版本签名会回退为现场切词
+MEMORY_EVENT_SIGNATURE_VERSION = 1
+MEMORY_SIGNATURE_BACKFILL_BATCH_SIZE = int(os.getenv("RAG_MEMORY_SIGNATURE_BACKFILL_BATCH_SIZE", "500"))
 _sync_redis_client = None
 _memory_tables_ready = False
 _memory_vector_embedding_model = None
 _memory_vector_storage_cache: Dict[str, Any] = {}
+_memory_vector_indexed_collections: set = set()
+_abandoned_memory_tasks: set = set()
+_event_token_index_cache: "OrderedDict[tuple, Dict[str, int]]" = OrderedDict()
+_event_token_index_lock = threading.Lock()
 
 PROFILE_ALLOWED_KEYS = {
     "response_language",
@@ -97,19 +120,95 @@ def _normalize_id(value: Any, default: str = "default") -> str:
     return text if text else default
 
 
+def _upgrade_memory_schema(conn) -> None:
+    """建表，或为旧版事件表补齐新增列与索引"""
+    inspector = inspect(conn)
+    for model in (UserMemoryProfile, UserMemoryEvent):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            table.create(bind=conn, checkfirst=True)
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(sql_text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            logger.info(f"记忆表 {table.name} 已补齐列: {column.name}")
+        index_names = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in index_names:
+                index.create(bind=conn)
+
+
+def backfill_event_token_signatures(
+    batch_size: int = MEMORY_SIGNATURE_BACKFILL_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    为签名列新增前的存量事件补算签名（由 scripts/backfill_memory_event_signatures.py 离线执行）
+
+    每批单独提交，不会长时间持有事务；未回填的事件在排序时现场切词，回填期间服务照常可用。
+
+    Args:
+        batch_size: 每批回填的事件数
+        max_batches: 最多执行的批数，默认回填到没有缺失签名的事件为止
+
+    Returns:
+        int: 本次回填的事件数
+    """
+    if not _ensure_memory_tables():
+        raise RuntimeError("记忆表不可用")
+    table = UserMemoryEvent.__table__
+    engine = DatabaseFactory.get_engine()
+    last_id = 0
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.content)
+                .where(table.c.id > last_id, table.c.content_tokens.is_(None))
+                .order_by(table.c.id.asc())
+                .limit(max(1, int(batch_size)))
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                update(table).where(table.c.id == bindparam("event_id")).values(content_tokens=bindparam("signature")),
+                [{"event_id": row.id, "signature": build_event_token_signature(row.content or "")} for row in rows]
+            )
+        last_id = rows[-1].id
+        total += len(rows)
+        batches += 1
+    if total:
+        logger.info(f"记忆事件签名回填完成: {total} 条, 批次={batches}")
+    return total
+
+
 def _ensure_memory_tables() -> bool:
     global _memory_tables_ready
     if _memory_tables_ready:
         return True
     try:
         engine = DatabaseFactory.get_engine()
-        inspector = inspect(engine)
-        profile_exists = inspector.has_table(UserMemoryProfile.__tablename__)
-        event_exists = inspector.has_table(UserMemoryEvent.__tablename__)
-        if not profile_exists:
-            UserMemoryProfile.__table__.create(bind=engine, checkfirst=True)
-        if not event_exists:
-            UserMemoryEvent.__table__.create(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            _upgrade_memory_schema(conn)
+        _memory_tables_ready = True
+        return True
+    except SQLAlchemyError as exc:
+        logger.error(f"检查或创建记忆表失败: {exc}")
+        return False
+
+
+async def _ensure_memory_tables_async() -> bool:
+    global _memory_tables_ready
+    if _memory_tables_ready:
+        return True
+    try:
+        engine = DatabaseFactory.get_async_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(_upgrade_memory_schema)
         _memory_tables_ready = True
         return True
     except SQLAlchemyError as exc:
@@ -250,16 +349,71 @@ def _collect_content_tokens(text: str) -> set[str]:
     return token_set
 
 
-def _score_event_relevance(query_tokens: set[str], content: str) -> float:
-    if not query_tokens:
-        return 0.0
-    content_tokens = _collect_content_tokens(content)
-    if not content_tokens:
+def build_event_token_signature(text: str) -> Dict[str, Any]:
+    """写入时计算事件的词元/n-gram 签名，随事件落库并进入缓存载荷"""
+    return {"v": MEMORY_EVENT_SIGNATURE_VERSION, "tokens": sorted(_collect_content_tokens(text))}
+
+
+def _event_token_set(event: Dict[str, Any]) -> frozenset:
+    signature = event.get("content_tokens")
+    if isinstance(signature, dict) and signature.get("v") == MEMORY_EVENT_SIGNATURE_VERSION:
+        tokens = signature.get("tokens")
+        if isinstance(tokens, list):
+            return frozenset(tokens)
+    # 旧数据没有签名时现场切词
+    return frozenset(_collect_content_tokens(str(event.get("content") or "")))
+
+
+def _score_event_relevance(query_tokens: set[str], content_tokens: frozenset) -> float:
+    if not query_tokens or not content_tokens:
         return 0.0
     overlap = len(query_tokens & content_tokens)
     return overlap / max(1, len(query_tokens))
 
 
+def _get_event_token_index(events: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    构建词元 -> 事件位图的倒排索引（第 i 位表示第 i 个事件包含该词元）
+
+    同一批事件（按 id 序列识别）的索引在进程内 LRU 缓存，用户连续多轮对话只在事件变化时重建。
+    """
+    cache_key = tuple(str(event.get("id") or "") for event in events)
+    cacheable = MEMORY_EVENT_INDEX_CACHE_SIZE > 0 and all(cache_key)
+    if cacheable:
+        with _event_token_index_lock:
+            index = _event_token_index_cache.get(cache_key)
+            if index is not None:
+                _event_token_index_cache.move_to_end(cache_key)
+                return index
+    index: Dict[str, int] = {}
+    for position, event in enumerate(events):
+        bit = 1 << position
+        for token in _event_token_set(event):
+            index[token] = index.get(token, 0) | bit
+    if cacheable:
+        with _event_token_index_lock:
+            _event_token_index_cache[cache_key] = index
+            while len(_event_token_index_cache) > MEMORY_EVENT_INDEX_CACHE_SIZE:
+                _event_token_index_cache.popitem(last=False)
+    return index
+
+
+def _score_events_relevance(events: List[Dict[str, Any]], query_tokens: set[str]) -> List[float]:
+    """按倒排位图累计每个事件命中的查询词数，只访问与查询有重叠的事件"""
+    if not events or not query_tokens:
+        return [0.0] * len(events)
+    index = _get_event_token_index(events)
+    overlaps = [0] * len(events)
+    for token in query_tokens:
+        bits = index.get(token, 0)
+        while bits:
+            lowest = bits & -bits
+            overlaps[lowest.bit_length() - 1] += 1
+            bits ^= lowest
+    denominator = max(1, len(query_tokens))
+    return [count / denominator for count in overlaps]
+
+
 def _score_event_recency(created_at_text: str | None) -> float:
     if not created_at_text:
         return 0.0
@@ -280,9 +434,9 @@ def _rank_events(
     if not events:
         return []
     query_tokens = _collect_query_tokens(query_text)
+    relevances = _score_events_relevance(events, query_tokens)
     scored: List[Dict[str, Any]] = []
-    for event in events:
-        relevance = _score_event_relevance(query_tokens, str(event.get("content") or ""))
+    for event, relevance in zip(events, relevances):
         recency = _score_event_recency(event.get("created_at"))
         importance = float(event.get("importance") or 0.0)
         total = relevance * 0.60 + recency * 0.20 + importance * 0.20
@@ -309,7 +463,9 @@ def _get_memory_vector_storage(collection_id: str):
         vector_collection_name = f"{MEMORY_VECTOR_COLLECTION_PREFIX}_{normalized_collection}"
         storage = MilvusStorage(
             embedding_function=_memory_vector_embedding_model,
-            collection_name=vector_collection_name
+            collection_name=vector_collection_name,
+            partition_key_field=MEMORY_VECTOR_PARTITION_KEY,
+            num_partitions=MEMORY_VECTOR_NUM_PARTITIONS
         )
         _memory_vector_storage_cache[normalized_collection] = storage
         return storage
@@ -318,38 +474,93 @@ def _get_memory_vector_storage(collection_id: str):
         return None
 
 
-def _index_events_to_vector(collection_id: str, events: List[Dict[str, Any]]) -> None:
+def _index_events_to_vector(collection_id: str, events: List[Dict[str, Any]]) -> bool:
+    """
+    写入记忆向量索引；向量写入失败时抛出异常，由调用方保留任务重试
+
+    Returns:
+        bool: 是否已写入向量库（未启用向量或存储不可用时为 False）
+    """
     if not MEMORY_VECTOR_ENABLED or not events:
-        return
+        return False
     storage = _get_memory_vector_storage(collection_id)
     if not storage:
-        return
+        return False
+    documents, ids = _build_memory_vector_documents(events)
+    if not documents:
+        return False
+    storage.vector_store.add_documents(documents=documents, ids=ids)
     try:
-        from langchain_core.documents import Document
-        documents = []
-        ids = []
-        for item in events:
-            content = str(item.get("content") or "").strip()
-            event_id = item.get("id")
-            if not content or event_id is None:
-                continue
-            metadata = {
-                "event_id": str(event_id),
-                "user_id": str(item.get("user_id") or ""),
-                "collection_id": str(item.get("collection_id") or ""),
-                "conversation_id": str(item.get("conversation_id") or ""),
-                "role": str(item.get("role") or ""),
-                "importance": float(item.get("importance") or 0.0),
-                "created_at": str(item.get("created_at") or ""),
-                "source": "memory_event"
-            }
-            documents.append(Document(page_content=content, metadata=metadata))
-            ids.append(f"memory_event_{event_id}")
-        if not documents:
-            return
-        storage.vector_store.add_documents(documents=documents, ids=ids)
+        _ensure_memory_vector_indexes(storage)
     except Exception as exc:
-        logger.warning(f"写入记忆向量索引失败: {exc}")
+        logger.warning(f"补建记忆向量标量索引失败: {exc}")
+    return True
+
+
+def _mark_events_vector_indexed(event_ids: List[int]) -> None:
+    if not event_ids:
+        return
+    db = DatabaseFactory.create_session()
+    try:
+        db.execute(
+            update(UserMemoryEvent)
+            .where(UserMemoryEvent.id.in_(event_ids))
+            .values(vector_indexed_at=datetime.utcnow())
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _build_memory_vector_documents(events: List[Dict[str, Any]]) -> tuple:
+    from langchain_core.documents import Document
+    documents = []
+    ids = []
+    for item in events:
+        content = str(item.get("content") or "").strip()
+        event_id = item.get("id")
+        if not content or event_id is None:
+            continue
+        metadata = {
+            "event_id": str(event_id),
+            "user_id": str(item.get("user_id") or ""),
+            "collection_id": str(item.get("collection_id") or ""),
+            "conversation_id": str(item.get("conversation_id") or ""),
+            "role": str(item.get("role") or ""),
+            "importance": float(item.get("importance") or 0.0),
+            "created_at": str(item.get("created_at") or ""),
+            "source": "memory_event"
+        }
+        documents.append(Document(page_content=content, metadata=metadata))
+        ids.append(f"memory_event_{event_id}")
+    return documents, ids
+
+
+def _ensure_memory_vector_indexes(storage: Any) -> None:
+    """collection 在首次写入时才由 langchain 建出，之后补建一次过滤字段的标量索引"""
+    if storage.collection_name in _memory_vector_indexed_collections:
+        return
+    created = storage.ensure_scalar_indexes(list(MEMORY_VECTOR_SCALAR_INDEX_FIELDS))
+    if created:
+        logger.info(f"记忆向量集合已创建标量索引: collection={storage.collection_name}, fields={created}")
+    _memory_vector_indexed_collections.add(storage.collection_name)
+
+
+def _milvus_string_literal(value: str) -> str:
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def _memory_vector_filter_expr(user_id: str, collection_id: str) -> str:
+    """构造记忆向量检索的过滤表达式；user_id 为分区键，Milvus 只会扫描该用户所在分区"""
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    return (
+        f"{MEMORY_VECTOR_PARTITION_KEY} == {_milvus_string_literal(normalized_user)}"
+        f" and collection_id == {_milvus_string_literal(normalized_collection)}"
+    )
 
 
 def _retrieve_vector_event_ids(user_id: str, collection_id: str, query_text: str, top_k: int) -> List[str]:
@@ -362,16 +573,14 @@ def _retrieve_vector_event_ids(user_id: str, collection_id: str, query_text: str
     if not storage:
         return []
     try:
-        docs = storage.hybrid_search(query=query, k=max(4, top_k * 2))
+        docs = storage.hybrid_search(
+            query=query,
+            k=max(1, top_k),
+            expr=_memory_vector_filter_expr(user_id, collection_id)
+        )
         matched_ids: List[str] = []
-        normalized_user = _normalize_id(user_id, "anonymous")
-        normalized_collection = _normalize_id(collection_id)
         for doc in docs or []:
             metadata = dict(getattr(doc, "metadata", {}) or {})
-            if str(metadata.get("user_id") or "") != normalized_user:
-                continue
-            if str(metadata.get("collection_id") or "") != normalized_collection:
-                continue
             event_id = str(metadata.get("event_id") or "").strip()
             if not event_id or event_id in matched_ids:
                 continue
@@ -384,6 +593,109 @@ def _retrieve_vector_event_ids(user_id: str, collection_id: str, query_text: str
         return []
 
 
+def list_memory_vector_collection_ids() -> List[str]:
+    """列出存在记忆事件的全部知识库，供迁移脚本遍历"""
+    if not _ensure_memory_tables():
+        return []
+    db = DatabaseFactory.create_session()
+    try:
+        rows = db.execute(select(UserMemoryEvent.collection_id).distinct()).all()
+        return sorted(str(row[0]) for row in rows if row[0])
+    finally:
+        db.close()
+
+
+def _iter_memory_event_batches(collection_id: str, batch_size: int):
+    """按主键游标分批读取某知识库下未过期的记忆事件"""
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        db = DatabaseFactory.create_session()
+        try:
+            rows = db.execute(
+                select(UserMemoryEvent).where(
+                    UserMemoryEvent.collection_id == collection_id,
+                    UserMemoryEvent.id > last_id,
+                    or_(UserMemoryEvent.expires_at.is_(None), UserMemoryEvent.expires_at >= now)
+                ).order_by(UserMemoryEvent.id.asc()).limit(batch_size)
+            ).scalars().all()
+            batch = [row.to_dict() for row in rows]
+        finally:
+            db.close()
+        if not batch:
+            return
+        last_id = batch[-1]["id"]
+        yield batch
+
+
+def migrate_memory_vector_collection(
+    collection_id: str,
+    batch_size: int = MEMORY_VECTOR_MIGRATE_BATCH_SIZE,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    将旧的记忆向量集合迁移为 user_id 分区键 + 标量索引的结构
+
+    Milvus 不支持为已有集合追加分区键，因此以数据库中的记忆事件为准删除旧集合后重建并全量回灌；
+    迁移期间向量召回为空，记忆上下文会退化为仅结构化检索，不影响可用性。
+
+    Args:
+        collection_id: 知识库ID
+        batch_size: 每批回灌的事件数
+        force: 即使已是分区键结构也强制重建
+
+    Returns:
+        Dict: {"success", "collection_id", "migrated", "indexed", "message"}
+    """
+    normalized_collection = _normalize_id(collection_id)
+    result: Dict[str, Any] = {
+        "success": False,
+        "collection_id": normalized_collection,
+        "migrated": False,
+        "indexed": 0
+    }
+    if not _ensure_memory_tables():
+        result["error"] = "记忆表不可用"
+        return result
+    storage = _get_memory_vector_storage(normalized_collection)
+    if not storage:
+        result["error"] = "记忆向量存储不可用，请确认 RAG_MEMORY_VECTOR_ENABLED 已开启"
+        return result
+    try:
+        if not force and storage.get_partition_key_field() == MEMORY_VECTOR_PARTITION_KEY:
+            storage.ensure_scalar_indexes(list(MEMORY_VECTOR_SCALAR_INDEX_FIELDS))
+            result.update(success=True, message="集合已是分区键结构，仅补建标量索引")
+            return result
+
+        dropped = storage.drop_collection()
+        if dropped.get("status") == "error":
+            result["error"] = dropped.get("error") or dropped.get("message")
+            return result
+        _memory_vector_storage_cache.pop(normalized_collection, None)
+        _memory_vector_indexed_collections.discard(storage.collection_name)
+        storage = _get_memory_vector_storage(normalized_collection)
+        if not storage:
+            result["error"] = "重建记忆向量存储失败"
+            return result
+
+        indexed = 0
+        for batch in _iter_memory_event_batches(normalized_collection, max(1, int(batch_size))):
+            documents, ids = _build_memory_vector_documents(batch)
+            if not documents:
+                continue
+            storage.vector_store.add_documents(documents=documents, ids=ids)
+            _mark_events_vector_indexed([item["id"] for item in batch])
+            indexed += len(documents)
+        if indexed:
+            _ensure_memory_vector_indexes(storage)
+        result.update(success=True, migrated=True, indexed=indexed, message=f"已重建记忆向量集合并回灌 {indexed} 条事件")
+        return result
+    except Exception as exc:
+        logger.error(f"迁移记忆向量集合失败，collection={normalized_collection}, error={exc}")
+        result["error"] = str(exc)
+        return result
+
+
 def _apply_vector_boost(events: List[Dict[str, Any]], vector_event_ids: List[str]) -> List[Dict[str, Any]]:
     if not events or not vector_event_ids:
         return events
@@ -537,7 +849,7 @@ def _inject_vector_hits(
         raw = event_map.get(event_id)
         if not raw:
             continue
-        relevance = _score_event_relevance(query_tokens, str(raw.get("content") or ""))
+        relevance = _score_event_relevance(query_tokens, _event_token_set(raw))
         recency = _score_event_recency(raw.get("created_at"))
         importance = float(raw.get("importance") or 0.0)
         base_score = relevance * 0.60 + recency * 0.20 + importance * 0.20
@@ -587,26 +899,21 @@ def _policy_gate_stage3(
     return budgeted[:max(1, int(final_limit or MEMORY_EVENT_LIMIT))]
 
 
+def _memory_metric_key(metric_key: str, collection_id: str) -> str:
+    minute_bucket = datetime.utcnow().strftime("%Y%m%d%H%M")
+    return f"{MEMORY_METRICS_PREFIX}:{metric_key}:collection:{collection_id}:minute:{minute_bucket}"
+
+
 def _inc_metric(redis_client: Any, metric_key: str, collection_id: str) -> None:
-    if not redis_client:
-        return
-    try:
-        minute_bucket = datetime.utcnow().strftime("%Y%m%d%H%M")
-        key = f"{MEMORY_METRICS_PREFIX}:{metric_key}:collection:{collection_id}:minute:{minute_bucket}"
-        redis_client.incr(key)
-        redis_client.expire(key, 7 * 24 * 3600)
-    except Exception:
-        return
+    _inc_metric_by(redis_client, metric_key, collection_id, 1)
 
 
 def _inc_metric_by(redis_client: Any, metric_key: str, collection_id: str, amount: int) -> None:
+    # redis_client 仅表示指标后端是否可用；计数先在进程内聚合，由聚合器按间隔批量写出
     if not redis_client or amount <= 0:
         return
     try:
-        minute_bucket = datetime.utcnow().strftime("%Y%m%d%H%M")
-        key = f"{MEMORY_METRICS_PREFIX}:{metric_key}:collection:{collection_id}:minute:{minute_bucket}"
-        redis_client.incrby(key, int(amount))
-        redis_client.expire(key, 7 * 24 * 3600)
+        get_metrics_aggregator().incr(_memory_metric_key(metric_key, collection_id), int(amount))
     except Exception:
         return
 
@@ -661,31 +968,6 @@ def _evaluate_event_persistence(text: str, importance: float) -> tuple[bool, str
     return True, "ok"
 
 
-def _is_recent_duplicate_event(
-    db: Any,
-    user_id: str,
-    collection_id: str,
-    conversation_id: str,
-    role: str,
-    normalized_content: str
-) -> bool:
-    if not normalized_content:
-        return False
-    since = datetime.utcnow() - timedelta(hours=MEMORY_DEDUP_HOURS)
-    rows = db.query(UserMemoryEvent).filter(
-        UserMemoryEvent.user_id == user_id,
-        UserMemoryEvent.collection_id == collection_id,
-        UserMemoryEvent.conversation_id == conversation_id,
-        UserMemoryEvent.role == role,
-        UserMemoryEvent.created_at >= since
-    ).order_by(UserMemoryEvent.created_at.desc()).limit(20).all()
-    for row in rows:
-        existing = _normalize_event_text(str(row.content or ""))
-        if existing and existing == normalized_content:
-            return True
-    return False
-
-
 def _should_replace_profile_value(memory_key: str, old_value: str, new_value: str, source_text: str) -> bool:
     if old_value == new_value:
         return True
@@ -762,6 +1044,52 @@ def _profile_expires_at(memory_key: str) -> Optional[datetime]:
     return datetime.utcnow() + timedelta(days=ttl_days)
 
 
+def _finalize_memory_events(
+    candidate_events: List[Dict[str, Any]],
+    vector_event_ids: List[str],
+    query_text: str,
+    candidate_limit: int,
+    event_limit: int,
+    enforce_relevance: bool,
+    redis_client: Any,
+    collection_id: str
+) -> List[Dict[str, Any]]:
+    """对候选事件执行 stage1 排序 + 向量加权/注入 + stage2 重排 + stage3 策略过滤"""
+    stage1_candidates = _rank_events(candidate_events, query_text, candidate_limit)
+    retained_vector_ids = _retain_vector_ids_in_events(
+        events=stage1_candidates,
+        vector_event_ids=vector_event_ids,
+        redis_client=redis_client,
+        collection_id=collection_id
+    )
+    stage1_candidates = _apply_vector_boost(stage1_candidates, retained_vector_ids)
+    stage1_candidates = _inject_vector_hits(
+        ranked_events=stage1_candidates,
+        all_events=candidate_events,
+        vector_event_ids=retained_vector_ids,
+        query_text=query_text,
+        candidate_limit=candidate_limit
+    )
+    stage2_reranked = _rerank_events_stage2(stage1_candidates, query_text)
+    if enforce_relevance:
+        return _strip_internal_fields(_policy_gate_stage3(stage2_reranked, query_text, event_limit))
+    return _strip_internal_fields(stage2_reranked[:event_limit])
+
+
+def _strip_internal_fields(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """排序用的词元签名不随记忆上下文返回"""
+    for event in events:
+        event.pop("content_tokens", None)
+    return events
+
+
+def _candidate_event_limit(event_limit: int) -> int:
+    return max(
+        event_limit,
+        min(200, max(1, int(event_limit or MEMORY_EVENT_LIMIT)) * max(1, int(MEMORY_EVENT_CANDIDATE_MULTIPLIER)))
+    )
+
+
 def get_user_memory_context(
     user_id: str,
     collection_id: str,
@@ -776,10 +1104,7 @@ def get_user_memory_context(
     normalized_user = _normalize_id(user_id, "anonymous")
     normalized_collection = _normalize_id(collection_id)
     redis_client = redis_client or get_sync_redis_client()
-    candidate_limit = max(
-        event_limit,
-        min(200, max(1, int(event_limit or MEMORY_EVENT_LIMIT)) * max(1, int(MEMORY_EVENT_CANDIDATE_MULTIPLIER)))
-    )
+    candidate_limit = _candidate_event_limit(event_limit)
 
     cached_profile = []
     cached_events = []
@@ -793,32 +1118,22 @@ def get_user_memory_context(
                 cached_events = _safe_json_loads(event_text, [])
             if cached_profile or cached_events:
                 _inc_metric(redis_client, "read_cache_hit", normalized_collection)
-                stage1_candidates = _rank_events(cached_events, query_text, candidate_limit)
                 vector_ids = _retrieve_vector_event_ids(
                     user_id=normalized_user,
                     collection_id=normalized_collection,
                     query_text=query_text,
                     top_k=max(candidate_limit, MEMORY_VECTOR_TOPK)
                 )
-                retained_ids = _retain_vector_ids_in_events(
-                    events=stage1_candidates,
+                stage3_final = _finalize_memory_events(
+                    candidate_events=cached_events,
                     vector_event_ids=vector_ids,
+                    query_text=query_text,
+                    candidate_limit=candidate_limit,
+                    event_limit=event_limit,
+                    enforce_relevance=enforce_relevance,
                     redis_client=redis_client,
                     collection_id=normalized_collection
                 )
-                stage1_candidates = _apply_vector_boost(stage1_candidates, retained_ids)
-                stage1_candidates = _inject_vector_hits(
-                    ranked_events=stage1_candidates,
-                    all_events=cached_events,
-                    vector_event_ids=retained_ids,
-                    query_text=query_text,
-                    candidate_limit=candidate_limit
-                )
-                stage2_reranked = _rerank_events_stage2(stage1_candidates, query_text)
-                if enforce_relevance:
-                    stage3_final = _policy_gate_stage3(stage2_reranked, query_text, event_limit)
-                else:
-                    stage3_final = stage2_reranked[:event_limit]
                 return {"profiles": cached_profile[:profile_limit], "events": stage3_final}
         except Exception as exc:
             logger.warning(f"读取记忆缓存失败: {exc}")
@@ -842,7 +1157,7 @@ def get_user_memory_context(
             or_(UserMemoryEvent.expires_at.is_(None), UserMemoryEvent.expires_at >= now)
         ).order_by(UserMemoryEvent.created_at.desc()).limit(candidate_limit).all()
         profiles = [row.to_dict() for row in profile_rows]
-        events = [row.to_dict() for row in event_rows]
+        events = [row.to_internal_dict() for row in event_rows]
         _inc_metric(redis_client, "read_db_hit", normalized_collection)
     except Exception as exc:
         logger.error(f"读取用户记忆失败: {exc}")
@@ -867,33 +1182,205 @@ def get_user_memory_context(
             logger.warning(f"写入记忆缓存失败: {exc}")
             _inc_metric(redis_client, "write_cache_error", normalized_collection)
 
-    stage1_candidates = _rank_events(events, query_text, candidate_limit)
     vector_event_ids = _retrieve_vector_event_ids(
         user_id=normalized_user,
         collection_id=normalized_collection,
         query_text=query_text,
         top_k=max(candidate_limit, MEMORY_VECTOR_TOPK)
     )
-    retained_vector_ids = _retain_vector_ids_in_events(
-        events=stage1_candidates,
+    stage3_final = _finalize_memory_events(
+        candidate_events=events,
         vector_event_ids=vector_event_ids,
+        query_text=query_text,
+        candidate_limit=candidate_limit,
+        event_limit=event_limit,
+        enforce_relevance=enforce_relevance,
         redis_client=redis_client,
         collection_id=normalized_collection
     )
-    stage1_candidates = _apply_vector_boost(stage1_candidates, retained_vector_ids)
-    stage1_candidates = _inject_vector_hits(
-        ranked_events=stage1_candidates,
-        all_events=events,
-        vector_event_ids=retained_vector_ids,
+    return {"profiles": profiles, "events": stage3_final}
+
+
+async def _read_memory_cache_async(redis_client: Any, user_id: str, collection_id: str) -> tuple:
+    """一次 pipeline 往返读取画像与事件缓存"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(_profile_cache_key(user_id, collection_id))
+    pipe.get(_event_cache_key(user_id, collection_id))
+    profile_text, event_text = await pipe.execute()
+    return _safe_json_loads(profile_text, []) if profile_text else [], _safe_json_loads(event_text, []) if event_text else []
+
+
+async def _write_memory_cache_async(
+    redis_client: Any,
+    user_id: str,
+    collection_id: str,
+    profiles: List[Dict[str, Any]],
+    events: List[Dict[str, Any]]
+) -> None:
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.setex(_profile_cache_key(user_id, collection_id), MEMORY_CACHE_TTL_SECONDS, json.dumps(profiles, ensure_ascii=False))
+    pipe.setex(_event_cache_key(user_id, collection_id), MEMORY_CACHE_TTL_SECONDS, json.dumps(events, ensure_ascii=False))
+    await pipe.execute()
+
+
+def _discard_abandoned_task(task: asyncio.Task) -> None:
+    _abandoned_memory_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"超时的记忆读取任务异常结束: {task.exception()}")
+
+
+def _inc_metrics(redis_client: Any, metric_keys: List[str], collection_id: str) -> None:
+    for metric_key in metric_keys:
+        _inc_metric(redis_client, metric_key, collection_id)
+
+
+async def get_user_memory_context_async(
+    user_id: str,
+    collection_id: str,
+    query_text: str = "",
+    redis_client: Any = None,
+    profile_limit: int = MEMORY_PROFILE_LIMIT,
+    event_limit: int = MEMORY_EVENT_LIMIT,
+    enforce_relevance: bool = True,
+    time_budget_ms: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    异步获取用户记忆上下文
+
+    缓存读取为一次 pipeline 往返；向量检索与缓存读取同时开始，缓存未命中时画像/事件查询并发执行。
+    超过时间预算仍未返回的来源会被放弃，返回已就绪部分（partial=True），并给出各来源耗时。
+
+    Args:
+        redis_client: 异步 Redis 客户端，默认使用全局单例
+        time_budget_ms: 总时间预算（毫秒），<=0 表示不限制
+
+    Returns:
+        Dict[str, Any]: profiles/events，以及 latency_ms/timed_out/partial/source
+    """
+    started_at = time.perf_counter()
+    budget_ms = MEMORY_CONTEXT_TIME_BUDGET_MS if time_budget_ms is None else int(time_budget_ms)
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    candidate_limit = _candidate_event_limit(event_limit)
+    latency_ms: Dict[str, int] = {}
+    timed_out: List[str] = []
+    metric_keys: List[str] = []
+    result: Dict[str, Any] = {
+        "profiles": [],
+        "events": [],
+        "latency_ms": latency_ms,
+        "timed_out": timed_out,
+        "partial": False,
+        "source": "db"
+    }
+
+    def remaining_seconds() -> Optional[float]:
+        if budget_ms <= 0:
+            return None
+        return max(0.0, budget_ms / 1000 - (time.perf_counter() - started_at))
+
+    async def timed(name: str, awaitable):
+        source_started_at = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            latency_ms[name] = int((time.perf_counter() - source_started_at) * 1000)
+
+    if not await _ensure_memory_tables_async():
+        result["partial"] = True
+        return result
+
+    tasks: Dict[str, asyncio.Task] = {
+        "vector": asyncio.create_task(timed("vector", asyncio.to_thread(
+            _retrieve_vector_event_ids,
+            normalized_user,
+            normalized_collection,
+            query_text,
+            max(candidate_limit, MEMORY_VECTOR_TOPK)
+        )))
+    }
+
+    cached_profile: List[Dict[str, Any]] = []
+    cached_events: List[Dict[str, Any]] = []
+    try:
+        redis_client = redis_client or await get_redis_client()
+        cached_profile, cached_events = await asyncio.wait_for(
+            timed("cache", _read_memory_cache_async(redis_client, normalized_user, normalized_collection)),
+            timeout=remaining_seconds()
+        )
+    except asyncio.TimeoutError:
+        timed_out.append("cache")
+        metric_keys.append("read_cache_timeout")
+    except Exception as exc:
+        logger.warning(f"读取记忆缓存失败: {exc}")
+        redis_client = None
+        metric_keys.append("read_cache_error")
+
+    cache_hit = bool(cached_profile or cached_events)
+    if cache_hit:
+        result["source"] = "cache"
+        metric_keys.append("read_cache_hit")
+    else:
+        tasks["profiles"] = asyncio.create_task(timed("profiles", load_memory_profiles_async(
+            normalized_user, normalized_collection, limit=profile_limit
+        )))
+        tasks["events"] = asyncio.create_task(timed("events", load_memory_events_async(
+            normalized_user, normalized_collection, limit=candidate_limit
+        )))
+
+    timeout = remaining_seconds()
+    await asyncio.wait(tasks.values(), timeout=timeout)
+    values: Dict[str, Any] = {}
+    for name, task in tasks.items():
+        if not task.done():
+            # 超时来源不再等待；不取消任务以免中断进行中的数据库连接，任务结束后结果直接丢弃
+            _abandoned_memory_tasks.add(task)
+            task.add_done_callback(_discard_abandoned_task)
+            timed_out.append(name)
+            latency_ms[name] = int((time.perf_counter() - started_at) * 1000)
+            metric_keys.append(f"read_{name}_timeout")
+            continue
+        try:
+            values[name] = task.result()
+        except Exception as exc:
+            logger.warning(f"读取记忆来源失败: source={name}, error={exc}")
+            metric_keys.append(f"read_{name}_error")
+
+    if cache_hit:
+        profiles = cached_profile[:profile_limit]
+        events = cached_events
+    else:
+        profiles = values.get("profiles") or []
+        events = values.get("events") or []
+        if "profiles" in values and "events" in values:
+            metric_keys.append("read_db_hit")
+            if redis_client:
+                try:
+                    await _write_memory_cache_async(redis_client, normalized_user, normalized_collection, profiles, events)
+                except Exception as exc:
+                    logger.warning(f"写入记忆缓存失败: {exc}")
+                    metric_keys.append("write_cache_error")
+
+    metric_client = get_sync_redis_client()
+    result["profiles"] = profiles
+    result["events"] = _finalize_memory_events(
+        candidate_events=events,
+        vector_event_ids=values.get("vector") or [],
         query_text=query_text,
-        candidate_limit=candidate_limit
+        candidate_limit=candidate_limit,
+        event_limit=event_limit,
+        enforce_relevance=enforce_relevance,
+        redis_client=metric_client,
+        collection_id=normalized_collection
     )
-    stage2_reranked = _rerank_events_stage2(stage1_candidates, query_text)
-    if enforce_relevance:
-        stage3_final = _policy_gate_stage3(stage2_reranked, query_text, event_limit)
-    else:
-        stage3_final = stage2_reranked[:event_limit]
-    return {"profiles": profiles, "events": stage3_final}
+    result["partial"] = bool(timed_out)
+    latency_ms["total"] = int((time.perf_counter() - started_at) * 1000)
+    if metric_keys and metric_client:
+        _inc_metrics(metric_client, metric_keys, normalized_collection)
+    if metric_client:
+        # 直方图以哈希写出：count/sum/le_<毫秒上界>
+        get_metrics_aggregator().observe(_memory_metric_key("context_latency_ms", normalized_collection), latency_ms["total"])
+    return result
 
 
 def build_memory_system_prompt(memory_context: Dict[str, List[Dict[str, Any]]]) -> str:
@@ -921,157 +1408,277 @@ def build_memory_system_prompt(memory_context: Dict[str, List[Dict[str, Any]]])
     return "以下是系统检索到的用户记忆，仅在与当前问题相关时参考；如果无关请忽略。\n" + "\n\n".join(sections)
 
 
-def write_user_memory(
+def build_memory_write_job(
     user_id: str,
     collection_id: str,
     conversation_id: str,
     user_message: str,
     assistant_message: Optional[str] = None,
-    redis_client: Any = None
-) -> None:
+    job_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """构造一条记忆写入任务；job_id 用作幂等键，重复投递同一任务不会重复写入事件"""
+    return {
+        "job_id": job_id or uuid.uuid4().hex,
+        "user_id": _normalize_id(user_id, "anonymous"),
+        "collection_id": _normalize_id(collection_id),
+        "conversation_id": _normalize_id(conversation_id, "default"),
+        "user_message": (user_message or "").strip(),
+        "assistant_message": (assistant_message or "").strip() or None,
+        "created_at": time.time()
+    }
+
+
+def _memory_event_key(job_id: str, role: str) -> str:
+    return hashlib.sha1(f"{job_id}:{role}".encode("utf-8")).hexdigest()
+
+
+def _load_profile_rows_for_jobs(db: Any, jobs: List[Dict[str, Any]], candidates: List[Dict[str, str]]) -> Dict[tuple, Any]:
+    scope_keys: Dict[tuple, set] = {}
+    for job, profile_candidates in zip(jobs, candidates):
+        if profile_candidates:
+            scope_keys.setdefault((job["user_id"], job["collection_id"]), set()).update(profile_candidates.keys())
+    if not scope_keys:
+        return {}
+    conditions = [
+        and_(
+            UserMemoryProfile.user_id == scope[0],
+            UserMemoryProfile.collection_id == scope[1],
+            UserMemoryProfile.memory_key.in_(sorted(keys))
+        )
+        for scope, keys in scope_keys.items()
+    ]
+    rows = db.query(UserMemoryProfile).filter(or_(*conditions)).all()
+    return {(row.user_id, row.collection_id, row.memory_key): row for row in rows}
+
+
+def _load_recent_event_texts(db: Any, jobs: List[Dict[str, Any]]) -> Dict[tuple, set]:
+    """按 (user, collection, conversation) 一次性加载去重窗口内的事件文本，替代逐条去重查询"""
+    groups = {(job["user_id"], job["collection_id"], job["conversation_id"]) for job in jobs}
+    since = datetime.utcnow() - timedelta(hours=MEMORY_DEDUP_HOURS)
+    recent: Dict[tuple, set] = {}
+    for user_id, collection_id, conversation_id in groups:
+        rows = db.query(UserMemoryEvent.role, UserMemoryEvent.content).filter(
+            UserMemoryEvent.user_id == user_id,
+            UserMemoryEvent.collection_id == collection_id,
+            UserMemoryEvent.conversation_id == conversation_id,
+            UserMemoryEvent.created_at >= since
+        ).order_by(UserMemoryEvent.created_at.desc()).limit(40).all()
+        texts = {
+            (role, _normalize_event_text(str(content or "")))
+            for role, content in rows
+        }
+        recent[(user_id, collection_id, conversation_id)] = {item for item in texts if item[1]}
+    return recent
+
+
+def write_user_memory_batch(jobs: List[Dict[str, Any]], redis_client: Any = None) -> Dict[str, int]:
+    """
+    批量写入记忆任务（多轮、多用户）
+
+    画像按批次一次性查询后在内存中合并再统一提交，事件去重按会话一次性加载，
+    事件写入后按知识库分组批量向量化；事件以 job_id+role 派生的 event_key 做幂等，
+    因此同一任务重复投递（至少一次语义）不会重复落库，但会为其尚未写入向量库的事件补建索引。
+    数据库或向量写入失败时抛出异常，由调用方重试。
+
+    Returns:
+        Dict[str, int]: 写入统计
+    """
+    stats = {"jobs": 0, "profiles": 0, "events": 0, "replayed": 0, "reindexed": 0}
+    prepared = [job for job in jobs or [] if str(job.get("user_message") or "").strip()]
+    if not prepared:
+        return stats
     if not _ensure_memory_tables():
-        return
-    normalized_user = _normalize_id(user_id, "anonymous")
-    normalized_collection = _normalize_id(collection_id)
-    normalized_conversation = _normalize_id(conversation_id, "default")
-    message_text = (user_message or "").strip()
-    if not message_text:
-        return
+        raise RuntimeError("记忆表不可用")
     redis_client = redis_client or get_sync_redis_client()
 
     db = None
     indexed_events: List[Dict[str, Any]] = []
+    replayed_keys: List[str] = []
     try:
         db = DatabaseFactory.create_session()
-        profile_candidates = _extract_profile_candidates(message_text)
-        if not profile_candidates:
-            _inc_metric(redis_client, "profile_extract_empty", normalized_collection)
-        else:
-            _inc_metric_by(redis_client, "profile_extract_candidates", normalized_collection, len(profile_candidates))
-        for key, value in profile_candidates.items():
-            compliant, reason = _check_profile_compliance(key, value)
-            if not compliant:
-                _inc_metric(redis_client, f"profile_skip_{reason}", normalized_collection)
+        candidates = [_extract_profile_candidates(job["user_message"]) for job in prepared]
+        event_keys = [
+            _memory_event_key(job["job_id"], role)
+            for job in prepared for role in ("user", "assistant")
+        ]
+        existing_keys = {
+            key for (key,) in db.query(UserMemoryEvent.event_key).filter(
+                UserMemoryEvent.event_key.in_(event_keys)
+            ).all()
+        }
+        profile_rows = _load_profile_rows_for_jobs(db, prepared, candidates)
+        recent_texts = _load_recent_event_texts(db, prepared)
+        new_events: List[Any] = []
+        expires_at = datetime.utcnow() + timedelta(days=MEMORY_EVENT_DAYS)
+
+        for job, profile_candidates in zip(prepared, candidates):
+            normalized_user = job["user_id"]
+            normalized_collection = job["collection_id"]
+            normalized_conversation = job["conversation_id"]
+            message_text = job["user_message"]
+            user_event_key = _memory_event_key(job["job_id"], "user")
+            assistant_event_key = _memory_event_key(job["job_id"], "assistant")
+            if user_event_key in existing_keys or assistant_event_key in existing_keys:
+                # 任务已处理过（重复投递），画像与事件都不再重复写入
+                stats["replayed"] += 1
+                replayed_keys.extend((user_event_key, assistant_event_key))
+                _inc_metric(redis_client, "write_replay_skip", normalized_collection)
                 continue
-            expires_at_profile = _profile_expires_at(key)
-            row = db.query(UserMemoryProfile).filter(
-                UserMemoryProfile.user_id == normalized_user,
-                UserMemoryProfile.collection_id == normalized_collection,
-                UserMemoryProfile.memory_key == key
-            ).first()
-            if row:
-                old_value = str(row.memory_value or "")
-                candidate_value = value
-                if key in {"conditions", "allergies"}:
-                    candidate_value = _merge_json_array_values(old_value, value)
-                if _should_replace_profile_value(key, old_value, candidate_value, message_text):
-                    row.memory_value = candidate_value
-                    if old_value == candidate_value:
-                        row.confidence = min(0.98, float(row.confidence or 0.7) + 0.03)
+            stats["jobs"] += 1
+
+            if not profile_candidates:
+                _inc_metric(redis_client, "profile_extract_empty", normalized_collection)
+            else:
+                _inc_metric_by(redis_client, "profile_extract_candidates", normalized_collection, len(profile_candidates))
+            for key, value in profile_candidates.items():
+                compliant, reason = _check_profile_compliance(key, value)
+                if not compliant:
+                    _inc_metric(redis_client, f"profile_skip_{reason}", normalized_collection)
+                    continue
+                expires_at_profile = _profile_expires_at(key)
+                row = profile_rows.get((normalized_user, normalized_collection, key))
+                if row:
+                    old_value = str(row.memory_value or "")
+                    candidate_value = value
+                    if key in {"conditions", "allergies"}:
+                        candidate_value = _merge_json_array_values(old_value, value)
+                    if _should_replace_profile_value(key, old_value, candidate_value, message_text):
+                        row.memory_value = candidate_value
+                        if old_value == candidate_value:
+                            row.confidence = min(0.98, float(row.confidence or 0.7) + 0.03)
+                        else:
+                            row.confidence = 0.85
+                        row.source = "chat_extractor"
+                        row.is_deleted = False
+                        row.expires_at = expires_at_profile
+                        _inc_metric(redis_client, "profile_update_success", normalized_collection)
                     else:
-                        row.confidence = 0.85
-                    row.source = "chat_extractor"
-                    row.is_deleted = False
-                    row.expires_at = expires_at_profile
-                    _inc_metric(redis_client, "profile_update_success", normalized_collection)
+                        row.confidence = max(0.5, float(row.confidence or 0.7) - 0.05)
+                        _inc_metric(redis_client, "profile_conflict_skip", normalized_collection)
                 else:
-                    row.confidence = max(0.5, float(row.confidence or 0.7) - 0.05)
-                    _inc_metric(redis_client, "profile_conflict_skip", normalized_collection)
-            else:
-                row = UserMemoryProfile(
-                    user_id=normalized_user,
-                    collection_id=normalized_collection,
-                    memory_key=key,
-                    memory_value=value,
-                    confidence=0.8,
-                    source="chat_extractor",
-                    expires_at=expires_at_profile
-                )
-                db.add(row)
-                _inc_metric(redis_client, "profile_insert_success", normalized_collection)
-
-        user_importance = _compute_event_importance(message_text, profile_candidates)
-        expires_at = datetime.utcnow() + timedelta(days=MEMORY_EVENT_DAYS)
-        normalized_user_event = _normalize_event_text(message_text)
-        should_user_write, user_skip_reason = _evaluate_event_persistence(message_text, user_importance)
-        if should_user_write and not _is_recent_duplicate_event(
-            db=db,
-            user_id=normalized_user,
-            collection_id=normalized_collection,
-            conversation_id=normalized_conversation,
-            role="user",
-            normalized_content=normalized_user_event
-        ):
-            user_event = UserMemoryEvent(
-                user_id=normalized_user,
-                conversation_id=normalized_conversation,
-                collection_id=normalized_collection,
-                role="user",
-                content=message_text,
-                importance=user_importance,
-                source="chat",
-                expires_at=expires_at
-            )
-            db.add(user_event)
-            db.flush()
-            indexed_events.append(user_event.to_dict())
-            _inc_metric(redis_client, "event_user_write_success", normalized_collection)
-        elif not should_user_write:
-            _inc_metric(redis_client, f"event_user_skip_{user_skip_reason}", normalized_collection)
-        else:
-            _inc_metric(redis_client, "event_user_skip_duplicate", normalized_collection)
-
-        assistant_text = (assistant_message or "").strip()
-        if assistant_text:
-            assistant_importance = _compute_event_importance(assistant_text, {})
-            normalized_assistant_event = _normalize_event_text(assistant_text[:1000])
-            should_assistant_write, assistant_skip_reason = _evaluate_event_persistence(assistant_text, assistant_importance)
-            if should_assistant_write and not _is_recent_duplicate_event(
-                db=db,
-                user_id=normalized_user,
-                collection_id=normalized_collection,
-                conversation_id=normalized_conversation,
-                role="assistant",
-                normalized_content=normalized_assistant_event
-            ):
-                assistant_event = UserMemoryEvent(
+                    row = UserMemoryProfile(
+                        user_id=normalized_user,
+                        collection_id=normalized_collection,
+                        memory_key=key,
+                        memory_value=value,
+                        confidence=0.8,
+                        source="chat_extractor",
+                        expires_at=expires_at_profile
+                    )
+                    db.add(row)
+                    profile_rows[(normalized_user, normalized_collection, key)] = row
+                    _inc_metric(redis_client, "profile_insert_success", normalized_collection)
+                stats["profiles"] += 1
+
+            recent = recent_texts.setdefault((normalized_user, normalized_collection, normalized_conversation), set())
+            event_specs = [("user", message_text, _compute_event_importance(message_text, profile_candidates), user_event_key)]
+            assistant_text = (job.get("assistant_message") or "").strip()
+            if assistant_text:
+                event_specs.append((
+                    "assistant",
+                    assistant_text[:1000],
+                    _compute_event_importance(assistant_text, {}),
+                    assistant_event_key
+                ))
+            for role, content, importance, event_key in event_specs:
+                should_write, skip_reason = _evaluate_event_persistence(content, importance)
+                normalized_content = _normalize_event_text(content)
+                if not should_write:
+                    _inc_metric(redis_client, f"event_{role}_skip_{skip_reason}", normalized_collection)
+                    continue
+                if normalized_content and (role, normalized_content) in recent:
+                    _inc_metric(redis_client, f"event_{role}_skip_duplicate", normalized_collection)
+                    continue
+                event = UserMemoryEvent(
                     user_id=normalized_user,
                     conversation_id=normalized_conversation,
                     collection_id=normalized_collection,
-                    role="assistant",
-                    content=assistant_text[:1000],
-                    importance=assistant_importance,
+                    role=role,
+                    content=content,
+                    importance=importance,
                     source="chat",
+                    event_key=event_key,
+                    content_tokens=build_event_token_signature(content),
                     expires_at=expires_at
                 )
-                db.add(assistant_event)
-                db.flush()
-                indexed_events.append(assistant_event.to_dict())
-                _inc_metric(redis_client, "event_assistant_write_success", normalized_collection)
-            elif not should_assistant_write:
-                _inc_metric(redis_client, f"event_assistant_skip_{assistant_skip_reason}", normalized_collection)
-            else:
-                _inc_metric(redis_client, "event_assistant_skip_duplicate", normalized_collection)
-
+                db.add(event)
+                new_events.append(event)
+                recent.add((role, normalized_content))
+                _inc_metric(redis_client, f"event_{role}_write_success", normalized_collection)
+
+        db.flush()
+        indexed_events = [event.to_dict() for event in new_events]
+        stats["events"] = len(indexed_events)
+        if MEMORY_VECTOR_ENABLED and replayed_keys:
+            # 上次投递已落库但向量写入失败的事件，重放时补建索引
+            pending_rows = db.query(UserMemoryEvent).filter(
+                UserMemoryEvent.event_key.in_(replayed_keys),
+                UserMemoryEvent.vector_indexed_at.is_(None)
+            ).all()
+            indexed_events.extend(row.to_dict() for row in pending_rows)
+            stats["reindexed"] = len(pending_rows)
         db.commit()
-        _index_events_to_vector(collection_id=normalized_collection, events=indexed_events)
-        _inc_metric(redis_client, "write_db_success", normalized_collection)
     except Exception as exc:
-        logger.error(f"写入用户记忆失败: {exc}")
-        _inc_metric(redis_client, "write_db_error", normalized_collection)
+        logger.error(f"批量写入用户记忆失败: {exc}")
+        for collection_id in {job["collection_id"] for job in prepared}:
+            _inc_metric(redis_client, "write_db_error", collection_id)
         if db:
             db.rollback()
+        raise
     finally:
         if db:
             db.close()
 
+    for job in prepared:
+        _inc_metric(redis_client, "write_db_success", job["collection_id"])
+
     if redis_client:
+        cache_keys = set()
+        for job in prepared:
+            cache_keys.add(_profile_cache_key(job["user_id"], job["collection_id"]))
+            cache_keys.add(_event_cache_key(job["user_id"], job["collection_id"]))
         try:
-            redis_client.delete(_profile_cache_key(normalized_user, normalized_collection))
-            redis_client.delete(_event_cache_key(normalized_user, normalized_collection))
+            redis_client.delete(*sorted(cache_keys))
         except Exception as exc:
             logger.warning(f"清理记忆缓存失败: {exc}")
 
+    # 按知识库分组，一次向量化调用覆盖该批次全部事件；失败时向上抛出，任务不确认以便重放补建
+    events_by_collection: Dict[str, List[Dict[str, Any]]] = {}
+    for event in indexed_events:
+        events_by_collection.setdefault(event["collection_id"], []).append(event)
+    for collection_id, events in events_by_collection.items():
+        try:
+            if _index_events_to_vector(collection_id=collection_id, events=events):
+                _mark_events_vector_indexed([event["id"] for event in events])
+        except Exception as exc:
+            logger.error(f"写入记忆向量索引失败，collection={collection_id}, error={exc}")
+            _inc_metric(redis_client, "write_vector_error", collection_id)
+            raise
+    return stats
+
+
+def write_user_memory(
+    user_id: str,
+    collection_id: str,
+    conversation_id: str,
+    user_message: str,
+    assistant_message: Optional[str] = None,
+    redis_client: Any = None
+) -> None:
+    job = build_memory_write_job(
+        user_id=user_id,
+        collection_id=collection_id,
+        conversation_id=conversation_id,
+        user_message=user_message,
+        assistant_message=assistant_message
+    )
+    if not job["user_message"]:
+        return
+    try:
+        write_user_memory_batch([job], redis_client=redis_client)
+    except Exception as exc:
+        logger.error(f"写入用户记忆失败: {exc}")
+
 
 def list_user_memories(user_id: str, collection_id: str, profile_limit: int = 50, event_limit: int = 50) -> Dict[str, Any]:
     normalized_user = _normalize_id(user_id, "anonymous")
@@ -1092,6 +1699,41 @@ def list_user_memories(user_id: str, collection_id: str, profile_limit: int = 50
     }
 
 
+async def list_user_memories_async(
+    user_id: str,
+    collection_id: str,
+    profile_limit: int = 50,
+    event_limit: int = 50
+) -> Dict[str, Any]:
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    memory_context = await get_user_memory_context_async(
+        user_id=normalized_user,
+        collection_id=normalized_collection,
+        query_text="",
+        profile_limit=profile_limit,
+        event_limit=event_limit,
+        enforce_relevance=False,
+        time_budget_ms=0
+    )
+    return {
+        "user_id": normalized_user,
+        "collection_id": normalized_collection,
+        "profiles": memory_context.get("profiles", []),
+        "events": memory_context.get("events", []),
+        "source_latency_ms": memory_context.get("latency_ms", {})
+    }
+
+
+def _invalidate_memory_cache(*cache_keys: str) -> None:
+    redis_client = get_sync_redis_client()
+    if redis_client and cache_keys:
+        try:
+            redis_client.delete(*cache_keys)
+        except Exception:
+            pass
+
+
 def delete_memory_profile(user_id: str, collection_id: str, memory_key: str) -> bool:
     if not _ensure_memory_tables():
         return False
@@ -1120,12 +1762,7 @@ def delete_memory_profile(user_id: str, collection_id: str, memory_key: str) ->
     finally:
         if db:
             db.close()
-    redis_client = get_sync_redis_client()
-    if redis_client:
-        try:
-            redis_client.delete(_profile_cache_key(normalized_user, normalized_collection))
-        except Exception:
-            pass
+    _invalidate_memory_cache(_profile_cache_key(normalized_user, normalized_collection))
     return True
 
 
@@ -1153,12 +1790,7 @@ def delete_memory_events_by_conversation(user_id: str, conversation_id: str, col
     finally:
         if db:
             db.close()
-    redis_client = get_sync_redis_client()
-    if redis_client:
-        try:
-            redis_client.delete(_event_cache_key(normalized_user, normalized_collection))
-        except Exception:
-            pass
+    _invalidate_memory_cache(_event_cache_key(normalized_user, normalized_collection))
     return int(deleted_count)
 
 
@@ -1190,11 +1822,154 @@ def delete_all_user_memory(user_id: str, collection_id: str) -> Dict[str, int]:
     finally:
         if db:
             db.close()
-    redis_client = get_sync_redis_client()
-    if redis_client:
-        try:
-            redis_client.delete(_profile_cache_key(normalized_user, normalized_collection))
-            redis_client.delete(_event_cache_key(normalized_user, normalized_collection))
-        except Exception:
-            pass
+    _invalidate_memory_cache(
+        _profile_cache_key(normalized_user, normalized_collection),
+        _event_cache_key(normalized_user, normalized_collection)
+    )
+    return {"profiles": int(profile_count), "events": int(event_count)}
+
+
+# ---------------------------------------------------------------------------
+# 异步仓储：基于 AsyncSession，供 async 路由直接 await
+# ---------------------------------------------------------------------------
+
+async def load_memory_profiles_async(
+    user_id: str,
+    collection_id: str,
+    limit: int = MEMORY_PROFILE_LIMIT
+) -> List[Dict[str, Any]]:
+    if not await _ensure_memory_tables_async():
+        return []
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    now = datetime.utcnow()
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(
+                select(UserMemoryProfile).where(
+                    UserMemoryProfile.user_id == normalized_user,
+                    UserMemoryProfile.collection_id == normalized_collection,
+                    UserMemoryProfile.is_deleted == False,
+                    or_(UserMemoryProfile.expires_at.is_(None), UserMemoryProfile.expires_at >= now)
+                ).order_by(UserMemoryProfile.updated_at.desc()).limit(limit)
+            )).scalars().all()
+        return [row.to_dict() for row in rows]
+    except Exception as exc:
+        logger.error(f"读取画像记忆失败: {exc}")
+        return []
+
+
+async def load_memory_events_async(
+    user_id: str,
+    collection_id: str,
+    limit: int = MEMORY_EVENT_LIMIT
+) -> List[Dict[str, Any]]:
+    if not await _ensure_memory_tables_async():
+        return []
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    now = datetime.utcnow()
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            rows = (await db.execute(
+                select(UserMemoryEvent).where(
+                    UserMemoryEvent.user_id == normalized_user,
+                    UserMemoryEvent.collection_id == normalized_collection,
+                    or_(UserMemoryEvent.expires_at.is_(None), UserMemoryEvent.expires_at >= now)
+                ).order_by(UserMemoryEvent.created_at.desc()).limit(limit)
+            )).scalars().all()
+        return [row.to_internal_dict() for row in rows]
+    except Exception as exc:
+        logger.error(f"读取事件记忆失败: {exc}")
+        return []
+
+
+async def delete_memory_profile_async(user_id: str, collection_id: str, memory_key: str) -> bool:
+    if not await _ensure_memory_tables_async():
+        return False
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    key = str(memory_key or "").strip()
+    if not key:
+        return False
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            result = await db.execute(
+                update(UserMemoryProfile).where(
+                    UserMemoryProfile.user_id == normalized_user,
+                    UserMemoryProfile.collection_id == normalized_collection,
+                    UserMemoryProfile.memory_key == key
+                ).values(is_deleted=True)
+            )
+            await db.commit()
+        if not result.rowcount:
+            return False
+    except Exception as exc:
+        logger.error(f"删除画像记忆失败: {exc}")
+        return False
+    await asyncio.to_thread(
+        _invalidate_memory_cache,
+        _profile_cache_key(normalized_user, normalized_collection)
+    )
+    return True
+
+
+async def delete_memory_events_by_conversation_async(user_id: str, conversation_id: str, collection_id: str) -> int:
+    if not await _ensure_memory_tables_async():
+        return 0
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    normalized_conversation = _normalize_id(conversation_id, "default")
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            result = await db.execute(
+                delete(UserMemoryEvent).where(
+                    UserMemoryEvent.user_id == normalized_user,
+                    UserMemoryEvent.collection_id == normalized_collection,
+                    UserMemoryEvent.conversation_id == normalized_conversation
+                )
+            )
+            await db.commit()
+        deleted_count = result.rowcount or 0
+    except Exception as exc:
+        logger.error(f"按会话删除事件记忆失败: {exc}")
+        return 0
+    await asyncio.to_thread(
+        _invalidate_memory_cache,
+        _event_cache_key(normalized_user, normalized_collection)
+    )
+    return int(deleted_count)
+
+
+async def delete_all_user_memory_async(user_id: str, collection_id: str) -> Dict[str, int]:
+    if not await _ensure_memory_tables_async():
+        return {"profiles": 0, "events": 0}
+    normalized_user = _normalize_id(user_id, "anonymous")
+    normalized_collection = _normalize_id(collection_id)
+    try:
+        async with DatabaseFactory.create_async_session() as db:
+            profile_result = await db.execute(
+                update(UserMemoryProfile).where(
+                    UserMemoryProfile.user_id == normalized_user,
+                    UserMemoryProfile.collection_id == normalized_collection,
+                    UserMemoryProfile.is_deleted == False
+                ).values(is_deleted=True)
+            )
+            event_result = await db.execute(
+                delete(UserMemoryEvent).where(
+                    UserMemoryEvent.user_id == normalized_user,
+                    UserMemoryEvent.collection_id == normalized_collection
+                )
+            )
+            await db.commit()
+        profile_count = profile_result.rowcount or 0
+        event_count = event_result.rowcount or 0
+    except Exception as exc:
+        logger.error(f"删除用户全部记忆失败: {exc}")
+        return {"profiles": 0, "events": 0}
+    await asyncio.to_thread(
+        _invalidate_memory_cache,
+        _profile_cache_key(normalized_user, normalized_collection),
+        _event_cache_key(normalized_user, normalized_collection)
+    )
     return {"profiles": int(profile_count), "events": int(event_count)}
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记忆写入队列与后台消费者
+聊天请求只负责把写入任务投递到 Redis Stream，由消费者批量写入画像/事件与向量索引。
+基于消费组实现至少一次投递：任务处理成功后才 ACK，进程崩溃遗留的待确认任务超时后被重新认领；
+写入端以 job_id 做幂等，重复投递不会重复落库。
+"""
+import asyncio
+import json
+import os
+import socket
+from typing import Any, Dict, List, Optional, Tuple
+from backend.config.log import get_logger
+from backend.config.redis import get_redis_client
+from backend.service.memory import (
+    MEMORY_CACHE_PREFIX,
+    build_memory_write_job,
+    write_user_memory_batch
+)
+
+logger = get_logger(__name__)
+
+# queue=投递到队列由消费者批量写入；sync=在请求内直接写入（旧行为）
+MEMORY_INGEST_MODE = os.getenv("RAG_MEMORY_INGEST_MODE", "queue").strip().lower()
+MEMORY_INGEST_STREAM = os.getenv("RAG_MEMORY_INGEST_STREAM", f"{MEMORY_CACHE_PREFIX}:ingest")
+MEMORY_INGEST_DEAD_STREAM = os.getenv("RAG_MEMORY_INGEST_DEAD_STREAM", f"{MEMORY_INGEST_STREAM}:dead")
+MEMORY_INGEST_GROUP = os.getenv("RAG_MEMORY_INGEST_GROUP", "memory-writers")
+MEMORY_INGEST_BATCH_SIZE = int(os.getenv("RAG_MEMORY_INGEST_BATCH_SIZE", "64"))
+MEMORY_INGEST_BLOCK_MS = int(os.getenv("RAG_MEMORY_INGEST_BLOCK_MS", "1000"))
+MEMORY_INGEST_CLAIM_IDLE_MS = int(os.getenv("RAG_MEMORY_INGEST_CLAIM_IDLE_MS", "60000"))
+MEMORY_INGEST_MAX_DELIVERIES = int(os.getenv("RAG_MEMORY_INGEST_MAX_DELIVERIES", "5"))
+MEMORY_INGEST_MAXLEN = int(os.getenv("RAG_MEMORY_INGEST_MAXLEN", "100000"))
+MEMORY_INGEST_EMBEDDED_WORKER = str(os.getenv("RAG_MEMORY_INGEST_EMBEDDED_WORKER", "true")).strip().lower() in {"1", "true", "yes", "on"}
+
+_embedded_worker: Optional["MemoryIngestWorker"] = None
+_embedded_worker_task: Optional[asyncio.Task] = None
+
+
+def is_memory_queue_enabled() -> bool:
+    return MEMORY_INGEST_MODE == "queue"
+
+
+async def enqueue_memory_write_async(
+    user_id: str,
+    collection_id: str,
+    conversation_id: str,
+    user_message: str,
+    assistant_message: Optional[str] = None,
+    redis_client: Any = None
+) -> bool:
+    """
+    投递一条记忆写入任务（一次 XADD）
+
+    Returns:
+        bool: 是否投递成功；队列未启用或 Redis 不可用时返回 False，调用方应回退为直接写入
+    """
+    if not is_memory_queue_enabled():
+        return False
+    job = build_memory_write_job(
+        user_id=user_id,
+        collection_id=collection_id,
+        conversation_id=conversation_id,
+        user_message=user_message,
+        assistant_message=assistant_message
+    )
+    if not job["user_message"]:
+        return True
+    try:
+        client = redis_client or await get_redis_client()
+        await client.xadd(
+            MEMORY_INGEST_STREAM,
+            {"job": json.dumps(job, ensure_ascii=False)},
+            maxlen=MEMORY_INGEST_MAXLEN,
+            approximate=True
+        )
+        return True
+    except Exception as exc:
+        logger.warning(f"记忆写入任务投递失败，将回退为直接写入: {exc}")
+        return False
+
+
+def _decode_job(fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    raw = (fields or {}).get("job")
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    try:
+        job = json.loads(raw or "")
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(job, dict) or not job.get("job_id"):
+        return None
+    return job
+
+
+class MemoryIngestWorker:
+    """
+    记忆写入消费者：每轮先认领超时未确认的任务，再读取新任务，合并为一批调用 write_user_memory_batch
+    """
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        consumer_name: Optional[str] = None,
+        batch_size: int = MEMORY_INGEST_BATCH_SIZE,
+        block_ms: int = MEMORY_INGEST_BLOCK_MS,
+        claim_idle_ms: int = MEMORY_INGEST_CLAIM_IDLE_MS,
+        max_deliveries: int = MEMORY_INGEST_MAX_DELIVERIES
+    ):
+        self.redis_client = redis_client
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = max(1, int(batch_size))
+        self.block_ms = max(1, int(block_ms))
+        self.claim_idle_ms = max(1, int(claim_idle_ms))
+        self.max_deliveries = max(1, int(max_deliveries))
+        self._stopped = asyncio.Event()
+        self._group_ready = False
+
+    async def _client(self) -> Any:
+        if self.redis_client is None:
+            self.redis_client = await get_redis_client()
+        return self.redis_client
+
+    async def ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        client = await self._client()
+        try:
+            await client.xgroup_create(MEMORY_INGEST_STREAM, MEMORY_INGEST_GROUP, id="0", mkstream=True)
+        except Exception as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_ready = True
+
+    async def _claim_stale(self, client: Any) -> List[Tuple[str, Dict[str, Any]]]:
+        result = await client.xautoclaim(
+            MEMORY_INGEST_STREAM,
+            MEMORY_INGEST_GROUP,
+            self.consumer_name,
+            min_idle_time=self.claim_idle_ms,
+            start_id="0-0",
+            count=self.batch_size
+        )
+        messages = list(result[1]) if result and len(result) > 1 else []
+        return [(message_id, fields) for message_id, fields in messages if fields]
+
+    async def _read_new(self, client: Any, count: int) -> List[Tuple[str, Dict[str, Any]]]:
+        response = await client.xreadgroup(
+            MEMORY_INGEST_GROUP,
+            self.consumer_name,
+            {MEMORY_INGEST_STREAM: ">"},
+            count=count,
+            block=self.block_ms
+        )
+        messages: List[Tuple[str, Dict[str, Any]]] = []
+        for _, stream_messages in response or []:
+            messages.extend(stream_messages)
+        return messages
+
+    async def _dead_letter_exhausted(
+        self,
+        client: Any,
+        claimed: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """超过最大投递次数的任务转入死信流并确认，避免毒消息反复阻塞批次"""
+        if not claimed:
+            return claimed
+        pending = await client.xpending_range(
+            MEMORY_INGEST_STREAM,
+            MEMORY_INGEST_GROUP,
+            min=claimed[0][0],
+            max=claimed[-1][0],
+            count=len(claimed)
+        )
+        deliveries = {item["message_id"]: int(item.get("times_delivered") or 0) for item in pending or []}
+        alive: List[Tuple[str, Dict[str, Any]]] = []
+        for message_id, fields in claimed:
+            if deliveries.get(message_id, 0) > self.max_deliveries:
+                await client.xadd(MEMORY_INGEST_DEAD_STREAM, fields, maxlen=MEMORY_INGEST_MAXLEN, approximate=True)
+                await client.xack(MEMORY_INGEST_STREAM, MEMORY_INGEST_GROUP, message_id)
+                logger.error(f"记忆写入任务超过最大重试次数，已转入死信: {message_id}")
+                continue
+            alive.append((message_id, fields))
+        return alive
+
+    async def run_once(self) -> int:
+        """
+        处理一批任务
+
+        Returns:
+            int: 本批成功确认的消息数
+        """
+        await self.ensure_group()
+        client = await self._client()
+        messages = await self._dead_letter_exhausted(client, await self._claim_stale(client))
+        if len(messages) < self.batch_size:
+            messages.extend(await self._read_new(client, self.batch_size - len(messages)))
+        if not messages:
+            return 0
+
+        entries: List[Tuple[str, Dict[str, Any]]] = []
+        acked_ids: List[str] = []
+        for message_id, fields in messages:
+            job = _decode_job(fields)
+            if job is None:
+                logger.warning(f"丢弃无法解析的记忆写入任务: {message_id}")
+                acked_ids.append(message_id)
+                continue
+            entries.append((message_id, job))
+
+        stats: Dict[str, int] = {}
+        failed_ids: List[str] = []
+        try:
+            stats = await asyncio.to_thread(write_user_memory_batch, [job for _, job in entries])
+            acked_ids.extend(message_id for message_id, _ in entries)
+        except Exception as exc:
+            # 批量写入失败时逐条重试：成功的任务照常确认，只有失败的任务留在待确认列表中，
+            # 超时后被重新认领，超过最大投递次数才转入死信，不会连累同批次的正常任务
+            logger.warning(f"记忆写入批次失败，改为逐条写入: messages={len(entries)}, error={exc}")
+            for message_id, job in entries:
+                try:
+                    job_stats = await asyncio.to_thread(write_user_memory_batch, [job])
+                except Exception as job_exc:
+                    logger.error(f"记忆写入任务失败，等待重新投递: {message_id}, error={job_exc}")
+                    failed_ids.append(message_id)
+                    continue
+                acked_ids.append(message_id)
+                for key, value in job_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+
+        if acked_ids:
+            pipe = client.pipeline(transaction=False)
+            pipe.xack(MEMORY_INGEST_STREAM, MEMORY_INGEST_GROUP, *acked_ids)
+            pipe.xdel(MEMORY_INGEST_STREAM, *acked_ids)
+            await pipe.execute()
+        logger.info(
+            f"记忆写入批次完成: messages={len(messages)}, acked={len(acked_ids)}, failed={len(failed_ids)}, "
+            f"jobs={stats.get('jobs')}, events={stats.get('events')}, replayed={stats.get('replayed')}"
+        )
+        return len(acked_ids)
+
+    async def run_forever(self) -> None:
+        logger.info(f"记忆写入消费者启动: consumer={self.consumer_name}, stream={MEMORY_INGEST_STREAM}")
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"记忆写入消费者处理失败: {exc}")
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"记忆写入消费者已停止: consumer={self.consumer_name}")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def start_memory_ingest_worker() -> Optional[asyncio.Task]:
+    """在当前事件循环内启动内嵌消费者（RAG_MEMORY_INGEST_EMBEDDED_WORKER=true 时）"""
+    global _embedded_worker, _embedded_worker_task
+    if not is_memory_queue_enabled() or not MEMORY_INGEST_EMBEDDED_WORKER:
+        return None
+    if _embedded_worker_task and not _embedded_worker_task.done():
+        return _embedded_worker_task
+    _embedded_worker = MemoryIngestWorker()
+    _embedded_worker_task = asyncio.get_running_loop().create_task(_embedded_worker.run_forever())
+    return _embedded_worker_task
+
+
+async def stop_memory_ingest_worker(timeout: float = 5.0) -> None:
+    """停止内嵌消费者；正在处理的批次未确认的任务会由其他消费者重新认领"""
+    global _embedded_worker, _embedded_worker_task
+    worker, task = _embedded_worker, _embedded_worker_task
+    _embedded_worker, _embedded_worker_task = None, None
+    if worker:
+        worker.stop()
+    if task and not task.done():
+        try:
+            await asyncio.wait_for(task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            task.cancel()
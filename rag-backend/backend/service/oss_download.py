@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对象存储流式下载
+按 buffer_size 分块把对象写入文件对象（磁盘临时文件或 SpooledTemporaryFile），不在内存中保留整个文件；
+传输中途遇到超时、连接中断等瞬时错误时，用 Range 请求从已写入的偏移继续下载，而不是从头重来。
+后端可替换：OssObjectBackend 对接阿里云 OSS，LocalObjectBackend 以本地目录模拟（测试与本地开发）。
+"""
+import os
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+from backend.config.log import get_logger
+from backend.rag.storage.embedding_batcher import is_transient_error
+
+logger = get_logger(__name__)
+
+OSS_DOWNLOAD_BUFFER_SIZE = int(os.getenv("RAG_OSS_DOWNLOAD_BUFFER_SIZE", str(1024 * 1024)))
+# 不超过该大小的对象留在内存，超过后 SpooledTemporaryFile 自动转存磁盘
+OSS_DOWNLOAD_SPOOL_MAX_SIZE = int(os.getenv("RAG_OSS_DOWNLOAD_SPOOL_MAX_SIZE", str(8 * 1024 * 1024)))
+OSS_DOWNLOAD_MAX_RETRIES = int(os.getenv("RAG_OSS_DOWNLOAD_MAX_RETRIES", "3"))
+OSS_DOWNLOAD_RETRY_BASE_SECONDS = float(os.getenv("RAG_OSS_DOWNLOAD_RETRY_BASE_SECONDS", "1"))
+# oss：阿里云 OSS；local：从 RAG_OBJECT_STORE_LOCAL_ROOT/<bucket>/<key> 读取
+OBJECT_STORE_BACKEND = os.getenv("RAG_OBJECT_STORE_BACKEND", "oss").strip().lower()
+OBJECT_STORE_LOCAL_ROOT = os.getenv("RAG_OBJECT_STORE_LOCAL_ROOT", "./data/object_store")
+
+_STREAM_ERROR_HINTS = ("chunkedencoding", "incompleteread", "protocolerror", "readtimeout", "connectionreset")
+
+
+def is_transient_download_error(exc: BaseException) -> bool:
+    """沿 OSS SDK 的包装异常与 __cause__ 逐层判断是否为可续传的瞬时错误"""
+    seen = set()
+    current: Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if is_transient_error(current):
+            return True
+        name = type(current).__name__.lower()
+        if any(hint in name for hint in _STREAM_ERROR_HINTS):
+            return True
+        unwrap = getattr(current, "unwrap", None)
+        inner = unwrap() if callable(unwrap) else None
+        current = inner if isinstance(inner, BaseException) else current.__cause__
+    return False
+
+
+class OssObjectBackend:
+    """阿里云 OSS 后端：GetObject 响应体按块迭代，续传时携带 Range 头"""
+
+    def open(self, bucket: str, key: str, offset: int, buffer_size: int) -> Tuple[Iterator[bytes], Optional[int], Any]:
+        import alibabacloud_oss_v2 as oss
+        from backend.config.oss import OssClientFactory
+
+        request = oss.GetObjectRequest(bucket=bucket, key=key)
+        if offset > 0:
+            request.range_header = f"bytes={offset}-"
+            request.range_behavior = "standard"
+        result = OssClientFactory.get_client().get_object(request)
+        total = result.content_length + offset if result.content_length is not None else None
+        return result.body.iter_bytes(block_size=buffer_size), total, result.body
+
+
+class LocalObjectBackend:
+    """本地目录后端：对象位于 <root>/<bucket>/<key>"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or OBJECT_STORE_LOCAL_ROOT
+
+    def path_for(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key.lstrip("/"))
+
+    def open(self, bucket: str, key: str, offset: int, buffer_size: int) -> Tuple[Iterator[bytes], Optional[int], Any]:
+        path = self.path_for(bucket, key)
+        handle = open(path, "rb")
+        handle.seek(offset)
+
+        def chunks() -> Iterator[bytes]:
+            while True:
+                block = handle.read(buffer_size)
+                if not block:
+                    return
+                yield block
+
+        return chunks(), os.path.getsize(path), handle
+
+
+def get_object_backend():
+    """按 RAG_OBJECT_STORE_BACKEND 选择下载后端"""
+    if OBJECT_STORE_BACKEND == "local":
+        return LocalObjectBackend()
+    return OssObjectBackend()
+
+
+def download_object(
+    bucket: str,
+    key: str,
+    fileobj: BinaryIO,
+    backend=None,
+    buffer_size: int = OSS_DOWNLOAD_BUFFER_SIZE,
+    max_retries: int = OSS_DOWNLOAD_MAX_RETRIES,
+    retry_base_seconds: float = OSS_DOWNLOAD_RETRY_BASE_SECONDS
+) -> Dict[str, Any]:
+    """
+    把对象流式写入 fileobj（写完后定位到开头）
+
+    Returns:
+        Dict: bytes=下载字节数, retries=续传次数, seconds=耗时
+    """
+    backend = backend or get_object_backend()
+    buffer_size = max(1, int(buffer_size))
+    started = time.monotonic()
+    start_position = fileobj.tell()
+    written = 0
+    total: Optional[int] = None
+    retries = 0
+    while True:
+        handle = None
+        try:
+            chunks, total, handle = backend.open(bucket, key, written, buffer_size)
+            for block in chunks:
+                fileobj.write(block)
+                written += len(block)
+            if total is not None and written < total:
+                raise ConnectionError(f"对象下载不完整: {written}/{total} bytes")
+            break
+        except Exception as exc:
+            if retries >= max_retries or not is_transient_download_error(exc):
+                raise
+            delay = retry_base_seconds * (2 ** retries)
+            retries += 1
+            logger.warning(f"下载中断，{delay:.1f}s 后从 {written} bytes 处续传（第 {retries} 次）: {bucket}/{key}, {exc}")
+            time.sleep(delay)
+        finally:
+            close = getattr(handle, "close", None)
+            if callable(close):
+                close()
+    fileobj.flush()
+    fileobj.seek(start_position)
+    elapsed = time.monotonic() - started
+    logger.info(f"对象下载完成: {bucket}/{key}, {written} bytes, 续传 {retries} 次, 耗时 {elapsed:.2f}s")
+    return {"bytes": written, "retries": retries, "seconds": round(elapsed, 3)}
+
+
+def download_to_spooled_file(
+    bucket: str,
+    key: str,
+    backend=None,
+    max_size: int = OSS_DOWNLOAD_SPOOL_MAX_SIZE,
+    **kwargs: Any
+) -> Tuple[tempfile.SpooledTemporaryFile, Dict[str, Any]]:
+    """下载到 SpooledTemporaryFile：小文件留在内存，超过 max_size 自动落盘；调用方负责关闭"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        stats = download_object(bucket, key, spooled, backend=backend, **kwargs)
+    except Exception:
+        spooled.close()
+        raise
+    return spooled, stats
+
+
+def download_to_temp_path(bucket: str, key: str, suffix: str = "", backend=None, **kwargs: Any) -> Tuple[str, Dict[str, Any]]:
+    """下载到磁盘临时文件（供需要文件路径的解析器/子进程使用），调用方负责删除"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        try:
+            stats = download_object(bucket, key, temp_file, backend=backend, **kwargs)
+        except Exception:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+    return temp_file.name, stats
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量数据异步清理
+删除知识库文档后，Milvus 分块按 document_id 批量删除（in 表达式分批调用），在后台任务中执行，不阻塞删除接口；
+每个清理任务登记 pending -> running -> success/error 状态与删除条数，可通过任务ID查询是否完成。
+进程内只保留最近 RAG_VECTOR_CLEANUP_HISTORY 个已结束任务的记录。
+"""
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from backend.config.log import get_logger
+
+logger = get_logger(__name__)
+
+VECTOR_CLEANUP_HISTORY = int(os.getenv("RAG_VECTOR_CLEANUP_HISTORY", "200"))
+
+_cleanup_tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_running: Dict[str, asyncio.Task] = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _default_storage_factory(collection_id: str):
+    from backend.config.embedding import get_embedding_model
+    from backend.rag.storage.milvus_storage import MilvusStorage
+
+    return MilvusStorage(embedding_function=get_embedding_model(), collection_name=collection_id)
+
+
+def _trim_history() -> None:
+    finished = [task_id for task_id, record in _cleanup_tasks.items() if record["status"] in ("success", "error")]
+    for task_id in finished[:max(0, len(finished) - VECTOR_CLEANUP_HISTORY)]:
+        _cleanup_tasks.pop(task_id, None)
+
+
+async def _run_cleanup(task_id: str, storage_factory: Callable[[str], Any]) -> None:
+    record = _cleanup_tasks[task_id]
+    record["status"] = "running"
+    record["started_at"] = _now()
+    try:
+        storage = await asyncio.to_thread(storage_factory, record["collection_id"])
+        result = await asyncio.to_thread(storage.delete_documents, record["document_ids"], record["document_names"])
+        record["result"] = result
+        if result.get("status") == "error":
+            raise RuntimeError(result.get("error") or "Milvus 删除失败")
+        record["status"] = "success"
+        logger.info(
+            f"向量清理完成: {task_id}, collection={record['collection_id']}, "
+            f"文档数={len(record['document_ids'])}, 删除={result.get('delete_count', 0)}, 批次={result.get('batches', 0)}"
+        )
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+        logger.error(f"向量清理失败: {task_id}, collection={record['collection_id']}, 错误: {str(e)}")
+    finally:
+        record["finished_at"] = _now()
+        _running.pop(task_id, None)
+        _trim_history()
+
+
+def submit_vector_cleanup(
+    collection_id: str,
+    document_ids: List[str],
+    document_names: Optional[List[str]] = None,
+    storage_factory: Optional[Callable[[str], Any]] = None
+) -> Dict[str, Any]:
+    """
+    登记并在后台启动一次向量清理（需在事件循环中调用）
+
+    Args:
+        collection_id: 知识库 collection_id
+        document_ids: 要删除的 document_id（见 milvus_storage.knowledge_document_id）
+        document_names: 对应文档名，旧 collection 没有 document_id 字段时按文档名删除
+        storage_factory: collection_id -> MilvusStorage，默认按当前 embedding 模型创建
+
+    Returns:
+        Dict: 清理任务记录（含 task_id）
+    """
+    task_id = uuid.uuid4().hex
+    record = {
+        "task_id": task_id,
+        "collection_id": collection_id,
+        "document_ids": list(document_ids),
+        "document_names": list(document_names or []),
+        "status": "pending",
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None
+    }
+    _cleanup_tasks[task_id] = record
+    _running[task_id] = asyncio.create_task(_run_cleanup(task_id, storage_factory or _default_storage_factory))
+    return dict(record)
+
+
+def get_vector_cleanup(task_id: str) -> Optional[Dict[str, Any]]:
+    """查询清理任务状态，任务不存在（或已被淘汰）时返回 None"""
+    record = _cleanup_tasks.get(task_id)
+    return dict(record) if record is not None else None
+
+
+async def wait_vector_cleanup(task_id: str) -> Optional[Dict[str, Any]]:
+    """等待清理任务结束并返回最终状态"""
+    task = _running.get(task_id)
+    if task is not None:
+        await asyncio.shield(task)
+    return get_vector_cleanup(task_id)
+
+
+def get_vector_cleanup_stats() -> Dict[str, int]:
+    stats = {"pending": 0, "running": 0, "success": 0, "error": 0}
+    for record in _cleanup_tasks.values():
+        stats[record["status"]] = stats.get(record["status"], 0) + 1
+    return stats
@@ -0,0 +1,224 @@
+import asyncio
+
+import pytest
+from sqlalchemy import inspect, text
+
+from backend.config.database import DatabaseFactory, to_async_db_url
+from backend.service import chat_history
+
+
+def test_to_async_db_url_should_map_sync_drivers():
+    assert to_async_db_url("mysql+pymysql://u:p@localhost:3306/rag") == "mysql+aiomysql://u:p@localhost:3306/rag"
+    assert to_async_db_url("postgresql://u:p@localhost/rag") == "postgresql+asyncpg://u:p@localhost/rag"
+    assert to_async_db_url("postgresql+psycopg2://u:p@localhost/rag") == "postgresql+asyncpg://u:p@localhost/rag"
+    assert to_async_db_url("postgresql+asyncpg://u:p@localhost/rag") == "postgresql+asyncpg://u:p@localhost/rag"
+
+
+def test_memory_sqlite_engines_should_skip_queue_pool_sizing(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", "sqlite://")
+    monkeypatch.delenv("ASYNC_DB_URL", raising=False)
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+
+    async def ping():
+        async with DatabaseFactory.get_async_engine().connect() as conn:
+            return (await conn.execute(text("select 1"))).scalar()
+
+    with DatabaseFactory.get_engine().connect() as conn:
+        assert conn.execute(text("select 1")).scalar() == 1
+    assert asyncio.run(ping()) == 1
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    DatabaseFactory.get_engine().dispose()
+
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'pool.db'}")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    assert DatabaseFactory.get_engine().pool.size() == 3
+    DatabaseFactory.get_engine().dispose()
+
+
+@pytest.fixture
+def async_sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("ASYNC_DB_URL", f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+    monkeypatch.setattr(chat_history, "_chat_history_table_ready", False)
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    yield
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+
+
+def test_async_session_factory_should_be_cached(async_sqlite_db):
+    first = DatabaseFactory.get_async_session()
+    second = DatabaseFactory.get_async_session()
+    assert first is second
+    assert DatabaseFactory.get_async_engine() is DatabaseFactory.get_async_engine()
+
+
+def test_chat_history_async_round_trip(async_sqlite_db):
+    async def scenario():
+        assert await chat_history.save_chat_message_async("conv-1", "user", "messages", "你好")
+        assert await chat_history.save_chat_message_async("conv-1", "assistant", "messages", "您好")
+        assert await chat_history.save_chat_message_async("conv-1", "system", "summary", "摘要一")
+        assert await chat_history.save_chat_message_async("conv-2", "user", "messages", "其他会话")
+
+        messages = await chat_history.get_chat_messages_async("conv-1")
+        recent = await chat_history.get_recent_dialog_messages_async("conv-1", limit=1)
+        summary = await chat_history.get_latest_conversation_summary_async("conv-1")
+        count = await chat_history.get_message_count_async("conv-1")
+        deleted = await chat_history.delete_conversation_messages_async("conv-1")
+        remaining = await chat_history.get_message_count_async("conv-1")
+        return messages, recent, summary, count, deleted, remaining
+
+    messages, recent, summary, count, deleted, remaining = asyncio.run(scenario())
+
+    assert [item["content"] for item in messages] == ["你好", "您好", "摘要一"]
+    assert [item["content"] for item in recent] == ["您好"]
+    assert summary == "摘要一"
+    assert count == 3
+    assert deleted is True
+    assert remaining == 0
+
+
+def test_chat_message_buffer_should_batch_updates_and_keep_order(async_sqlite_db):
+    async def scenario():
+        buffer = chat_history.ChatMessageBuffer("conv-3", durability="batched", max_rows=50, flush_interval=60)
+        await buffer.add("user", "messages", "问题", durable=True)
+        await buffer.add("system", "updates", "节点1")
+        await buffer.add("system", "updates", "节点2")
+        persisted_before_answer = await chat_history.get_message_count_async("conv-3")
+        await buffer.add("assistant", "messages", "回答", durable=True)
+        await buffer.add("system", "updates", "end")
+        await buffer.close()
+        messages = await chat_history.get_chat_messages_async("conv-3")
+        return buffer, persisted_before_answer, messages
+
+    buffer, persisted_before_answer, messages = asyncio.run(scenario())
+
+    assert persisted_before_answer == 1
+    assert [item["content"] for item in messages] == ["问题", "节点1", "节点2", "回答", "end"]
+    assert buffer.flush_count == 3
+    assert buffer.pending_count == 0
+
+
+def test_chat_message_buffer_should_flush_on_size_threshold(async_sqlite_db):
+    async def scenario():
+        buffer = chat_history.ChatMessageBuffer("conv-4", durability="batched", max_rows=2, flush_interval=60)
+        await buffer.add("system", "updates", "a")
+        await buffer.add("system", "updates", "b")
+        await buffer.add("system", "updates", "c")
+        return buffer, await chat_history.get_message_count_async("conv-4")
+
+    buffer, count = asyncio.run(scenario())
+
+    assert count == 2
+    assert buffer.pending_count == 1
+
+
+def test_chat_message_buffer_row_mode_should_write_immediately(async_sqlite_db):
+    async def scenario():
+        buffer = chat_history.ChatMessageBuffer("conv-5", durability="row")
+        await buffer.add("system", "updates", "a")
+        return buffer, await chat_history.get_message_count_async("conv-5")
+
+    buffer, count = asyncio.run(scenario())
+
+    assert count == 1
+    assert buffer.pending_count == 0
+
+
+def test_chat_history_should_classify_kind_and_paginate(async_sqlite_db):
+    async def scenario():
+        buffer = chat_history.ChatMessageBuffer("conv-6", durability="batched", max_rows=50, flush_interval=60)
+        for turn in range(3):
+            await buffer.add("user", "messages", f"问题{turn}", durable=True)
+            await buffer.add("system", "updates", f"轨迹{turn}")
+            await buffer.add("assistant", "messages", f"回答{turn}", durable=True)
+        await chat_history.save_chat_message_async("conv-6", "system", "summary", "摘要")
+        first_page = await chat_history.get_chat_messages_page_async("conv-6", limit=3)
+        second_page = await chat_history.get_chat_messages_page_async(
+            "conv-6", before_id=first_page["next_before_id"], limit=3
+        )
+        all_messages = await chat_history.get_chat_messages_async("conv-6")
+        first_user_id = all_messages[0]["id"]
+        second_user_id = all_messages[3]["id"]
+        traces = await chat_history.get_trace_messages_async(
+            "conv-6", after_id=first_user_id, before_id=second_user_id
+        )
+        return first_page, second_page, all_messages, traces
+
+    first_page, second_page, all_messages, traces = asyncio.run(scenario())
+
+    assert [item["kind"] for item in all_messages[:3]] == ["dialog", "trace", "dialog"]
+    assert all_messages[-1]["kind"] == "summary"
+    assert [item["content"] for item in first_page["messages"]] == ["问题2", "回答2", "摘要"]
+    assert first_page["has_more"] is True
+    assert [item["content"] for item in second_page["messages"]] == ["回答0", "问题1", "回答1"]
+    assert [item["content"] for item in traces] == ["轨迹0"]
+
+
+def test_chat_history_should_migrate_legacy_table(async_sqlite_db):
+    async def scenario():
+        engine = DatabaseFactory.get_async_engine()
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE chat_history (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "conversation_id VARCHAR(36) NOT NULL, role VARCHAR(20) NOT NULL, "
+                "type VARCHAR(20) NOT NULL, content TEXT NOT NULL, extra_data JSON)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO chat_history (conversation_id, role, type, content) VALUES "
+                "('legacy', 'user', 'messages', '旧问题'), ('legacy', 'system', 'updates', '旧轨迹'), "
+                "('legacy', 'system', 'summary', '旧摘要')"
+            ))
+        recent = await chat_history.get_recent_dialog_messages_async("legacy")
+        summary = await chat_history.get_latest_conversation_summary_async("legacy")
+        async with engine.connect() as conn:
+            index_names = await conn.run_sync(
+                lambda sync_conn: {item["name"] for item in inspect(sync_conn).get_indexes("chat_history")}
+            )
+        return recent, summary, index_names
+
+    recent, summary, index_names = asyncio.run(scenario())
+
+    assert [item["content"] for item in recent] == ["旧问题"]
+    assert summary == "旧摘要"
+    assert "ix_chat_history_conversation_kind_id" in index_names
+
+
+def test_verify_conversation_owner_should_touch_once_and_cache(async_sqlite_db, monkeypatch):
+    from sqlalchemy import event
+
+    from backend.model.conversation import Conversation
+    from backend.service import conversation as conversation_service
+
+    monkeypatch.setattr(conversation_service, "_owner_cache", conversation_service.OrderedDict())
+    statements = []
+
+    async def scenario():
+        engine = DatabaseFactory.get_async_engine()
+        async with engine.begin() as conn:
+            await conn.run_sync(Conversation.__table__.create)
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        created = await conversation_service.create_conversation("7", "测试")
+        conversation_id = created["data"]["conversation_id"]
+        statements.clear()
+        first = await conversation_service.verify_conversation_owner(conversation_id, 7, touch=True)
+        first_statements = list(statements)
+        statements.clear()
+        second = await conversation_service.verify_conversation_owner(conversation_id, "7", touch=True)
+        cached_statements = list(statements)
+        other = await conversation_service.verify_conversation_owner(conversation_id, 8, touch=True)
+        missing = await conversation_service.verify_conversation_owner("missing", 7)
+        await conversation_service.delete_conversation(conversation_id)
+        deleted = await conversation_service.verify_conversation_owner(conversation_id, 7)
+        return first, first_statements, second, cached_statements, other, missing, deleted
+
+    first, first_statements, second, cached_statements, other, missing, deleted = asyncio.run(scenario())
+
+    assert first["success"] is True and first["data"]["cached"] is False
+    assert len(first_statements) == 1 and first_statements[0].lstrip().upper().startswith("UPDATE")
+    assert second["success"] is True and second["data"]["cached"] is True
+    assert cached_statements == []
+    assert other["reason"] == "forbidden"
+    assert missing["reason"] == "not_found"
+    assert deleted["reason"] == "not_found"
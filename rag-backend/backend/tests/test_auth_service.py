@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from backend.config.database import DatabaseFactory
+from backend.config.jwt import verify_token
+from backend.model.user import User
+from backend.param.auth import LoginRequest
+from backend.service import auth
+
+
+@pytest.fixture
+def auth_db(tmp_path, monkeypatch):
+    db_path = tmp_path / "auth.db"
+    monkeypatch.setenv("DB_URL", f"sqlite:///{db_path}")
+    monkeypatch.setenv("ASYNC_DB_URL", f"sqlite+aiosqlite:///{db_path}")
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setattr(DatabaseFactory, "_Session", None)
+    monkeypatch.setattr(auth, "_principal_cache", auth.OrderedDict())
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    User.__table__.create(bind=DatabaseFactory.get_engine())
+    yield
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    DatabaseFactory.get_engine().dispose()
+
+
+def test_password_hash_should_run_in_worker_pool():
+    async def scenario():
+        hashed = await auth.hash_password("s3cret")
+        return hashed, await auth.verify_password("s3cret", hashed), await auth.verify_password("wrong", hashed)
+
+    hashed, ok, bad = asyncio.run(scenario())
+
+    assert hashed.startswith("$2")
+    assert ok is True and bad is False
+    assert auth._password_executor._max_workers == max(1, auth.AUTH_PASSWORD_HASH_WORKERS)
+
+
+def test_login_token_should_carry_claims_and_principal_should_be_cached(auth_db):
+    user = asyncio.run(auth.create_user("alice", "s3cret", "alice@example.com"))
+    statements = []
+
+    async def scenario():
+        response = await auth.login(LoginRequest(email="alice@example.com", password="s3cret"))
+        engine = DatabaseFactory.get_async_engine()
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        first = await auth.get_user_principal(user.id)
+        second = await auth.get_user_principal(user.id)
+        cached_statements = len(statements)
+        auth.invalidate_user_principal(user.id)
+        third = await auth.get_user_principal(user.id)
+        return response, first, second, cached_statements, third
+
+    response, first, second, cached_statements, third = asyncio.run(scenario())
+
+    claims = verify_token(response.data["access_token"])
+    assert claims["sub"] == str(user.id)
+    assert claims["username"] == "alice" and claims["email"] == "alice@example.com"
+    assert first == second == third
+    assert first["username"] == "alice"
+    assert cached_statements == 1
+    assert len(statements) == 2
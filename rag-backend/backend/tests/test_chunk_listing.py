@@ -0,0 +1,163 @@
+import random
+
+import pytest
+from pymilvus import DataType
+
+from backend.config import milvus as milvus_config
+from backend.config.milvus import MilvusClientFactory
+from backend.rag.storage import chunk_listing
+from backend.rag.storage.chunk_listing import (
+    InvalidCursorError,
+    describe_chunk_fields,
+    document_chunk_filter,
+    list_chunk_page,
+)
+
+
+class _FakeIterator:
+    def __init__(self, rows, batch_size, limit):
+        self.rows = rows[:limit] if limit > 0 else rows
+        self.batch_size = batch_size
+        self.closed = False
+
+    def next(self):
+        batch, self.rows = self.rows[:self.batch_size], self.rows[self.batch_size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeClient:
+    """按主键有序保存分块（与 Milvus 一样查询结果按主键返回），过滤表达式按 Python 表达式求值"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row["pk"])
+        self.iterators = []
+        self.output_fields = []
+        self.filters = []
+
+    def describe_collection(self, name):
+        return {"fields": [
+            {"name": "pk", "type": DataType.VARCHAR, "is_primary": True},
+            {"name": "text", "type": DataType.VARCHAR},
+            {"name": "vector", "type": DataType.FLOAT_VECTOR},
+            {"name": "sparse", "type": DataType.SPARSE_FLOAT_VECTOR},
+            {"name": "document_id", "type": DataType.VARCHAR},
+            {"name": "document_name", "type": DataType.VARCHAR},
+            {"name": "chunk_index", "type": DataType.INT64},
+        ]}
+
+    def _match(self, filter_expr):
+        self.filters.append(filter_expr)
+        return [row for row in self.rows if eval(filter_expr, {}, dict(row))]
+
+    def query_iterator(self, collection_name, batch_size, limit, filter, output_fields):
+        self.output_fields.append(output_fields)
+        rows = [{field: row.get(field) for field in output_fields} for row in self._match(filter)]
+        iterator = _FakeIterator(rows, batch_size, limit)
+        self.iterators.append(iterator)
+        return iterator
+
+    def query(self, collection_name, filter, output_fields):
+        return [{"count(*)": len(self._match(filter))}]
+
+
+@pytest.fixture
+def client():
+    rows = [
+        {"pk": f"{n:03d}", "document_id": "kb-1" if n % 3 else "kb-2", "document_name": "guide.md",
+         "chunk_index": n, "text": f"分块{n}", "vector": [0.1], "sparse": {1: 0.5}}
+        for n in range(1, 31)
+    ]
+    return _FakeClient(rows)
+
+
+def test_pages_should_walk_every_chunk_once_without_vectors(client):
+    schema = describe_chunk_fields(client, "kb")
+    filter_expr = document_chunk_filter(schema, "kb-1", "guide.md")
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = list_chunk_page(client, "kb", filter_expr, cursor=cursor, page_size=7, with_total=cursor is None, schema=schema)
+        pages += 1
+        seen.extend(row["chunk_index"] for row in page["rows"])
+        if pages == 1:
+            assert page["total"] == 20
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            break
+        cursor = page["next_cursor"]
+
+    assert seen == [n for n in range(1, 31) if n % 3]
+    assert pages == 3
+    assert all("vector" not in fields and "sparse" not in fields for fields in client.output_fields)
+    assert client.output_fields[0][0] == "pk" and "text" in client.output_fields[0]
+    assert all(iterator.closed for iterator in client.iterators)
+
+
+def test_pages_should_follow_chunk_order_not_random_primary_keys():
+    rng = random.Random(7)
+    indexes = [n for n in range(40) if n % 5] + [300, 301, 2000]
+    rows = [
+        {"pk": f"{rng.getrandbits(64):016x}", "document_id": "kb-1", "document_name": "guide.md",
+         "chunk_index": n, "text": f"分块{n}"}
+        for n in indexes
+    ]
+    # 图表分块与文本分块可能共享 chunk_index，按主键区分先后
+    rows += [dict(row, pk=f"{rng.getrandbits(64):016x}", chunk_type="chart") for row in rows[:6]]
+    client = _FakeClient(rows)
+    schema = describe_chunk_fields(client, "kb")
+    filter_expr = document_chunk_filter(schema, "kb-1", "guide.md")
+    seen, cursor = [], None
+    while True:
+        page = list_chunk_page(client, "kb", filter_expr, cursor=cursor, page_size=4, schema=schema)
+        seen.extend((row["chunk_index"], row["pk"]) for row in page["rows"])
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert seen == sorted((row["chunk_index"], row["pk"]) for row in rows)
+    assert [row["pk"] for row in client.rows] != [pk for _, pk in seen]
+    assert all(f.startswith('(document_id == "kb-1")') for f in client.filters)
+
+
+def test_page_size_should_be_capped_by_server_limit(client, monkeypatch):
+    monkeypatch.setattr(chunk_listing, "CHUNK_LIST_MAX_PAGE_SIZE", 5)
+    filter_expr = document_chunk_filter(describe_chunk_fields(client, "kb"), "kb-1", "guide.md")
+
+    page = list_chunk_page(client, "kb", filter_expr, page_size=1000)
+
+    assert page["page_size"] == 5 and len(page["rows"]) == 5 and page["has_more"]
+
+
+def test_filter_should_fall_back_to_document_name_and_reject_bad_cursor(client):
+    schema = describe_chunk_fields(client, "kb")
+    legacy = dict(schema, field_names=schema["field_names"] - {"document_id"})
+
+    assert document_chunk_filter(legacy, "kb-1", 'a"b.md') == 'document_name == "a\\"b.md"'
+    with pytest.raises(InvalidCursorError):
+        list_chunk_page(client, "kb", document_chunk_filter(schema, "kb-1", "guide.md"), cursor="not-a-cursor")
+
+
+def test_client_factory_should_reuse_pooled_clients(monkeypatch):
+    created = []
+
+    class _Client:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+        def close(self):
+            created.append("closed")
+
+    monkeypatch.setattr(milvus_config, "MilvusClient", _Client)
+    monkeypatch.setattr(milvus_config, "MILVUS_CLIENT_POOL_SIZE", 2)
+    MilvusClientFactory.close_all()
+
+    clients = [MilvusClientFactory.get_client(uri="http://milvus:19530", db_name="rag") for _ in range(6)]
+    other = MilvusClientFactory.get_client(uri="http://other:19530", db_name="rag")
+
+    assert len({id(c) for c in clients}) == 2
+    assert other not in clients
+    assert MilvusClientFactory.stats() == {"targets": 2, "clients": 3}
+    MilvusClientFactory.close_all()
+    assert created.count("closed") == 3
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from backend.config.database import DatabaseFactory
+from backend.service import chat_history, conversation_summary
+
+
+class _FakeSummaryLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return f"摘要{len(self.prompts)}"
+
+
+@pytest.fixture
+def summary_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("ASYNC_DB_URL", f"sqlite+aiosqlite:///{tmp_path / 'summary.db'}")
+    monkeypatch.setattr(chat_history, "_chat_history_table_ready", False)
+    monkeypatch.setattr(conversation_summary, "SUMMARY_TRIGGER_DIALOG", 4)
+    monkeypatch.setattr(conversation_summary, "SUMMARY_KEEP_RECENT", 2)
+    monkeypatch.setattr(conversation_summary, "SUMMARY_MIN_NEW_DIALOG", 2)
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    yield
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+
+
+async def _add_turns(conversation_id, start, count):
+    for index in range(start, start + count):
+        await chat_history.save_chat_message_async(conversation_id, "user", "messages", f"问题{index}")
+        await chat_history.save_chat_message_async(conversation_id, "assistant", "messages", f"回答{index}")
+
+
+def test_summary_should_fold_only_new_turns_since_checkpoint(summary_db):
+    llm = _FakeSummaryLLM()
+
+    async def scenario():
+        await _add_turns("conv-s", 0, 2)
+        skipped = await conversation_summary.refresh_conversation_summary("conv-s", llm)
+        await _add_turns("conv-s", 2, 1)
+        first = await conversation_summary.refresh_conversation_summary("conv-s", llm)
+        unchanged = await conversation_summary.refresh_conversation_summary("conv-s", llm)
+        await _add_turns("conv-s", 3, 1)
+        second = await conversation_summary.refresh_conversation_summary("conv-s", llm)
+        record = await chat_history.get_latest_conversation_summary_record_async("conv-s")
+        return skipped, first, unchanged, second, record
+
+    skipped, first, unchanged, second, record = asyncio.run(scenario())
+
+    assert skipped is None
+    assert first == "摘要1"
+    assert unchanged is None
+    assert second == "摘要2"
+    assert "问题0" in llm.prompts[0] and "回答2" not in llm.prompts[0]
+    assert "摘要1" in llm.prompts[1]
+    assert "问题0" not in llm.prompts[1] and "问题2" in llm.prompts[1]
+    assert record["content"] == "摘要2"
+    assert record["extra_data"]["folded_count"] == 2
+
+
+def test_schedule_summary_should_run_in_background_once_per_conversation(summary_db):
+    llm = _FakeSummaryLLM()
+
+    async def scenario():
+        await _add_turns("conv-t", 0, 3)
+        first_task = conversation_summary.schedule_conversation_summary("conv-t", llm)
+        second_task = conversation_summary.schedule_conversation_summary("conv-t", llm)
+        result = await first_task
+        return first_task, second_task, result
+
+    first_task, second_task, result = asyncio.run(scenario())
+
+    assert first_task is second_task
+    assert result == "摘要1"
+    assert len(llm.prompts) == 1
+    assert conversation_summary._summary_tasks == {}
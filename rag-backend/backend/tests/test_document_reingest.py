@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from backend.config.database import DatabaseFactory
+from backend.service import document_chunk_index, ingest_pipeline, ingest_tasks
+from backend.service.document_chunk_index import load_document_chunks, plan_chunk_diff
+from backend.service.document_processor import DocumentProcessor
+
+
+@pytest.fixture
+def chunk_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'chunks.db'}")
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setattr(DatabaseFactory, "_Session", None)
+    monkeypatch.setattr(document_chunk_index, "_chunk_table_ready", False)
+    monkeypatch.setattr(ingest_pipeline, "_document_pipeline", None)
+    yield
+    DatabaseFactory.get_engine().dispose()
+
+
+class _FakeMilvus:
+    def __init__(self):
+        self.rows = {}
+        self.embedded = []
+        self.embedding_batcher = SimpleNamespace(last_stats={})
+        self._ids = itertools.count(1)
+
+    def prepare_documents(self, chunk_results):
+        return [chunk for result in chunk_results for chunk in result.chunks]
+
+    def embed_documents(self, documents):
+        self.embedded.extend(doc.page_content for doc in documents)
+        return [[1.0] for _ in documents]
+
+    def insert_embedded_documents(self, documents, embeddings):
+        ids = [f"v{next(self._ids)}" for _ in documents]
+        self.rows.update({vector_id: doc.page_content for vector_id, doc in zip(ids, documents)})
+        return ids
+
+    def delete_by_ids(self, ids):
+        for vector_id in ids:
+            self.rows.pop(vector_id)
+        return len(ids)
+
+
+class _FakeLightRAG:
+    def __init__(self):
+        self.rag = object()
+        self.inserted = []
+        self.deleted = []
+        self.embedding_cache_stats = {"hits": 0, "embedded": 0}
+
+    async def insert_texts(self, texts, **kwargs):
+        self.inserted.extend(texts)
+
+    async def delete_doc_ids(self, doc_ids):
+        self.deleted.extend(doc_ids)
+        return len(doc_ids)
+
+
+def _markdown(sections):
+    return "\n\n".join(f"## {title}\n\n" + body * 12 for title, body in sections)
+
+
+V1 = [("饮食", "高血压患者应低盐饮食。"), ("运动", "每周规律有氧运动五次。"), ("用药", "遵医嘱服用降压药物。")]
+V2 = [("饮食", "高血压患者应低盐饮食。"), ("运动", "每周规律有氧运动三到五次。"), ("监测", "每日早晚测量血压并记录。")]
+
+
+def test_plan_chunk_diff_should_treat_duplicates_as_multiset():
+    plan = plan_chunk_diff([(1, "a"), (2, "a"), (3, "b")], ["a", "c", "a", "a"])
+
+    assert plan == {"added": [1, 3], "removed": [3], "kept": 2}
+
+
+def test_reingest_should_only_process_changed_chunks(chunk_db):
+    milvus, lightrag = _FakeMilvus(), _FakeLightRAG()
+    processor = DocumentProcessor("kb1", milvus, lightrag, document_id=7)
+    versions = iter([_markdown(V1), _markdown(V2)])
+    current = {}
+    processor._read_from_oss_sync = lambda bucket, key, file_type, source_url: current["content"]
+
+    async def scenario():
+        try:
+            current["content"] = next(versions)
+            first = await processor.process_document("bp.md", "bucket", "bp.md")
+            embedded_before, inserted_before = len(milvus.embedded), len(lightrag.inserted)
+            current["content"] = next(versions)
+            second = await processor.process_document("bp.md", "bucket", "bp.md")
+            return first, second, embedded_before, inserted_before
+        finally:
+            await ingest_pipeline.close_document_pipeline()
+
+    first, second, embedded_before, inserted_before = asyncio.run(scenario())
+
+    assert first["diff"]["vector"] == {"added": 3, "removed": 0, "kept": 0}
+    assert second["diff"]["vector"] == {"added": 2, "removed": 2, "kept": 1}
+    assert second["diff"]["graph"] == {"added": 2, "removed": 2, "kept": 1}
+    assert len(milvus.embedded) - embedded_before == 2
+    assert len(lightrag.inserted) - inserted_before == 2
+    assert len(lightrag.deleted) == 2
+    v2_chunks = ingest_tasks.chunk_document_content(_markdown(V2), "bp.md", "md").chunks
+    assert sorted(milvus.rows.values()) == sorted(chunk.page_content for chunk in v2_chunks)
+    rows = load_document_chunks(7)
+    assert len(rows) == 3
+    assert all(row["vector_id"] and row["in_graph"] for row in rows)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from backend.rag.storage.embedding_batcher import EmbeddingBatcher, RateLimiter, estimate_tokens
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+class _FakeEmbeddings:
+    def __init__(self, delay=0.0, fail_first=None):
+        self.delay = delay
+        self.fail_first = dict(fail_first or {})
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            error = self.fail_first.pop(texts[0], None)
+        try:
+            time.sleep(self.delay)
+            if error:
+                raise error
+            return [[float(len(text))] for text in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _batcher(embeddings, **kwargs):
+    options = {"rate_limiter": RateLimiter(0), "retry_base_seconds": 0, "use_cache": False}
+    options.update(kwargs)
+    return EmbeddingBatcher(embeddings, **options)
+
+
+def test_plan_batches_should_respect_size_and_token_budget():
+    texts = ["高" * 300, "血" * 300, "压" * 300, "a" * 40, "b" * 40, "糖" * 2000]
+    batcher = _batcher(_FakeEmbeddings(), max_batch_size=3, max_batch_tokens=700)
+
+    batches = batcher.plan_batches(texts)
+
+    assert estimate_tokens("高" * 300) == 300
+    assert estimate_tokens("a" * 40) == 10
+    assert batches == [[0, 1], [2, 3, 4], [5]]
+
+
+def test_embed_should_run_batches_concurrently_and_keep_order():
+    embeddings = _FakeEmbeddings(delay=0.05)
+    texts = [f"chunk-{i}" + "x" * i for i in range(40)]
+    batcher = _batcher(embeddings, max_batch_size=4, concurrency=4)
+
+    vectors = batcher.embed(texts)
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert embeddings.max_active > 1
+    assert batcher.last_stats["batches"] == 10
+    assert batcher.last_stats["chunks"] == 40
+    assert batcher.last_stats["chunks_per_second"] > 0
+
+
+def test_embed_should_retry_transient_batch_failures_only():
+    flaky = _FakeEmbeddings(fail_first={"t0": _RateLimitError("too many requests")})
+    batcher = _batcher(flaky, max_batch_size=2)
+
+    assert batcher.embed(["t0", "t1", "t2"]) == [[2.0], [2.0], [2.0]]
+    assert batcher.last_stats["retries"] == 1
+    assert len(flaky.calls) == 3
+
+    broken = _FakeEmbeddings(fail_first={"t0": ValueError("bad input")})
+    with pytest.raises(ValueError):
+        _batcher(broken, max_batch_size=2).embed(["t0", "t1"])
+
+
+def test_rate_limiter_should_space_requests():
+    limiter = RateLimiter(50)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.monotonic() - started >= 4 / 50 * 0.9
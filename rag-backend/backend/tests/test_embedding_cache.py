@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.config.database import DatabaseFactory
+from backend.rag.storage import embedding_cache, lightrag_storage
+from backend.rag.storage.embedding_batcher import EmbeddingBatcher, RateLimiter
+from backend.rag.storage.embedding_cache import EmbeddingCache, content_hash
+from backend.rag.storage.lightrag_storage import LightRAGStorage
+
+
+@pytest.fixture
+def cache_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'cache.db'}")
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setattr(DatabaseFactory, "_Session", None)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache_table_ready", False)
+    yield EmbeddingCache()
+    DatabaseFactory.get_engine().dispose()
+
+
+class _CountingEmbeddings:
+    model = "text-embedding-v4"
+    dimensions = 4
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 0.5, -1.0, 2.0] for text in texts]
+
+
+def test_cache_should_round_trip_vectors_per_model_and_dimension(cache_db):
+    key = content_hash("高血压患者应低盐饮食")
+
+    assert cache_db.put_many([(key, [0.25, -1.5, 3.0])], "m1", 3) == 1
+    assert cache_db.put_many([(key, [9.0, 9.0, 9.0])], "m1", 3) == 0
+
+    assert cache_db.get_many([key], "m1", 3) == {key: [0.25, -1.5, 3.0]}
+    assert cache_db.get_many([key], "m1", 1024) == {}
+    assert cache_db.get_many([key], "m2", 3) == {}
+
+
+def test_batcher_should_only_embed_cache_misses_and_report_hit_ratio(cache_db):
+    embeddings = _CountingEmbeddings()
+    batcher = EmbeddingBatcher(embeddings, rate_limiter=RateLimiter(0), cache=cache_db)
+
+    first = batcher.embed(["公共段落", "指南 v1 正文", "公共段落"])
+    first_stats = dict(batcher.last_stats)
+    second = batcher.embed(["公共段落", "指南 v2 正文"])
+
+    assert embeddings.embedded == ["公共段落", "指南 v1 正文", "指南 v2 正文"]
+    assert first[0] == first[2] == second[0]
+    assert (first_stats["cache_hits"], first_stats["embedded"]) == (0, 2)
+    assert batcher.last_stats["cache_hits"] == 1
+    assert batcher.last_stats["cache_hit_ratio"] == 0.5
+
+
+def test_lightrag_embedding_func_should_share_cache(cache_db, monkeypatch):
+    requested = []
+
+    async def fake_openai_embed(texts, **kwargs):
+        requested.extend(texts)
+        return np.array([[float(len(text))] * 2 for text in texts])
+
+    monkeypatch.setenv("EMBEDDING_DIM", "2")
+    monkeypatch.setattr(lightrag_storage, "openai_embed", fake_openai_embed)
+    monkeypatch.setattr(embedding_cache, "_embedding_cache", cache_db)
+    storage = LightRAGStorage(workspace="kb1")
+
+    async def scenario():
+        embed = await storage._get_embedding_func()
+        first = await embed(["实体A", "实体B"])
+        second = await embed(["实体B", "实体C"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert requested == ["实体A", "实体B", "实体C"]
+    assert second[0].tolist() == first[1].tolist()
+    assert storage.embedding_cache_stats == {"hits": 1, "embedded": 3}
@@ -266,7 +266,10 @@ def test_train_classifier_payload_should_return_model_and_thresholds():
     assert 0 <= result["recommended_thresholds"]["positive"] <= 1
     assert 0 <= result["recommended_thresholds"]["negative"] <= 1
     assert result["split"]["train_size"] >= 1
+    compiled_path = Path(result["compiled_model_path"])
+    assert compiled_path.exists()
     model_path.unlink(missing_ok=True)
+    compiled_path.unlink(missing_ok=True)
 
 
 def test_eval_dataset_entries_should_merge_user_and_builtin_and_prefer_user(monkeypatch, tmp_path):
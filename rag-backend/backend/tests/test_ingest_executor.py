@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from backend.service.ingest_executor import CpuTaskExecutor, ensure_serializable_task
+from backend.service.ingest_tasks import chunk_document_with_charts
+
+MARKDOWN = """# 高血压管理
+
+## 用药方案
+推荐首选 ACEI 或 ARB，证据等级: A。起始剂量从小剂量开始，逐步滴定。
+
+![血压控制流程](images/flow.png)
+
+## 禁忌
+妊娠期禁用 ACEI，双侧肾动脉狭窄者禁用。
+"""
+
+
+def _nested_task():
+    def task():
+        return 1
+    return task
+
+
+def test_executor_should_reject_non_module_level_tasks():
+    for fn in (lambda: 1, _nested_task(), CpuTaskExecutor(0).stats):
+        with pytest.raises(TypeError):
+            ensure_serializable_task(fn)
+    ensure_serializable_task(chunk_document_with_charts)
+
+
+def test_executor_should_run_tasks_in_recycled_child_processes():
+    executor = CpuTaskExecutor(workers=1, max_tasks_per_child=1)
+    try:
+        first = executor.run_sync(os.getpid)
+        second = asyncio.run(executor.run(os.getpid))
+    finally:
+        executor.shutdown()
+
+    assert os.getpid() not in {first, second}
+    # 每个子进程只执行一个任务后即被替换
+    assert first != second
+    assert executor.stats()["completed"] == 2
+
+
+def test_cancelling_a_running_task_should_not_block_the_event_loop():
+    executor = CpuTaskExecutor(workers=1, max_tasks_per_child=10)
+
+    async def scenario():
+        await executor.run(os.getpid)  # 预热子进程
+        task = asyncio.create_task(executor.run(time.sleep, 3))
+        await asyncio.sleep(0.3)
+        started = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - started
+
+    try:
+        elapsed = asyncio.run(scenario())
+    finally:
+        executor.shutdown(wait=False)
+
+    assert elapsed < 0.5
+
+
+def test_chunk_task_should_match_between_process_and_thread_mode():
+    args = (MARKDOWN, "htn.md", "md", "https://example.com/guide/htn.md")
+    process_executor = CpuTaskExecutor(workers=1, max_tasks_per_child=10)
+    thread_executor = CpuTaskExecutor(workers=0)
+    try:
+        in_process = asyncio.run(process_executor.run(chunk_document_with_charts, *args))
+    finally:
+        process_executor.shutdown()
+    in_thread = asyncio.run(thread_executor.run(chunk_document_with_charts, *args))
+
+    assert thread_executor.stats()["mode"] == "thread"
+    for process_result, thread_result in zip(in_process, in_thread):
+        assert [c.page_content for c in process_result.chunks] == [c.page_content for c in thread_result.chunks]
+        assert [c.metadata for c in process_result.chunks] == [c.metadata for c in thread_result.chunks]
+    text_result, chart_result = in_process
+    assert text_result.chunks and text_result.chunks[0].metadata["chunk_type"] == "text"
+    assert chart_result.total_chunks == 1
+    assert chart_result.chunks[0].metadata["chart_image_url"] == "https://example.com/guide/images/flow.png"
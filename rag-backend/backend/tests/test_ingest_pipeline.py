@@ -0,0 +1,158 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.service import ingest_pipeline
+from backend.service.document_processor import DocumentProcessor, PdfSource, cleanup_document_job
+from backend.service.ingest_pipeline import PipelineStage, StagedPipeline
+
+
+def test_pipeline_should_overlap_stages_across_documents():
+    async def scenario():
+        second_extracted = asyncio.Event()
+
+        async def extract(doc):
+            if doc == "B":
+                second_extracted.set()
+            return doc
+
+        async def embed(doc):
+            if doc == "A":
+                # A 的 embed 只有在 B 的 extract 同时进行时才能完成
+                await asyncio.wait_for(second_extracted.wait(), timeout=2)
+            return f"{doc}-embedded"
+
+        pipeline = StagedPipeline([PipelineStage("extract", extract), PipelineStage("embed", embed)])
+        try:
+            return await asyncio.gather(pipeline.submit("A"), pipeline.submit("B")), pipeline.stats()
+        finally:
+            await pipeline.close()
+
+    results, stats = asyncio.run(scenario())
+
+    assert results == ["A-embedded", "B-embedded"]
+    assert stats["stages"]["extract"]["processed"] == 2
+    assert stats["stages"]["embed"]["processed"] == 2
+
+
+def test_pipeline_should_stop_failed_item_and_report_stats():
+    reached_store = []
+
+    async def extract(doc):
+        if doc == "bad":
+            raise ValueError("解析失败")
+        return doc
+
+    async def store(doc):
+        reached_store.append(doc)
+        return doc
+
+    async def scenario():
+        pipeline = StagedPipeline([PipelineStage("extract", extract, 2, queue_size=1), PipelineStage("store", store)])
+        try:
+            ok = await pipeline.submit("good")
+            with pytest.raises(ValueError):
+                await pipeline.submit("bad")
+            return ok, pipeline.stats()
+        finally:
+            await pipeline.close()
+
+    ok, stats = asyncio.run(scenario())
+
+    assert ok == "good"
+    assert reached_store == ["good"]
+    extract_stats = stats["stages"]["extract"]
+    assert (extract_stats["processed"], extract_stats["failed"]) == (1, 1)
+    assert (extract_stats["concurrency"], extract_stats["queue_capacity"], extract_stats["queue_depth"]) == (2, 1, 0)
+
+
+def test_pipeline_should_clean_up_dropped_items(tmp_path):
+    release_extract = asyncio.Event()
+
+    async def extract(job):
+        path = tmp_path / f"{job['name']}.pdf"
+        path.write_bytes(b"%PDF-1.4")
+        job["pdf_source"] = PdfSource(str(path), "bucket", f"{job['name']}.pdf")
+        if job["name"] == "cancelled":
+            await release_extract.wait()
+        return job
+
+    async def chunk(job):
+        raise ValueError("分块失败")
+
+    async def scenario():
+        pipeline = StagedPipeline(
+            [PipelineStage("extract", extract, 2), PipelineStage("chunk", chunk)], cleanup=cleanup_document_job
+        )
+        try:
+            with pytest.raises(ValueError):
+                await pipeline.submit({"name": "failed"})
+            waiter = asyncio.create_task(pipeline.submit({"name": "cancelled"}))
+            while not (tmp_path / "cancelled.pdf").exists():
+                await asyncio.sleep(0.01)
+            waiter.cancel()
+            release_extract.set()
+            for _ in range(100):
+                if not (tmp_path / "cancelled.pdf").exists():
+                    break
+                await asyncio.sleep(0.01)
+            return pipeline.stats()
+        finally:
+            await pipeline.close()
+
+    stats = asyncio.run(scenario())
+
+    assert list(tmp_path.iterdir()) == []
+    assert stats["stages"]["chunk"]["failed"] == 1
+
+
+class _FakeMilvus:
+    def __init__(self):
+        self.inserted = []
+        self.embedding_batcher = SimpleNamespace(last_stats={"chunks_per_second": 1.0})
+
+    def prepare_documents(self, chunk_results):
+        return [chunk for result in chunk_results for chunk in result.chunks]
+
+    def embed_documents(self, documents):
+        return [[float(len(doc.page_content))] for doc in documents]
+
+    def insert_embedded_documents(self, documents, embeddings):
+        self.inserted.extend(zip(documents, embeddings))
+        return [str(i) for i in range(len(documents))]
+
+
+class _FakeLightRAG:
+    def __init__(self):
+        self.rag = object()
+        self.texts = []
+        self.embedding_cache_stats = {"hits": 0, "embedded": 0}
+
+    async def insert_texts(self, texts, **kwargs):
+        self.texts.extend(texts)
+
+
+def test_document_processor_should_run_through_staged_pipeline(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "_document_pipeline", None)
+    content = "# 高血压\n\n" + "高血压患者应低盐饮食，规律监测血压。" * 20 + "\n\n![血压趋势](https://img/bp.png)\n"
+    milvus, lightrag = _FakeMilvus(), _FakeLightRAG()
+    processor = DocumentProcessor("kb1", milvus, lightrag)
+    monkeypatch.setattr(processor, "_read_from_oss_sync", lambda bucket, key, file_type, source_url: content)
+
+    async def scenario():
+        try:
+            vectorized = await processor.vectorize_document("bp.md", "bucket", "bp.md")
+            full = await processor.process_document("bp.md", "bucket", "bp.md")
+            return vectorized, full, ingest_pipeline.get_document_pipeline_stats()
+        finally:
+            await ingest_pipeline.close_document_pipeline()
+
+    vectorized, full, stats = asyncio.run(scenario())
+
+    assert vectorized["chart_chunk_count"] == 1
+    assert vectorized["embedding_stats"] == {"chunks_per_second": 1.0}
+    assert len(milvus.inserted) == vectorized["chunk_count"] * 2
+    assert len(lightrag.texts) == full["chunk_count"]
+    assert list(stats["stages"]) == ["extract", "chunk", "embed", "store", "graph"]
+    assert stats["stages"]["graph"]["processed"] == 2
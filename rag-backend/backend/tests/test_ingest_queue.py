@@ -0,0 +1,211 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from backend.config.database import DatabaseFactory
+from backend.model.ingest_job import DocumentIngestJob
+from backend.service import ingest_queue
+
+
+@pytest.fixture
+def ingest_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'ingest.db'}")
+    monkeypatch.setenv("ASYNC_DB_URL", f"sqlite+aiosqlite:///{tmp_path / 'ingest.db'}")
+    monkeypatch.setattr(ingest_queue, "_ingest_table_ready", False)
+    monkeypatch.setattr(ingest_queue, "INGEST_RETRY_BASE_SECONDS", 0.0)
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    yield
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+
+
+async def _enqueue(document_id=1, mode="all", max_attempts=3):
+    return await ingest_queue.enqueue_ingest_job(
+        document_id, f"doc-{document_id}.md", mode,
+        payload={"url": "https://oss/doc.md", "collection_id": "kb1"},
+        max_attempts=max_attempts
+    )
+
+
+async def _expire_lease(job_id):
+    async with DatabaseFactory.create_async_session() as db:
+        await db.execute(
+            update(DocumentIngestJob).where(DocumentIngestJob.id == job_id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+def test_enqueue_should_dedup_active_job_per_document_and_mode(ingest_db):
+    async def scenario():
+        first = await _enqueue()
+        duplicate = await _enqueue()
+        other_mode = await _enqueue(mode="graph")
+        return first, duplicate, other_mode
+
+    first, duplicate, other_mode = asyncio.run(scenario())
+
+    assert first["created"] is True
+    assert duplicate["created"] is False
+    assert duplicate["job"]["id"] == first["job"]["id"]
+    assert other_mode["job"]["id"] != first["job"]["id"]
+
+
+def test_claim_should_lease_job_to_single_worker(ingest_db):
+    async def scenario():
+        await _enqueue()
+        claims = await asyncio.gather(*[ingest_queue.claim_ingest_job(f"w{i}", 60) for i in range(4)])
+        return [job for job in claims if job]
+
+    claimed = asyncio.run(scenario())
+
+    assert len(claimed) == 1
+    assert claimed[0]["status"] == "running"
+    assert claimed[0]["attempts"] == 1
+    assert claimed[0]["payload"]["collection_id"] == "kb1"
+
+
+def test_failed_job_should_retry_then_fail_after_max_attempts(ingest_db):
+    async def scenario():
+        job = (await _enqueue(max_attempts=2))["job"]
+        statuses = []
+        for _ in range(2):
+            claimed = await ingest_queue.claim_ingest_job("w1", 60)
+            statuses.append(await ingest_queue.fail_ingest_job(claimed["id"], "w1", "boom"))
+        jobs = await ingest_queue.get_document_ingest_jobs(job["document_id"])
+        return statuses, jobs[0], await ingest_queue.claim_ingest_job("w1", 60)
+
+    statuses, job, next_claim = asyncio.run(scenario())
+
+    assert statuses == ["queued", "failed"]
+    assert job["attempts"] == 2
+    assert job["last_error"] == "boom"
+    assert next_claim is None
+
+
+def test_expired_lease_should_be_reclaimed_by_another_worker(ingest_db):
+    async def scenario():
+        await _enqueue()
+        job = await ingest_queue.claim_ingest_job("w1", 60)
+        assert await ingest_queue.claim_ingest_job("w2", 60) is None
+        await _expire_lease(job["id"])
+        reclaimed = await ingest_queue.claim_ingest_job("w2", 60)
+        stale_complete = await ingest_queue.complete_ingest_job(job["id"], "w1")
+        stale_extend = await ingest_queue.extend_ingest_job_lease(job["id"], "w1", 60)
+        return reclaimed, stale_complete, stale_extend
+
+    reclaimed, stale_complete, stale_extend = asyncio.run(scenario())
+
+    assert reclaimed["lease_owner"] == "w2"
+    assert reclaimed["attempts"] == 2
+    assert stale_complete is False
+    assert stale_extend is False
+
+
+def test_worker_should_process_jobs_and_report_snapshot(ingest_db):
+    handled = []
+
+    async def handler(job):
+        handled.append(job["document_id"])
+        if job["document_id"] == 2:
+            raise RuntimeError("parse failed")
+        return {"chunks": 3}
+
+    async def scenario():
+        for document_id in (1, 2, 3):
+            await _enqueue(document_id, max_attempts=1)
+        worker = ingest_queue.IngestWorker(handler=handler, worker_id="w1", concurrency=2, visibility_timeout=60)
+        before = await ingest_queue.get_ingest_queue_snapshot()
+        while await worker.run_once():
+            await worker.drain()
+        return before, await ingest_queue.get_ingest_queue_snapshot(), await ingest_queue.get_document_ingest_jobs(1)
+
+    before, after, jobs = asyncio.run(scenario())
+
+    assert before["queued_count"] == 3
+    assert sorted(handled) == [1, 2, 3]
+    assert after["queued_count"] == after["running_count"] == 0
+    assert [job["document_id"] for job in after["failed"]] == [2]
+    assert jobs[0]["status"] == "succeeded"
+    assert jobs[0]["result"] == {"chunks": 3}
+
+
+def test_lost_lease_should_cancel_handler_without_touching_job_state(ingest_db, monkeypatch):
+    events = []
+
+    async def handler(job):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            events.append("handler_cancelled")
+            raise
+        return {"chunks": 1}
+
+    async def lost_lease(job_id, worker_id, visibility_timeout):
+        return False
+
+    def record(name):
+        async def _record(*args, **kwargs):
+            events.append(name)
+        return _record
+
+    async def scenario():
+        await _enqueue()
+        monkeypatch.setattr(ingest_queue, "extend_ingest_job_lease", lost_lease)
+        monkeypatch.setattr(ingest_queue, "complete_ingest_job", record("complete"))
+        monkeypatch.setattr(ingest_queue, "fail_ingest_job", record("fail"))
+        worker = ingest_queue.IngestWorker(handler=handler, worker_id="w1", concurrency=1, visibility_timeout=3)
+        assert await worker.run_once() == 1
+        await asyncio.wait_for(worker.drain(), timeout=5)
+        return worker.active_count
+
+    active = asyncio.run(scenario())
+
+    assert events == ["handler_cancelled"]
+    assert active == 0
+
+
+def test_heartbeat_should_retry_failed_renewals_until_lease_expires(ingest_db, monkeypatch):
+    events = []
+
+    async def handler(job):
+        try:
+            await asyncio.sleep(job["sleep"])
+        except asyncio.CancelledError:
+            events.append(f"handler_cancelled:{job['id']}")
+            raise
+        return {"chunks": 1}
+
+    async def flaky_extend(job_id, worker_id, visibility_timeout):
+        # 任务 1 只失败一次；任务 2 一直失败
+        events.append(f"extend:{job_id}")
+        if job_id == 2 or events.count("extend:1") == 1:
+            raise RuntimeError("database is locked")
+        return True
+
+    def record(name):
+        async def _record(job_id, *args, **kwargs):
+            events.append(f"{name}:{job_id}")
+        return _record
+
+    async def run(document_id, sleep):
+        job = (await _enqueue(document_id))["job"]
+        worker = ingest_queue.IngestWorker(
+            handler=lambda job: handler(dict(job, sleep=sleep)), worker_id="w1", concurrency=1, visibility_timeout=3
+        )
+        assert await worker.run_once() == 1
+        await asyncio.wait_for(worker.drain(), timeout=6)
+        return job["id"]
+
+    async def scenario():
+        monkeypatch.setattr(ingest_queue, "extend_ingest_job_lease", flaky_extend)
+        monkeypatch.setattr(ingest_queue, "complete_ingest_job", record("complete"))
+        monkeypatch.setattr(ingest_queue, "fail_ingest_job", record("fail"))
+        return await run(1, 2.5), await run(2, 30)
+
+    assert asyncio.run(scenario()) == (1, 2)
+    assert "complete:1" in events and "handler_cancelled:1" not in events
+    assert events.count("extend:2") == 3
+    assert events[-1] == "handler_cancelled:2"
+    assert "complete:2" not in events and "fail:2" not in events
@@ -0,0 +1,31 @@
+import asyncio
+
+from backend.rag.storage.lightrag_storage import LightRAGStorage
+
+
+class _FakeRAG:
+    def __init__(self):
+        self.calls = []
+
+    async def ainsert(self, input, ids=None, file_paths=None):
+        self.calls.append({"input": list(input), "ids": list(ids), "file_paths": file_paths})
+
+
+def test_insert_texts_should_batch_dedupe_and_report_progress():
+    storage = LightRAGStorage(workspace="kb1")
+    storage.rag = _FakeRAG()
+    progress = []
+
+    async def on_progress(done, total):
+        progress.append((done, total))
+
+    texts = [f"分块{i}：高血压管理要点" for i in range(5)] + ["分块0：高血压管理要点", "  "]
+    stats = asyncio.run(storage.insert_texts(texts, batch_size=2, file_path="bp.md", progress_callback=on_progress))
+
+    calls = storage.rag.calls
+    assert [len(call["input"]) for call in calls] == [2, 2, 1]
+    assert calls[0]["ids"] == [LightRAGStorage.doc_id_for_text(text) for text in texts[:2]]
+    assert calls[0]["file_paths"] == ["bp.md", "bp.md"]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+    assert stats["total"] == 5
+    assert stats["batches"] == 3
@@ -0,0 +1,84 @@
+from langchain.text_splitter import MarkdownHeaderTextSplitter
+
+from backend.rag.chunks.chunks import TextChunker
+from backend.rag.chunks.markdown_outline import parse_markdown_outline
+from backend.scripts.benchmark_markdown_outline import build_guideline, legacy_chunk
+from backend.service.ingest_tasks import build_chart_chunks, chunk_config_for, chunk_document_with_charts
+
+GUIDELINE = """前言说明，本指南适用于成人高血压。
+
+# 高血压指南
+## 药物治疗
+推荐首选ACEI类药物（证据等级：A）。
+![降压流程](images/flow.png)
+第 12 页
+
+| 药物 | 剂量 |
+| --- | --- |
+| 氨氯地平 | 5 mg |
+
+```
+# 这不是标题
+![代码里的图](skip.png)
+```
+## 禁忌
+妊娠期禁用。<img src="https://cdn.example.com/c.png" alt="x">
+### 特殊人群 ###
+老年人慎用。
+"""
+
+
+def test_outline_should_record_headings_with_offsets_and_paths():
+    outline = parse_markdown_outline(GUIDELINE)
+
+    assert [(h.level, h.title) for h in outline.headings] == [
+        (1, "高血压指南"), (2, "药物治疗"), (2, "禁忌"), (3, "特殊人群")
+    ]
+    special = outline.headings[-1]
+    assert special.path == ("高血压指南", "禁忌", "特殊人群")
+    assert GUIDELINE[special.start:special.end] == "### 特殊人群 ###\n"
+    assert outline.section_title_at(GUIDELINE.index("老年人")) == "特殊人群"
+    assert outline.section_title_at(0) == "未标注章节"
+
+
+def test_outline_should_locate_images_and_skip_code_fences():
+    outline = parse_markdown_outline(GUIDELINE)
+
+    assert [(image.url, image.kind) for image in outline.images] == [
+        ("images/flow.png", "markdown"), ("https://cdn.example.com/c.png", "html")
+    ]
+    assert outline.images[0].alt == "降压流程"
+    assert GUIDELINE[outline.images[0].start:outline.images[0].end] == "![降压流程](images/flow.png)"
+
+
+def test_outline_sections_should_match_markdown_header_splitter():
+    config = chunk_config_for("md")
+    expected = [
+        (next(doc.metadata[f"Header_{n}"] for n in range(6, 0, -1) if doc.metadata.get(f"Header_{n}")), doc.page_content)
+        for doc in MarkdownHeaderTextSplitter(headers_to_split_on=config.headers_to_split_on).split_text(
+            "# 总则\n概述内容\n## 用法\n每日一次\n\n## 禁忌\n妊娠禁用\n"
+        )
+    ]
+    outline = parse_markdown_outline("# 总则\n概述内容\n## 用法\n每日一次\n\n## 禁忌\n妊娠禁用\n")
+
+    actual = [(section.title, outline.section_text(section)) for section in outline.sections()]
+
+    assert actual == expected
+
+
+def test_medical_chunking_and_charts_should_share_outline():
+    content = build_guideline(200 * 1024)
+
+    text_result, chart_result = chunk_document_with_charts(content, "guide.md", "md", "https://oss.example.com/docs/guide.md")
+
+    assert (text_result.total_chunks, chart_result.total_chunks) == legacy_chunk(content, "guide.md")
+    assert all(chunk.metadata["section_title"] != "未标注章节" for chunk in text_result.chunks)
+    first_chart = chart_result.chunks[0].metadata
+    assert first_chart["chart_image_url"].startswith("https://oss.example.com/docs/images/")
+    assert first_chart["section_title"].endswith("用药方案")
+    assert first_chart["page_number"] is not None
+    # 复用大纲与单独解析结果一致
+    assert [c.page_content for c in build_chart_chunks(content, "guide.md", None).chunks] == [
+        c.page_content for c in build_chart_chunks(content, "guide.md", None, parse_markdown_outline(content)).chunks
+    ]
+    assert len(TextChunker()._split_medical_sections(content, chunk_config_for("md"))) > 1
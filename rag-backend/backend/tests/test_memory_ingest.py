@@ -0,0 +1,296 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.config.database import DatabaseFactory
+from backend.model.memory import UserMemoryEvent, UserMemoryProfile
+from backend.service import memory
+from backend.service import memory_ingest
+from backend.service.memory_ingest import MemoryIngestWorker, _decode_job
+
+
+@pytest.fixture
+def memory_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'memory.db'}")
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setattr(DatabaseFactory, "_Session", None)
+    monkeypatch.setattr(memory, "_memory_tables_ready", False)
+    monkeypatch.setattr(memory, "get_sync_redis_client", lambda: None)
+    yield
+    DatabaseFactory.get_engine().dispose()
+
+
+def _job(user_id, message, assistant=None, job_id=None, conversation_id="conv-1"):
+    return memory.build_memory_write_job(
+        user_id=user_id,
+        collection_id="kb1",
+        conversation_id=conversation_id,
+        user_message=message,
+        assistant_message=assistant,
+        job_id=job_id
+    )
+
+
+def _rows(model):
+    db = DatabaseFactory.create_session()
+    try:
+        return [
+            row.to_internal_dict() if model is UserMemoryEvent else row.to_dict()
+            for row in db.query(model).order_by(model.id.asc()).all()
+        ]
+    finally:
+        db.close()
+
+
+def test_write_user_memory_batch_should_merge_jobs_across_users(memory_db):
+    jobs = [
+        _job("u1", "我今年45岁，患有高血压，请用中文回答", assistant="建议您规律监测血压并低盐饮食，高血压患者需要长期随访管理"),
+        _job("u2", "我今年30岁，想了解糖尿病的饮食注意事项"),
+        _job("u1", "我今年46岁，最近血压控制得还不错", conversation_id="conv-2"),
+    ]
+
+    stats = memory.write_user_memory_batch(jobs)
+
+    profiles = {(item["user_id"], item["memory_key"]): item for item in _rows(UserMemoryProfile)}
+    events = _rows(UserMemoryEvent)
+    assert stats["jobs"] == 3
+    assert profiles[("u1", "age")]["memory_value"] == "46"
+    assert profiles[("u2", "age")]["memory_value"] == "30"
+    assert [(item["user_id"], item["role"]) for item in events] == [
+        ("u1", "user"), ("u1", "assistant"), ("u2", "user"), ("u1", "user")
+    ]
+
+
+def test_write_user_memory_batch_should_be_idempotent_on_redelivery(memory_db):
+    job = _job("u1", "我今年45岁，患有高血压", assistant="建议您规律监测血压并低盐饮食，高血压患者需要长期随访管理", job_id="job-1")
+
+    first = memory.write_user_memory_batch([job])
+    replay = memory.write_user_memory_batch([job, dict(job)])
+
+    assert first["events"] == 2
+    assert replay["replayed"] == 2
+    assert replay["events"] == 0
+    assert len(_rows(UserMemoryEvent)) == 2
+    age = [item for item in _rows(UserMemoryProfile) if item["memory_key"] == "age"][0]
+    assert age["confidence"] == pytest.approx(0.8)
+
+
+class _FakeStream:
+    """只实现消费者用到的 Redis Stream 命令"""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.acked = []
+        self.deleted = []
+
+    async def xgroup_create(self, *args, **kwargs):
+        pass
+
+    async def xautoclaim(self, *args, **kwargs):
+        return ["0-0", []]
+
+    async def xreadgroup(self, group, consumer, streams, count, block):
+        batch, self.messages = self.messages[:count], self.messages[count:]
+        return [(memory_ingest.MEMORY_INGEST_STREAM, batch)] if batch else []
+
+    def pipeline(self, transaction=False):
+        stream = self
+
+        class _Pipeline:
+            def xack(self, name, group, *ids):
+                stream.acked.extend(ids)
+
+            def xdel(self, name, *ids):
+                stream.deleted.extend(ids)
+
+            async def execute(self):
+                return []
+
+        return _Pipeline()
+
+
+def test_worker_should_retry_jobs_individually_and_keep_only_failures_pending(monkeypatch):
+    jobs = [_job("u1", "第一条", job_id="ok-1"), _job("u2", "第二条", job_id="bad"), _job("u3", "第三条", job_id="ok-2")]
+    stream = _FakeStream(
+        [(f"1-{n}", {"job": json.dumps(job)}) for n, job in enumerate(jobs)] + [("1-9", {"job": "not-json"})]
+    )
+    calls = []
+
+    def _write(batch):
+        calls.append([job["job_id"] for job in batch])
+        if any(job["job_id"] == "bad" for job in batch):
+            raise RuntimeError("写入失败")
+        return {"jobs": len(batch), "events": len(batch), "replayed": 0}
+
+    monkeypatch.setattr(memory_ingest, "write_user_memory_batch", _write)
+    worker = MemoryIngestWorker(redis_client=stream, batch_size=10)
+
+    acked = asyncio.run(worker.run_once())
+
+    assert calls == [["ok-1", "bad", "ok-2"], ["ok-1"], ["bad"], ["ok-2"]]
+    assert acked == 3
+    assert sorted(stream.acked) == ["1-0", "1-2", "1-9"]
+    assert stream.deleted == stream.acked
+
+
+def test_replay_should_reindex_events_whose_vector_write_failed(memory_db, monkeypatch):
+    monkeypatch.setattr(memory, "MEMORY_VECTOR_ENABLED", True)
+    indexed = []
+
+    def _index(collection_id, events):
+        if not indexed:
+            indexed.append(None)
+            raise RuntimeError("embedding 服务不可用")
+        indexed.extend(event["id"] for event in events)
+        return True
+
+    monkeypatch.setattr(memory, "_index_events_to_vector", _index)
+    job = _job("u1", "我今年45岁，患有高血压", assistant="建议您规律监测血压并低盐饮食，高血压患者需要长期随访管理", job_id="job-v")
+
+    with pytest.raises(RuntimeError):
+        memory.write_user_memory_batch([job])
+    db = DatabaseFactory.create_session()
+    try:
+        assert all(row.vector_indexed_at is None for row in db.query(UserMemoryEvent).all())
+    finally:
+        db.close()
+
+    replay = memory.write_user_memory_batch([job])
+    again = memory.write_user_memory_batch([job])
+
+    assert (replay["replayed"], replay["reindexed"], replay["events"]) == (1, 2, 0)
+    assert sorted(indexed[1:]) == [item["id"] for item in _rows(UserMemoryEvent)]
+    assert again["reindexed"] == 0
+
+
+def test_decode_job_should_reject_invalid_payload():
+    job = _job("u1", "你好，我想咨询血压问题", job_id="job-2")
+
+    assert _decode_job({"job": json.dumps(job)})["job_id"] == "job-2"
+    assert _decode_job({"job": "not-json"}) is None
+    assert _decode_job({}) is None
+
+
+class _DictCache:
+    def __init__(self, delay=0.0):
+        self.data = {}
+        self.delay = delay
+
+    def pipeline(self, transaction=False):
+        return _DictCachePipeline(self)
+
+
+class _DictCachePipeline:
+    def __init__(self, cache):
+        self.cache = cache
+        self.ops = []
+
+    def get(self, key):
+        self.ops.append(("get", key, None))
+
+    def setex(self, key, ttl, value):
+        self.ops.append(("set", key, value))
+
+    async def execute(self):
+        await asyncio.sleep(self.cache.delay)
+        results = []
+        for op, key, value in self.ops:
+            if op == "get":
+                results.append(self.cache.data.get(key))
+            else:
+                self.cache.data[key] = value
+                results.append(True)
+        return results
+
+
+@pytest.fixture
+def async_memory_db(memory_db, tmp_path, monkeypatch):
+    monkeypatch.setenv("ASYNC_DB_URL", f"sqlite+aiosqlite:///{tmp_path / 'memory.db'}")
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+    yield
+    asyncio.run(DatabaseFactory.dispose_async_engine())
+
+
+def test_memory_context_async_should_load_concurrently_and_fill_cache(async_memory_db):
+    memory.write_user_memory_batch([
+        _job("u1", "我今年45岁，患有高血压，请用中文回答", assistant="建议您规律监测血压并低盐饮食，高血压患者需要长期随访管理")
+    ])
+    cache = _DictCache()
+
+    first = asyncio.run(memory.get_user_memory_context_async(
+        "u1", "kb1", "高血压怎么控制", redis_client=cache, enforce_relevance=False
+    ))
+    second = asyncio.run(memory.get_user_memory_context_async(
+        "u1", "kb1", "高血压怎么控制", redis_client=cache, enforce_relevance=False
+    ))
+
+    assert first["source"] == "db"
+    assert {item["memory_key"] for item in first["profiles"]} >= {"age", "conditions"}
+    assert len(first["events"]) == 2
+    assert {"cache", "profiles", "events", "vector", "total"} <= set(first["latency_ms"])
+    assert first["partial"] is False
+    assert second["source"] == "cache"
+    assert second["profiles"] == first["profiles"]
+    # 词元签名只在缓存与排序中使用，不出现在对外返回的记忆里
+    assert "content_tokens" in json.loads(cache.data[memory._event_cache_key("u1", "kb1")])[0]
+    assert all("content_tokens" not in item for item in first["events"] + second["events"])
+    assert set(second["events"][0]) >= {"id", "content", "created_at"}
+
+
+def test_memory_context_async_should_return_partial_result_on_budget_exceeded(async_memory_db):
+    slow_cache = _DictCache(delay=0.5)
+
+    result = asyncio.run(memory.get_user_memory_context_async(
+        "u1", "kb1", "高血压", redis_client=slow_cache, time_budget_ms=50
+    ))
+
+    assert result["partial"] is True
+    assert "cache" in result["timed_out"]
+    assert result["latency_ms"]["total"] < 400
+
+
+def test_events_should_persist_token_signature_and_rank_with_it(memory_db, monkeypatch):
+    monkeypatch.setattr(memory, "_event_token_index_cache", memory.OrderedDict())
+    memory.write_user_memory_batch([
+        _job("u1", "我今年45岁，患有高血压，请用中文回答", assistant="建议您规律监测血压并低盐饮食，高血压患者需要长期随访管理")
+    ])
+    events = _rows(UserMemoryEvent)
+    legacy = [dict(item, content_tokens=None) for item in events]
+
+    ranked = memory._rank_events(events, "高血压 饮食", limit=5)
+    ranked_legacy = memory._rank_events(legacy, "高血压 饮食", limit=5)
+
+    assert all(item["content_tokens"]["v"] == memory.MEMORY_EVENT_SIGNATURE_VERSION for item in events)
+    assert "高血压" in events[0]["content_tokens"]["tokens"]
+    assert [item["memory_relevance"] for item in ranked] == [item["memory_relevance"] for item in ranked_legacy]
+    assert ranked[0]["memory_relevance"] > 0
+    assert memory._get_event_token_index(events) is memory._get_event_token_index(events)
+
+
+def test_schema_upgrade_should_defer_token_signature_backfill(memory_db):
+    engine = DatabaseFactory.get_engine()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE user_memory_events (id INTEGER PRIMARY KEY, user_id VARCHAR(64) NOT NULL, "
+            "conversation_id VARCHAR(64) NOT NULL, collection_id VARCHAR(128) NOT NULL, role VARCHAR(20) NOT NULL, "
+            "content TEXT NOT NULL, importance FLOAT NOT NULL, source VARCHAR(64) NOT NULL, extra_data JSON, "
+            "expires_at DATETIME, created_at DATETIME)"
+        )
+        for content in ("最近血压偏高", "血糖控制稳定", "每天步行半小时"):
+            conn.exec_driver_sql(
+                "INSERT INTO user_memory_events (user_id, conversation_id, collection_id, role, content, importance, source) "
+                f"VALUES ('u1', 'conv-1', 'kb1', 'user', '{content}', 0.6, 'chat')"
+            )
+
+    assert memory._ensure_memory_tables() is True
+    legacy = _rows(UserMemoryEvent)
+    assert all(item["content_tokens"] is None for item in legacy)
+    assert memory._rank_events(legacy, "血压", limit=1)[0]["content"] == "最近血压偏高"
+
+    assert memory.backfill_event_token_signatures(batch_size=2, max_batches=1) == 2
+    assert memory.backfill_event_token_signatures(batch_size=2) == 1
+    assert memory.backfill_event_token_signatures(batch_size=2) == 0
+    events = _rows(UserMemoryEvent)
+    assert "血压" in events[0]["content_tokens"]["tokens"]
+    assert all(item["content_tokens"] is not None for item in events)
@@ -0,0 +1,105 @@
+import pytest
+from langchain_core.documents import Document
+
+from backend.config.database import DatabaseFactory
+from backend.service import memory
+
+
+class _FakeVectorStore:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add_documents(self, documents, ids):
+        self.storage.documents.extend(documents)
+
+
+class _FakeMemoryStorage:
+    def __init__(self, collection_name, partition_key=None, hits=None):
+        self.collection_name = collection_name
+        self.partition_key = partition_key
+        self.hits = hits or []
+        self.documents = []
+        self.search_calls = []
+        self.index_calls = []
+        self.dropped = False
+        self.vector_store = _FakeVectorStore(self)
+
+    def hybrid_search(self, query, k=4, **kwargs):
+        self.search_calls.append({"query": query, "k": k, **kwargs})
+        return self.hits[:k]
+
+    def get_partition_key_field(self):
+        return self.partition_key
+
+    def ensure_scalar_indexes(self, field_names):
+        self.index_calls.append(list(field_names))
+        return list(field_names)
+
+    def drop_collection(self):
+        self.dropped = True
+        return {"status": "success"}
+
+
+@pytest.fixture
+def vector_memory(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'memory.db'}")
+    monkeypatch.setattr(DatabaseFactory, "_engine", None)
+    monkeypatch.setattr(DatabaseFactory, "_Session", None)
+    monkeypatch.setattr(memory, "_memory_tables_ready", False)
+    monkeypatch.setattr(memory, "get_sync_redis_client", lambda: None)
+    monkeypatch.setattr(memory, "MEMORY_VECTOR_ENABLED", True)
+    monkeypatch.setattr(memory, "_memory_vector_storage_cache", {})
+    monkeypatch.setattr(memory, "_memory_vector_indexed_collections", set())
+    yield
+    DatabaseFactory.get_engine().dispose()
+
+
+def test_filter_expr_should_quote_user_and_collection():
+    expr = memory._memory_vector_filter_expr('u"1', "kb1")
+
+    assert expr == 'user_id == "u\\"1" and collection_id == "kb1"'
+
+
+def test_vector_retrieval_should_push_filter_into_search(vector_memory, monkeypatch):
+    hits = [Document(page_content="血压", metadata={"event_id": str(i)}) for i in (3, 3, 5, 7)]
+    storage = _FakeMemoryStorage("memory_events_kb1", partition_key="user_id", hits=hits)
+    monkeypatch.setattr(memory, "_get_memory_vector_storage", lambda collection_id: storage)
+
+    event_ids = memory._retrieve_vector_event_ids("u1", "kb1", "高血压", top_k=3)
+
+    assert event_ids == ["3", "5"]
+    assert storage.search_calls[0]["k"] == 3
+    assert storage.search_calls[0]["expr"] == 'user_id == "u1" and collection_id == "kb1"'
+
+
+def test_migration_should_rebuild_legacy_collection_from_events(vector_memory, monkeypatch):
+    monkeypatch.setattr(memory, "_get_memory_vector_storage", lambda collection_id: None)
+    memory.write_user_memory_batch([
+        memory.build_memory_write_job(
+            user_id=user_id,
+            collection_id="kb1",
+            conversation_id="conv-1",
+            user_message=f"我今年{age}岁，患有高血压，想了解饮食注意事项"
+        )
+        for user_id, age in (("u1", 45), ("u2", 52), ("u3", 61))
+    ])
+    legacy = _FakeMemoryStorage("memory_events_kb1")
+    rebuilt = _FakeMemoryStorage("memory_events_kb1", partition_key="user_id")
+    storages = [legacy, rebuilt]
+    monkeypatch.setattr(memory, "_get_memory_vector_storage", lambda collection_id: storages[0])
+
+    def _drop():
+        storages.pop(0)
+        return {"status": "success"}
+
+    legacy.drop_collection = _drop
+
+    result = memory.migrate_memory_vector_collection("kb1", batch_size=2)
+    second = memory.migrate_memory_vector_collection("kb1")
+
+    assert memory.list_memory_vector_collection_ids() == ["kb1"]
+    assert result["success"] is True and result["migrated"] is True
+    assert result["indexed"] == 3
+    assert sorted(doc.metadata["user_id"] for doc in rebuilt.documents) == ["u1", "u2", "u3"]
+    assert rebuilt.index_calls[0] == ["user_id", "collection_id"]
+    assert second["migrated"] is False
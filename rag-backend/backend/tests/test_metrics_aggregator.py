@@ -0,0 +1,89 @@
+from backend.config.metrics import MetricsAggregator
+from backend.service import memory
+
+
+class _RecordingRedis:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.executed = []
+        self.transactions = []
+
+    def pipeline(self, transaction=True):
+        self.transactions.append(transaction)
+        return _RecordingPipeline(self)
+
+
+class _RecordingPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.ops.append((name, *args))
+        return record
+
+    def execute(self):
+        if self.client.fail_times > 0:
+            self.client.fail_times -= 1
+            raise ConnectionError("redis down")
+        self.client.executed.append(self.ops)
+        return [True] * len(self.ops)
+
+
+def test_aggregator_should_merge_increments_into_one_pipeline():
+    client = _RecordingRedis()
+    aggregator = MetricsAggregator(redis_client_factory=lambda: client, flush_interval=3600)
+    aggregator.incr("c:1")
+    aggregator.incr("c:1", 2)
+    aggregator.hincr("h:1", "total")
+    aggregator.hincr("h:1", "total")
+    aggregator.hincr("h:1", "fallback")
+    aggregator.observe("lat", 30, buckets=(10, 50, 100))
+
+    written = aggregator.flush()
+    aggregator.close()
+
+    assert written == 3
+    assert len(client.executed) == 1 and client.transactions == [True]
+    ops = client.executed[0]
+    assert ("incrby", "c:1", 3) in ops
+    assert ("hincrby", "h:1", "total", 2) in ops
+    assert ("hincrby", "h:1", "fallback", 1) in ops
+    assert ("hincrby", "lat", "le_50", 1) in ops and ("hincrby", "lat", "le_100", 1) in ops
+    assert not any(op[0] == "hincrby" and op[2] == "le_10" for op in ops)
+    assert sorted(op[1] for op in ops if op[0] == "expire") == ["c:1", "h:1", "lat"]
+
+
+def test_aggregator_should_keep_increments_when_flush_fails():
+    client = _RecordingRedis(fail_times=1)
+    aggregator = MetricsAggregator(redis_client_factory=lambda: client, flush_interval=3600)
+    aggregator.incr("c:1")
+
+    assert aggregator.flush() == 0
+    aggregator.incr("c:1")
+    assert aggregator.flush() == 1
+    assert ("incrby", "c:1", 2) in client.executed[0]
+    assert aggregator.pending_keys() == 0
+
+
+def test_memory_metrics_should_keep_minute_key_format(monkeypatch):
+    client = _RecordingRedis()
+    aggregator = MetricsAggregator(redis_client_factory=lambda: client, flush_interval=3600)
+    monkeypatch.setattr(memory, "get_metrics_aggregator", lambda: aggregator)
+
+    memory._inc_metric(object(), "read_db_hit", "kb1")
+    memory._inc_metric_by(object(), "profile_extract_candidates", "kb1", 3)
+    memory._inc_metric(None, "read_db_hit", "kb1")
+    aggregator.flush()
+
+    increments = {op[1]: op[2] for op in client.executed[0] if op[0] == "incrby"}
+    assert len(increments) == 2
+    for key, amount in increments.items():
+        prefix, minute = key.rsplit(":minute:", 1)
+        assert prefix in {
+            f"{memory.MEMORY_METRICS_PREFIX}:read_db_hit:collection:kb1",
+            f"{memory.MEMORY_METRICS_PREFIX}:profile_extract_candidates:collection:kb1",
+        }
+        assert len(minute) == 12
+    assert sorted(increments.values()) == [1, 3]
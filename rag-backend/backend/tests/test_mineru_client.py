@@ -0,0 +1,195 @@
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.rag.chunks import mineru_client
+from backend.rag.chunks.document_extraction import DocumentExtractor
+from backend.rag.chunks.mineru_client import AsyncMineruClient, MineruError
+
+
+class _FakeMineru:
+    """本地假 MinerU 服务：任务轮询 polls_needed 次后完成，URL 含 fail/hang 时分别失败/永不完成，
+    含 nozip/rawfile 时完成但分别不返回结果地址/返回非 zip 地址"""
+
+    def __init__(self, polls_needed=4):
+        self.polls_needed = polls_needed
+        self.tasks = {}
+        self.poll_times = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    task_id = f"task-{len(fake.tasks) + 1}"
+                    fake.tasks[task_id] = {"url": payload["url"], "polls": 0}
+                    fake.active += 1
+                    fake.max_active = max(fake.max_active, fake.active)
+                self._send(200, json.dumps({"code": 0, "data": {"task_id": task_id}}).encode())
+
+            def do_GET(self):
+                if self.path.startswith("/files/"):
+                    task_id = self.path.rsplit("/", 1)[-1][:-len(".zip")]
+                    buffer = io.BytesIO()
+                    with zipfile.ZipFile(buffer, "w") as archive:
+                        archive.writestr("result/full.md", f"# {fake.tasks[task_id]['url']}")
+                    with fake.lock:
+                        fake.active -= 1
+                    self._send(200, buffer.getvalue(), "application/zip")
+                    return
+                task_id = self.path.rsplit("/", 1)[-1]
+                with fake.lock:
+                    task = fake.tasks[task_id]
+                    task["polls"] += 1
+                    fake.poll_times.setdefault(task_id, []).append(time.monotonic())
+                if "fail" in task["url"]:
+                    data = {"state": "failed", "err_msg": "文件损坏"}
+                elif "hang" in task["url"] or task["polls"] < fake.polls_needed:
+                    data = {"state": "running", "extract_progress": {"extracted_pages": 1, "total_pages": 3}}
+                elif "nozip" in task["url"]:
+                    data = {"state": "done"}
+                elif "rawfile" in task["url"]:
+                    data = {"state": "done", "full_zip_url": f"{fake.base_url}/files/{task_id}.md"}
+                else:
+                    data = {"state": "done", "full_zip_url": f"{fake.base_url}/files/{task_id}.zip"}
+                self._send(200, json.dumps({"code": 0, "data": data}).encode())
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self, **kwargs):
+        options = {"max_concurrency": 2, "poll_initial_seconds": 0.02, "poll_max_seconds": 0.2, "timeout_seconds": 5}
+        options.update(kwargs)
+        return AsyncMineruClient(api_url=f"{self.base_url}/api/v4", api_key="test-key", **options)
+
+
+@pytest.fixture
+def fake_mineru():
+    fake = _FakeMineru()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def test_client_should_run_jobs_concurrently_within_cap(fake_mineru):
+    client = fake_mineru.client()
+    urls = [f"https://oss/doc-{i}.pdf" for i in range(6)]
+
+    async def scenario():
+        return await asyncio.gather(*(client.extract(url) for url in urls))
+
+    results = asyncio.run(scenario())
+
+    assert results == [f"# {url}" for url in urls]
+    assert fake_mineru.max_active == 2
+    intervals = [b - a for a, b in zip(fake_mineru.poll_times["task-1"], fake_mineru.poll_times["task-1"][1:])]
+    # 指数退避：间隔约为 0.02 -> 0.04 -> 0.08 秒
+    assert len(intervals) == 3
+    assert intervals[2] > intervals[0] * 2
+
+
+def test_client_should_raise_on_failed_or_timed_out_task(fake_mineru):
+    with pytest.raises(MineruError, match="文件损坏"):
+        asyncio.run(fake_mineru.client().extract("https://oss/fail.pdf"))
+    with pytest.raises(MineruError, match="超时"):
+        asyncio.run(fake_mineru.client(timeout_seconds=0.2).extract("https://oss/hang.pdf"))
+
+
+def test_client_should_raise_when_result_is_not_a_zip(fake_mineru):
+    with pytest.raises(MineruError, match="未返回结果文件URL"):
+        asyncio.run(fake_mineru.client().extract("https://oss/nozip.pdf"))
+    with pytest.raises(MineruError, match="不是zip"):
+        asyncio.run(fake_mineru.client().extract("https://oss/rawfile.pdf"))
+
+
+def test_concurrency_cap_should_hold_across_event_loops_in_threads(fake_mineru):
+    client = fake_mineru.client(max_concurrency=2)
+    results = []
+
+    def run_batch(batch):
+        async def scenario():
+            return await asyncio.gather(*(client.extract(f"https://oss/{batch}-{i}.pdf") for i in range(3)))
+
+        results.extend(asyncio.run(scenario()))
+
+    threads = [threading.Thread(target=run_batch, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(results) == 6
+    assert fake_mineru.max_active == 2
+    assert client.active == 0
+
+
+def test_cancelled_job_should_release_concurrency_slot(fake_mineru):
+    client = fake_mineru.client(max_concurrency=1)
+
+    async def scenario():
+        hanging = asyncio.create_task(client.extract("https://oss/hang.pdf"))
+        while "task-1" not in fake_mineru.poll_times:
+            await asyncio.sleep(0.01)
+        # 排队等待名额时被取消的任务也不能占走名额
+        queued = asyncio.create_task(client.extract("https://oss/queued.pdf"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        hanging.cancel()
+        for task in (queued, hanging):
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        return await asyncio.wait_for(client.extract("https://oss/next.pdf"), timeout=3)
+
+    assert asyncio.run(scenario()) == "# https://oss/next.pdf"
+    assert client.active == 0
+
+
+def test_queued_jobs_should_not_hold_executor_threads(fake_mineru):
+    client = fake_mineru.client(max_concurrency=1)
+
+    async def scenario():
+        from concurrent.futures import ThreadPoolExecutor
+
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        hanging = asyncio.create_task(client.extract("https://oss/hang.pdf"))
+        while "task-1" not in fake_mineru.poll_times:
+            await asyncio.sleep(0.01)
+        queued = [asyncio.create_task(client.extract(f"https://oss/q{n}.pdf")) for n in range(4)]
+        await asyncio.sleep(0.05)
+        # 排队中的任务不占用默认线程池，其他 to_thread 调用照常执行
+        value = await asyncio.wait_for(asyncio.to_thread(lambda: "free"), timeout=1)
+        for task in [hanging, *queued]:
+            task.cancel()
+        await asyncio.gather(hanging, *queued, return_exceptions=True)
+        return value
+
+    assert asyncio.run(scenario()) == "free"
+    assert client.active == 0
+
+
+def test_sync_extractor_should_delegate_to_async_client(monkeypatch, fake_mineru):
+    monkeypatch.setattr(mineru_client, "_mineru_client", fake_mineru.client())
+
+    content = DocumentExtractor().read_document("https://oss/guide.pdf", pdf_extract_method="mineru").content
+
+    assert content == "# https://oss/guide.pdf"
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from backend.service import oss_download
+from backend.service.document_processor import DocumentProcessor, PdfSource
+from backend.service.oss_download import LocalObjectBackend, download_object, download_to_spooled_file
+
+
+class _FlakyBackend:
+    """第一次连接写出 fail_after 字节后断开，之后正常"""
+
+    def __init__(self, inner, fail_after):
+        self.inner = inner
+        self.fail_after = fail_after
+        self.offsets = []
+
+    def open(self, bucket, key, offset, buffer_size):
+        self.offsets.append(offset)
+        chunks, total, handle = self.inner.open(bucket, key, offset, buffer_size)
+        if len(self.offsets) > 1:
+            return chunks, total, handle
+
+        def broken():
+            sent = 0
+            for block in chunks:
+                yield block
+                sent += len(block)
+                if sent >= self.fail_after:
+                    raise ConnectionResetError("connection reset by peer")
+
+        return broken(), total, handle
+
+
+def _put_object(root, bucket, key, data):
+    path = os.path.join(root, bucket, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+def test_download_should_resume_from_written_offset(tmp_path):
+    data = os.urandom(10_000)
+    _put_object(str(tmp_path), "bucket", "docs/scan.pdf", data)
+    backend = _FlakyBackend(LocalObjectBackend(str(tmp_path)), fail_after=4096)
+    target = tmp_path / "out.bin"
+
+    with open(target, "w+b") as file:
+        stats = download_object("bucket", "docs/scan.pdf", file, backend=backend, buffer_size=1024, retry_base_seconds=0)
+        assert file.read() == data
+
+    assert backend.offsets == [0, 4096]
+    assert stats["bytes"] == len(data) and stats["retries"] == 1
+
+
+def test_download_should_not_retry_missing_object(tmp_path):
+    backend = _FlakyBackend(LocalObjectBackend(str(tmp_path)), fail_after=1)
+    with open(os.devnull, "wb") as sink, pytest.raises(FileNotFoundError):
+        download_object("bucket", "missing.md", sink, backend=backend, retry_base_seconds=0)
+    assert backend.offsets == [0]
+
+
+def test_spooled_download_should_roll_large_objects_to_disk(tmp_path):
+    _put_object(str(tmp_path), "bucket", "small.md", b"# small")
+    _put_object(str(tmp_path), "bucket", "large.md", b"x" * 5000)
+    backend = LocalObjectBackend(str(tmp_path))
+
+    small, _ = download_to_spooled_file("bucket", "small.md", backend=backend, max_size=1024)
+    large, _ = download_to_spooled_file("bucket", "large.md", backend=backend, max_size=1024, buffer_size=512)
+    with small, large:
+        assert (small._rolled, large._rolled) == (False, True)
+        assert small.read() == b"# small"
+        assert len(large.read()) == 5000
+
+
+def test_processor_should_read_objects_from_local_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(oss_download, "OBJECT_STORE_BACKEND", "local")
+    monkeypatch.setattr(oss_download, "OBJECT_STORE_LOCAL_ROOT", str(tmp_path))
+    _put_object(str(tmp_path), "bucket", "指南/bp.md", "# 高血压\n低盐饮食".encode("utf-8"))
+    _put_object(str(tmp_path), "bucket", "scan.bin", b"%PDF-1.4\n%%EOF\n")
+    processor = DocumentProcessor("kb1", milvus_storage=None, lightrag_storage=None)
+
+    content = processor._read_from_oss_sync("bucket", "%E6%8C%87%E5%8D%97/bp.md", "md", None)
+    source = processor._read_from_oss_sync("bucket", "scan.bin", "", None)
+
+    assert content == "# 高血压\n低盐饮食"
+    assert isinstance(source, PdfSource) and source.path.endswith(".pdf")
+    with open(source.path, "rb") as file:
+        assert file.read().startswith(b"%PDF")
+    source.cleanup()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+from backend.rag.chunks.chunks import TextChunker
+from backend.rag.chunks.document_extraction import DocumentExtractor
+from backend.rag.chunks.models import PageContent
+from backend.service import document_processor, ingest_pipeline
+from backend.service.document_processor import DocumentProcessor, PdfSource
+from backend.service.ingest_tasks import chunk_config_for, plan_page_ranges
+from backend.tests.test_ingest_pipeline import _FakeLightRAG, _FakeMilvus
+
+
+def _page_lines(page_number):
+    return [f"Page {page_number} line {line} blood pressure follow up note." for line in range(1, 31)]
+
+
+def _write_pdf(path, page_count):
+    """生成每页若干行 ASCII 文本的最小 PDF"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_number in range(1, page_count + 1):
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in _page_lines(page_number)) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>"
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref_at = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as file:
+        file.write(body)
+
+
+def test_extractor_should_yield_pdf_pages_with_page_numbers(tmp_path):
+    path = str(tmp_path / "guide.pdf")
+    _write_pdf(path, 4)
+    extractor = DocumentExtractor()
+
+    pages = list(extractor.iter_pdf_pages(path, start_page=2, end_page=3))
+
+    assert extractor.count_pdf_pages(path) == 4
+    assert [page.page_number for page in pages] == [2, 3]
+    assert "Page 2 line 1" in pages[0].content and "Page 3 line 30" in pages[1].content
+    full = extractor.read_document(path).content
+    assert full == "".join(page.content for page in extractor.iter_pdf_pages(path))
+
+
+def test_page_chunks_should_carry_window_tail_and_keep_page_numbers():
+    pages = [PageContent("\n".join(_page_lines(n)), n, "guide.pdf") for n in range(1, 7)]
+    config = chunk_config_for("pdf")
+
+    streamed = list(TextChunker().iter_page_chunks(pages, config, "guide.pdf", window_chars=1500))
+
+    for page_number in range(1, 7):
+        for line in _page_lines(page_number):
+            holders = [chunk for chunk in streamed if line in chunk.page_content]
+            # 窗口边界没有截断任何一行，且分块页码覆盖该行所在页
+            assert holders, line
+            assert any(c.metadata["page_number"] <= page_number <= c.metadata["page_end"] for c in holders)
+    assert streamed[0].metadata["page_number"] == 1
+    assert streamed[-1].metadata["page_end"] == 6
+
+
+def test_plan_page_ranges_should_split_only_large_documents():
+    assert plan_page_ranges(0) == []
+    assert plan_page_ranges(10, parallel_min_pages=20, range_size=4) == [(1, 10)]
+    assert plan_page_ranges(10, parallel_min_pages=5, range_size=4) == [(1, 4), (5, 8), (9, 10)]
+
+
+def test_document_processor_should_stream_pdf_by_page_ranges(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest_pipeline, "_document_pipeline", None)
+    monkeypatch.setattr(document_processor, "plan_page_ranges", lambda count: plan_page_ranges(count, 2, 2))
+    path = str(tmp_path / "guide.pdf")
+    _write_pdf(path, 5)
+    milvus, lightrag = _FakeMilvus(), _FakeLightRAG()
+    processor = DocumentProcessor("kb1", milvus, lightrag)
+    monkeypatch.setattr(
+        processor, "_read_from_oss_sync",
+        lambda bucket, key, file_type, source_url: PdfSource(path=path, bucket=bucket, key=key)
+    )
+
+    async def scenario():
+        try:
+            return await processor.vectorize_document("guide.pdf", "bucket", "guide.pdf", file_type="pdf")
+        finally:
+            await ingest_pipeline.close_document_pipeline()
+
+    result = asyncio.run(scenario())
+
+    assert result["status"] == "success"
+    assert not os.path.exists(path)
+    documents = [document for document, _ in milvus.inserted]
+    assert [doc.metadata["chunk_index"] for doc in documents] == list(range(len(documents)))
+    assert {doc.metadata["page_number"] for doc in documents} == {1, 2, 3, 4, 5}
+    assert "Page 5 line 30" in documents[-1].page_content
@@ -10,7 +10,11 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
 
 from backend.agent.graph.raggraph_node import RAGNodes
 from backend.agent.models.raggraph_models import RetrievalMode
-from backend.agent.models.retrieval_classifier import RetrievalIntentClassifier
+from backend.agent.models.retrieval_classifier import (
+    RetrievalIntentClassifier,
+    compile_model_file,
+    load_compiled_model,
+)
 
 
 def test_retrieval_intent_classifier_should_return_unavailable_when_model_missing():
@@ -61,6 +65,53 @@ def test_retrieval_intent_classifier_should_predict_probability_from_model(tmp_p
     assert uncertain_result["band"] == "uncertain"
 
 
+def test_retrieval_intent_classifier_compiled_model_should_match_json_model(tmp_path: Path):
+    model_path = tmp_path / "retrieval_intent_nb_v1.json"
+    payload = {
+        "model_version": "nb-test",
+        "smoothing": 1.0,
+        "vocab_size": 4,
+        "class_counts": {"pos": 3, "neg": 4},
+        "token_totals": {"pos": 12, "neg": 9},
+        "token_counts": {
+            "药": {"pos": 6, "neg": 1},
+            "指": {"pos": 3, "neg": 1},
+            "你": {"pos": 1, "neg": 4},
+            "hello": {"pos": 2, "neg": 3},
+        },
+    }
+    model_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    questions = ["药物指南", "你好 hello", "今天", ""]
+
+    json_classifier = RetrievalIntentClassifier(model_path=str(model_path), enabled=True)
+    json_results = json_classifier.predict_many(questions)
+
+    compiled_path = compile_model_file(model_path)
+    assert compiled_path.suffix == ".nbc"
+    compiled = load_compiled_model(compiled_path)
+    assert compiled.vocab_size == 4
+    assert compiled.model_version == "nb-test"
+
+    compiled_classifier = RetrievalIntentClassifier(model_path=str(compiled_path), enabled=True)
+    compiled_results = compiled_classifier.predict_many(questions)
+
+    assert [item["probability"] for item in json_results] == [item["probability"] for item in compiled_results]
+    assert [item["decision"] for item in compiled_results] == [
+        compiled_classifier.predict(question)["decision"] for question in questions
+    ]
+    assert compiled_results[-1]["reason"] == "empty_input"
+
+
+def test_retrieval_intent_classifier_predict_many_should_report_unavailable():
+    classifier = RetrievalIntentClassifier(
+        model_path="/tmp/not-exists-retrieval-model.json",
+        enabled=True,
+    )
+    results = classifier.predict_many(["糖尿病", "你好"])
+    assert len(results) == 2
+    assert all(item["available"] is False for item in results)
+
+
 def test_check_retrieval_needed_should_use_statistical_classifier_before_llm():
     class _NoCallLLM:
         def with_structured_output(self, _schema):
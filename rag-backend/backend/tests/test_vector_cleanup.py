@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from backend.rag.chunks.chunks import TextChunker
+from backend.rag.chunks.models import ChunkResult, ChunkStrategy, DocumentContent, PageContent
+from backend.rag.storage import milvus_storage
+from backend.rag.storage.milvus_storage import MilvusStorage, knowledge_document_id, source_document_id
+from backend.service import vector_cleanup
+from backend.service.ingest_tasks import chunk_config_for
+
+
+class _FakeClient:
+    def __init__(self, fields):
+        self.fields = fields
+        self.deletes = []
+        self.indexes = []
+
+    def has_collection(self, name):
+        return True
+
+    def describe_collection(self, name):
+        return {"fields": [{"name": field} for field in self.fields]}
+
+    def delete(self, collection_name, filter):
+        self.deletes.append(filter)
+        return {"delete_count": 3}
+
+    def list_indexes(self, name):
+        return [f"idx_{field}" for field in self.indexes]
+
+    def describe_index(self, name, index_name):
+        return {"field_name": index_name[len("idx_"):]}
+
+    def prepare_index_params(self):
+        client = self
+
+        class _Params:
+            def add_index(self, field_name, **kwargs):
+                client.indexes.append(field_name)
+
+        return _Params()
+
+    def create_index(self, name, params):
+        pass
+
+
+class _FakeVectorStore:
+    def __init__(self, *args, metadata_schema=None, **kwargs):
+        self.client = _FakeClient(["pk", "text", "vector", "document_name", "document_id"])
+        self.metadata_schema = metadata_schema or {}
+        self.schema = None
+        self.inserted = []
+
+    def add_embeddings(self, texts, embeddings, metadatas, batch_size, ids):
+        # 与 langchain_milvus 一致：首次写入按第一条元数据建表，关闭动态字段，未声明可空的字段不接受 None
+        if self.schema is None:
+            self.schema = {
+                key: self.metadata_schema.get(key, {}).get("kwargs", {}).get("nullable", False)
+                for key in metadatas[0]
+            }
+        for metadata in metadatas:
+            for key, nullable in self.schema.items():
+                if metadata.get(key) is None and not nullable:
+                    raise ValueError(f"字段 {key} 不能为空")
+        self.inserted.extend({key: metadata.get(key) for key in self.schema} for metadata in metadatas)
+        return ids
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(milvus_storage, "Milvus", _FakeVectorStore)
+    monkeypatch.setattr(milvus_storage, "BM25BuiltInFunction", lambda: None)
+    return MilvusStorage(embedding_function=None, collection_name="kb1")
+
+
+def test_every_chunk_should_carry_stable_document_id(storage):
+    chunks = [Document(page_content="血压", metadata={}), Document(page_content="血糖", metadata={})]
+    tracked = ChunkResult(chunks, ChunkStrategy.MEDICAL_HYBRID, 2, "guide.md", document_id=knowledge_document_id(7))
+    crawled = ChunkResult(chunks, ChunkStrategy.MARKDOWN_HEADER, 2, "crawled_document")
+
+    documents = storage.prepare_documents([tracked, crawled])
+    storage.insert_embedded_documents(documents, [[0.1]] * len(documents))
+    storage.insert_embedded_documents(documents, [[0.1]] * len(documents))
+
+    assert [doc.metadata["document_id"] for doc in documents] == ["kb-7", "kb-7"] + [source_document_id("crawled_document")] * 2
+    assert source_document_id("https://a/1") == source_document_id("https://a/1") != source_document_id("https://a/2")
+    assert storage.vector_store.client.indexes == ["document_id"]
+
+
+def test_pdf_and_markdown_chunks_should_share_one_collection(storage):
+    pdf_chunks = list(TextChunker().iter_page_chunks(
+        [PageContent("第一页：血压控制目标。\n" * 40, 1, "guide.pdf"), PageContent("第二页：用药随访。\n" * 40, 2, "guide.pdf")],
+        chunk_config_for("pdf"), "guide.pdf"
+    ))
+    md_result = TextChunker().chunk_document(
+        DocumentContent(content="# 饮食\n低盐饮食。\n## 运动\n规律运动。", document_name="diet.md"), chunk_config_for("md")
+    )
+    pdf_result = ChunkResult(pdf_chunks, ChunkStrategy.MEDICAL_HYBRID, len(pdf_chunks), "guide.pdf", document_id="kb-1")
+
+    for order in ([md_result, pdf_result], [pdf_result, md_result]):
+        storage.vector_store.schema, storage.vector_store.inserted = None, []
+        documents = storage.prepare_documents(order)
+        storage.insert_embedded_documents(documents, [[0.1]] * len(documents))
+        assert {"page_number", "page_end"} <= set(storage.vector_store.schema)
+        by_name = {}
+        for row in storage.vector_store.inserted:
+            by_name.setdefault(row["document_name"], []).append(row["page_number"])
+        assert set(by_name["diet.md"]) == {None}
+        assert by_name["guide.pdf"][0] == 1 and None not in by_name["guide.pdf"]
+    assert storage.vector_store.metadata_schema["page_end"]["kwargs"] == {"nullable": True}
+    assert storage.vector_store.metadata_schema["evidence_level"]["kwargs"] == {"max_length": 64, "nullable": True}
+
+
+def test_delete_documents_should_batch_in_expressions(storage):
+    ids = [knowledge_document_id(n) for n in range(1, 6)] + ['kb-"x']
+
+    result = storage.delete_documents(ids, batch_size=4)
+
+    assert storage.vector_store.client.deletes == [
+        'document_id in ["kb-1", "kb-2", "kb-3", "kb-4"]',
+        'document_id in ["kb-5", "kb-\\"x"]',
+    ]
+    assert result["status"] == "success"
+    assert (result["batches"], result["delete_count"], result["document_count"]) == (2, 6, 6)
+
+
+def test_legacy_collection_should_delete_by_document_name(storage):
+    storage.vector_store.client.fields = ["pk", "text", "vector", "document_name"]
+
+    result = storage.delete_documents(["kb-1"], document_names=["指南.pdf"])
+    storage.delete_document('a"b.md')
+
+    assert result["field"] == "document_name"
+    assert storage.vector_store.client.deletes == ['document_name in ["指南.pdf"]', 'document_name == "a\\"b.md"']
+
+
+def test_cleanup_task_should_track_completion(storage):
+    failing = MilvusStorage.__new__(MilvusStorage)
+    failing.delete_documents = lambda ids, names: {"status": "error", "error": "连接失败"}
+
+    async def scenario():
+        ok = vector_cleanup.submit_vector_cleanup("kb1", ["kb-1", "kb-2"], storage_factory=lambda collection_id: storage)
+        bad = vector_cleanup.submit_vector_cleanup("kb1", ["kb-3"], storage_factory=lambda collection_id: failing)
+        assert ok["status"] == "pending"
+        return await vector_cleanup.wait_vector_cleanup(ok["task_id"]), await vector_cleanup.wait_vector_cleanup(bad["task_id"])
+
+    done, failed = asyncio.run(scenario())
+
+    assert done["status"] == "success" and done["result"]["delete_count"] == 3
+    assert done["finished_at"] is not None
+    assert failed["status"] == "error" and failed["error"] == "连接失败"
+    assert vector_cleanup.get_vector_cleanup("missing") is None
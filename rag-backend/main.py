@@ -5,6 +5,13 @@ RAG Backend 主入口
 """
 
 from backend.config.log import setup_default_logging, get_logger
+from backend.config.database import DatabaseFactory
+from backend.config.metrics import shutdown_metrics_aggregator
+from backend.config.milvus import MilvusClientFactory
+from backend.service.memory_ingest import start_memory_ingest_worker, stop_memory_ingest_worker
+from backend.service.ingest_queue import start_ingest_worker, stop_ingest_worker
+from backend.service.ingest_pipeline import close_document_pipeline
+from backend.service.ingest_executor import shutdown_cpu_executor
 from fastapi import FastAPI
 from backend.api import rag, chat, auth, crawl, knowledge_library,visual_graph
 from dotenv import load_dotenv
@@ -21,8 +28,17 @@ async def lifespan(app: FastAPI):
 
     logger = get_logger(__name__)
     logger.info("FastAPI 应用启动中...")
+    start_memory_ingest_worker()    # 内嵌记忆写入消费者（可独立部署）
+    start_ingest_worker()    # 内嵌文档入库 worker（可独立部署）
     yield
-    # 关闭时执行（如果需要清理资源）
+    # 关闭时执行：停止后台消费者并释放异步数据库连接池
+    await stop_memory_ingest_worker()
+    await stop_ingest_worker()
+    await close_document_pipeline()
+    shutdown_cpu_executor()    # 回收入库 CPU 子进程
+    shutdown_metrics_aggregator()    # 写出进程内尚未落地的指标
+    MilvusClientFactory.close_all()    # 关闭共享的 Milvus 客户端
+    await DatabaseFactory.dispose_async_engine()
 
 app = FastAPI(title="RAG Demo API", version="1.0.0", lifespan=lifespan)
 
@@ -158,6 +158,47 @@ export async function getSingleConversationHistory(conversationId) {
   }
 }
 
+/**
+ * 键集分页获取会话历史（默认不含节点轨迹）
+ * @param {string} conversationId - 会话ID
+ * @param {Object} [options] - 分页参数
+ * @param {number} [options.beforeId] - 翻页游标（上一页返回的 next_before_id）
+ * @param {number} [options.limit] - 每页条数
+ * @param {boolean} [options.includeTraces] - 是否包含节点轨迹
+ * @returns {Promise<Object>} 分页历史响应
+ */
+export async function getConversationHistoryPage(conversationId, { beforeId = null, limit = 50, includeTraces = false } = {}) {
+  try {
+    const params = { limit, include_traces: includeTraces }
+    if (beforeId) params.before_id = beforeId
+    const response = await httpClient.get(`/llm/history/page/${conversationId}`, params)
+    return response
+  } catch (error) {
+    console.error('分页获取对话历史失败:', error)
+    throw new Error(error.message || '分页获取对话历史失败')
+  }
+}
+
+/**
+ * 按需获取一轮对话的节点轨迹
+ * @param {string} conversationId - 会话ID
+ * @param {number} [afterId] - 起始对话消息 id（不含）
+ * @param {number} [beforeId] - 结束对话消息 id（不含）
+ * @returns {Promise<Object>} 轨迹响应
+ */
+export async function getConversationTraces(conversationId, afterId = null, beforeId = null) {
+  try {
+    const params = {}
+    if (afterId) params.after_id = afterId
+    if (beforeId) params.before_id = beforeId
+    const response = await httpClient.get(`/llm/history/traces/${conversationId}`, params)
+    return response
+  } catch (error) {
+    console.error('获取对话轨迹失败:', error)
+    throw new Error(error.message || '获取对话轨迹失败')
+  }
+}
+
 /**
  * 获取所有历史记录标题列表
  * @param {string} userId - 用户ID
@@ -211,13 +211,17 @@ class KnowledgeLibraryAPI {
   }
 
   /**
-   * 获取文档分块信息
+   * 分页获取文档分块信息
    * @param {number} documentId - 文档ID
-   * @returns {Promise} API响应，包含 chunks数组和总数
+   * @param {Object} options - cursor: 上一页返回的 next_cursor；pageSize: 每页条数
+   * @returns {Promise} API响应，包含 chunks数组、next_cursor/has_more，首页附带总数
    */
-  async getDocumentChunks(documentId) {
+  async getDocumentChunks(documentId, { cursor, pageSize } = {}) {
     try {
-      const response = await httpClient.get(`/api/knowledge/documents/${documentId}/chunks`)
+      const params = {}
+      if (cursor) params.cursor = cursor
+      if (pageSize) params.page_size = pageSize
+      const response = await httpClient.get(`/api/knowledge/documents/${documentId}/chunks`, params)
       return response
     } catch (error) {
       console.error('获取文档分块失败:', error)
@@ -5,7 +5,8 @@ import {
   sendMessage as apiSendMessage, 
   sendMessageStream, 
   getChatHistory, 
-  getSingleConversationHistory,
+  getConversationHistoryPage,
+  getConversationTraces,
   getChatHistoryTitles,
   createConversation as apiCreateConversation,
   deleteConversation as apiDeleteConversation
@@ -18,6 +19,13 @@ export const useChatStore = defineStore('chat', () => {
   const loading = ref(false)
   const streaming = ref(false)
   const hasUnsavedConversation = ref(false) // 标记是否有未保存的新对话
+  const historyHasMore = ref(false) // 是否还有更早的历史消息
+  const historyBeforeId = ref(null) // 加载更早消息的游标（next_before_id）
+  const historyLoadingMore = ref(false)
+  const loadedTraceTurns = ref(new Set()) // 已按需加载过节点轨迹的用户消息 id
+  const traceLoadingTurn = ref(null)
+
+  const HISTORY_PAGE_SIZE = 50
 
   // 创建本地临时对话（不调用后端API）
   const createLocalConversation = () => {
@@ -165,70 +173,73 @@ export const useChatStore = defineStore('chat', () => {
     }
   }
 
+  // 统一历史记录和实时消息的格式
+  const normalizeHistoryMessage = (msg, index) => {
+    // 基础消息对象
+    const baseMessage = {
+      id: msg.id || `${Date.now()}-${index}`,
+      content: msg.content,
+      timestamp: msg.timestamp ? new Date(msg.timestamp) : new Date()
+    }
+
+    if (msg.type === 'updates' && msg.role === 'system') {
+      const extraData = msg.extra_data || {}
+      // 历史记录中的节点更新消息：type: "updates", role: "system"
+      // 转换为实时消息格式：role: "node_update"
+      return {
+        ...baseMessage,
+        role: 'node_update',
+        node_name: msg.node_name || extraData.node_name,
+        step_index: msg.step_index || extraData.step_index || null,
+        trace_data: msg.trace_data || extraData.trace_data || null,
+        expanded: false // 默认折叠状态
+      }
+    } else if (msg.type === 'messages') {
+      // 历史记录中的普通消息：type: "messages"
+      // 保持原有的role（user或assistant）
+      const messageObj = {
+        ...baseMessage,
+        role: msg.role
+      }
+
+      // 如果是assistant消息，提取sources信息
+      if (msg.role === 'assistant' && msg.extra_data && msg.extra_data.sources) {
+        messageObj.sources = msg.extra_data.sources
+      }
+
+      return messageObj
+    }
+    // 其他情况保持原格式
+    return {
+      ...baseMessage,
+      role: msg.role
+    }
+  }
+
+  const fetchHistoryPage = async (conversationId, beforeId = null) => {
+    const response = await getConversationHistoryPage(conversationId, { beforeId, limit: HISTORY_PAGE_SIZE })
+    if (response.status !== 200 || !response.data || !Array.isArray(response.data.history)) {
+      console.warn('历史记录数据格式不正确:', response)
+      return null
+    }
+    return {
+      messages: response.data.history.map(normalizeHistoryMessage),
+      hasMore: Boolean(response.data.has_more),
+      nextBeforeId: response.data.next_before_id || null
+    }
+  }
+
+  // 首屏只加载最近一页对话消息（不含节点轨迹），更早的消息与轨迹按需加载
   const loadConversationMessages = async (conversationId) => {
+    historyHasMore.value = false
+    historyBeforeId.value = null
+    loadedTraceTurns.value = new Set()
     try {
       loading.value = true
-      const response = await getSingleConversationHistory(conversationId)
-      
-      if (response.status === 200 && response.data) {
-        // 检查响应数据结构
-        let historyData = response.data
-        
-        // 如果data是嵌套结构，提取history数组
-        if (historyData.success && historyData.history) {
-          historyData = historyData.history
-        }
-        
-        // 确保historyData是数组
-        if (Array.isArray(historyData)) {
-          messages.value = historyData.map((msg, index) => {
-            // 基础消息对象
-            const baseMessage = {
-              id: msg.id || `${Date.now()}-${index}`,
-              content: msg.content,
-              timestamp: msg.timestamp ? new Date(msg.timestamp) : new Date()
-            }
-            
-            // 格式转换逻辑：统一历史记录和实时消息的格式
-            if (msg.type === 'updates' && msg.role === 'system') {
-              const extraData = msg.extra_data || {}
-              // 历史记录中的节点更新消息：type: "updates", role: "system"
-              // 转换为实时消息格式：role: "node_update"
-              return {
-                ...baseMessage,
-                role: 'node_update',
-                node_name: msg.node_name || extraData.node_name,
-                step_index: msg.step_index || extraData.step_index || null,
-                trace_data: msg.trace_data || extraData.trace_data || null,
-                expanded: false // 默认折叠状态
-              }
-            } else if (msg.type === 'messages') {
-              // 历史记录中的普通消息：type: "messages"
-              // 保持原有的role（user或assistant）
-              const messageObj = {
-                ...baseMessage,
-                role: msg.role
-              }
-              
-              // 如果是assistant消息，提取sources信息
-              if (msg.role === 'assistant' && msg.extra_data && msg.extra_data.sources) {
-                messageObj.sources = msg.extra_data.sources
-              }
-              
-              return messageObj
-            } else {
-              // 其他情况保持原格式
-              return {
-                ...baseMessage,
-                role: msg.role
-              }
-            }
-          })
-        } else {
-          console.warn('历史记录数据格式不正确:', historyData)
-          messages.value = []
-        }
-      }
+      const page = await fetchHistoryPage(conversationId)
+      messages.value = page ? page.messages : []
+      historyHasMore.value = page ? page.hasMore : false
+      historyBeforeId.value = page ? page.nextBeforeId : null
     } catch (error) {
       console.error('加载对话消息失败:', error)
       messages.value = []
@@ -237,6 +248,66 @@ export const useChatStore = defineStore('chat', () => {
     }
   }
 
+  // 按 before_id 游标加载更早的一页消息并插到列表前面
+  const loadOlderMessages = async () => {
+    const conversationId = currentConversation.value?.id
+    if (!conversationId || !historyHasMore.value || !historyBeforeId.value || historyLoadingMore.value) {
+      return 0
+    }
+    try {
+      historyLoadingMore.value = true
+      const page = await fetchHistoryPage(conversationId, historyBeforeId.value)
+      if (!page || currentConversation.value?.id !== conversationId) {
+        return 0
+      }
+      const existingIds = new Set(messages.value.map((msg) => msg.id))
+      const older = page.messages.filter((msg) => !existingIds.has(msg.id))
+      messages.value = [...older, ...messages.value]
+      historyHasMore.value = page.hasMore
+      historyBeforeId.value = page.nextBeforeId
+      return older.length
+    } catch (error) {
+      console.error('加载更早的对话消息失败:', error)
+      return 0
+    } finally {
+      historyLoadingMore.value = false
+    }
+  }
+
+  // 展开某轮对话的流程追溯时才加载其节点轨迹，插入到该轮用户消息之后
+  const loadTurnTraces = async (userMessageId) => {
+    const conversationId = currentConversation.value?.id
+    if (!conversationId || !Number.isInteger(userMessageId) || loadedTraceTurns.value.has(userMessageId)) {
+      return
+    }
+    const index = messages.value.findIndex((msg) => msg.id === userMessageId)
+    if (index < 0) {
+      return
+    }
+    const nextUser = messages.value.slice(index + 1).find((msg) => msg.role === 'user' && Number.isInteger(msg.id))
+    try {
+      traceLoadingTurn.value = userMessageId
+      const response = await getConversationTraces(conversationId, userMessageId, nextUser ? nextUser.id : null)
+      if (response.status !== 200 || !response.data || currentConversation.value?.id !== conversationId) {
+        return
+      }
+      const traces = (response.data.traces || []).map(normalizeHistoryMessage)
+      loadedTraceTurns.value = new Set([...loadedTraceTurns.value, userMessageId])
+      if (!traces.length) {
+        return
+      }
+      const existingIds = new Set(messages.value.map((msg) => msg.id))
+      const position = messages.value.findIndex((msg) => msg.id === userMessageId)
+      const updated = [...messages.value]
+      updated.splice(position + 1, 0, ...traces.filter((msg) => !existingIds.has(msg.id)))
+      messages.value = updated
+    } catch (error) {
+      console.error('加载节点轨迹失败:', error)
+    } finally {
+      traceLoadingTurn.value = null
+    }
+  }
+
   const sendMessage = async (messageData) => {
     // 解析messageData参数
     let content, ragMode, selectedLibrary, conversationIdOverride, collectionId, maxRetrievalDocs, systemPrompt
@@ -769,12 +840,18 @@ export const useChatStore = defineStore('chat', () => {
     loading,
     streaming,
     hasUnsavedConversation,
+    historyHasMore,
+    historyLoadingMore,
+    loadedTraceTurns,
+    traceLoadingTurn,
     createConversation,
     createLocalConversation,
     saveConversationToBackend,
     selectConversation,
     sendMessage,
     loadConversationMessages,
+    loadOlderMessages,
+    loadTurnTraces,
     loadChatHistory,
     deleteConversation
   }